@@ -0,0 +1,445 @@
+"""Local stand-in for the Wildberries and Ozon endpoints used by the importers.
+
+The emulator serves deterministic synthetic data of any size with the same
+paging schemes as the real APIs, a per-token ``429`` limiter with
+``Retry-After`` and a configurable response latency.  Data is generated on
+the fly from row indices, so a million-row report costs no memory.
+
+Point the importers at it through the shared HTTP client::
+
+    with run_emulator(EmulatorConfig(wb_report_rows_per_day=5000)) as base:
+        os.environ['FINMODEL_API_BASE'] = base      # см. http_client
+        wb_report.import_wb_detailed_reports(wb)
+
+or from the command line::
+
+    python -m scripts.api_emulator --port 8765 --latency 0.05
+
+Endpoints (paths as on the real hosts):
+
+* WB ``/api/v5/supplier/reportDetailByPeriod`` – ``rrdid`` paging
+* WB ``/api/v2/list/goods/filter`` – ``offset`` paging
+* WB ``/content/v2/get/cards/list`` – ``updatedAt``/``nmID`` cursor
+* Ozon ``/v2/finance/realization`` – one month per request
+* Ozon ``/v3/product/list`` – ``last_id`` paging
+* Ozon ``/v5/product/info/prices`` – ``cursor`` paging
+* Ozon ``/v3/finance/transaction/list`` – ``page``/``page_count``
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import datetime as dt
+import json
+import math
+import random
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Iterator
+from urllib.parse import parse_qs, urlsplit
+
+EPOCH = dt.date(2020, 1, 1)
+SUBJECTS = ["Футболки", "Платья", "Брюки", "Куртки", "Носки", "Рубашки"]
+BRANDS = ["Finmodel", "Nord", "Sever", "Luna"]
+
+
+@dataclass
+class EmulatorConfig:
+    """Sizes, latency and quota of the emulated APIs (all per token / cabinet)."""
+
+    seed: int = 1
+    latency: float = 0.0                # секунд на ответ
+    rate: float = 0.0                   # запросов/с на токен и эндпоинт, 0 — без лимита
+    burst: int = 5
+    wb_report_rows_per_day: int = 200
+    wb_items: int = 500
+    wb_goods: int = 2000
+    wb_cards: int = 2000
+    ozon_products: int = 2000
+    ozon_archived: int = 200
+    ozon_realization_rows: int = 1000   # строк на месяц
+    ozon_transactions_per_day: int = 100
+
+
+def _salt(*parts: Any) -> int:
+    return zlib.crc32("|".join(map(str, parts)).encode("utf-8"))
+
+
+def _rng(*parts: Any) -> random.Random:
+    return random.Random(_salt(*parts))
+
+
+def _date(value: str) -> dt.date:
+    return dt.date.fromisoformat(str(value)[:10])
+
+
+# ---------- Генераторы данных ---------------------------------------------
+
+class DataSet:
+    """Synthetic marketplace data addressed by index."""
+
+    def __init__(self, cfg: EmulatorConfig) -> None:
+        self.cfg = cfg
+
+    # --- WB: детальный отчёт ------------------------------------------------
+    def wb_report_row(self, token: str, rrd_id: int) -> dict[str, Any]:
+        cfg = self.cfg
+        day, _ = divmod(rrd_id - 1, cfg.wb_report_rows_per_day)
+        date = EPOCH + dt.timedelta(days=day)
+        r = _rng(cfg.seed, token, rrd_id)
+        item = r.randrange(cfg.wb_items)
+        base = _salt(token) % 1000 * 10_000
+        price = round(300 + item % 50 * 37.5, 2)
+        ret = r.random() < 0.05
+        return {
+            "realizationreport_id": 100_000 + base // 10_000 * 1000 + day // 7,
+            "rrd_id": rrd_id,
+            "create_dt": f"{date.isoformat()}T10:00:00",
+            "subject_name": SUBJECTS[item % len(SUBJECTS)],
+            "nm_id": 10_000_000 + base + item,
+            "brand_name": BRANDS[item % len(BRANDS)],
+            "sa_name": f"SKU-{item:05d}",
+            "doc_type_name": "Возврат" if ret else "Продажа",
+            "quantity": 1,
+            "retail_amount": price,
+            "ppvz_for_pay": round(price * 0.78, 2),
+            "delivery_rub": round(r.uniform(30, 90), 2),
+            "storage_fee": round(r.uniform(0, 5), 2),
+            "acceptance": 0,
+            "penalty": 0,
+            "deduction": 0,
+            "additional_payment": 0,
+        }
+
+    def wb_report_page(self, token: str, date_from: str, date_to: str,
+                       rrdid: int, limit: int) -> list[dict[str, Any]]:
+        per_day = self.cfg.wb_report_rows_per_day
+        first = (_date(date_from) - EPOCH).days * per_day + 1
+        last = ((_date(date_to) - EPOCH).days + 1) * per_day
+        start = max(first, rrdid + 1)
+        stop = min(last, start + limit - 1)
+        return [self.wb_report_row(token, i) for i in range(start, stop + 1)]
+
+    # --- WB: цены -----------------------------------------------------------
+    def wb_goods(self, token: str, offset: int, limit: int) -> list[dict[str, Any]]:
+        base = _salt(token) % 1000 * 10_000
+        out = []
+        for i in range(offset, min(offset + limit, self.cfg.wb_goods)):
+            r = _rng(self.cfg.seed, token, "goods", i)
+            price = 500 + i % 100 * 10
+            sizes = [{"sizeID": 1_000_000 + i * 10 + s, "techSizeName": str(42 + 2 * s),
+                      "price": price, "discountedPrice": round(price * 0.8),
+                      "clubDiscountedPrice": round(price * 0.75)}
+                     for s in range(1 + r.randrange(3))]
+            out.append({"nmID": 10_000_000 + base + i, "vendorCode": f"SKU-{i:05d}",
+                        "sizes": sizes})
+        return out
+
+    # --- WB: карточки -------------------------------------------------------
+    def wb_card(self, token: str, i: int) -> dict[str, Any]:
+        base = _salt(token) % 1000 * 10_000
+        return {
+            "nmID": 10_000_000 + base + i,
+            "vendorCode": f"SKU-{i:05d}",
+            "brand": BRANDS[i % len(BRANDS)],
+            "title": f"Товар {i}",
+            "subjectName": SUBJECTS[i % len(SUBJECTS)],
+            "dimensions": {"width": 10 + i % 20, "height": 5 + i % 10,
+                           "length": 20 + i % 15, "weightBrutto": round(0.2 + i % 30 / 10, 2)},
+            "updatedAt": (dt.datetime(2025, 1, 1) + dt.timedelta(minutes=i)).isoformat() + "Z",
+        }
+
+    # --- Ozon ---------------------------------------------------------------
+    def ozon_realization(self, client_id: str, year: int, month: int) -> list[dict[str, Any]]:
+        out = []
+        for i in range(self.cfg.ozon_realization_rows):
+            r = _rng(self.cfg.seed, client_id, year, month, i)
+            item = i % max(1, self.cfg.ozon_products)
+            price = 400 + item % 60 * 15
+            qty = 1 + r.randrange(3)
+
+            def block(q: int) -> dict[str, Any]:
+                amount = price * q
+                return {"amount": amount, "bonus": 0, "commission": round(amount * 0.15, 2),
+                        "compensation": 0, "price_per_instance": price, "quantity": q,
+                        "standard_fee": round(amount * 0.12, 2), "bank_coinvestment": 0,
+                        "stars": 0, "pick_up_point_coinvestment": 0,
+                        "total": round(amount * 0.85, 2)}
+
+            out.append({
+                "rowNumber": i,
+                "item": {"offer_id": f"OZ-{item:05d}", "sku": 500_000_000 + item,
+                         "barcode": f"460{item:010d}", "name": f"Товар {item}"},
+                "delivery_commission": block(qty),
+                "return_commission": block(1) if r.random() < 0.05 else None,
+                "commission_ratio": 0.15,
+                "seller_price_per_instance": price,
+            })
+        return out
+
+    def ozon_product(self, client_id: str, i: int, archived: bool = False) -> dict[str, Any]:
+        return {"product_id": 900_000 + i, "offer_id": f"OZ-{i:05d}", "archived": archived,
+                "has_fbo_stocks": True, "has_fbs_stocks": False, "is_discounted": False}
+
+    def ozon_price(self, client_id: str, i: int) -> dict[str, Any]:
+        price = 400 + i % 60 * 15
+        return {
+            "offer_id": f"OZ-{i:05d}", "product_id": 900_000 + i,
+            "acquiring": 1.5,
+            "commissions": {
+                "fbo_deliv_to_customer_amount": 25, "fbo_direct_flow_trans_min_amount": 10,
+                "fbo_direct_flow_trans_max_amount": 30, "fbo_return_flow_amount": 20,
+                "fbs_deliv_to_customer_amount": 25, "fbs_direct_flow_trans_min_amount": 15,
+                "fbs_direct_flow_trans_max_amount": 35, "fbs_first_mile_min_amount": 0,
+                "fbs_first_mile_max_amount": 25, "fbs_return_flow_amount": 20,
+                "sales_percent_fbo": 15, "sales_percent_fbs": 16, "acquiring": 1.5,
+            },
+            "price": {"currency_code": "RUB", "auto_action_enabled": False,
+                      "auto_add_to_ozon_actions_list_enabled": False,
+                      "marketing_price": price * 0.9, "marketing_seller_price": price * 0.95,
+                      "min_price": price * 0.7, "old_price": price * 1.2, "price": price,
+                      "retail_price": price * 0.6, "vat": 0.2},
+            "marketing_actions": {"ozon_actions_exist": False, "current_period_from": None,
+                                  "current_period_to": None},
+        }
+
+    def ozon_operation(self, client_id: str, day: dt.date, i: int) -> dict[str, Any]:
+        r = _rng(self.cfg.seed, client_id, day.isoformat(), i)
+        amount = round(r.uniform(-200, 1500), 2)
+        return {
+            "operation_id": _salt(client_id, day.isoformat(), i),
+            "operation_type": "OperationAgentDeliveredToCustomer",
+            "operation_date": f"{day.isoformat()} 12:00:00",
+            "operation_type_name": "Доставка покупателю",
+            "delivery_charge": 0, "return_delivery_charge": 0,
+            "accruals_for_sale": max(amount, 0), "sale_commission": round(-abs(amount) * 0.15, 2),
+            "amount": amount, "type": "orders",
+            "posting": {"delivery_schema": "FBO", "order_date": f"{day.isoformat()} 09:00:00",
+                        "posting_number": f"{client_id}-{day:%m%d}-{i}", "warehouse_id": 1},
+            "items": [], "services": [],
+        }
+
+
+# ---------- HTTP ----------------------------------------------------------
+
+class _Quota:
+    """Per (token, path) token bucket deciding on ``429``."""
+
+    def __init__(self, rate: float, burst: int) -> None:
+        self.rate, self.burst = rate, burst
+        self._state: dict[tuple[str, str], tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def check(self, key: tuple[str, str]) -> float:
+        """``0`` if allowed, else seconds until the next token."""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            tokens, stamp = self._state.get(key, (float(self.burst), now))
+            tokens = min(self.burst, tokens + (now - stamp) * self.rate)
+            if tokens >= 1:
+                self._state[key] = (tokens - 1, now)
+                return 0.0
+            self._state[key] = (tokens, now)
+            return (1 - tokens) / self.rate
+
+
+class EmulatorServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, cfg: EmulatorConfig) -> None:
+        super().__init__(address, _Handler)
+        self.cfg = cfg
+        self.data = DataSet(cfg)
+        self.quota = _Quota(cfg.rate, cfg.burst)
+        self.hits: dict[str, int] = {}
+        self._hits_lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, path: str) -> None:
+        with self._hits_lock:
+            self.hits[path] = self.hits.get(path, 0) + 1
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: EmulatorServer
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True      # заголовки и тело уходят разными пакетами
+
+    def log_message(self, *args) -> None:       # без шума в консоли
+        pass
+
+    # --- ответы -------------------------------------------------------------
+    def _send(self, status: int, payload: Any, headers: dict[str, str] | None = None) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body(self) -> dict[str, Any]:
+        n = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(n) or b"{}") if n else {}
+
+    def _dispatch(self, method: str) -> None:
+        parts = urlsplit(self.path)
+        path = parts.path.rstrip("/")
+        query = {k: v[-1] for k, v in parse_qs(parts.query).items()}
+        body = self._body() if method == "POST" else {}
+        route = ROUTES.get((method, path))
+        if route is None:
+            self._send(404, {"error": f"no route {method} {path}"})
+            return
+        wb_api = not path.startswith("/v")
+        token = (self.headers.get("Authorization") if wb_api else self.headers.get("Client-Id")) or ""
+        if not token or (not wb_api and not self.headers.get("Api-Key")):
+            self._send(401, {"error": "unauthorized"})
+            return
+        self.server.count(path)
+        wait = self.server.quota.check((token, path))
+        if wait:
+            self._send(429, {"error": "too many requests"},
+                       {"Retry-After": str(max(1, math.ceil(wait)))})
+            return
+        if self.server.cfg.latency:
+            time.sleep(self.server.cfg.latency)
+        self._send(200, route(self.server.data, token, query, body))
+
+    def do_GET(self) -> None:
+        self._dispatch("GET")
+
+    def do_POST(self) -> None:
+        self._dispatch("POST")
+
+
+# ---------- Маршруты ------------------------------------------------------
+
+def _wb_report(data: DataSet, token: str, q: dict, body: dict) -> Any:
+    return data.wb_report_page(token, q["dateFrom"], q.get("dateTo", q["dateFrom"]),
+                               int(float(q.get("rrdid") or 0)), int(q.get("limit") or 100_000))
+
+
+def _wb_goods(data: DataSet, token: str, q: dict, body: dict) -> Any:
+    goods = data.wb_goods(token, int(q.get("offset") or 0), int(q.get("limit") or 1000))
+    return {"data": {"listGoods": goods}}
+
+
+def _wb_cards(data: DataSet, token: str, q: dict, body: dict) -> Any:
+    cursor = body.get("settings", {}).get("cursor", {}) or {}
+    limit = int(cursor.get("limit") or 100)
+    after = cursor.get("nmID")
+    base = _salt(token) % 1000 * 10_000
+    start = after - 10_000_000 - base + 1 if after else 0
+    cards = [data.wb_card(token, i) for i in range(start, min(start + limit, data.cfg.wb_cards))]
+    cur = {"total": len(cards)}
+    if cards:
+        cur.update(updatedAt=cards[-1]["updatedAt"], nmID=cards[-1]["nmID"])
+    return {"cards": cards, "cursor": cur}
+
+
+def _ozon_realization(data: DataSet, client_id: str, q: dict, body: dict) -> Any:
+    year, month = int(body["year"]), int(body["month"])
+    rows = data.ozon_realization(client_id, year, month)
+    return {"result": {"header": {"num": f"{client_id}-{year}{month:02d}",
+                                  "start_date": f"{year}-{month:02d}-01"},
+                       "rows": rows}}
+
+
+def _ozon_products(data: DataSet, client_id: str, q: dict, body: dict) -> Any:
+    limit = int(body.get("limit") or 1000)
+    start = int(body.get("last_id") or 0)
+    total = data.cfg.ozon_products
+    items = [data.ozon_product(client_id, i) for i in range(start, min(start + limit, total))]
+    last_id = str(start + len(items)) if start + len(items) < total else ""
+    return {"result": {"items": items, "total": total, "last_id": last_id}}
+
+
+def _ozon_prices(data: DataSet, client_id: str, q: dict, body: dict) -> Any:
+    vis = (body.get("filter") or {}).get("visibility", "ALL")
+    limit = int(body.get("limit") or 1000)
+    start = int(body.get("cursor") or 0)
+    if vis == "ARCHIVED":
+        lo, hi = data.cfg.ozon_products, data.cfg.ozon_products + data.cfg.ozon_archived
+    else:
+        lo, hi = 0, data.cfg.ozon_products
+    first = lo + start
+    items = [data.ozon_price(client_id, i) for i in range(first, min(first + limit, hi))]
+    nxt = start + len(items)
+    return {"items": items, "cursor": str(nxt) if lo + nxt < hi else "", "total": hi - lo}
+
+
+def _ozon_transactions(data: DataSet, client_id: str, q: dict, body: dict) -> Any:
+    flt = body.get("filter", {}).get("date", {})
+    d0, d1 = _date(flt["from"]), _date(flt["to"])
+    per_day = data.cfg.ozon_transactions_per_day
+    total = ((d1 - d0).days + 1) * per_day
+    page, size = int(body.get("page") or 1), int(body.get("page_size") or 1000)
+    ops = []
+    for n in range((page - 1) * size, min(page * size, total)):
+        day_i, i = divmod(n, per_day)
+        ops.append(data.ozon_operation(client_id, d0 + dt.timedelta(days=day_i), i))
+    return {"result": {"operations": ops, "page_count": max(1, math.ceil(total / size)),
+                       "row_count": total}}
+
+
+ROUTES = {
+    ("GET", "/api/v5/supplier/reportDetailByPeriod"): _wb_report,
+    ("GET", "/api/v2/list/goods/filter"): _wb_goods,
+    ("POST", "/content/v2/get/cards/list"): _wb_cards,
+    ("POST", "/v2/finance/realization"): _ozon_realization,
+    ("POST", "/v3/product/list"): _ozon_products,
+    ("POST", "/v5/product/info/prices"): _ozon_prices,
+    ("POST", "/v3/finance/transaction/list"): _ozon_transactions,
+}
+
+
+def start_emulator(cfg: EmulatorConfig | None = None, host: str = "127.0.0.1",
+                   port: int = 0) -> EmulatorServer:
+    """Start the emulator in a daemon thread; ``port=0`` picks a free port."""
+    server = EmulatorServer((host, port), cfg or EmulatorConfig())
+    threading.Thread(target=server.serve_forever, name="api_emulator", daemon=True).start()
+    return server
+
+
+@contextlib.contextmanager
+def run_emulator(cfg: EmulatorConfig | None = None, **kw) -> Iterator[EmulatorServer]:
+    server = start_emulator(cfg, **kw)
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def main(argv: list[str] | None = None) -> None:
+    ap = argparse.ArgumentParser(description="Эмулятор API Wildberries/Ozon")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    for name, value in vars(EmulatorConfig()).items():
+        ap.add_argument(f"--{name.replace('_', '-')}", type=type(value), default=value)
+    args = vars(ap.parse_args(argv))
+    host, port = args.pop("host"), args.pop("port")
+    server = EmulatorServer((host, port), EmulatorConfig(**args))
+    print(f"Эмулятор API: {server.base_url}  (FINMODEL_API_BASE={server.base_url})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
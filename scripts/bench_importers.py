@@ -0,0 +1,251 @@
+"""End-to-end throughput of the API importers against the local emulator.
+
+Every importer runs unchanged on the headless workbook backend while the
+shared HTTP client is redirected (``FINMODEL_API_BASE``) to
+:mod:`scripts.api_emulator`.  For each importer the run time, the number of
+rows written, rows per second and the HTTP requests made are reported::
+
+    python -m scripts.bench_importers --orgs 3 --rows-per-day 2000
+    python -m scripts.bench_importers wb_report ozon_prices --json bench.json
+
+By default the client's per-token rate budgets stay on, as in production;
+``--unthrottled`` switches them off to measure parsing and writing alone.
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import datetime as dt
+import io
+import json
+import os
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Callable
+from unittest import mock
+
+import xlwings as xw
+
+from scripts import http_client
+from scripts.api_emulator import EmulatorConfig, run_emulator
+from scripts.workbook_backend import open_headless
+
+
+@dataclass
+class BenchResult:
+    name: str
+    seconds: float
+    rows: int
+    requests: int
+    retries: int
+    bytes: int
+    error: str | None = None
+
+    @property
+    def rows_per_sec(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+
+class _Unthrottled(http_client.HttpClient):
+    """Client without rate budgets: the emulator's own quota still applies."""
+
+    def _bucket(self, url, key):
+        return None
+
+
+def build_workbook(path: Path, orgs: int, date_from: dt.date, date_to: dt.date) -> Path:
+    """Minimal source workbook with the settings sheets the importers read."""
+    from openpyxl import Workbook
+
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Настройки"
+    ws.append(["Параметр", "Значение"])
+    ws.append(["ПериодНачало", date_from.strftime("%d.%m.%Y")])
+    ws.append(["ПериодКонец", date_to.strftime("%d.%m.%Y")])
+    ws = wb.create_sheet("НастройкиОрганизаций")
+    ws.append(["Организация", "Token_WB", "Client-Id", "Token_Ozon", "rrd_id"])
+    for i in range(1, orgs + 1):
+        ws.append([f"ООО Тест {i}", f"wb-token-{i}", str(100_000 + i), f"ozon-key-{i}", 0])
+    wb.save(path)
+    return path
+
+
+# ---------- Импортёры ---------------------------------------------------------
+
+def _caller(wb):
+    return mock.patch.object(xw.Book, "caller", staticmethod(lambda: wb))
+
+
+def _run_wb_report(wb, period) -> int:
+    from scripts import wb_report
+    wb_report.import_wb_detailed_reports(wb)
+    return _data_rows(wb, wb_report.SHEET_FACTS)
+
+
+def _run_wb_prices(wb, period) -> int:
+    from scripts import wb_prices
+    wb_prices.load_wb_prices_by_size_xlwings(wb)
+    return _data_rows(wb, "Цены_WB")
+
+
+def _run_wb_cards(wb, period) -> int:
+    from scripts import import_wb_product_cards as mod
+    with _caller(wb):
+        mod.main()
+    return _data_rows(wb, mod.PRODUCTS_SHEET)
+
+
+def _run_ozon_realization(wb, period) -> int:
+    from scripts import import_ozon_realization_grouped as mod
+    with _caller(wb):
+        mod.main()
+    return _data_rows(wb, mod.SHEET_NAME)
+
+
+def _run_ozon_products(wb, period) -> int:
+    from scripts import import_ozon_products as mod
+    with _caller(wb):
+        mod.main()
+    return _data_rows(wb, mod.PRODUCTS_SHEET)
+
+
+def _run_ozon_prices(wb, period) -> int:
+    from scripts import import_ozon_price_info as mod
+    with _caller(wb):
+        mod.main()
+    return _data_rows(wb, mod.SHEET_PRICES)
+
+
+def _run_ozon_transactions(wb, period) -> int:
+    from scripts import trans
+    path = Path(wb.output_path).with_name("Ozon_Transactions.xlsx")
+    with _caller(wb), _env(**{trans.TARGET_ENV: str(path)}):
+        trans.main()
+        target = open_headless(path, path)
+    try:
+        return _data_rows(target, trans.SHEET_NAME)
+    finally:
+        target.close()
+
+
+def _data_rows(wb, sheet: str) -> int:
+    if sheet not in wb.sheets:
+        return 0
+    grid = wb.sheets[sheet].grid
+    return max(0, sum(1 for r in grid if any(v is not None for v in r)) - 1)
+
+
+IMPORTERS: dict[str, Callable[[Any, tuple[dt.date, dt.date]], int]] = {
+    "wb_report": _run_wb_report,
+    "wb_prices": _run_wb_prices,
+    "wb_cards": _run_wb_cards,
+    "ozon_realization": _run_ozon_realization,
+    "ozon_products": _run_ozon_products,
+    "ozon_prices": _run_ozon_prices,
+    "ozon_transactions": _run_ozon_transactions,
+}
+
+
+# ---------- Прогон --------------------------------------------------------------
+
+@contextlib.contextmanager
+def _env(**values: str):
+    old = {k: os.environ.get(k) for k in values}
+    os.environ.update(values)
+    try:
+        yield
+    finally:
+        for k, v in old.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+
+
+def run_benchmarks(names: list[str] | None = None, cfg: EmulatorConfig | None = None,
+                   orgs: int = 2, date_from: dt.date = dt.date(2025, 1, 1),
+                   date_to: dt.date = dt.date(2025, 1, 31), unthrottled: bool = False,
+                   verbose: bool = False) -> list[BenchResult]:
+    """Run the selected importers (all by default) against a fresh emulator."""
+    names = names or list(IMPORTERS)
+    results = []
+    with tempfile.TemporaryDirectory(prefix="finmodel_bench_") as tmp, \
+            run_emulator(cfg) as server, \
+            _env(FINMODEL_API_BASE=server.base_url, FINMODEL_CACHE_DIR=str(Path(tmp) / "cache")):
+        src = build_workbook(Path(tmp) / "bench.xlsx", orgs, date_from, date_to)
+        old_client = http_client._CLIENT
+        try:
+            for name in names:
+                client = _Unthrottled() if unthrottled else http_client.HttpClient()
+                http_client._CLIENT = client
+                wb = open_headless(src, Path(tmp) / f"{name}_out.xlsx")
+                out = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+                started = time.perf_counter()
+                rows, error = 0, None
+                try:
+                    with out:
+                        rows = IMPORTERS[name](wb, (date_from, date_to))
+                except Exception as e:          # результат остальных импортёров не теряется
+                    error = f"{type(e).__name__}: {e}"
+                seconds = time.perf_counter() - started
+                wb.close()
+                client.close()
+                stats = client.metrics.by_endpoint().values()
+                results.append(BenchResult(
+                    name, seconds, rows,
+                    requests=int(sum(s["requests"] for s in stats)),
+                    retries=int(sum(s["retries"] for s in stats)),
+                    bytes=int(sum(s["bytes"] for s in stats)),
+                    error=error))
+        finally:
+            http_client._CLIENT = old_client
+    return results
+
+
+def format_results(results: list[BenchResult]) -> str:
+    lines = [f"{'импортёр':<18} {'сек':>8} {'строк':>9} {'строк/с':>10} {'запр.':>6} {'повт.':>6} {'МБ':>7}"]
+    for r in results:
+        line = (f"{r.name:<18} {r.seconds:>8.2f} {r.rows:>9,} {r.rows_per_sec:>10,.0f} "
+                f"{r.requests:>6} {r.retries:>6} {r.bytes / 2**20:>7.2f}")
+        lines.append(line + (f"  ❌ {r.error}" if r.error else ""))
+    return "\n".join(lines)
+
+
+def main(argv: list[str] | None = None) -> list[BenchResult]:
+    ap = argparse.ArgumentParser(description="Бенчмарк импортёров на эмуляторе API")
+    ap.add_argument("importers", nargs="*", metavar="importer",
+                    help=f"из: {', '.join(IMPORTERS)} (по умолчанию все)")
+    ap.add_argument("--orgs", type=int, default=2)
+    ap.add_argument("--date-from", type=dt.date.fromisoformat, default=dt.date(2025, 1, 1))
+    ap.add_argument("--date-to", type=dt.date.fromisoformat, default=dt.date(2025, 1, 31))
+    ap.add_argument("--rows-per-day", type=int, default=200, help="строк отчёта WB в день")
+    ap.add_argument("--products", type=int, default=2000, help="товаров/карточек на кабинет")
+    ap.add_argument("--latency", type=float, default=0.0, help="задержка ответа, сек")
+    ap.add_argument("--rate", type=float, default=0.0, help="квота эмулятора, запр./с (0 — нет)")
+    ap.add_argument("--unthrottled", action="store_true", help="без бюджетов клиента")
+    ap.add_argument("--verbose", action="store_true", help="показывать вывод импортёров")
+    ap.add_argument("--json", type=Path, help="сохранить результаты в JSON")
+    args = ap.parse_args(argv)
+    unknown = [n for n in args.importers if n not in IMPORTERS]
+    if unknown:
+        ap.error(f"неизвестные импортёры: {', '.join(unknown)}")
+
+    n = args.products
+    cfg = EmulatorConfig(latency=args.latency, rate=args.rate,
+                         wb_report_rows_per_day=args.rows_per_day,
+                         wb_goods=n, wb_cards=n, ozon_products=n, ozon_realization_rows=n)
+    results = run_benchmarks(args.importers, cfg, args.orgs, args.date_from, args.date_to,
+                             args.unthrottled, args.verbose)
+    print(format_results(results))
+    if args.json:
+        payload = [dict(asdict(r), rows_per_sec=r.rows_per_sec) for r in results]
+        args.json.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
+    return results
+
+
+if __name__ == "__main__":
+    main()
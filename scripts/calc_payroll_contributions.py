@@ -21,6 +21,8 @@ import argparse
 from decimal import Decimal
 import numpy as np
 
+from scripts import org_settings
+
 # -------- Показатели, которые будем выводить в сводный лист --------
 SCENARIOS = {
     'as_is'        : 'Как есть',
@@ -177,33 +179,16 @@ def load_benefits(wb):
     return benefit
 
 
-# ----- вставьте вместо старой load_org_meta -----
 def load_org_meta(wb):
-    sht = wb.sheets['НастройкиОрганизаций']
-    df  = (sht.range('A1')
-              .options(pd.DataFrame, header=1, index=False, expand='table')
-              .value)
-
-    # чистим заголовки
-    df.columns = (df.columns.astype(str)
-                  .str.replace(r'[\u00A0\u2007\u202F]', '', regex=True)
-                  .str.strip())
-
-    # alias для старого имени колонки
-    if 'РежимНалого' in df.columns and 'РежимНалогооблNew' not in df.columns:
-        df.rename(columns={'РежимНалого': 'РежимНалогооблNew'}, inplace=True)
-
-    cols = ['Организация', 'Категория_Льготы', 'Тариф_НСиПЗ',
-            'РежимНалогооблNew', 'СтавкаНалогаУСН']
-
-    meta = df.reindex(columns=cols).set_index('Организация')
+    registry = org_settings.load(wb)
+    meta = registry.frame(['Категория_Льготы', 'Тариф_НСиПЗ', 'СтавкаНалогаУСН'])
+    meta.insert(2, 'РежимНалогооблNew', [registry[org].tax_mode for org in meta.index])
 
     meta['Тариф_НСиПЗ']     = meta['Тариф_НСиПЗ'].apply(
                                 lambda x: standardize_rate(to_float(x)))
     meta['СтавкаНалогаУСН'] = meta['СтавкаНалогаУСН'].apply(
                                 lambda x: to_float(x) or 0.06)
     return meta
-# -----------------------------------------------
 
 
 
@@ -2,27 +2,22 @@
 
 from pathlib import Path
 import xlwings as xw
+import numpy as np
 import pandas as pd
 import logging
 import datetime
+import sys
+import time
+from scripts import org_settings
+from scripts.cogs_engine import (HEADER, RUB_COLUMNS, join_inputs, price_inputs, row_hashes,
+                                 table_hashes, table_rows)
+from scripts.cogs_state import CogsState, settings_hash
+from scripts.price_store import row_blocks
+from scripts.rate_table import read_rates
 from scripts.sheet_utils import apply_sheet_settings
+from scripts.workbook_backend import headless_requested, open_headless
+from scripts.workbook_snapshot import book_tag, cache_dir
 
-# Налоговая списываемость закупочной цены в зависимости от типа логистики
-TAX_DEDUCTIBLE_BY_LOGISTIC = {"Карго": False, "Белая": True}
-RUS_TO_LAT = str.maketrans("АВЕКМНОРСТХ", "ABEKMHOPCTX")  # кир → лат
-
-
-
-def norm(key: str) -> str:
-    """
-    Нормализует артикул:
-    • обрезает пробелы
-    • приводит к верхнему регистру
-    • переводит русские 'A,B, ...' в латиницу
-    """
-    if key is None:
-        return ""
-    return str(key).replace(" ", " ").strip().upper().translate(RUS_TO_LAT)
 BASE_DIR = Path(__file__).resolve().parent
 LOG_DIR = (BASE_DIR / "log")
 LOG_DIR.mkdir(exist_ok=True)
@@ -51,7 +46,7 @@ SHEET_PRODUCTS = 'Номенклатура_WB'
 SHEET_PRICES   = 'ЗакупочныеЦены'
 SHEET_DUTIES   = 'ТаможенныеПошлины'
 SHEET_SETTINGS = 'Настройки'
-SHEET_ORGS = 'НастройкиОрганизаций'
+SHEET_ORGS = org_settings.SHEET
 
 SHEET_RESULT   = 'РасчётСебестоимости'
 TABLE_NAME     = 'CogsTable'
@@ -61,6 +56,10 @@ PROGRESS_CELL  = 'Z1'  # Можно скрыто хранить прогресс
 BATCH_SIZE = 1000  # Объём одной порции для записи в Excel
 
 def get_workbook():
+    if headless_requested():
+        wb = open_headless(EXCEL_PATH)
+        print(f'→ Headless-режим (openpyxl): {EXCEL_PATH} → {wb.output_path}')
+        return wb, wb.app
     try:
         wb = xw.Book.caller()
         app = None
@@ -71,14 +70,6 @@ def get_workbook():
         print(f'→ Запуск из терминала, открыт файл: {EXCEL_PATH}')
     return wb, app
 
-def safe_float(val):
-    try:
-        if pd.isna(val):
-            return 0.0
-        return float(str(val).replace(',', '.').replace(' ', '').replace(' ', ''))
-    except Exception:
-        return 0.0
-
 def read_settings(ws):
     df = ws.range(1, 1).expand().options(pd.DataFrame, header=1, index=False).value
     df = df.loc[:, ~df.columns.duplicated()]  # Убираем дубликаты
@@ -107,16 +98,6 @@ def read_settings(ws):
         "cnyRate": get_num('Курс_CNY'),
         "ndsRateWhite": get_num('НДС_Белая', 0) / 100.0 if get_num('НДС_Белая', 0) > 1 else get_num('НДС_Белая', 0)
     }
-def get_logistics_mode(org, orgs_ws):
-    df = orgs_ws.range(1, 1).expand().options(pd.DataFrame, header=1, index=False).value
-    row = df[df.iloc[:, 0] == org]
-    if not row.empty and 'Тип_Логистики' in row.columns:
-        val = row.iloc[0]['Тип_Логистики']
-        if isinstance(val, str) and 'бел' in val.lower():
-            return 'Белая'
-    return 'Карго'
-
-
 def get_progress(ws):
     try:
         val = ws.range(PROGRESS_CELL).value
@@ -130,7 +111,75 @@ def set_progress(ws, idx):
 def clear_progress(ws):
     ws.range(PROGRESS_CELL).value = None
 
-def main():
+def state_path(wb):
+    return cache_dir() / f"cogs_{book_tag(wb)}.npz"
+
+
+def sheet_rows(ws):
+    """Data rows of the result sheet, or ``None`` if it has no CogsTable header."""
+    if ws.range((1, 1), (1, len(HEADER))).value != HEADER:
+        return None
+    # Закуп_Цена_руб заполнена в каждой строке, в отличие от текстовых колонок
+    return ws.range((ws.cells.rows.count, 5)).end('up').row - 1
+
+
+def sheet_hashes(ws, nrows):
+    """:func:`table_hashes` of the first ``nrows`` rows now on the sheet (one range read).
+
+    A row with a blank or non-numeric rouble cell hashes as 0, i.e. never
+    matches a computed row.
+    """
+    if not nrows:
+        return np.zeros(0, dtype=np.uint64)
+    values = ws.range((2, 1), (nrows + 1, len(HEADER))).options(ndim=2).value
+    df = pd.DataFrame(values, columns=HEADER)
+    rub = df[RUB_COLUMNS].apply(pd.to_numeric, errors='coerce')
+    bad = rub.isna().any(axis=1).to_numpy()
+    df[RUB_COLUMNS] = rub.fillna(0)
+    return np.where(bad, np.uint64(0), table_hashes(df))
+
+
+def write_all(ws, rows):
+    ws.clear()
+    ws.range(1, 1).value = HEADER
+    for chunk_start in range(0, len(rows), BATCH_SIZE):
+        batch_out = rows[chunk_start:chunk_start + BATCH_SIZE]
+        ws.range((chunk_start + 2, 1)).value = batch_out
+        log(f"добавлено строк: {len(batch_out)}")
+
+
+def format_table(ws, nrows):
+    """(Re)create the smart table over the header and ``nrows`` rows."""
+    for tbl in ws.tables:
+        if tbl.name == TABLE_NAME:
+            tbl.delete()
+
+    rng = ws.range((1, 1), (nrows + 1, len(HEADER)))
+    ws.tables.add(rng, name=TABLE_NAME, table_style_name=TABLE_STYLE, has_headers=True)
+    # Форматирование рублёвых колонок с разделителем тысяч
+    try:
+        tbl = ws.api.ListObjects(TABLE_NAME)
+        fmt = '#,##0 ₽'
+        headers = [c.Name for c in tbl.ListColumns]
+        for col_name in RUB_COLUMNS:
+            if col_name in headers:
+                idx = headers.index(col_name) + 1
+                tbl.ListColumns(idx).Range.NumberFormat = fmt
+    except Exception as e:
+        log(f'Не удалось применить формат: {e}', 'warning')
+    ws.autofit()
+
+
+def resize_table(ws, nrows):
+    for tbl in ws.tables:
+        if tbl.name == TABLE_NAME:
+            tbl.resize(ws.range((1, 1), (nrows + 1, len(HEADER))))
+            return
+    format_table(ws, nrows)
+
+
+def main(full=False):
+    """Reprice changed products; ``full=True`` recomputes and rewrites everything."""
     log("=== Старт batch расчёта себестоимости ===")
     wb, app = get_workbook()           # app=None → запущено из Excel; иначе invis-Excel
 
@@ -140,8 +189,8 @@ def main():
             prod_ws     = wb.sheets[SHEET_PRODUCTS]
             price_ws    = wb.sheets[SHEET_PRICES]
             duty_ws     = wb.sheets[SHEET_DUTIES]
-            orgs_ws     = wb.sheets[SHEET_ORGS]
             settings_ws = wb.sheets[SHEET_SETTINGS]
+            orgs        = org_settings.load(wb)
         except Exception as e:
             print(f"❌ Не найден один из листов: {e}")
             log(f"Критическая ошибка: {e}", "error")
@@ -150,21 +199,19 @@ def main():
         # 2. Читаем глобальные параметры
         global_params = read_settings(settings_ws)
         log(f"→ Параметры: {global_params}")
+        rates = read_rates(wb)
+        if len(rates):
+            log(f"→ Датированных курсов и тарифов: {len(rates)}")
 
         # 3. Загружаем таблицы в DataFrame
         prod_df  = prod_ws.range(1,1).expand().options(pd.DataFrame, header=1, index=False).value
         price_df = price_ws.range(1,1).expand().options(pd.DataFrame, header=1, index=False).value
         duty_df  = duty_ws.range(1,1).expand().options(pd.DataFrame, header=1, index=False).value
 
-        # 4. Строим словари для быстрого поиска
-        price_dict = {norm(r['Артикул_поставщика']): r for _, r in price_df.iterrows()}
-        duty_dict  = {str(r['Предмет']).strip(): r for _, r in duty_df.iterrows()}
-
-        # --- ДОБАВЬ ЭТОТ БЛОК ---
 
         # Логируем список всех уникальных предметов из товаров и из пошлин
-        unique_subjects_products = set(str(row['Предмет']).strip() for _, row in prod_df.iterrows())
-        unique_subjects_duties   = set(str(row['Предмет']).strip() for _, row in duty_df.iterrows())
+        unique_subjects_products = set(prod_df['Предмет'].astype(str).str.strip())
+        unique_subjects_duties   = set(duty_df['Предмет'].astype(str).str.strip())
 
         log(f"[INFO] Всего уникальных предметов в товарах: {len(unique_subjects_products)}")
         log(f"[INFO] Всего уникальных предметов в пошлинах: {len(unique_subjects_duties)}")
@@ -179,132 +226,68 @@ def main():
         if extra_in_duties:
             log(f"[INFO] В пошлинах есть {len(extra_in_duties)} лишних предметов, которых нет в товарах. Примеры: {extra_in_duties[:10]}")
 
+        # 4. Собираем входы каждого товара и сравниваем с прошлым запуском
+        started = time.perf_counter()
+        inputs = join_inputs(prod_df, price_df, duty_df, orgs.logistics_modes())
+        in_hashes = row_hashes(inputs)
+        settings = settings_hash({**global_params, 'rates': rates.digest()})
+        missing_price = int((~inputs['has_price']).sum())
 
-        
-  # 5. Готовим лист результата
+        # 5. Готовим лист результата
         result_ws = wb.sheets[SHEET_RESULT] if SHEET_RESULT in [s.name for s in wb.sheets] \
                     else wb.sheets.add(SHEET_RESULT)
 
         # --- Применяем настройки листа (цвет и позицию) ---
         apply_sheet_settings(wb, SHEET_RESULT)
 
-            
-     
-
-        header = [
-            'Организация', 'Артикул_поставщика', 'Предмет', 'Наименование',
-            'Закуп_Цена_руб', 'Логистика_руб', 'Пошлина_руб', 'НДС_руб',
-            'Себестоимость_руб', 'Себестоимость_без_НДС_руб', 'Входящий_НДС_руб',
-            'СебестоимостьУпр', 'СебестоимостьНалог', 'СебестоимостьНалог_без_НДС'
-        ]
-        result_ws.clear()
-        result_ws.range(1, 1).value = header
-        first_free = 2
-
-        # 6. Основной цикл по товарам чанками
-        missing_price = 0
-        for chunk_start in range(0, len(prod_df), BATCH_SIZE):
-            chunk_end = min(len(prod_df), chunk_start + BATCH_SIZE)
-            batch_out = []
-            for i in range(chunk_start, chunk_end):
-                row = prod_df.iloc[i]
-                org          = row['Организация']
-                vendor_orig  = row['Артикул_поставщика']
-                vendor_norm  = norm(vendor_orig)
-                subject      = row['Предмет']
-                name         = row['Название']
-                weight       = safe_float(row['Вес_брутто'])
-
-                price_row = price_dict.get(vendor_norm)
-                if price_row is None:
-                    log(f"Нет закупочной цены для {vendor_orig} ({org}), ставим 0", "debug")
-                    missing_price += 1
-                    price_row = {}
-
-                # Тип логистики берём из закупочной строки, иначе из настроек организации
-                logistics_mode = price_row.get('Тип_Логистики')
-                if not isinstance(logistics_mode, str) or not logistics_mode.strip():
-                    logistics_mode = get_logistics_mode(org, orgs_ws)
-
-                # --- расчёты ---
-                price_val = safe_float(price_row.get('Закуп_Цена'))
-                rate      = global_params['usdRate'] if price_row.get('Валюта') == 'USD' \
-                        else global_params['cnyRate'] if price_row.get('Валюта') == 'CNY' else 1
-                purchase_rub = price_val * rate
-
-                duty_row = duty_dict.get(subject)
-                kg_rate  = global_params['cargoRatePerKg'] if logistics_mode == 'Карго' \
-                        else global_params['whiteRatePerKg']
-                logistics_rub = weight * kg_rate * global_params['usdRate']
-
-                duty_rate = 0
-                if logistics_mode == 'Белая' and duty_row is not None:
-                    raw = duty_row.get('Ставка_пошлины') or duty_row.get('Пошлина')
-                    log(f"Пошлина для {subject}: raw={raw}", "info")
-                    if raw:
-                        raw_str = str(raw).replace('%','').replace(',','.').strip()
-                        try:
-                            if float(raw_str) < 1:   # Уже доля, например 0.142 → не делим
-                                duty_rate = float(raw_str)
-                            else:                   # Вдруг где-то 14.2 → делим
-                                duty_rate = float(raw_str) / 100
-                        except Exception as e:
-                            log(f"[ERROR] Не удалось привести raw='{raw}' к числу: {e}", "error")
-                duty_rub = purchase_rub * duty_rate
-
-                vat_rub  = (purchase_rub + duty_rub + logistics_rub) * global_params['ndsRateWhite'] \
-                        if logistics_mode == 'Белая' else 0
-
-                total_cogs      = purchase_rub + duty_rub + logistics_rub + vat_rub
-                cogs_without_vat = total_cogs - vat_rub
-
-                # --- себестоимость по управленческому и налоговому учёту ---
-                total_cogs_full = purchase_rub + logistics_rub + duty_rub + vat_rub
-                is_deductible = logistics_mode != 'Карго'
-                cogs_mgmt = total_cogs_full
-                cogs_tax = total_cogs_full if is_deductible else 0
-                cogs_tax_wo = (total_cogs_full - vat_rub) if is_deductible else 0
-
-                batch_out.append([
-                    org, vendor_orig, subject, name,
-                    round(purchase_rub), round(logistics_rub), round(duty_rub),
-                    round(vat_rub),      round(total_cogs),    round(cogs_without_vat),
-                    round(vat_rub), round(cogs_mgmt), round(cogs_tax), round(cogs_tax_wo)
-                ])
-
-            if batch_out:
-                result_ws.range((first_free, 1)).value = batch_out
-                first_free += len(batch_out)
-                log(f"добавлено строк: {len(batch_out)}")
-
-        log(f"Расчёт завершён. Итоговых строк: {first_free-2}, строк без цены: {missing_price}")
-        #print(f"✓ COGS рассчитан: {first_free-2} строк, без цены {missing_price}")
-
-        # 7. Оформляем умную таблицу
-        for tbl in result_ws.tables:
-            if tbl.name == TABLE_NAME:
-                tbl.delete()
-
-        rng = result_ws.range((1,1), (first_free-1, len(header)))
-        result_ws.tables.add(rng, name=TABLE_NAME,
-                             table_style_name=TABLE_STYLE, has_headers=True)
-        # Форматирование рублёвых колонок с разделителем тысяч
-        try:
-            tbl = result_ws.api.ListObjects(TABLE_NAME)
-            fmt = '#,##0 ₽'
-            rub_cols = [
-                'Закуп_Цена_руб', 'Логистика_руб', 'Пошлина_руб', 'НДС_руб',
-                'Себестоимость_руб', 'Себестоимость_без_НДС_руб', 'Входящий_НДС_руб',
-                'СебестоимостьУпр', 'СебестоимостьНалог', 'СебестоимостьНалог_без_НДС'
-            ]
-            headers = [c.Name for c in tbl.ListColumns]
-            for col_name in rub_cols:
-                if col_name in headers:
-                    idx = headers.index(col_name) + 1
-                    tbl.ListColumns(idx).Range.NumberFormat = fmt
-        except Exception as e:
-            log(f'Не удалось применить формат: {e}', 'warning')
-        result_ws.autofit()
+        path = state_path(wb)
+        state = None if full else CogsState.load(path)
+        if state is not None and sheet_rows(result_ws) != state.rows:
+            log("Лист результата не совпадает с сохранённым состоянием — полный пересчёт", "warning")
+            state = None
+
+        # Лист сверяется с сохранёнными хэшами: книгу могли закрыть без сохранения
+        # или поправить строки таблицы вручную
+        n = len(inputs)
+        stale = np.zeros(0, dtype=np.int64)
+        if state is not None:
+            on_sheet = sheet_hashes(result_ws, state.rows)
+            stale = np.flatnonzero(on_sheet != state.outputs)
+            if stale.size:
+                log(f"Строк на листе не совпадает с последним расчётом: {stale.size} — будут переписаны",
+                    "warning")
+            state.outputs = on_sheet
+
+        # 6. Пересчитываем только изменившиеся товары
+        todo = np.arange(n) if state is None else \
+            np.union1d(state.changed(in_hashes, settings), stale[stale < n])
+        cogs_df = price_inputs(inputs.iloc[todo], global_params, rates)
+        out_hashes = np.zeros(n, dtype=np.uint64)
+        if state is not None:
+            m = min(n, state.rows)
+            out_hashes[:m] = state.outputs[:m]
+        new_hashes = table_hashes(cogs_df)
+        out_hashes[todo] = new_hashes
+        log(f"Себестоимость {len(todo)} из {n} товаров рассчитана за {time.perf_counter() - started:.3f} с")
+
+        if state is None:
+            write_all(result_ws, table_rows(cogs_df))
+            format_table(result_ws, n)
+        else:
+            write = state.differs(todo, new_hashes)
+            rows = dict(zip((todo[write] + 2).tolist(), table_rows(cogs_df[write])))
+            blocks = row_blocks(rows)
+            for first, last in blocks:
+                result_ws.range((first, 1)).value = [rows[r] for r in range(first, last + 1)]
+            if n < state.rows:
+                result_ws.range((n + 2, 1), (state.rows + 1, len(HEADER))).clear_contents()
+            if n != state.rows:
+                resize_table(result_ws, n)
+            log(f"Переписано строк: {len(rows)} ({len(blocks)} блок(ов)), "
+                f"без изменений: {n - len(rows)}, удалено: {max(0, state.rows - n)}")
+        CogsState(settings, in_hashes, out_hashes).save(path)
+
+        log(f"Расчёт завершён. Итоговых строк: {n}, строк без цены: {missing_price}")
         log("Готово, файл сохранён")
         print("✓ Готово!")
 
@@ -318,4 +301,4 @@ def main():
 
 # ------------------------------------------
 if __name__ == "__main__":
-    main()
+    main(full="--full" in sys.argv[1:])
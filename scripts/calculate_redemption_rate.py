@@ -1,21 +1,30 @@
 # calculate_redemption_rate.py
 # ----------------------------------------------------------
 # Расчёт % выкупа по nmId на основе srid за 90 дней
+# Заказы и продажи копятся в локальном хранилище (scripts.redemption_store),
+# с API запрашиваются только записи, изменённые после прошлого запуска.
 # ----------------------------------------------------------
 
 from pathlib import Path
-import time
 import datetime
-import requests
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 import xlwings as xw
 
+from scripts import org_settings
+from scripts.http_client import get_client
+from scripts.redemption_store import RedemptionStore
+from scripts.workbook_snapshot import book_tag, cache_dir
+
 EXCEL_PATH = Path(__file__).resolve().parents[1] / 'Finmodel.xlsm'
-SHEET_SETTINGS = 'НастройкиОрганизаций'
+SHEET_SETTINGS = org_settings.SHEET
 SHEET_OUTPUT = '%ВыкупаWB'
 DAYS = 90
 WB_ORDERS_URL = 'https://statistics-api.wildberries.ru/api/v1/supplier/orders'
 WB_SALES_URL = 'https://statistics-api.wildberries.ru/api/v1/supplier/sales'
+PAGE_ROWS = 80000        # строк в полной странице; страница короче — последняя
+WB_MAX_WORKERS = 8       # одновременных выгрузок (организация × заказы/продажи)
+FEEDS = {'orders': WB_ORDERS_URL, 'sales': WB_SALES_URL}
 
 def get_workbook():
     try:
@@ -29,68 +38,80 @@ def get_workbook():
     return wb, app
 
 def fetch_wb_data(url, token, date_from):
+    """Records changed since ``date_from``; ``None`` if the download broke off.
+
+    Pages are requested until one is shorter than ``PAGE_ROWS``, so an
+    incremental run costs one request instead of a full page plus an empty
+    one – each request is worth a minute of the endpoint's quota.
+    """
+    # пауза между страницами — бюджет эндпоинта в http_client (1 запрос в минуту на токен)
     headers = {'Authorization': token}
     data_all = []
     while True:
-        response = requests.get(url, headers=headers, params={'dateFrom': date_from})
+        response = get_client().get(url, headers=headers, params={'dateFrom': date_from},
+                                    budget_key=token)
         if response.status_code != 200:
             print(f'⚠ Ошибка {response.status_code}: {response.text}')
-            break
+            return None
         data = response.json()
         if not data:
             break
         data_all.extend(data)
-        date_from = data[-1]['lastChangeDate']
-        print(f'  → Загружено: {len(data_all)} записей, продолжаем с {date_from}')
-        time.sleep(60)
+        last = data[-1]['lastChangeDate']
+        print(f'  → Загружено: {len(data_all)} записей, продолжаем с {last}')
+        if len(data) < PAGE_ROWS or last == date_from:
+            break
+        date_from = last
     return data_all
 
-def process_org(name, token):
-    print(f'\n=== Обработка: {name} ===')
-    date_from = (datetime.datetime.now() - datetime.timedelta(days=DAYS)).strftime('%Y-%m-%dT00:00:00')
-    
-    print('→ Выгрузка заказов...')
-    orders = fetch_wb_data(WB_ORDERS_URL, token, date_from)
-    orders_filtered = {o['srid']: o['nmId'] for o in orders if not o.get('isCancel', True)}
-    print(f'  → Отфильтровано заказов: {len(orders_filtered)}')
-
-    print('→ Выгрузка продаж...')
-    sales = fetch_wb_data(WB_SALES_URL, token, date_from)
-    sales_srid = {s['srid'] for s in sales if s.get('saleID')}
-    print(f'  → Продаж найдено: {len(sales_srid)}')
+def store_path(wb):
+    return cache_dir() / f"wb_redemption_{book_tag(wb)}.sqlite"
 
-    result = {}
-    for srid, nmId in orders_filtered.items():
-        if nmId not in result:
-            result[nmId] = {'orders': 0, 'sales': 0}
-        result[nmId]['orders'] += 1
-        if srid in sales_srid:
-            result[nmId]['sales'] += 1
+def window_start(today=None):
+    today = today or datetime.date.today()
+    return (today - datetime.timedelta(days=DAYS)).isoformat()
 
-    print('→ Расчёт % выкупа...')
+def process_org(name, store):
+    """Rows of ``%ВыкупаWB`` for one organization from the store's counters."""
     rows = []
-    for nmId, stats in result.items():
-        percent = round(stats['sales'] / stats['orders'] * 100, 2) if stats['orders'] > 0 else 0
-        rows.append([name, nmId, stats['orders'], stats['sales'], percent])
-
+    for nmId, orders, sales in store.rates(name, window_start()):
+        percent = round(sales / orders * 100, 2) if orders > 0 else 0
+        rows.append([name, int(nmId) if nmId.isdigit() else nmId, orders, sales, percent])
     return rows
 
 def main():
     wb, app = get_workbook()
-    sht = wb.sheets[SHEET_SETTINGS]
-    df_settings = sht.range('A1').options(pd.DataFrame, header=1, index=False, expand='table').value
+    orgs = org_settings.load(wb).wb_tokens()
 
     all_results = []
-    for _, row in df_settings.iterrows():
-        token = row.get('Token_WB')
-        name = row.get('Организация')
-        if pd.isna(token) or pd.isna(name):
-            continue
-        try:
-            rows = process_org(name, token)
-            all_results.extend(rows)
-        except Exception as e:
-            print(f'❌ Ошибка при обработке {name}: {e}')
+    with RedemptionStore(store_path(wb)) as store:
+        # заказы и продажи всех организаций — параллельно: квоты у токенов и эндпоинтов свои
+        default_from = f"{window_start()}T00:00:00"
+        units = [(name, token, feed, store.watermark(name, feed) or default_from)
+                 for name, token in orgs for feed in FEEDS]
+        workers = max(1, min(WB_MAX_WORKERS, len(units)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="wb_redemption") as pool:
+            futures = [pool.submit(fetch_wb_data, FEEDS[feed], token, date_from)
+                       for _, token, feed, date_from in units]
+            for (name, _, feed, date_from), fut in zip(units, futures):
+                try:
+                    records = fut.result()
+                except Exception as e:
+                    print(f'❌ Ошибка при обработке {name} ({feed}): {e}')
+                    continue
+                if records is None:
+                    print(f'❌ {name}: {feed} не загружены, используются сохранённые данные')
+                    continue
+                if feed == 'orders':
+                    n = store.add_orders(name, records)
+                else:
+                    n = store.add_sales(name, records)
+                print(f'→ {name}: {feed} с {date_from} — получено {len(records)}, новых/изменённых {n}')
+
+        print('→ Расчёт % выкупа...')
+        store.prune(window_start())
+        for name, _ in orgs:
+            all_results.extend(process_org(name, store))
 
     df_result = pd.DataFrame(all_results, columns=[
         'Организация', 'nmId', 'Кол-во заказов', 'Кол-во продаж', '% выкупа'
@@ -105,7 +126,8 @@ def main():
     
     sht_out.range('A1').value = df_result
     sht_out.api.Tab.ColorIndex = 4  # зелёный ярлык
-    sht_out.api.Move(Before=wb.sheets[32].api)  # вставить на 33 позицию
+    if len(wb.sheets) > 32:
+        sht_out.api.Move(Before=wb.sheets[32].api)  # вставить на 33 позицию
 
     print('✅ Готово.')
     if app is not None:
@@ -0,0 +1,110 @@
+"""Local store of WB product cards for delta syncs of ``Номенклатура_WB``.
+
+``content/v2/get/cards/list`` pages by a cursor ``(updatedAt, nmID)`` over
+cards sorted by update time, so the cursor after the last page is a
+watermark: a request starting from it returns only cards updated since.
+:class:`CardStore` keeps, per workbook (``cache/wb_cards_<книга>.sqlite``):
+
+* the sheet row values of every card, keyed by ``(org, nmID)``;
+* the last cursor of every organization.
+
+:meth:`CardStore.diff` splits a downloaded batch into new and changed
+cards; :meth:`CardStore.apply` stores them together with the new cursors
+in one transaction, after the sheet has been written, and drops the cards
+a full crawl no longer returned.
+"""
+
+from __future__ import annotations
+
+import json
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Iterable, Iterator
+
+Key = tuple[str, str]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cards (
+    org TEXT NOT NULL, nm_id TEXT NOT NULL,
+    row TEXT NOT NULL, updated_at TEXT,
+    PRIMARY KEY (org, nm_id)
+);
+CREATE TABLE IF NOT EXISTS cursors (
+    org TEXT PRIMARY KEY, updated_at TEXT NOT NULL, nm_id INTEGER NOT NULL,
+    synced_at TEXT NOT NULL
+);
+"""
+
+
+def card_key(org: Any, nm_id: Any) -> Key:
+    """Key of a card; ``123.0`` and ``'123'`` give the same key."""
+    nm = str(nm_id).strip().split(".")[0] if nm_id is not None else ""
+    return (str(org or "").strip(), nm)
+
+
+def _dump(row: list[Any]) -> str:
+    return json.dumps(row, ensure_ascii=False, default=str)
+
+
+class CardStore:
+    """SQLite-backed cards and per-org cursor watermarks."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(str(self.path))
+        self.db.executescript(_SCHEMA)
+
+    def __enter__(self) -> "CardStore":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.db.close()
+
+    def __len__(self) -> int:
+        return self.db.execute("SELECT COUNT(*) FROM cards").fetchone()[0]
+
+    # --- курсоры -----------------------------------------------------------
+    def cursor(self, org: str) -> dict[str, Any] | None:
+        """Saved ``{'updatedAt': ..., 'nmID': ...}`` of ``org`` or ``None``."""
+        r = self.db.execute("SELECT updated_at, nm_id FROM cursors WHERE org = ?",
+                            (str(org),)).fetchone()
+        return {"updatedAt": r[0], "nmID": r[1]} if r else None
+
+    # --- карточки ----------------------------------------------------------
+    def rows(self, orgs: set[str] | None = None) -> Iterator[tuple[Key, list[Any]]]:
+        """``(key, row)`` of all stored cards (of ``orgs`` only, if given)."""
+        for org, nm, row in self.db.execute("SELECT org, nm_id, row FROM cards ORDER BY rowid"):
+            if orgs is None or org in orgs:
+                yield (org, nm), json.loads(row)
+
+    def diff(self, fresh: dict[Key, list[Any]]) -> tuple[list[Key], list[Key]]:
+        """``(new, changed)`` keys of ``fresh`` ``{key: row}`` against the store."""
+        new, changed = [], []
+        for key, row in fresh.items():
+            r = self.db.execute("SELECT row FROM cards WHERE org = ? AND nm_id = ?", key).fetchone()
+            if r is None:
+                new.append(key)
+            elif r[0] != _dump(row):
+                changed.append(key)
+        return new, changed
+
+    def apply(self, fresh: dict[Key, tuple[list[Any], str | None]],
+              cursors: dict[str, dict[str, Any]], removed: Iterable[Key] = ()) -> None:
+        """Upsert ``{key: (row, updatedAt)}``, delete ``removed`` and save ``{org: cursor}``
+        in one transaction."""
+        stamp = datetime.now().isoformat(timespec="seconds")
+        with self.db:
+            self.db.executemany("DELETE FROM cards WHERE org = ? AND nm_id = ?", list(removed))
+            self.db.executemany(
+                "INSERT INTO cards (org, nm_id, row, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (org, nm_id) DO UPDATE SET row = excluded.row, "
+                "updated_at = excluded.updated_at",
+                [(*k, _dump(row), upd) for k, (row, upd) in fresh.items()])
+            self.db.executemany(
+                "INSERT OR REPLACE INTO cursors VALUES (?, ?, ?, ?)",
+                [(org, c["updatedAt"], int(c["nmID"]), stamp) for org, c in cursors.items()])
@@ -0,0 +1,222 @@
+"""Columnar cost-of-goods engine for ``РасчётСебестоимости``.
+
+:func:`compute_cogs` prices the whole ``Номенклатура_WB`` assortment at
+once: ``ЗакупочныеЦены`` and ``ТаможенныеПошлины`` are reduced to one row
+per normalized key (the last row wins, as the old per-row dict lookups
+did), joined to the products in a single pass (:func:`join_inputs`), and
+purchase, logistics, duty, VAT and management/tax COGS are computed as
+array expressions over whole columns (:func:`price_inputs`).  Duty rates
+are parsed once per ``Предмет``, not per product.
+
+When a price row has ``Дата_Закупки`` the FX and logistics rates of that
+date are taken from the dated :class:`~scripts.rate_table.RateTable`
+(one as-of join per rate), so the COGS of an old batch does not drift with
+today's ``Настройки``.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Mapping
+
+import numpy as np
+import pandas as pd
+
+from scripts.rate_table import RateTable, dates
+
+RUS_TO_LAT = str.maketrans("АВЕКМНОРСТХ", "ABEKMHOPCTX")  # кир → лат
+
+CARGO, WHITE = "Карго", "Белая"
+
+HEADER = [
+    'Организация', 'Артикул_поставщика', 'Предмет', 'Наименование',
+    'Закуп_Цена_руб', 'Логистика_руб', 'Пошлина_руб', 'НДС_руб',
+    'Себестоимость_руб', 'Себестоимость_без_НДС_руб', 'Входящий_НДС_руб',
+    'СебестоимостьУпр', 'СебестоимостьНалог', 'СебестоимостьНалог_без_НДС',
+]
+RUB_COLUMNS = HEADER[4:]
+
+# валюта закупки → ключ курса в параметрах; прочие валюты считаются рублями
+FX_KEYS = {"USD": "usdRate", "CNY": "cnyRate"}
+
+
+def norm(key: Any) -> str:
+    """Normalize a supplier article: trim, upper-case, Cyrillic look-alikes → Latin."""
+    if key is None:
+        return ""
+    return str(key).replace("\xa0", " ").strip().upper().translate(RUS_TO_LAT)
+
+
+def _per_unique(s: pd.Series, fn, missing: Any) -> np.ndarray:
+    """``fn`` applied once per distinct value of ``s`` and broadcast back."""
+    codes, uniques = pd.factorize(s.astype(object), use_na_sentinel=True)
+    values = np.array([fn(v) for v in uniques] + [missing], dtype=object)
+    return values[codes]                                     # -1 (пусто) → missing
+
+
+def norm_keys(s: pd.Series) -> pd.Series:
+    """:func:`norm` over a column (blanks → ``''``)."""
+    return pd.Series(_per_unique(s, norm, ""), index=s.index, dtype=object)
+
+
+def safe_float(val: Any) -> float:
+    try:
+        if pd.isna(val):
+            return 0.0
+        return float(str(val).replace(",", ".").replace(" ", "").replace("\xa0", ""))
+    except Exception:
+        return 0.0
+
+
+def to_number(s: pd.Series) -> np.ndarray:
+    """Column of numbers, ``'1 234,5'`` parsed, blanks and garbage → 0."""
+    if pd.api.types.is_numeric_dtype(s) and not pd.api.types.is_bool_dtype(s):
+        return pd.to_numeric(s).fillna(0.0).to_numpy(dtype=float)
+    return _per_unique(s, safe_float, 0.0).astype(float)
+
+
+def duty_rate(raw: Any) -> float:
+    """Duty as a fraction: ``0.142``, ``'14,2%'`` and ``14.2`` all give 0.142."""
+    if raw is None or (isinstance(raw, float) and np.isnan(raw)) or not raw:
+        return 0.0
+    try:
+        v = float(str(raw).replace("%", "").replace(",", ".").strip())
+    except ValueError:
+        return 0.0
+    return v if v < 1 else v / 100
+
+
+def _column(df: pd.DataFrame, name: str) -> pd.Series:
+    return df[name] if name in df.columns else pd.Series([None] * len(df), index=df.index, dtype=object)
+
+
+def _last_by(df: pd.DataFrame, keys: pd.Series) -> pd.DataFrame:
+    return df.assign(_key=keys.to_numpy()).drop_duplicates("_key", keep="last").set_index("_key")
+
+
+def duty_rates(duty_df: pd.DataFrame) -> dict[str, float]:
+    """``{Предмет: rate}``; ``Ставка_пошлины`` falls back to ``Пошлина`` when empty."""
+    rates: dict[str, float] = {}
+    main, alt = _column(duty_df, "Ставка_пошлины"), _column(duty_df, "Пошлина")
+    for subject, a, b in zip(duty_df["Предмет"].tolist(), main.tolist(), alt.tolist()):
+        raw = a if a and not (isinstance(a, float) and np.isnan(a)) else b
+        rates[str(subject).strip()] = duty_rate(raw)
+    return rates
+
+
+def join_inputs(prod_df: pd.DataFrame, price_df: pd.DataFrame, duty_df: pd.DataFrame,
+                org_modes: Mapping[Any, str]) -> pd.DataFrame:
+    """Everything one product's cost depends on, except the global rates.
+
+    ``org_modes`` (see :meth:`OrgRegistry.logistics_modes`) gives the
+    logistics type of organizations whose price row has none.
+    """
+    prices = _last_by(price_df, norm_keys(price_df["Артикул_поставщика"]))
+    vendor_keys = norm_keys(prod_df["Артикул_поставщика"])
+    joined = prices.reindex(vendor_keys.to_numpy())
+
+    # Тип логистики: из закупочной строки, иначе из настроек организации
+    mode = _column(joined, "Тип_Логистики").to_numpy(dtype=object)
+    own = np.array([isinstance(m, str) and bool(m.strip()) for m in mode], dtype=bool)
+    orgs = prod_df["Организация"]
+    fallback = orgs.map(lambda o: org_modes.get(o, CARGO)).to_numpy(dtype=object)
+
+    subjects = prod_df["Предмет"].map(lambda s: s.strip() if isinstance(s, str) else None)
+    return pd.DataFrame({
+        "org": orgs.to_numpy(dtype=object),
+        "vendor": prod_df["Артикул_поставщика"].to_numpy(dtype=object),
+        "subject": prod_df["Предмет"].to_numpy(dtype=object),
+        "name": prod_df["Название"].to_numpy(dtype=object),
+        "weight": to_number(prod_df["Вес_брутто"]),
+        "price": to_number(_column(joined, "Закуп_Цена")),
+        "currency": _column(joined, "Валюта").to_numpy(dtype=object),
+        "mode": np.where(own, mode, fallback),
+        "batch_date": dates(_column(joined, "Дата_Закупки")),
+        "duty_rate": subjects.map(duty_rates(duty_df)).fillna(0.0).to_numpy(dtype=float),
+        "has_price": vendor_keys.isin(prices.index).to_numpy(),
+    })
+
+
+def price_inputs(inputs: pd.DataFrame, params: Mapping[str, float],
+                 rates: RateTable | None = None) -> pd.DataFrame:
+    """The 14 ``CogsTable`` columns of :func:`join_inputs` rows.
+
+    FX and logistics rates are those of ``rates`` on each row's batch date,
+    or the ``params`` rates where the table has none.
+    """
+    rates = rates if rates is not None else RateTable()
+    mode = inputs["mode"].to_numpy(dtype=object)
+    cargo, white = mode == CARGO, mode == WHITE
+    on = inputs["batch_date"].to_numpy(dtype="datetime64[ns]")
+
+    fx_keys = inputs["currency"].map(FX_KEYS).fillna("").to_numpy(dtype=object)
+    purchase = inputs["price"].to_numpy(dtype=float) * rates.lookup(fx_keys, on, params)
+
+    kg_keys = np.where(cargo, "cargoRatePerKg", "whiteRatePerKg").astype(object)
+    usd = rates.lookup("usdRate", on, params)
+    logistics = inputs["weight"].to_numpy(dtype=float) * rates.lookup(kg_keys, on, params) * usd
+
+    duty = purchase * np.where(white, inputs["duty_rate"].to_numpy(dtype=float), 0.0)
+
+    vat = np.where(white, (purchase + duty + logistics) * params["ndsRateWhite"], 0.0)
+    total = purchase + duty + logistics + vat
+    tax = np.where(cargo, 0.0, total)
+    tax_wo = np.where(cargo, 0.0, total - vat)
+
+    def rub(a: np.ndarray) -> np.ndarray:
+        return np.rint(a).astype(np.int64)
+
+    return pd.DataFrame({
+        'Организация': inputs["org"].to_numpy(dtype=object),
+        'Артикул_поставщика': inputs["vendor"].to_numpy(dtype=object),
+        'Предмет': inputs["subject"].to_numpy(dtype=object),
+        'Наименование': inputs["name"].to_numpy(dtype=object),
+        'Закуп_Цена_руб': rub(purchase), 'Логистика_руб': rub(logistics),
+        'Пошлина_руб': rub(duty), 'НДС_руб': rub(vat),
+        'Себестоимость_руб': rub(total), 'Себестоимость_без_НДС_руб': rub(total - vat),
+        'Входящий_НДС_руб': rub(vat), 'СебестоимостьУпр': rub(total),
+        'СебестоимостьНалог': rub(tax), 'СебестоимостьНалог_без_НДС': rub(tax_wo),
+    }, columns=HEADER, index=inputs.index)
+
+
+def compute_cogs(prod_df: pd.DataFrame, price_df: pd.DataFrame, duty_df: pd.DataFrame,
+                 params: Mapping[str, float], org_modes: Mapping[Any, str],
+                 rates: RateTable | None = None) -> pd.DataFrame:
+    """The 14 ``CogsTable`` columns for every row of ``prod_df``.
+
+    ``params`` are the ``read_settings`` rates; see :func:`join_inputs`
+    for ``org_modes`` and :func:`price_inputs` for ``rates``.
+    """
+    inputs = join_inputs(prod_df, price_df, duty_df, org_modes)
+    out = price_inputs(inputs, params, rates)
+    out.attrs["missing_price"] = int((~inputs["has_price"]).sum())
+    return out
+
+
+def row_hashes(df: pd.DataFrame) -> np.ndarray:
+    """64-bit content hash of every row of ``df`` (objects hashed by their text)."""
+    text_cols = {c: str for c in df.columns if df[c].dtype == object}
+    return pd.util.hash_pandas_object(df.astype(text_cols), index=False).to_numpy(dtype=np.uint64)
+
+
+def _cell_text(v: Any) -> str:
+    if v is None or (isinstance(v, float) and np.isnan(v)):
+        return ""
+    if isinstance(v, float) and v.is_integer():
+        return str(int(v))
+    return str(v)
+
+
+def table_hashes(df: pd.DataFrame) -> np.ndarray:
+    """:func:`row_hashes` of ``CogsTable`` rows as they read back from the sheet.
+
+    Blanks in the text columns hash as ``''`` and ``12.0`` as ``'12'``, so
+    a computed frame and a read of the written rows give the same hashes.
+    """
+    text = {c: _per_unique(df[c], _cell_text, "") for c in HEADER[:4]}
+    rub = {c: np.rint(df[c].to_numpy(dtype=float)).astype(np.int64) for c in RUB_COLUMNS}
+    return row_hashes(pd.DataFrame({**text, **rub}, columns=HEADER))
+
+
+def table_rows(df: pd.DataFrame) -> list[list[Any]]:
+    """Sheet rows of a :func:`compute_cogs` frame with plain Python values."""
+    return [list(r) for r in zip(*(df[c].tolist() for c in df.columns))]
@@ -0,0 +1,85 @@
+"""State of the last ``РасчётСебестоимости`` run for incremental COGS.
+
+Recalculating COGS used to clear the result sheet and rewrite every SKU,
+although a buyer usually changes a handful of purchase prices.  After
+each run :class:`CogsState` keeps, per workbook
+(``cache/cogs_<книга>.npz``):
+
+* a hash of the global rates (``read_settings`` and the dated
+  ``КурсыИТарифы`` table) – when it changes every product is repriced;
+* a 64-bit hash of the joined inputs of every product row (product,
+  price and duty row, logistics type; see :func:`cogs_engine.row_hashes`);
+* a 64-bit hash of every written result row (:func:`cogs_engine.table_hashes`).
+
+:meth:`CogsState.changed` returns the product rows whose inputs differ
+from the last run; only those are repriced, and of those only the rows
+whose result differs are written back to the sheet.  The state is saved
+before the workbook is, so before it is trusted the rows on the sheet are
+read back and hashed: rows that differ from the stored hashes (book
+closed without saving, manual edits) are repriced and rewritten too.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Mapping
+
+import numpy as np
+
+STATE_VERSION = 2
+
+
+def settings_hash(params: Mapping[str, Any]) -> str:
+    raw = json.dumps({k: params[k] for k in sorted(params)}, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+
+@dataclass
+class CogsState:
+    """Hashes of the inputs and results of one COGS run."""
+
+    settings: str
+    inputs: np.ndarray          # uint64 на строку номенклатуры
+    outputs: np.ndarray         # uint64 на строку РасчётСебестоимости
+
+    @property
+    def rows(self) -> int:
+        return len(self.outputs)
+
+    def changed(self, inputs: np.ndarray, settings: str) -> np.ndarray:
+        """Positions of product rows to reprice: new, changed or all on new rates."""
+        if settings != self.settings:
+            return np.arange(len(inputs))
+        m = min(len(inputs), len(self.inputs))
+        return np.flatnonzero(np.concatenate(
+            [inputs[:m] != self.inputs[:m], np.ones(len(inputs) - m, dtype=bool)]))
+
+    def differs(self, pos: np.ndarray, outputs: np.ndarray) -> np.ndarray:
+        """Mask of ``pos`` whose result hash ``outputs`` is not the stored one."""
+        known = pos < len(self.outputs)
+        old = np.zeros(len(pos), dtype=np.uint64)
+        old[known] = self.outputs[pos[known]]
+        return ~known | (old != outputs)
+
+    def save(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + ".tmp.npz")
+        np.savez(tmp, meta=np.array(json.dumps({"version": STATE_VERSION, "settings": self.settings})),
+                 inputs=self.inputs, outputs=self.outputs)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: Path) -> "CogsState | None":
+        """Saved state or ``None`` if there is none or it is unreadable."""
+        try:
+            with np.load(path) as z:
+                meta = json.loads(str(z["meta"]))
+                if meta.get("version") != STATE_VERSION:
+                    return None
+                return cls(meta["settings"], z["inputs"], z["outputs"])
+        except (OSError, ValueError, KeyError):
+            return None
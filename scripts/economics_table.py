@@ -11,6 +11,9 @@ from pathlib import Path
 import pandas as pd
 import xlwings as xw
 
+from scripts import ozon_economics_engine
+from scripts.workbook_backend import headless_requested, open_headless
+
 # ---------- Константы ------------------------------------------------------
 
 EXCEL_PATH = Path(__file__).resolve().parents[1] / "Finmodel.xlsm"
@@ -20,11 +23,7 @@ SHEET_COST    = "РасчётСебестоимости"
 SHEET_SETTINGS= "Настройки"
 SHEET_TARGET  = "РасчетЭкономикиОзон"          # куда выводим итоговую таблицу
 
-MONTH_COLS    = [
-    ("Мес.01", 1), ("Мес.02", 2), ("Мес.03", 3), ("Мес.04", 4),
-    ("Мес.05", 5), ("Мес.06", 6), ("Мес.07", 7), ("Мес.08", 8),
-    ("Мес.09", 9), ("Мес.10", 10), ("Мес.11", 11), ("Мес.12", 12),
-]
+MONTH_COLS    = ozon_economics_engine.MONTH_COLS
 
 # ---------- Вспомогательные функции ----------------------------------------
 
@@ -43,6 +42,9 @@ def _percent(value) -> Decimal:
         return Decimal("0")
     
 def _get_workbook() -> tuple[xw.Book, xw.App, bool]:
+    if headless_requested():
+        wb = open_headless(EXCEL_PATH)
+        return wb, wb.app, True
     try:
         wb = xw.Book.caller()
         return wb, wb.app, False
@@ -174,171 +176,12 @@ def _drop_totals(df: pd.DataFrame, check_cols=("Артикул_поставщи
 def compute_ozon_economics_df(
     plan_df: pd.DataFrame, cost_df: pd.DataFrame, settings: dict
 ) -> pd.DataFrame:
-    """Compute Ozon economics records from source DataFrames."""
-    def get(key):
-        return settings.get(key, Decimal("0"))
-
-    tax_col_new = "СебестоимостьНалог_руб"
-    tax_col_old = "Себестоимость_Налог, руб (новый)"
-    tax_col_legacy = "СебестоимостьНалог"
-
-    for col in ["СебестоимостьУпр", tax_col_new]:
-        if col not in cost_df.columns:
-            if col == tax_col_new and tax_col_old in cost_df.columns:
-                cost_df[col] = cost_df[tax_col_old]
-            elif col == tax_col_new and tax_col_legacy in cost_df.columns:
-                cost_df[col] = cost_df[tax_col_legacy]
-            else:
-                cost_df[col] = 0
-
-    cost_df = cost_df[[
-        "Организация",
-        "Артикул_поставщика",
-        "Себестоимость_руб",
-        "Себестоимость_без_НДС_руб",
-        "СебестоимостьУпр",
-        tax_col_new,
-    ]]
-
-    records: list[dict] = []
-    for _, row in plan_df.iterrows():
-        for col_name, month_num in MONTH_COLS:
-            qty = row.get(col_name, 0) or 0
-            if qty == 0:
-                continue
-
-            price = Decimal(str(row["Плановая цена"]))
-            qty_dec = Decimal(str(qty))
-            sales_brut = qty_dec * price
-
-            bal_disc = sales_brut * get("Баллы за скидки")
-            partner_prg = sales_brut * get("Программы партнеров")
-            revenue = sales_brut - partner_prg - bal_disc
-
-            base_comm = sales_brut * get("Вознаграждение Озон")
-
-            def safe_dec(val, default="0"):
-                try:
-                    return Decimal(str(val))
-                except Exception:
-                    return Decimal(default)
-
-            base_comm_099 = safe_dec(base_comm) * safe_dec("0.99")
-            bal_disc_val = safe_dec(bal_disc)
-            try:
-                disc_limit = min(base_comm_099, bal_disc_val)
-            except Exception:
-                disc_limit = Decimal("0")
-            try:
-                comm_after = max(Decimal("0"), safe_dec(base_comm) - disc_limit)
-            except Exception:
-                comm_after = Decimal("0")
-
-            serv_deliv = sales_brut * get("Услуги доставки")
-            serv_agent = sales_brut * get("Услуги агентов")
-            serv_fbo = sales_brut * get("Услуги FBO")
-            reklama = sales_brut * get("Реклама")
-            other_serv = sales_brut * get("Другие услуги")
-
-            total_mp = comm_after + serv_deliv + serv_agent + serv_fbo + reklama + other_serv
-
-            cs_row = cost_df[
-                (cost_df["Организация"] == row["Организация"]) &
-                (cost_df["Артикул_поставщика"] == row["Артикул_поставщика"])
-            ]
-            if cs_row.empty:
-                cost_unit = Decimal("0")
-                cost_unit_nds = Decimal("0")
-                cost_mgmt = Decimal("0")
-                cost_tax = Decimal("0")
-            else:
-                first = cs_row.iloc[0]
-                cost_unit = Decimal(str(first["Себестоимость_руб"]))
-                cost_unit_nds = Decimal(str(first["Себестоимость_без_НДС_руб"]))
-                cost_mgmt = Decimal(str(first.get("СебестоимостьУпр", 0)))
-                cost_tax = Decimal(
-                    str(
-                        first.get(
-                            tax_col_new,
-                            first.get(tax_col_old, first.get(tax_col_legacy, 0))
-                        )
-                    )
-                )
-
-            cogs = cost_unit * qty_dec
-            cogs_no_vat = cost_unit_nds * qty_dec
-            cogs_mgmt = cost_mgmt * qty_dec
-            cogs_tax = cost_tax * qty_dec
-            gp_mgmt = revenue - cogs_mgmt
-            gp_tax = revenue - cogs_tax
+    """Compute Ozon economics records from source DataFrames.
 
-            records.append(
-                dict(
-                    Месяц=month_num,
-                    Организация=row["Организация"],
-                    Артикул_поставщика=row["Артикул_поставщика"],
-                    SKU=row["SKU"],
-                    План_шт=qty,
-                    ВыручкаБезСкидок_руб=float(sales_brut),
-                    БаллыСкидки_руб=float(bal_disc),
-                    ПрограммыПартнеров_руб=float(partner_prg),
-                    Выручка_руб=float(revenue),
-                    БазовоеВознаграждение_руб=float(base_comm),
-                    ВознаграждениеПослСкидок_руб=float(comm_after),
-                    УслугиДоставки_руб=float(serv_deliv),
-                    УслугиАгентов_руб=float(serv_agent),
-                    УслугиFBO_руб=float(serv_fbo),
-                    Реклама_руб=float(reklama),
-                    ДругиеУслуги_руб=float(other_serv),
-                    ИтогоРасходыМП_руб=float(total_mp),
-                    СебестоимостьПродаж_руб=float(cogs),
-                    СебестоимостьБезНДС_руб=float(cogs_no_vat),
-                    СебестоимостьНалог_руб=float(cogs_tax),
-                    ВаловаяПрибыль_Упр=float(gp_mgmt),
-                    ВаловаяПрибыль_Налог=float(gp_tax),
-                )
-            )
-
-    result_df = (
-        pd.DataFrame(records)
-        .sort_values(["Месяц", "Организация", "Артикул_поставщика"])
-        .reset_index(drop=True)
-    )
-
-    result_df = result_df.rename(columns={
-        "СебестоимостьНалог_руб": "СебестоимостьПродажНалог, ₽",
-    })
-    result_df["СебестоимостьПродажНалог_без_НДС, ₽"] = (
-        result_df["СебестоимостьПродажНалог, ₽"] / 1.2
-    ).round(2)
-
-    numeric_cols = [
-        "План_шт",
-        "ВыручкаБезСкидок_руб",
-        "БаллыСкидки_руб",
-        "ПрограммыПартнеров_руб",
-        "Выручка_руб",
-        "БазовоеВознаграждение_руб",
-        "ВознаграждениеПослСкидок_руб",
-        "УслугиДоставки_руб",
-        "УслугиАгентов_руб",
-        "УслугиFBO_руб",
-        "Реклама_руб",
-        "ДругиеУслуги_руб",
-        "ИтогоРасходыМП_руб",
-        "СебестоимостьПродаж_руб",
-        "СебестоимостьБезНДС_руб",
-        "СебестоимостьПродажНалог, ₽",
-        "СебестоимостьПродажНалог_без_НДС, ₽",
-        "ВаловаяПрибыль_Упр",
-        "ВаловаяПрибыль_Налог",
-    ]
-
-    for col in numeric_cols:
-        if col in result_df:
-            result_df[col] = pd.to_numeric(result_df[col], errors="coerce")
-
-    return result_df
+    See :mod:`scripts.ozon_economics_engine`: the plan is priced per
+    (organization, article, month) in integer kopecks.
+    """
+    return ozon_economics_engine.compute(plan_df, cost_df, settings)
 
 
 def compute_wb_economics_df(plan_df: pd.DataFrame, cost_df: pd.DataFrame) -> pd.DataFrame:
@@ -23,7 +23,10 @@ from pathlib import Path
 import ctypes  # noqa: F401  # <-- ДОБАВЬТЕ наверху рядом с os, sys …
 from ctypes import wintypes  # noqa: F401
 
+from scripts import org_settings
 from scripts.utils import ensure_interpreter_path  # noqa: F401
+from scripts.workbook_backend import BACKEND_ENV, headless_requested, open_headless
+from scripts.workbook_snapshot import load_snapshot
 
 # Флаг отладки по месяцам. Значение может быть переопределено
 # через аргументы командной строки в ``parse_args``.
@@ -46,6 +49,10 @@ def parse_args():
                    help='Имя Excel-книги (по умолчанию Finmodel.xlsm)')
     p.add_argument('-dm', '--debug-month', action='store_true',
                    help='log every imported month')
+    p.add_argument('-b', '--backend', default=os.environ.get(BACKEND_ENV, 'xlwings'),
+                   help='xlwings (Excel/COM) или openpyxl (без Excel)')
+    p.add_argument('--no-cache', action='store_true',
+                   help='не использовать кэш снимка входных листов')
     args, _ = p.parse_known_args()       # игнорируем лишние флаги xlwings
     global DEBUG_MONTH
     DEBUG_MONTH = args.debug_month
@@ -93,11 +100,15 @@ def log_warn(msg):            # короткий alias
 
 SHEET_WB   = 'РасчётЭкономикиWB'
 SHEET_OZON = 'РасчетЭкономикиОзон'
-SHEET_ORG  = 'НастройкиОрганизаций'
+SHEET_ORG  = org_settings.SHEET
 SHEET_SAL  = 'Зарплата'
 SHEET_OTH  = 'ПрочиеРасходы'
+SHEET_PAYROLL = 'РасчетЗарплаты'
 SHEET_OUT  = 'РасчетПлановыхПоказателей'
 
+# входные листы читаются одним снимком (см. workbook_snapshot)
+INPUT_SHEETS = [SHEET_WB, SHEET_OZON, SHEET_ORG, SHEET_SAL, SHEET_OTH, SHEET_PAYROLL]
+
 TABLE_NAME  = 'PlannedIndicatorsTbl'
 TABLE_STYLE = 'TableStyleMedium7'          # зелёный Medium 7
 
@@ -129,6 +140,12 @@ def _attach_open_wb(fullname: Path):
 def get_workbook():
     if not EXCEL_PATH.exists():
         raise FileNotFoundError(EXCEL_PATH)
+    # 0) headless-режим: читаем файл через openpyxl, Excel не нужен
+    if headless_requested(ARGS.backend):
+        wb = open_headless(EXCEL_PATH)
+        log_info(f'🗂  Headless backend: {wb.fullname} → {wb.output_path}')
+        return wb, wb.app
+
     # 1) пробуем подцепиться к уже открытому файлу
     try:
         wb = _attach_open_wb(EXCEL_PATH)
@@ -222,6 +239,20 @@ def find_key(idx, target):
             return k
     return None
 
+def org_config(header, rows):
+    """``{организация: параметры}`` из НастройкиОрганизаций по настоящей шапке листа."""
+    return {
+        o.name: dict(
+            type=o.org_type,
+            orig_mode=o.tax_mode,
+            consolidation=o.consolidation is not False,     # пусто — консолидируется
+            nds_rate=o.vat_rate,
+            usn_rate=o.usn_rate
+        )
+        for o in org_settings.OrgRegistry.from_rows(header, rows)
+    }
+
+
 def ndfl_prog(base):
     left, tax, prev = base, 0, 0
     for lim, r in [(2.4e6, .13), (5e6, .15),
@@ -409,7 +440,10 @@ def fill_planned_indicators():
         # === 4.1 Открываем книгу ========================================
         wb, app = get_workbook()
         ss = wb
-        sheet_names = [s.name for s in ss.sheets]
+        snap = load_snapshot(ss, INPUT_SHEETS, use_cache=not ARGS.no_cache)
+        sheet_names = snap.sheet_names
+        log_info(f"[SNAPSHOT] {'из кэша' if snap.from_cache else 'прочитан из книги'}: "
+                 f"{', '.join(snap.sheets)}")
 
         # === 4.2 Данные WB =============================================
         # === 4.2 Данные WB =============================================
@@ -417,7 +451,7 @@ def fill_planned_indicators():
             raise ValueError(f'Нет листа {SHEET_WB}')
 
         # ❶ читаем строки и индексы
-        wb_rows, wb_idx = read_rows(ss.sheets[SHEET_WB])
+        wb_rows, wb_idx = snap.read_rows(SHEET_WB)
 
         # выводим индексы только при запуске из ТЕРМИНАЛА (app == None)
         if app is None:          # <<< добавили условие
@@ -440,7 +474,7 @@ def fill_planned_indicators():
         oz_rows = []                      # на случай отсутствия листа Ozon
                          # сюда будем складывать все строки
         if SHEET_OZON in sheet_names:
-            oz_rows, oz_idx_raw = read_rows(ss.sheets[SHEET_OZON])
+            oz_rows, oz_idx_raw = snap.read_rows(SHEET_OZON)
 
             # Приводим ключи к нижнему регистру и убираем пробелы
             oz_idx = {str(k).strip().lower(): i for k, i in oz_idx_raw.items()}
@@ -538,46 +572,17 @@ def fill_planned_indicators():
         # === 4.5 НастройкиОрганизаций ===================================
         if SHEET_ORG not in sheet_names:
             raise ValueError(f'Нет листа {SHEET_ORG}')
-        cfg_rows, cfg_idx = read_rows(ss.sheets[SHEET_ORG])
-        org_cfg = {}
-        for r in cfg_rows:
-            org = r[cfg_idx['организация']]
-
-            # --- ставка НДС/УСН (как было) ---
-            nds = parse_money(str(r[cfg_idx.get('ставка ндс', '')]).replace('%', '').replace(',', '.')) or 0
-            nds = nds * 100 if 0 < nds < 1 else nds
-            usn = parse_money(str(r[cfg_idx.get('ставканалогаусн', '')]).replace('%', '').replace(',', '.')) or 0
-            usn = usn * 100 if 0 < usn < 1 else usn
-
-            # --- режим налогообложения ---
-            col_new = cfg_idx.get('режимналогооблnew')
-            col_old = cfg_idx.get('режим_налогообложения')     # оставим поддержку старого
-            mode_val = 'ОСНО'                                   # дефолт
-            src_col  = 'default'
-            if col_new is not None and str(r[col_new]).strip():
-                mode_val = str(r[col_new]).strip()
-                src_col  = 'New'
-            elif col_old is not None and str(r[col_old]).strip():
-                mode_val = str(r[col_old]).strip()
-                src_col  = 'Old'
-
-            # логируем выбор
-            if app is None:
-                log_info(f"[CFG] {org:<20} режим ← {src_col}: {mode_val}")
-
-            org_cfg[org] = dict(
-                type=str(r[cfg_idx.get('тип_организации', '')]).strip() or 'ООО',
-                orig_mode=mode_val,
-                consolidation=str(r[cfg_idx.get('консолидация', '')]).strip().lower() != 'нет',
-                nds_rate=nds,
-                usn_rate=usn
-            )
+        cfg_rows, _ = snap.read_rows(SHEET_ORG)
+        org_cfg = org_config(snap.sheets[SHEET_ORG].header, cfg_rows)
+        if app is None:
+            for name, cfg in org_cfg.items():
+                log_info(f"[CFG] {name:<20} режим: {cfg['orig_mode']}")
 
 
         # === 4.6 Зарплата и прочие расходы ==============================
         salary = {}
         if SHEET_SAL in sheet_names:
-            sal_rows, sal_idx = read_rows(ss.sheets[SHEET_SAL])
+            sal_rows, sal_idx = snap.read_rows(SHEET_SAL)
             for r in sal_rows:
                 salary[r[sal_idx['организация']]] = dict(
                     fot=parse_money(r[sal_idx['фот']]) or 0,
@@ -585,7 +590,7 @@ def fill_planned_indicators():
 
         other = {}
         if SHEET_OTH in sheet_names:
-            oth_rows, oth_idx_raw = read_rows(ss.sheets[SHEET_OTH])
+            oth_rows, oth_idx_raw = snap.read_rows(SHEET_OTH)
             oth_idx = {str(k).strip().lower(): i for k, i in oth_idx_raw.items()}
 
             # проверим, что нужные колонки существуют
@@ -602,8 +607,7 @@ def fill_planned_indicators():
                 other[org] += val
 
         # --- 4.6A Суммарные значения ФОТ и ЕСН по организации ---
-        SHEET_PAYROLL = 'РасчетЗарплаты'
-        payroll_rows, payroll_idx = read_rows(ss.sheets[SHEET_PAYROLL])
+        payroll_rows, payroll_idx = snap.read_rows(SHEET_PAYROLL)
         esn_by_org = {}
         fot_by_org = {}
         oklad_by_org = {}
@@ -0,0 +1,241 @@
+"""Shared HTTP client for the marketplace importers.
+
+All API calls go through one :class:`HttpClient` (see :func:`get_client`):
+
+* one ``requests.Session`` with keep-alive connection pools per host, so
+  pages of the same API reuse the TLS connection; responses are requested
+  with ``Accept-Encoding: gzip, deflate``;
+* retries on connection errors, timeouts, ``429`` and ``5xx`` with
+  exponential backoff plus jitter; ``Retry-After`` takes precedence;
+* per-endpoint rate budgets (:data:`ENDPOINT_BUDGETS`), kept per API token
+  because marketplace quotas are per token – this replaces the fixed
+  ``time.sleep`` pauses between pages;
+* per-request metrics (endpoint, status, seconds, bytes, attempts) with a
+  per-endpoint summary for the logs;
+* ``FINMODEL_API_BASE`` (e.g. ``http://127.0.0.1:8765``) redirects every
+  request to that host with the path kept – used with
+  :mod:`scripts.api_emulator` for offline runs and benchmarks.  Budgets and
+  metrics still refer to the original URL.
+
+Usage::
+
+    from scripts.http_client import get_client
+
+    resp = get_client().get(url, headers={'Authorization': token}, budget_key=token)
+"""
+
+from __future__ import annotations
+
+import os
+import random
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Any, Callable
+from urllib.parse import urlsplit, urlunsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from scripts.rate_limit import RateLimiter, parse_retry_after
+
+DEFAULT_TIMEOUT = (10, 60)            # (соединение, чтение), сек
+DEFAULT_RETRIES = 4
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+POOL_SIZE = 16
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# Запросов в секунду на один токен: префикс URL → (rate, burst).
+ENDPOINT_BUDGETS: dict[str, tuple[float, float]] = {
+    "https://statistics-api.wildberries.ru/api/v5/supplier/reportDetailByPeriod": (1.0, 1),
+    "https://statistics-api.wildberries.ru/api/v1/supplier/orders": (1 / 60, 1),
+    "https://statistics-api.wildberries.ru/api/v1/supplier/sales": (1 / 60, 1),
+    "https://discounts-prices-api.wildberries.ru/api/v2/list/goods/filter": (2.5, 5),
+    "https://content-api.wildberries.ru/content/v2/get/cards/list": (1.6, 5),
+    "https://api-seller.ozon.ru/v2/finance/realization": (1.0, 2),
+    "https://api-seller.ozon.ru/v3/finance/transaction/list": (5.0, 5),
+    "https://api-seller.ozon.ru/v5/product/info/prices": (5.0, 5),
+}
+
+
+def endpoint_of(url: str) -> str:
+    """``scheme://host/path`` of ``url`` (no query string)."""
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}{parts.path}"
+
+
+def redirect_url(url: str, base: str | None = None) -> str:
+    """``url`` moved to host ``base`` (default: ``$FINMODEL_API_BASE``), path and query kept."""
+    base = os.environ.get("FINMODEL_API_BASE") if base is None else base
+    if not base:
+        return url
+    target = urlsplit(base.rstrip("/"))
+    parts = urlsplit(url)
+    return urlunsplit((target.scheme, target.netloc, target.path + parts.path,
+                       parts.query, parts.fragment))
+
+
+@dataclass
+class RequestStat:
+    endpoint: str
+    method: str
+    status: int | None
+    seconds: float
+    bytes: int
+    attempts: int
+
+
+class HttpMetrics:
+    """Thread-safe log of :class:`RequestStat`."""
+
+    def __init__(self) -> None:
+        self.requests: list[RequestStat] = []
+        self._lock = threading.Lock()
+
+    def record(self, stat: RequestStat) -> None:
+        with self._lock:
+            self.requests.append(stat)
+
+    def by_endpoint(self) -> dict[str, dict[str, float]]:
+        out: dict[str, dict[str, float]] = defaultdict(
+            lambda: {"requests": 0, "errors": 0, "retries": 0, "seconds": 0.0, "bytes": 0})
+        with self._lock:
+            for s in self.requests:
+                e = out[s.endpoint]
+                e["requests"] += 1
+                e["errors"] += s.status is None or s.status >= 400
+                e["retries"] += s.attempts - 1
+                e["seconds"] += s.seconds
+                e["bytes"] += s.bytes
+        return dict(out)
+
+    def summary(self) -> str:
+        lines = []
+        for ep, e in sorted(self.by_endpoint().items()):
+            avg = e["seconds"] / e["requests"] if e["requests"] else 0.0
+            lines.append(f"{ep}: {e['requests']} запр., {e['retries']} повт., "
+                         f"{e['errors']} ошиб., {e['bytes'] / 1024:,.0f} КБ, "
+                         f"ср. {avg:.2f} с")
+        return "\n".join(lines)
+
+
+class HttpClient:
+    """Pooled session with retries, rate budgets and metrics."""
+
+    def __init__(self, session: requests.Session | None = None,
+                 timeout: Any = DEFAULT_TIMEOUT, retries: int = DEFAULT_RETRIES,
+                 backoff_base: float = BACKOFF_BASE, backoff_max: float = BACKOFF_MAX,
+                 budgets: dict[str, tuple[float, float]] | None = None,
+                 sleep: Callable[[float], None] = time.sleep) -> None:
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers["Accept-Encoding"] = "gzip, deflate"
+        self.session = session
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.metrics = HttpMetrics()
+        self._sleep = sleep
+        self._budgets = dict(ENDPOINT_BUDGETS if budgets is None else budgets)
+        self._limiters: dict[str, RateLimiter] = {}
+        self._lock = threading.Lock()
+
+    # --- бюджеты -----------------------------------------------------------
+    def set_budget(self, prefix: str, rate: float, burst: float = 1) -> None:
+        """Limit requests to URLs starting with ``prefix`` to ``rate`` per second per key."""
+        with self._lock:
+            self._budgets[prefix] = (rate, burst)
+            self._limiters.pop(prefix, None)
+
+    def _bucket(self, url: str, key: str | None):
+        with self._lock:
+            prefix = max((p for p in self._budgets if url.startswith(p)), key=len, default=None)
+            if prefix is None:
+                return None
+            limiter = self._limiters.get(prefix)
+            if limiter is None:
+                rate, burst = self._budgets[prefix]
+                limiter = self._limiters[prefix] = RateLimiter(rate, burst, sleep=self._sleep)
+        return limiter.bucket(key or "")
+
+    def backoff(self, attempt: int) -> float:
+        """Delay before retry ``attempt`` (0-based): full jitter over 2**attempt."""
+        cap = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        return random.uniform(cap / 2, cap)
+
+    # --- запросы -----------------------------------------------------------
+    def request(self, method: str, url: str, *, budget_key: str | None = None,
+                retries: int | None = None, timeout: Any = None,
+                **kwargs: Any) -> requests.Response:
+        """Send a request; the last response (possibly an error status) is returned.
+
+        Connection errors and timeouts are re-raised after the last retry.
+        """
+        retries = self.retries if retries is None else retries
+        timeout = self.timeout if timeout is None else timeout
+        endpoint = endpoint_of(url)
+        bucket = self._bucket(url, budget_key)
+        url = redirect_url(url)
+        started = time.perf_counter()
+        attempt = 0
+        while True:
+            if bucket is not None:
+                bucket.acquire()
+            try:
+                resp = self.session.request(method, url, timeout=timeout, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if attempt >= retries:
+                    self._record(endpoint, method, None, started, 0, attempt + 1)
+                    raise
+                self._sleep(self.backoff(attempt))
+                attempt += 1
+                continue
+
+            if resp.status_code in RETRY_STATUSES and attempt < retries:
+                delay = parse_retry_after(resp.headers.get("Retry-After"), self.backoff(attempt))
+                resp.close()
+                if bucket is not None and resp.status_code == 429:
+                    bucket.penalize(delay)      # квота токена: ждут все его запросы
+                else:
+                    self._sleep(delay)
+                attempt += 1
+                continue
+
+            if kwargs.get("stream"):
+                size = int(resp.headers.get("Content-Length") or 0)
+            else:
+                size = len(resp.content)
+            self._record(endpoint, method, resp.status_code, started, size, attempt + 1)
+            return resp
+
+    def _record(self, endpoint, method, status, started, size, attempts) -> None:
+        self.metrics.record(RequestStat(endpoint, method, status,
+                                        time.perf_counter() - started, size, attempts))
+
+    def get(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def close(self) -> None:
+        self.session.close()
+
+
+_CLIENT: HttpClient | None = None
+_CLIENT_LOCK = threading.Lock()
+
+
+def get_client() -> HttpClient:
+    """Process-wide shared :class:`HttpClient`."""
+    global _CLIENT
+    with _CLIENT_LOCK:
+        if _CLIENT is None:
+            _CLIENT = HttpClient()
+        return _CLIENT
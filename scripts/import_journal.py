@@ -0,0 +1,109 @@
+"""Checkpoint journal for resumable API imports.
+
+An import is split into ``(org, period)`` units fetched page by page.  After
+every page :class:`ImportJournal` appends one JSON line with the unit, the
+last ``rrd_id`` (cursor) and the page's aggregated records, and fsyncs the
+file.  If the run dies, the next run with the same parameters reads the
+journal, reuses finished units as is and continues unfinished ones from the
+saved cursor, so no page is requested twice.  The journal is removed once
+the import has been written to the workbook.
+
+Lines::
+
+    {"run": {...}}                                      # параметры запуска
+    {"org": ..., "start": ..., "end": ..., "rrd": 123, "records": [...], "doc_types": {...}}
+    {"org": ..., "start": ..., "end": ..., "done": true, "max_rrd": 456}
+
+A torn last line (crash while writing) is ignored.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any
+
+
+class ImportJournal:
+    """Append-only progress journal of one import run."""
+
+    def __init__(self, path: Path, run: dict[str, Any]) -> None:
+        self.path = Path(path)
+        self.run = run
+        self.units: dict[tuple[str, str, str], dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._started = False
+        self._load()
+
+    @property
+    def resumed(self) -> bool:
+        return bool(self.units)
+
+    @property
+    def pages(self) -> int:
+        return sum(len(u["pages"]) for u in self.units.values())
+
+    def _load(self) -> None:
+        try:
+            lines = self.path.read_text(encoding="utf-8").splitlines()
+        except OSError:
+            return
+        entries = []
+        for line in lines:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                break                       # оборванная запись в конце файла
+        if not entries or entries[0].get("run") != self.run:
+            return                          # журнал другого запуска — начать заново
+        self._started = True
+        for e in entries[1:]:
+            unit = self._unit(e["org"], e["start"], e["end"])
+            if e.get("done"):
+                unit["done"] = True
+                unit["max_rrd"] = e["max_rrd"]
+            else:
+                unit["rrd"] = e["rrd"]
+                unit["pages"].append((e["records"], e["doc_types"]))
+
+    def _unit(self, org: str, start: str, end: str) -> dict[str, Any]:
+        return self.units.setdefault((org, start, end),
+                                     {"pages": [], "rrd": 0, "done": False, "max_rrd": 0})
+
+    def get(self, org: str, start: str, end: str) -> dict[str, Any] | None:
+        """Saved progress of a unit or ``None``."""
+        return self.units.get((org, start, end))
+
+    def _append(self, entry: dict[str, Any]) -> None:
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            mode = "a" if self._started else "w"
+            with open(self.path, mode, encoding="utf-8") as f:
+                if not self._started:
+                    f.write(json.dumps({"run": self.run}, ensure_ascii=False) + "\n")
+                    self._started = True
+                f.write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+    def page(self, org: str, start: str, end: str, rrd: Any,
+             records: list[dict[str, Any]], doc_types: dict[str, int]) -> None:
+        """Record a fetched page and the cursor after it."""
+        self._append({"org": org, "start": start, "end": end, "rrd": rrd,
+                      "records": records, "doc_types": dict(doc_types)})
+
+    def done(self, org: str, start: str, end: str, max_rrd: Any) -> None:
+        """Mark a unit as completely fetched."""
+        self._append({"org": org, "start": start, "end": end, "done": True, "max_rrd": max_rrd})
+
+    def clear(self) -> None:
+        """Drop the journal after the import has been written."""
+        with self._lock:
+            try:
+                self.path.unlink()
+            except FileNotFoundError:
+                pass
+            self.units.clear()
+            self._started = False
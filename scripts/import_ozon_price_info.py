@@ -1,18 +1,30 @@
 # import_ozon_price_info.py
+"""Load Ozon prices and commissions of all cabinets into sheet «ЦеныОзон».
+
+Every (cabinet, visibility) crawl runs in its own thread; requests of one
+Client-Id share its budget in the HTTP client.  Rows are deduplicated on
+(Client-Id, offer_id) as the crawls are merged in settings order, and the
+sheet is written once, in a single block.  If any crawl fails the sheet
+keeps the previous prices.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
 
-import requests
 import xlwings as xw
-import pandas as pd
-from time import sleep
 from pathlib import Path
+from scripts import org_settings
+from scripts.http_client import get_client
 from scripts.sheet_utils import apply_sheet_settings
 
 
 EXCEL_PATH = str(Path(__file__).resolve().parents[1] / 'Finmodel.xlsm')
 
-SHEET_SETTINGS = 'НастройкиОрганизаций'
+SHEET_SETTINGS = org_settings.SHEET
 SHEET_PRICES   = 'ЦеныОзон'
 API_URL        = 'https://api-seller.ozon.ru/v5/product/info/prices'
+VISIBILITIES   = ['ALL', 'ARCHIVED']
+PAGE_LIMIT     = 1000
+OZON_MAX_WORKERS = 8     # одновременных выгрузок (кабинет × видимость)
 
 OUTPUT_HEADERS = [
     'Артикул','ID товара','Эквайринг max',
@@ -25,6 +37,24 @@ OUTPUT_HEADERS = [
     'Акции есть','Акции период с','Акции период по'
 ]
 
+# источник каждого столбца OUTPUT_HEADERS: (раздел ответа, поле)
+_COLUMNS = (
+    [(None, 'offer_id'), (None, 'product_id'), ('commissions', 'acquiring')]
+    + [('commissions', f) for f in (
+        'fbo_deliv_to_customer_amount', 'fbo_direct_flow_trans_min_amount',
+        'fbo_direct_flow_trans_max_amount', 'fbo_return_flow_amount',
+        'fbs_deliv_to_customer_amount', 'fbs_direct_flow_trans_min_amount',
+        'fbs_direct_flow_trans_max_amount', 'fbs_first_mile_min_amount',
+        'fbs_first_mile_max_amount', 'fbs_return_flow_amount',
+        'sales_percent_fbo', 'sales_percent_fbs')]
+    + [('price', f) for f in (
+        'currency_code', 'auto_action_enabled', 'auto_add_to_ozon_actions_list_enabled',
+        'marketing_price', 'marketing_seller_price', 'min_price', 'old_price', 'price',
+        'retail_price', 'vat')]
+    + [('marketing_actions', f) for f in (
+        'ozon_actions_exist', 'current_period_from', 'current_period_to')]
+)
+
 def get_workbook():
     try:
         wb = xw.Book.caller()
@@ -36,97 +66,95 @@ def get_workbook():
         print(f'→ Запуск из терминала, открыт файл: {EXCEL_PATH}')
     return wb, app
 
-def get_ozon_credentials(settings_ws):
-    df = settings_ws.range(1,1).expand().options(pd.DataFrame, header=1, index=False).value
-
-    print(f'=== Заголовки таблицы: {list(df.columns)}')
-    print('=== Первые строки:')
-    print(df.head(3).to_string(index=False))
-
-    df.columns = [str(c).strip() for c in df.columns]
-    print(f'=== После trim колонок: {list(df.columns)}')
-
-    for col in ['Client-Id', 'Token_Ozon']:
-        if col not in df.columns:
-            raise Exception(f'❌ Отсутствует колонка "{col}"')
-
-    found = df[df['Client-Id'].notna() & (df['Client-Id'] != '') & df['Token_Ozon'].notna() & (df['Token_Ozon'] != '')]
+def get_ozon_credentials(orgs):
+    """``[[Client-Id, Token_Ozon]]`` of an :class:`OrgRegistry`."""
+    found = orgs.ozon_cabinets()
     print(f'=== Найдено строк с заполненными Client-Id и Token_Ozon: {len(found)}')
-    if found.empty:
+    if not found:
         raise Exception('❌ Не найдено ни одной строки с Client-Id и Token_Ozon')
-    return found[['Client-Id', 'Token_Ozon']].dropna().values.tolist()
+    return [[o.client_id, o.token_ozon] for o in found]
+
+def price_row(it):
+    sections = {None: it}
+    row = []
+    for section, field in _COLUMNS:
+        src = sections.get(section)
+        if src is None:
+            src = sections[section] = it.get(section) or {}
+        row.append(src.get(field, '') if section is None else src.get(field))
+    return row
+
+def fetch_prices(client_id, api_key, vis):
+    """All items of one visibility of a cabinet; ``None`` if the crawl broke off."""
+    headers = {
+        'Client-Id': client_id,
+        'Api-Key': api_key,
+        'Content-Type': 'application/json'
+    }
+    items = []
+    cursor = ''
+    page = 1
+    while True:
+        payload = {"filter": {"visibility": vis}, "limit": PAGE_LIMIT}
+        if cursor:
+            payload["cursor"] = cursor
+        try:
+            resp = get_client().post(API_URL, json=payload, headers=headers,
+                                     timeout=(10, 30), budget_key=client_id)
+            if resp.status_code != 200:
+                print(f'❌ {client_id} {vis}: ошибка {resp.status_code}: {resp.text}')
+                return None
+            result = resp.json()
+        except Exception as e:
+            print(f'❌ {client_id} {vis}: ошибка при запросе: {e}')
+            return None
+
+        cursor = result.get('cursor', '')
+        batch = result.get('items', [])
+        print(f"  → {client_id} {vis}: page {page}, строк {len(batch)}")
+        items.extend(batch)
+        if not batch or not cursor:
+            return items
+        page += 1
+
+def fetch_all(credentials):
+    """``[(client_id, vis, items)]`` in settings order, crawled concurrently."""
+    units = [(str(int(float(cid))).strip(), str(key).strip(), vis)
+             for cid, key in credentials for vis in VISIBILITIES]
+    workers = max(1, min(OZON_MAX_WORKERS, len(units)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ozon_prices") as pool:
+        futures = [pool.submit(fetch_prices, *u) for u in units]
+        for (cid, _, vis), fut in zip(units, futures):
+            yield cid, vis, fut.result()
 
 def main():
     print("=== Старт import_ozon_price_info ===")
     wb, app = get_workbook()
     try:
-        settings_ws = wb.sheets[SHEET_SETTINGS]
+        credentials = get_ozon_credentials(org_settings.load(wb))
+
+        rows = {}               # (Client-Id, offer_id) → строка
+        failed = []
+        for client_id, vis, items in fetch_all(credentials):
+            if items is None:
+                failed.append(f'{client_id}/{vis}')
+                continue
+            before = len(rows)
+            for it in items:
+                rows.setdefault((client_id, str(it.get('offer_id', '')).strip()), it)
+            print(f'→ {client_id} {vis}: получено {len(items)}, новых {len(rows) - before}')
+        if failed:
+            print(f'❌ Не загружены: {", ".join(failed)} — лист {SHEET_PRICES} не изменён')
+            return
+
+        data = [price_row(it) for it in rows.values()]
         prices_ws = wb.sheets[SHEET_PRICES] if SHEET_PRICES in [s.name for s in wb.sheets] else wb.sheets.add(SHEET_PRICES)
+        for tbl in prices_ws.tables:
+            if tbl.name == "OzonPricesTable":
+                tbl.delete()
         prices_ws.clear()
-        prices_ws.range(1, 1).value = OUTPUT_HEADERS
-        print(f'→ Лист {SHEET_PRICES} очищен и подготовлен')
-
-        credentials = get_ozon_credentials(settings_ws)
-        row_ptr = 2  # строка для записи (после заголовка)
-
-        for org_idx, (client_id_raw, api_key) in enumerate(credentials, start=1):
-            client_id = str(int(float(client_id_raw))).strip()
-            print(f"\n=== Организация #{org_idx}: client_id='{client_id}' ===")
-
-            session = requests.Session()
-            session.headers.update({
-                'Client-Id': client_id,
-                'Api-Key': str(api_key).strip(),
-                'Content-Type': 'application/json'
-            })
-
-            for vis in ['ALL', 'ARCHIVED']:
-                print(f'→ Получение данных для видимости: {vis}')
-                cursor = ''
-                page = 1
-                while True:
-                    payload = {"filter": {"visibility": vis}, "limit": 1000}
-                    if cursor:
-                        payload["cursor"] = cursor
-                    try:
-                        resp = session.post(API_URL, json=payload, timeout=30)
-                        print(f"  → page {page}, HTTP {resp.status_code}")
-                        if resp.status_code != 200:
-                            print(f'❌ Ошибка {resp.status_code}: {resp.text}')
-                            break
-                        result = resp.json()
-                    except Exception as e:
-                        print(f'❌ Ошибка при запросе: {e}')
-                        break
-
-                    cursor = result.get('cursor', '')
-                    items = result.get('items', [])
-                    print(f'    Строк в ответе: {len(items)}')
-                    if not items:
-                        break
-
-                    rows = []
-                    for it in items:
-                        c = it.get('commissions', {}) or {}
-                        p = it.get('price', {}) or {}
-                        m = it.get('marketing_actions', {}) or {}
-                        rows.append([
-                            it.get('offer_id', ''), it.get('product_id', ''), c.get('acquiring'),
-                            c.get('fbo_deliv_to_customer_amount'), c.get('fbo_direct_flow_trans_min_amount'), c.get('fbo_direct_flow_trans_max_amount'), c.get('fbo_return_flow_amount'),
-                            c.get('fbs_deliv_to_customer_amount'), c.get('fbs_direct_flow_trans_min_amount'), c.get('fbs_direct_flow_trans_max_amount'),
-                            c.get('fbs_first_mile_min_amount'), c.get('fbs_first_mile_max_amount'), c.get('fbs_return_flow_amount'),
-                            c.get('sales_percent_fbo'), c.get('sales_percent_fbs'),
-                            p.get('currency_code'), p.get('auto_action_enabled'), p.get('auto_add_to_ozon_actions_list_enabled'),
-                            p.get('marketing_price'), p.get('marketing_seller_price'), p.get('min_price'), p.get('old_price'), p.get('price'), p.get('retail_price'), p.get('vat'),
-                            m.get('ozon_actions_exist'), m.get('current_period_from'), m.get('current_period_to')
-                        ])
-                    if rows:
-                        prices_ws.range(row_ptr, 1).value = rows
-                        row_ptr += len(rows)
-                    page += 1
-                    if not cursor:
-                        break
-                sleep(0.5)
+        prices_ws.range(1, 1).value = [OUTPUT_HEADERS] + data      # одна запись
+        print(f'→ Лист {SHEET_PRICES} записан одним блоком')
 
         # Итоги
         prices_ws.range('A1').expand().columns.autofit()
@@ -135,12 +163,7 @@ def main():
         prices_ws.range('A2').select()
         wb.app.api.ActiveWindow.FreezePanes = True
 
-        # Удалить предыдущие таблицы
-        for tbl in prices_ws.tables:
-            if tbl.name == "OzonPricesTable":
-                tbl.delete()
-
-        last_row = prices_ws.range('A1').end('down').row
+        last_row = len(data) + 1
         last_col = len(OUTPUT_HEADERS)
         tbl_range = prices_ws.range((1, 1), (last_row, last_col))
         prices_ws.tables.add(tbl_range, name="OzonPricesTable", table_style_name="TableStyleMedium7", has_headers=True)
@@ -148,7 +171,8 @@ def main():
 
         apply_sheet_settings(wb, SHEET_PRICES)
 
-        print(f'→ Итог: записано строк: {row_ptr-2}')
+        print(f'→ Итог: записано строк: {len(data)}')
+        print(f'HTTP-статистика:\n{get_client().metrics.summary()}')
     except Exception as e:
         print(f'❌ Ошибка: {e}')
     finally:
@@ -4,26 +4,37 @@
 The workbook must contain sheet "НастройкиОрганизаций" with columns
 "Организация", "Client-Id" and "Token_Ozon". The sheet
 "Номенклатура_WB" uses the same columns as the Wildberries loader and
-is updated/extended with Ozon products.
+is updated/extended with Ozon products: rows are matched by
+(Организация, Артикул_поставщика) and only rows whose Ozon fields changed
+are rewritten, new products are appended (see :mod:`scripts.row_upsert`).
 """
 
 import os
-import requests
-import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+
 import xlwings as xw
 
+from scripts import org_settings
+from scripts.block_writer import BlockAppender
+from scripts.http_client import get_client
+from scripts.price_store import row_blocks
+from scripts.row_upsert import norm_cell, plan_upsert, row_hash
+
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 EXCEL_PATH = os.path.join(BASE_DIR, 'Finmodel.xlsm')
 
-SETTINGS_SHEET = 'НастройкиОрганизаций'
+SETTINGS_SHEET = org_settings.SHEET
 PRODUCTS_SHEET = 'Номенклатура_WB'
 HEADERS = [
     'Организация', 'Артикул_WB', 'Артикул_поставщика',
     'Бренд', 'Название', 'Предмет',
     'Ширина', 'Высота', 'Длина', 'Вес_брутто', 'Объем_литр'
 ]
+KEY_COLUMNS = ['Организация', 'Артикул_поставщика']
+OWNED_COLUMNS = ['Артикул_WB', 'Название']       # поля, которые заполняет Ozon
 API_URL = 'https://api-seller.ozon.ru/v3/product/list'
 PAGE_LIMIT = 1000
+OZON_MAX_WORKERS = 8        # кабинетов, загружаемых одновременно
 
 
 def get_workbook():
@@ -38,22 +49,13 @@ def get_workbook():
     return wb, app
 
 
-def read_credentials(ws):
-    df = ws.range(1, 1).expand().options(pd.DataFrame, header=1, index=False).value
-    df.columns = [str(c).strip() for c in df.columns]
-    creds = []
-    for _, row in df.iterrows():
-        org = str(row.get('Организация', '')).strip()
-        cid = str(row.get('Client-Id', '')).strip()
-        api_key = str(row.get('Token_Ozon', '')).strip()
-        if cid.endswith('.0'):
-            cid = cid[:-2]
-        if org and cid and api_key:
-            creds.append({'org': org, 'client_id': cid, 'api_key': api_key})
-    return creds
+def read_credentials(orgs):
+    """Cabinets with Client-Id and Token_Ozon of an :class:`OrgRegistry`."""
+    return [{'org': o.name, 'client_id': o.client_id, 'api_key': o.token_ozon}
+            for o in orgs.ozon_cabinets()]
 
 
-def fetch_products(session):
+def fetch_products(headers):
     last_id = ''
     page = 1
     items = []
@@ -62,8 +64,9 @@ def fetch_products(session):
         if last_id:
             payload['last_id'] = last_id
         try:
-            resp = session.post(API_URL, json=payload, timeout=30)
-            print(f'  → page {page}, HTTP {resp.status_code}')
+            resp = get_client().post(API_URL, json=payload, headers=headers, timeout=(10, 30),
+                                     budget_key=headers.get('Client-Id'))
+            print(f"  → {headers.get('Client-Id')}: page {page}, HTTP {resp.status_code}")
             if resp.status_code != 200:
                 print(f'    ❌ Ошибка {resp.status_code}: {resp.text}')
                 break
@@ -81,23 +84,49 @@ def fetch_products(session):
     return items
 
 
-def merge_products(df_old: pd.DataFrame, df_new: pd.DataFrame) -> pd.DataFrame:
-    key = ['Организация', 'Артикул_поставщика']
-    if df_old.empty:
-        return df_new
-    merged = pd.merge(df_old, df_new, on=key, how='outer', suffixes=('', '_new'))
-    for col in ['Артикул_WB', 'Название']:
-        if f'{col}_new' in merged.columns:
-            merged[col] = merged[f'{col}_new'].combine_first(merged[col])
-            merged.drop(columns=[f'{col}_new'], inplace=True)
-    return merged[HEADERS]
+def fetch_all(creds):
+    """``[(info, items)]`` in settings order; cabinets are fetched concurrently."""
+    workers = max(1, min(OZON_MAX_WORKERS, len(creds)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ozon_products") as pool:
+        futures = [pool.submit(fetch_products, {'Client-Id': info['client_id'],
+                                                'Api-Key': info['api_key'],
+                                                'Content-Type': 'application/json'})
+                   for info in creds]
+        return [(info, fut.result()) for info, fut in zip(creds, futures)]
+
+
+def product_row(org, it):
+    return [org, it.get('product_id', ''), str(it.get('offer_id', '')).strip(),
+            '', it.get('name', ''), '', '', '', '', '', '']
+
+
+def row_key(values):
+    return tuple(norm_cell(values[HEADERS.index(c)]) for c in KEY_COLUMNS)
+
+
+def owned(values):
+    return [values[HEADERS.index(c)] for c in OWNED_COLUMNS]
+
+
+def read_products(ws):
+    """``{key: (sheet_row, values)}`` of the data rows and the last used row."""
+    last = ws.range('A' + str(ws.cells.rows.count)).end('up').row
+    if last < 2:
+        return {}, 1
+    values = ws.range((2, 1), (last, len(HEADERS))).options(ndim=2).value or []
+    rows = {}
+    for r, vals in enumerate(values, start=2):
+        key = row_key(vals)
+        if all(key):
+            rows.setdefault(key, (r, vals))
+    return rows, last
 
 
 def main():
     print('=== Старт import_ozon_products ===')
     wb, app = get_workbook()
     try:
-        settings_ws = wb.sheets[SETTINGS_SHEET]
+        orgs = org_settings.load(wb)
     except Exception:
         print(f'❌ Нет листа {SETTINGS_SHEET}')
         if app:
@@ -111,53 +140,49 @@ def main():
     if prod_ws.range('A1').value != HEADERS[0]:
         prod_ws.clear()
         prod_ws.range(1, 1).value = HEADERS
+        prod_ws.api.Rows(1).Font.Bold = True
+        prod_ws.api.Application.ActiveWindow.SplitRow = 1
+        prod_ws.api.Application.ActiveWindow.FreezePanes = True
 
-    df_existing = prod_ws.range(1, 1).expand().options(pd.DataFrame, header=1, index=False).value
-    if df_existing is None or df_existing.empty:
-        df_existing = pd.DataFrame(columns=HEADERS)
-
-    creds = read_credentials(settings_ws)
+    creds = read_credentials(orgs)
     if not creds:
         print('❌ Нет организаций с Client-Id и Token_Ozon')
         if app:
             app.quit()
         return
 
-    df_all_new = pd.DataFrame(columns=HEADERS)
-
-    for idx, info in enumerate(creds, start=1):
-        print(f"→ Организация {info['org']} ({idx}/{len(creds)})")
-        session = requests.Session()
-        session.headers.update({
-            'Client-Id': info['client_id'],
-            'Api-Key': info['api_key'],
-            'Content-Type': 'application/json'
-        })
-        items = fetch_products(session)
-        rows = []
+    fresh = {}
+    for info, items in fetch_all(creds):
+        print(f"→ Организация {info['org']}: товаров {len(items)}")
         for it in items:
-            offer = str(it.get('offer_id', '')).strip()
-            prod_id = it.get('product_id', '')
-            name = it.get('name', '')
-            rows.append([
-                info['org'], prod_id, offer,
-                '', name, '', '', '', '', '', ''
-            ])
-        if rows:
-            df_org = pd.DataFrame(rows, columns=HEADERS)
-            df_all_new = pd.concat([df_all_new, df_org], ignore_index=True)
-        session.close()
-
-    df_result = merge_products(df_existing, df_all_new)
-
-    prod_ws.clear()
-    prod_ws.range(1, 1).value = HEADERS
-    if not df_result.empty:
-        prod_ws.range(2, 1).value = df_result.values
-    prod_ws.range('A1').expand().columns.autofit()
-    prod_ws.api.Rows(1).Font.Bold = True
-    prod_ws.api.Application.ActiveWindow.SplitRow = 1
-    prod_ws.api.Application.ActiveWindow.FreezePanes = True
+            row = product_row(info['org'], it)
+            key = row_key(row)
+            if all(key):
+                fresh.setdefault(key, row)
+
+    existing, last_row = read_products(prod_ws)
+    plan = plan_upsert({k: (r, row_hash(owned(vals))) for k, (r, vals) in existing.items()},
+                       {k: owned(row) for k, row in fresh.items()})
+    print(f'→ Товары Ozon: {plan.summary()}')
+
+    # в изменённых строках обновляются только поля Ozon, остальные остаются
+    writes = {}
+    for r, key in plan.updates.items():
+        vals = list(existing[key][1])
+        for c in OWNED_COLUMNS:
+            i = HEADERS.index(c)
+            vals[i] = fresh[key][i]
+        writes[r] = vals
+    blocks = row_blocks(writes)
+    for first, last in blocks:
+        prod_ws.range((first, 1)).value = [writes[r] for r in range(first, last + 1)]
+    with BlockAppender(prod_ws, last_row + 1) as appender:
+        appender.extend(fresh[k] for k in plan.appends)
+    if plan:
+        print(f'→ Записано строк: {len(writes)} ({len(blocks)} блок(ов)), добавлено: {appender.rows}')
+        prod_ws.range('A1').expand().columns.autofit()
+    else:
+        print('→ Изменений нет — лист не изменён')
 
     if app:
         wb.save()
@@ -1,14 +1,22 @@
 # import_ozon_realization_grouped.py
 
+import time
 import warnings
-from collections import defaultdict
-import requests
+from array import array
+from concurrent.futures import Future, ThreadPoolExecutor
+import numpy as np
 import pandas as pd
+import requests
 from pathlib import Path
 import re
 import xlwings as xw
 from datetime import datetime
 
+from scripts import org_settings
+from scripts.http_client import get_client
+from scripts.month_cache import MonthCache, month_closed
+from scripts.workbook_snapshot import cache_dir
+
 warnings.filterwarnings("ignore", category=UserWarning)
 
 def get_workbook():
@@ -49,8 +57,12 @@ BASE_DIR = Path(__file__).resolve().parents[1]
 EXCEL_PATH = BASE_DIR / 'Finmodel.xlsm'
 
   # подстрой под себя!
-ORG_SHEET = 'НастройкиОрганизаций'
+ORG_SHEET = org_settings.SHEET
 CFG_SHEET = 'Настройки'
+# Отчёт за месяц считается закрытым (неизменным) через столько дней после его конца
+REALIZATION_CLOSED_AFTER_DAYS = 15
+OZON_MAX_WORKERS = 8             # одновременных запросов (org × месяц)
+OZON_TIMEOUT = (10, 120)         # отчёт за месяц крупного кабинета отдаётся долго
 
 def log(msg):
     print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {msg}")
@@ -59,33 +71,15 @@ def log(msg):
 def load_settings(wb):
     """Читаем настройки прямо из открытой книги (Book.caller())."""
     # ---------- 1. Организации -------------------------------------
-    sht_orgs = wb.sheets[ORG_SHEET]
-    df_all = sht_orgs.range('A1').expand().options(
-        pd.DataFrame, header=1, index=False).value
-
-    org_rows = []
-    for _, row in df_all.iterrows():
-        if pd.isna(row['Организация']) or str(row['Организация']).strip() == '':
-            break
-        org_rows.append(row)
-    if not org_rows:
+    registry = org_settings.load(wb)
+    if not len(registry):
         raise Exception("В таблице 'НастройкиОрганизаций' нет данных!")
-    df_orgs = pd.DataFrame(org_rows)
-
-    def safe_str(x):
-        if pd.isna(x):
-            return ''
-        s = str(x).strip()
-        return s[:-2] if s.endswith('.0') else s
 
     orgs = []
-    for _, row in df_orgs.iterrows():
-        org       = safe_str(row['Организация'])
-        client_id = safe_str(row['Client-Id'])
-        token     = safe_str(row['Token_Ozon'])
-        print(f"[DEBUG] Организация: {org} | Client-Id: {client_id} | Api-Key: {token}")
-        if org and client_id and token:
-            orgs.append({'org': org, 'client_id': client_id, 'token': token})
+    for o in registry:
+        print(f"[DEBUG] Организация: {o.name} | Client-Id: {o.client_id} | Api-Key: {o.token_ozon}")
+        if o.has_ozon:
+            orgs.append({'org': o.name, 'client_id': o.client_id, 'token': o.token_ozon})
 
     # ---------- 2. Период загрузки ---------------------------------
     sht_cfg = wb.sheets[CFG_SHEET]
@@ -116,14 +110,61 @@ def get_periods(start, end):
     return periods
 
 def fetch_ozon_data(org, client_id, token, year, month):
+    """Rows of the realization report for one month; ``None`` on API errors."""
     headers = {'Client-Id': client_id, 'Api-Key': token}
     body = {'year': year, 'month': month}
-    resp = requests.post(API_URL, headers=headers, json=body)
+    try:
+        resp = get_client().post(API_URL, headers=headers, json=body,
+                                 timeout=OZON_TIMEOUT, budget_key=client_id)
+    except requests.exceptions.RequestException as e:
+        log(f"Ошибка сети {org} {year}-{month}: {e}")
+        return None
     if resp.status_code != 200:
         log(f"Ошибка API {org} {year}-{month}: {resp.status_code}")
-        return []
+        return None
     return resp.json().get('result', {}).get('rows', [])
 
+def realization_cache():
+    return MonthCache(cache_dir() / "ozon_realization")
+
+def fetch_month(cache, org, client_id, token, year, month):
+    """Fetch one month from the API and cache it; runs in a worker thread."""
+    started = time.perf_counter()
+    rows = fetch_ozon_data(org, client_id, token, year, month)
+    elapsed = time.perf_counter() - started
+    if rows is None:
+        log(f"Ответ: {org} {year}-{month} — ошибка за {elapsed:.2f} с")
+        return []
+    log(f"Ответ: {org} {year}-{month} — {len(rows)} строк за {elapsed:.2f} с")
+    cache.put(client_id, year, month, rows,
+              closed=month_closed(year, month, REALIZATION_CLOSED_AFTER_DAYS))
+    return rows
+
+def iter_month_rows(orgs, periods, cache):
+    """Yield ``(org_info, period, rows)`` in settings order (org, then month).
+
+    Closed months come from ``cache``; the others are fetched concurrently
+    by up to ``OZON_MAX_WORKERS`` threads, paced per Client-Id by the HTTP
+    client's budget.  Results are merged in the original order, so the
+    grouped table does not depend on which request finishes first.
+    """
+    with ThreadPoolExecutor(max_workers=OZON_MAX_WORKERS,
+                            thread_name_prefix="ozon_realization") as pool:
+        pending = []
+        for o in orgs:
+            for p in periods:
+                rows = cache.get(o['client_id'], p['year'], p['month'])
+                if rows is not None:
+                    log(f"Из кэша: {o['org']} {p['year']}-{p['month']} ({len(rows)} строк)")
+                    pending.append((o, p, rows))
+                else:
+                    log(f"Запрос: {o['org']} {p['year']}-{p['month']}")
+                    pending.append((o, p, pool.submit(
+                        fetch_month, cache, o['org'], o['client_id'], o['token'],
+                        p['year'], p['month'])))
+        for o, p, rows in pending:
+            yield o, p, rows.result() if isinstance(rows, Future) else rows
+
 def format_as_table(ws, df, table_name="OzonReportTable"):
     last_row = df.shape[0] + 1  # +1 для шапки
     last_col = df.shape[1]
@@ -185,6 +226,103 @@ def write_to_excel(df: pd.DataFrame):
             wb.close()
             app.quit()
 
+# поля блоков delivery_commission / return_commission в порядке OUTPUT_HEADERS
+BLOCK_FIELDS = [
+    'amount', 'bonus', 'commission', 'compensation', 'price_per_instance', 'quantity',
+    'standard_fee', 'bank_coinvestment', 'stars', 'pick_up_point_coinvestment', 'total'
+]
+_D = {f: 3 + i for i, f in enumerate(BLOCK_FIELDS)}                       # столбцы доставки
+_R = {f: 3 + len(BLOCK_FIELDS) + i for i, f in enumerate(BLOCK_FIELDS)}   # столбцы возвратов
+_WIDTH = 3 + 2 * len(BLOCK_FIELDS)
+
+
+class RealizationAccumulator:
+    """Group realization rows by ``(org, year, month, offer, sku, barcode, name)``.
+
+    Each group key is interned to an integer slot with a row in a
+    preallocated ``(capacity, 25)`` float64 buffer (``seller_price × qty``,
+    ``ratio × qty``, ``qty`` and the 11 fields of both blocks) that doubles
+    when full.  Every page is summed per slot with ``numpy.bincount`` and
+    folded into the buffer, so memory grows with groups, not with rows.
+    """
+
+    INITIAL_CAPACITY = 1024
+
+    def __init__(self):
+        self._slots = {}
+        self.keys = []
+        self.rows = 0
+        self._sums = np.zeros((self.INITIAL_CAPACITY, _WIDTH))
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _slot(self, key):
+        slot = self._slots.get(key)
+        if slot is None:
+            slot = self._slots[key] = len(self.keys)
+            self.keys.append(key)
+            if slot == len(self._sums):
+                grown = np.zeros((2 * len(self._sums), _WIDTH))
+                grown[:slot] = self._sums
+                self._sums = grown
+        return slot
+
+    def add_rows(self, org, year, month, rows):
+        slots, values = array('l'), array('d')          # только на одну страницу
+        for r in rows:
+            it    = r.get('item', {})
+            deliv = r.get('delivery_commission') or {}
+            ret   = r.get('return_commission')   or {}
+            slots.append(self._slot((org, year, month, str(it.get('offer_id', '')).strip(),
+                                     it.get('sku', ''), it.get('barcode', ''), it.get('name', ''))))
+
+            qty_del = deliv.get('quantity', 0) or 0
+            values.append((r.get('seller_price_per_instance', 0) or 0) * qty_del)
+            values.append((r.get('commission_ratio', 0) or 0) * qty_del)
+            values.append(qty_del)
+            values.extend([deliv.get(f, 0) or 0 for f in BLOCK_FIELDS])
+            values.extend([ret.get(f, 0) or 0 for f in BLOCK_FIELDS])
+        if not slots:
+            return
+        self.rows += len(slots)
+        m = np.frombuffer(values, dtype=np.float64).reshape(-1, _WIDTH)
+        page_slots, local = np.unique(np.frombuffer(slots, dtype=slots.typecode), return_inverse=True)
+        self._sums[page_slots] += np.column_stack(
+            [np.bincount(local, weights=m[:, j], minlength=len(page_slots)) for j in range(_WIDTH)])
+
+    def sums(self):
+        """``(groups, 25)`` array of per-group sums."""
+        return self._sums[:len(self.keys)].copy()
+
+    def frame(self):
+        """Grouped table with ``OUTPUT_HEADERS`` columns."""
+        t = self.sums()
+        d = {f: t[:, j] for f, j in _D.items()}
+        r = {f: t[:, j] for f, j in _R.items()}
+        seller_price_sum, ratio_sum, qty_sum = t[:, 0], t[:, 1], t[:, 2]
+
+        partner_payouts = (d['bank_coinvestment'] + d['pick_up_point_coinvestment'] + d['stars']
+                           - r['bank_coinvestment'] - r['pick_up_point_coinvestment'] - r['stars'])
+        base_fee = d['standard_fee'] - r['standard_fee']
+        bonused_points = d['bonus'] - r['bonus']
+        raw_commission = base_fee - bonused_points
+        min_commission = 0.01 * seller_price_sum      # вознаграждение не ниже 1 % от продаж
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio_avg = np.where(qty_sum != 0, ratio_sum / qty_sum, 0.0)
+
+        df = pd.DataFrame(self.keys, columns=OUTPUT_HEADERS[:7])
+        measures = [seller_price_sum, ratio_avg,
+                    *(d[f] for f in BLOCK_FIELDS), *(r[f] for f in BLOCK_FIELDS),
+                    d['quantity'] - r['quantity'],
+                    d['amount'] - r['amount'] + partner_payouts,
+                    partner_payouts, bonused_points, base_fee,
+                    np.where(raw_commission >= min_commission, raw_commission, min_commission)]
+        for name, col in zip(OUTPUT_HEADERS[7:], measures):
+            df[name] = col
+        return df
+
+
 def main():
     wb, app, created = get_workbook()
     log(f"Старт скрипта. Excel: {wb.fullname}")
@@ -196,107 +334,16 @@ def main():
     log(f"Организаций для запроса: {len(orgs)}")
     log(f"Периоды: {period_start:%Y-%m} — {period_end:%Y-%m}")
 
-    # ---------- блок инициализации словаря groups ----------
-   
-    groups = defaultdict(lambda: {
-        'org': '', 'year': 0, 'month': 0,
-        'offer_id': '', 'sku': '', 'barcode': '', 'name': '',
-        # комиссии после всех скидок
-        'commission_del': 0.0,
-        'commission_ret': 0.0,
-        # для корректной выручки и среднего процента
-        'seller_price_sum': 0.0,
-        'commission_ratio_sum': 0.0,   # сумма (ratio × qty)
-        'qty_sum': 0,                  # общее кол-во
-        # блоки delivery / return
-        'del': defaultdict(float),
-        'ret': defaultdict(float)
-    })
-
-
-    for org_info in orgs:
-        org       = org_info['org']
-        client_id = org_info['client_id']
-        token     = org_info['token']
-
-        for p in periods:
-            log(f"Запрос: {org} {p['year']}-{p['month']}")
-            rows = fetch_ozon_data(org, client_id, token, p['year'], p['month'])
-
-            for r in rows:
-                it    = r.get('item', {})
-                deliv = r.get('delivery_commission') or {}
-                ret   = r.get('return_commission')   or {}
-
-                offer = str(it.get('offer_id', '')).strip()
-                key = (
-                    org, p['year'], p['month'],
-                    offer, it.get('sku', ''), it.get('barcode', ''), it.get('name', '')
-                )
-                g = groups[key]
-
-                # статические поля
-                g['org'], g['year'], g['month'], g['offer_id'], g['sku'], g['barcode'], g['name'] = key
-
-                # количество доставленных штук
-                qty_del = deliv.get('quantity', 0) or 0
-
-                # оборот по цене продавца
-                g['seller_price_sum']     += (r.get('seller_price_per_instance', 0) or 0) * qty_del
-                # для среднего процента комиссии
-                g['commission_ratio_sum'] += (r.get('commission_ratio', 0) or 0) * qty_del
-                g['qty_sum']              += qty_del
-
-                # итоговые комиссии уже после скидок (rule 1 %)
-                g['commission_del'] += deliv.get('commission', 0) or 0
-                g['commission_ret'] += ret.get('commission', 0) or 0
-
-                # остальные показатели
-                for src, dct in zip(['del', 'ret'], [deliv, ret]):
-                    for f_api, f_out in [
-                        ('amount', 'amount'), ('bonus', 'bonus'), ('commission', 'commission'),
-                        ('compensation', 'compensation'), ('price_per_instance', 'price'),
-                        ('quantity', 'qty'), ('standard_fee', 'std_fee'),
-                        ('bank_coinvestment', 'bank'), ('stars', 'stars'),
-                        ('pick_up_point_coinvestment', 'pvz'), ('total', 'total')
-                    ]:
-                        g[src][f_out] += dct.get(f_api, 0) or 0
-
-   
-    # --- Подготовка итоговой таблицы ---------------------------------
-    result = []
-    for g in groups.values():
-        sold_qty = g['del']['qty'] - g['ret']['qty']
-        partner_payouts = (
-            g['del']['bank'] + g['del']['pvz'] + g['del']['stars']
-        - g['ret']['bank'] - g['ret']['pvz'] - g['ret']['stars']
-        )
-        revenue = g['del']['amount'] - g['ret']['amount'] + partner_payouts
-
-        base_fee        = g['del']['std_fee'] - g['ret']['std_fee']
-        bonused_points  = g['del']['bonus']   - g['ret']['bonus']
-        raw_commission  = base_fee - bonused_points
-        min_commission  = 0.01 * g['seller_price_sum']
-        net_reward      = raw_commission if raw_commission >= min_commission else min_commission
-
-        commission_ratio_avg = (
-            g['commission_ratio_sum'] / g['qty_sum'] if g['qty_sum'] else 0
-        )
-
-        result.append([
-            g['org'], g['year'], g['month'], g['offer_id'], g['sku'], g['barcode'], g['name'],
-            g['seller_price_sum'], commission_ratio_avg,
-            g['del']['amount'], g['del']['bonus'], g['del']['commission'], g['del']['compensation'],
-            g['del']['price'], g['del']['qty'], g['del']['std_fee'],
-            g['del']['bank'], g['del']['stars'], g['del']['pvz'], g['del']['total'],
-            g['ret']['amount'], g['ret']['bonus'], g['ret']['commission'], g['ret']['compensation'],
-            g['ret']['price'], g['ret']['qty'], g['ret']['std_fee'],
-            g['ret']['bank'], g['ret']['stars'], g['ret']['pvz'], g['ret']['total'],
-            sold_qty, revenue, partner_payouts,
-            bonused_points, base_fee, net_reward
-        ])
-
-    df = pd.DataFrame(result, columns=OUTPUT_HEADERS)
+    # закрытые месяцы берутся из кэша, в API уходят только открытые и новые
+    cache = realization_cache()
+    acc = RealizationAccumulator()
+    for org_info, p, rows in iter_month_rows(orgs, periods, cache):
+        acc.add_rows(org_info['org'], p['year'], p['month'], rows)
+
+    log(f"Месяцев из кэша: {cache.hits}, запрошено в API: {cache.misses}")
+    log(f"HTTP-статистика:\n{get_client().metrics.summary()}")
+    log(f"Строк отчёта: {acc.rows}, групп: {len(acc)}")
+    df = acc.frame()
     write_to_excel(df)
 
 
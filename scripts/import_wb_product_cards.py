@@ -1,8 +1,13 @@
 import xlwings as xw
-import requests
 import sys
 import os
-import time
+
+from scripts import org_settings
+from scripts.block_writer import BlockAppender
+from scripts.card_store import CardStore, card_key
+from scripts.http_client import get_client
+from scripts.price_store import row_blocks
+from scripts.workbook_snapshot import book_tag, cache_dir
 print("==== PYTHONPATH ====")
 print(sys.path)
 print("==== WORKDIR ====")
@@ -10,7 +15,7 @@ print(os.getcwd())
 print("==== FILES IN SCRIPTS ====")
 print(os.listdir(os.path.dirname(__file__)))
 
-SETTINGS_SHEET = 'НастройкиОрганизаций'
+SETTINGS_SHEET = org_settings.SHEET
 PRODUCTS_SHEET = 'Номенклатура_WB'
 HEADERS = [
     'Организация', 'Артикул_WB', 'Артикул_поставщика',
@@ -20,13 +25,114 @@ HEADERS = [
 API_URL = 'https://content-api.wildberries.ru/content/v2/get/cards/list?locale=ru'
 LIMIT = 100
 
-def get_idx(header_row):
-    return {h.strip(): i for i, h in enumerate(header_row)}
+def cards_store_path(wb):
+    """Card store of workbook ``wb`` (in the cache dir)."""
+    return cache_dir() / f"wb_cards_{book_tag(wb)}.sqlite"
+
+def card_row(org, c):
+    dims = c.get('dimensions', {})
+    width = dims.get('width', '')
+    height = dims.get('height', '')
+    length = dims.get('length', '')
+    # Считаем объем, если все размеры есть и являются числами
+    try:
+        vol_ltr = float(width) * float(height) * float(length) / 1000
+        vol_ltr = round(vol_ltr, 3)
+    except Exception:
+        vol_ltr = ''
+    return [
+        org,
+        str(c.get('nmID', '')),
+        c.get('vendorCode', ''),
+        c.get('brand', ''),
+        c.get('title', ''),
+        c.get('subjectName', ''),
+        width, height, length,
+        dims.get('weightBrutto', ''),
+        vol_ltr
+    ]
+
+def fetch_org_cards(org, token, cursor=None):
+    """Cards of ``org`` updated after ``cursor`` (all cards if ``None``).
+
+    Cards are requested in ascending ``updatedAt`` order, so the cursor of
+    the last card is the watermark for the next run.  Returns ``(cards,
+    cursor)`` – the cursor is ``None`` if no card was returned – or ``None``
+    if the crawl broke off.
+    """
+    cursor = dict(cursor) if cursor else {}
+    watermark = None
+    cards_all = []
+    page = 0
+    while True:
+        page += 1
+        payload = {
+            'settings': {
+                'sort': {'ascending': True},
+                'cursor': {**cursor, 'limit': LIMIT},
+                'filter': {'withPhoto': -1}
+            }
+        }
+        headers = {'Authorization': token}
+        try:
+            # повторы с паузой и лимит запросов к контент-API — в http_client
+            resp = get_client().post(API_URL, json=payload, headers=headers,
+                                     timeout=(10, 30), budget_key=token)
+        except Exception as e:
+            print(f'❌ Сетевая ошибка: {e}, страница {page}')
+            return None
+
+        if resp.status_code != 200:
+            print(f'❌ API {resp.status_code}: {resp.text}')
+            return None
+        data = resp.json()
+        cards = data.get('cards', [])
+        print(f'Страница {page}: карточек {len(cards)}')
+        cards_all.extend(cards)
+
+        cur = data.get('cursor', {})
+        if cards and 'updatedAt' in cur and 'nmID' in cur:
+            watermark = {'updatedAt': cur['updatedAt'], 'nmID': cur['nmID']}
+            cursor = dict(watermark)
+        if cur.get('total') is None or cur.get('total', 0) < LIMIT:
+            return cards_all, watermark
+
+def read_orgs(orgs):
+    """``[(организация, Token_WB)]`` or ``None`` if the sheet has no such columns."""
+    if not (orgs.has_column('Организация') and orgs.has_column('Token_WB')):
+        return None
+    return orgs.wb_tokens()
+
+def sheet_keys(sht_prod):
+    """``{(org, nmID): row}`` of the data rows and the last used row."""
+    last = sht_prod.range('A' + str(sht_prod.cells.rows.count)).end('up').row
+    if last < 2:
+        return {}, 1
+    values = sht_prod.range((2, 1), (last, 2)).options(ndim=2).value or []
+    return {card_key(org, nm): r for r, (org, nm) in enumerate(values, start=2) if org}, last
+
+def format_header(sht_prod):
+    hdr_rng = sht_prod.range((1, 1), (1, len(HEADERS)))
+    hdr_rng.api.Font.Bold = True
+    hdr_rng.api.HorizontalAlignment = -4108  # xlCenter
+    hdr_rng.api.Borders.Weight = 2           # xlThin
+    for col in range(1, len(HEADERS) + 1):
+        sht_prod.range((1, col)).api.EntireColumn.AutoFit()
 
-def main():
+def main(full=False):
+    """Sync WB cards into «Номенклатура_WB».
+
+    Each organization is crawled from its saved cursor, so only cards
+    updated since the last run are downloaded; new and changed cards are
+    written into their rows or appended, other rows (Ozon products
+    included) are not touched.  ``full=True`` crawls all cards again and
+    forgets stored cards of an organization that the complete crawl no
+    longer returned.  Stored cards are written back only to a sheet
+    without a header; a card row deleted by hand stays deleted.
+    """
     print('=== START import_wb_product_cards ===')
     wb = xw.Book.caller()  # <-- ВАЖНО!
-    sht_set = wb.sheets[SETTINGS_SHEET]
+    registry = org_settings.load(wb)
 
     # --- Подготовка листа с товарами ---
     sheet_names = [sht.name for sht in wb.sheets]
@@ -37,107 +143,71 @@ def main():
         sht_prod = wb.sheets[PRODUCTS_SHEET]
         print(f'Лист для загрузки карточек: {PRODUCTS_SHEET}')
 
-    sht_prod.clear()
-    sht_prod.range('A1').value = HEADERS
-
-    hdr_rng = sht_prod.range((1, 1), (1, len(HEADERS)))
-    hdr_rng.api.Font.Bold = True
-    hdr_rng.api.HorizontalAlignment = -4108  # xlCenter
-    hdr_rng.api.Borders.Weight = 2           # xlThin
-
-    for col in range(1, len(HEADERS) + 1):
-        sht_prod.range((1, col)).api.EntireColumn.AutoFit()
-    print('Выполнен автоподбор ширины колонок.')
-
-    cfgHdr = sht_set.range('A1').expand('right').value
-    print('Шапка листа настроек:', cfgHdr)
-    idx = get_idx(cfgHdr)
-    if 'Организация' not in idx or 'Token_WB' not in idx:
+    orgs = read_orgs(registry)
+    if orgs is None:
         print('❌ В листе «НастройкиОрганизаций» нет колонок «Организация» и/или «Token_WB»')
         return
-
-    org_col = idx['Организация']
-    org_values = sht_set.range((2, org_col+1), (sht_set.cells.last_cell.row, org_col+1)).options(ndim=1).value
-    org_rows_count = next((i for i, val in enumerate(org_values) if not val), len(org_values))
-    if org_rows_count == 0:
+    if not orgs:
         print('ℹ️ Нет организаций для обработки')
         return
 
-    last_col = len(cfgHdr)
-    settings = sht_set.range((2,1), (org_rows_count+1, last_col)).value
-
-    allCards = []
-    for i, row in enumerate(settings):
-        org = row[idx['Организация']]
-        token = row[idx['Token_WB']]
-        print(f'--- Организация "{org}"')
-        if not org or not token:
-            print('Строка пропущена (нет org или token)')
-            continue
-        cursor = None
-        page = 0
-        existSet = set()
-        while True:
-            page += 1
-            payload = {
-                'settings': {
-                    'cursor': cursor if cursor else {'limit': LIMIT},
-                    'filter': {'withPhoto': -1}
-                }
-            }
-            headers = {'Authorization': token}
-            try:
-                resp = requests.post(API_URL, json=payload, headers=headers, timeout=30)
-            except Exception as e:
-                print(f'❌ Сетевая ошибка: {e}, попытка {page}')
-                time.sleep(10)
+    # без шапки лист считается пустым: все карточки из хранилища пишутся заново
+    rebuild = sht_prod.range((1, 1), (1, len(HEADERS))).value != HEADERS
+    if rebuild:
+        sht_prod.clear()
+        sht_prod.range('A1').value = HEADERS
+        format_header(sht_prod)
+        print('Лист без шапки — карточки будут записаны заново')
+
+    with CardStore(cards_store_path(wb)) as store:
+        fresh = {}
+        cursors = {}
+        crawled = set()                   # организации, полностью выгруженные заново
+        for org, token in orgs:
+            cursor = None if full else store.cursor(org)
+            print(f'--- Организация "{org}"' + (f' (изменения после {cursor["updatedAt"]})' if cursor else ''))
+            got = fetch_org_cards(org, token, cursor)
+            if got is None:
+                print(f'⚠️ {org}: загрузка прервана, курсор не сдвинут')
                 continue
-
-            print(f'HTTP {resp.status_code}')
-            if resp.status_code != 200:
-                print(f'❌ API {resp.status_code}: {resp.text}')
-                break
-            data = resp.json()
-            cards = data.get('cards', [])
-            print(f'Получено карточек: {len(cards)}')
+            cards, watermark = got
             for c in cards:
-                nm = str(c.get('nmID', ''))
-                if nm and nm not in existSet:
-                    width = c.get('dimensions', {}).get('width', '')
-                    height = c.get('dimensions', {}).get('height', '')
-                    length = c.get('dimensions', {}).get('length', '')
-                    # Считаем объем, если все размеры есть и являются числами
-                    try:
-                        vol_ltr = float(width) * float(height) * float(length) / 1000
-                        vol_ltr = round(vol_ltr, 3)
-                    except Exception:
-                        vol_ltr = ''
-                    allCards.append([
-                        org,
-                        nm,
-                        c.get('vendorCode', ''),
-                        c.get('brand', ''),
-                        c.get('title', ''),
-                        c.get('subjectName', ''),
-                        width, height, length,
-                        c.get('dimensions', {}).get('weightBrutto', ''),
-                        vol_ltr
-                    ])
-                    existSet.add(nm)
-
-            cur = data.get('cursor', {})
-            if cur.get('total') is None or cur.get('total', 0) < LIMIT:
-                print('Пагинация завершена')
-                break
-            cursor = {k: cur[k] for k in ('updatedAt','nmID') if k in cur}
-            cursor['limit'] = LIMIT
-
-    if allCards:
-        sht_prod.range((2, 1)).value = allCards
-        sht_prod.range('B:B').api.NumberFormat = '@'
-        print(f'✅ Добавлено новых карточек: {len(allCards)}')
-    else:
-        print('ℹ️ Новых карточек не найдено')
+                key = card_key(org, c.get('nmID'))
+                if key[1]:
+                    fresh[key] = (card_row(org, c), c.get('updatedAt'))
+            if watermark:
+                cursors[org] = watermark
+            if full:
+                crawled.add(org)
+
+        new, changed = store.diff({k: row for k, (row, _) in fresh.items()})
+        print(f'Карточек получено: {len(fresh)}, новых: {len(new)}, изменённых: {len(changed)}')
+        pending = {k: fresh[k][0] for k in new + changed}
+        # карточки, которых нет в полной выгрузке, удалены в WB
+        removed = [k for k, _ in store.rows(crawled) if k not in fresh]
+        if removed:
+            print(f'Удалено в WB и забыто в хранилище: {len(removed)}')
+
+        if pending or rebuild:
+            on_sheet, last_row = sheet_keys(sht_prod)
+            if rebuild:
+                # лист без шапки очищен — карточки возвращаются из хранилища
+                gone = set(removed)
+                for key, row in store.rows({org for org, _ in orgs}):
+                    if key not in pending and key not in gone:
+                        pending[key] = row
+            writes = {on_sheet[k]: row for k, row in pending.items() if k in on_sheet}
+            blocks = row_blocks(writes)
+            for first, last in blocks:
+                sht_prod.range((first, 1)).value = [writes[r] for r in range(first, last + 1)]
+            with BlockAppender(sht_prod, last_row + 1) as appender:
+                appender.extend(row for k, row in pending.items() if k not in on_sheet)
+            sht_prod.range('B:B').api.NumberFormat = '@'
+            print(f'✅ Обновлено строк: {len(writes)} ({len(blocks)} блок(ов)), '
+                  f'добавлено: {appender.rows}')
+        else:
+            print('ℹ️ Изменённых карточек нет — лист не изменён')
+        store.apply(fresh, cursors, removed)
 
     print('=== END import_wb_product_cards ===')
 
@@ -0,0 +1,91 @@
+"""Incremental parsing of large JSON array responses.
+
+Marketplace reports arrive as one JSON array of up to 100k objects.
+:func:`iter_json_array` yields the elements while the body is still being
+downloaded (``resp.iter_content``), so the raw list never has to be held in
+memory and parsing overlaps the network transfer.  Only the standard
+``json`` decoder is used: each element is decoded with
+``JSONDecoder.raw_decode`` as soon as it is complete in the buffer.
+"""
+
+from __future__ import annotations
+
+import codecs
+import json
+from typing import Any, Iterable, Iterator
+
+CHUNK_SIZE = 64 * 1024
+_WS = " \t\r\n"
+
+
+def _skip_ws(buf: str, pos: int) -> int:
+    n = len(buf)
+    while pos < n and buf[pos] in _WS:
+        pos += 1
+    return pos
+
+
+def iter_json_array(chunks: Iterable[bytes | str], encoding: str = "utf-8") -> Iterator[Any]:
+    """Yield elements of the JSON array spread over ``chunks``.
+
+    Raises :class:`ValueError` if the document is not an array or ends
+    before the closing bracket.
+    """
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder(encoding)()
+    buf, pos = "", 0
+    state = "start"                 # start → first → (item ↔ sep) → done
+    chunks = iter(chunks)
+    final = False
+
+    while not final:
+        try:
+            chunk = next(chunks)
+        except StopIteration:
+            chunk, final = b"", True
+        part = text.decode(chunk, final) if isinstance(chunk, bytes) else chunk
+        buf, pos = buf[pos:] + part, 0
+
+        while True:
+            pos = _skip_ws(buf, pos)
+            if pos >= len(buf):
+                break
+            ch = buf[pos]
+            if state == "start":
+                if ch == "\ufeff":
+                    pos += 1
+                    continue
+                if ch != "[":
+                    raise ValueError("JSON array expected")
+                pos += 1
+                state = "first"
+            elif state == "sep":
+                if ch == ",":
+                    pos += 1
+                    state = "item"
+                elif ch == "]":
+                    state = "done"
+                    pos += 1
+                else:
+                    raise ValueError(f"unexpected {ch!r} in JSON array")
+            elif state == "done":
+                raise ValueError("extra data after JSON array")
+            else:
+                if state == "first" and ch == "]":
+                    state = "done"
+                    pos += 1
+                    continue
+                try:
+                    obj, end = decoder.raw_decode(buf, pos)
+                except json.JSONDecodeError:
+                    if final:
+                        raise ValueError("truncated JSON array") from None
+                    break           # элемент ещё не дочитан
+                if end == len(buf) and not final and not isinstance(obj, (dict, list)):
+                    break           # число/литерал может продолжиться в следующем куске
+                pos = end
+                state = "sep"
+                yield obj
+
+    if state != "done":
+        raise ValueError("truncated JSON array")
@@ -0,0 +1,246 @@
+"""Persistent dedup index of row keys for an append-only sheet.
+
+Importers that append to a growing sheet (``ФинотчетыWB``) used to read the
+whole sheet on every run only to rebuild the set of already loaded keys.
+:class:`SheetKeyIndex` keeps those keys on disk instead:
+
+* ``<name>.keys`` – 64-bit BLAKE2b digests of the key tuples.  The first
+  ``sorted`` entries are unique and sorted (binary search); newer entries
+  are appended unsorted and kept in a small in-memory set.
+* ``<name>.json`` – metadata: entry count, number of sheet data rows the
+  index covers, key digests of the last ``TAIL_ROWS`` covered rows, a
+  checksum of the file (sum of its digests mod 2**64), a checksum of the
+  sheet (sum of the key digests of every covered row, duplicates
+  included) and the number of runs since that checksum was last compared.
+
+On start :meth:`SheetKeyIndex.sync` compares the row count and the key
+columns of the last ``TAIL_ROWS`` covered rows with the index, so a run
+reads a bounded range however long the history is.  The whole key columns
+are read and compared with the sheet checksum only with ``verify=True`` or
+once every ``VERIFY_EVERY`` runs; until then an edit above the last
+``TAIL_ROWS`` rows goes unnoticed.  Rows appended outside the importer are
+caught up by reading only those rows; any other mismatch (rows deleted or
+edited, delete-and-append, unsaved workbook, damaged files) falls back to
+a full rebuild from the sheet.  :meth:`commit` appends the new digests and
+compacts the file once the unsorted tail grows.
+
+A 64-bit digest makes a false "already loaded" answer practically
+impossible for the sheet sizes involved (~1e-7 for a million keys).
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from collections import deque
+from pathlib import Path
+from typing import Any, Callable, Iterable, Sequence
+
+import numpy as np
+
+INDEX_VERSION = 3
+COMPACT_MIN_TAIL = 4096
+TAIL_ROWS = 256          # последние строки, сверяемые при каждом запуске
+VERIFY_EVERY = 20        # полная сверка ключевых колонок раз в столько запусков
+_MASK = (1 << 64) - 1
+
+
+def key_digest(key: Iterable[str]) -> int:
+    """64-bit digest of a key tuple of strings."""
+    raw = "\x1f".join(key).encode("utf-8")
+    return int.from_bytes(hashlib.blake2b(raw, digest_size=8).digest(), "little")
+
+
+def _checksum(arr: np.ndarray) -> int:
+    return int(arr.sum(dtype=np.uint64)) & _MASK if arr.size else 0
+
+
+class SheetKeyIndex:
+    """Key digests of the data rows of one sheet, persisted next to the cache."""
+
+    def __init__(self, path: Path, key_columns: Sequence[str],
+                 normalize: Callable[[Any], str] = str) -> None:
+        self.path = Path(path)
+        self.key_columns = list(key_columns)
+        self.normalize = normalize
+        self.header: list[Any] = []
+        self.rows = 0                     # строк данных на листе (без заголовка)
+        self._recent: deque[int] = deque(maxlen=TAIL_ROWS)   # дайджесты последних строк
+        self._unverified = 0              # запусков без полной сверки листа
+        self._head = np.empty(0, dtype=np.uint64)
+        self._extra: set[int] = set()     # ключи вне отсортированной части
+        self._file_tail = 0               # сколько из _extra уже лежит в файле
+        self._pending: list[int] = []
+        self._sum = 0
+        self._rows_sum = 0                # сумма дайджестов всех строк листа
+
+    # --- файлы -------------------------------------------------------------
+    @property
+    def keys_path(self) -> Path:
+        return self.path.with_suffix(".keys")
+
+    @property
+    def meta_path(self) -> Path:
+        return self.path.with_suffix(".json")
+
+    def __len__(self) -> int:
+        return len(self._head) + len(self._extra)
+
+    def _load(self) -> dict | None:
+        try:
+            meta = json.loads(self.meta_path.read_text(encoding="utf-8"))
+            if meta.get("version") != INDEX_VERSION or meta.get("columns") != self.key_columns:
+                return None
+            arr = np.fromfile(self.keys_path, dtype="<u8")
+        except (OSError, ValueError, KeyError):
+            return None
+        if arr.size != meta["count"] or _checksum(arr) != int(meta["sum"]):
+            return None
+        n = meta["sorted"]
+        self._head = arr[:n]
+        self._extra = set(arr[n:].tolist())
+        self._file_tail = arr.size - n
+        self._sum = int(meta["sum"])
+        self._rows_sum = int(meta["rows_sum"])
+        self.rows = meta["rows"]
+        self._recent = deque((int(d) for d in meta["recent"]), maxlen=TAIL_ROWS)
+        self._unverified = meta["unverified"]
+        return meta
+
+    def _write_meta(self) -> None:
+        meta = {"version": INDEX_VERSION, "columns": self.key_columns,
+                "count": len(self._head) + self._file_tail, "sorted": len(self._head),
+                "rows": self.rows, "recent": [str(d) for d in self._recent],
+                "sum": str(self._sum), "rows_sum": str(self._rows_sum),
+                "unverified": self._unverified}
+        tmp = self.meta_path.with_name(self.meta_path.name + ".tmp")
+        tmp.write_text(json.dumps(meta), encoding="utf-8")
+        os.replace(tmp, self.meta_path)
+
+    def _rewrite(self) -> None:
+        """Compact: store every key once, sorted."""
+        arr = np.union1d(self._head, np.fromiter(self._extra, dtype=np.uint64,
+                                                  count=len(self._extra)))
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.keys_path.with_name(self.keys_path.name + ".tmp")
+        arr.astype("<u8").tofile(tmp)
+        os.replace(tmp, self.keys_path)
+        self._head, self._extra, self._file_tail = arr, set(), 0
+        self._sum = _checksum(arr)
+        self._pending = []
+        self._write_meta()
+
+    # --- ключи -------------------------------------------------------------
+    def row_key(self, row: Sequence[Any], idx: dict[str, int]) -> tuple[str, ...]:
+        return tuple(self.normalize(row[idx[c]]) for c in self.key_columns)
+
+    def _contains(self, d: int) -> bool:
+        if d in self._extra:
+            return True
+        i = int(np.searchsorted(self._head, np.uint64(d)))
+        return i < len(self._head) and int(self._head[i]) == d
+
+    def __contains__(self, key: Iterable[str]) -> bool:
+        return self._contains(key_digest(key))
+
+    def add(self, key: Iterable[str]) -> bool:
+        """Register ``key`` of the next appended row; ``False`` if already known."""
+        return self._add(key_digest(key))
+
+    def _add(self, d: int) -> bool:
+        if self._contains(d):
+            return False
+        self._extra.add(d)
+        self._pending.append(d)
+        self._rows_sum = (self._rows_sum + d) & _MASK
+        self._recent.append(d)
+        return True
+
+    def reset(self) -> None:
+        """Forget all keys (the sheet was cleared)."""
+        self._head = np.empty(0, dtype=np.uint64)
+        self._extra, self._pending = set(), []
+        self._file_tail, self._sum, self._rows_sum = 0, 0, 0
+        self.rows, self._unverified = 0, 0
+        self._recent.clear()
+
+    # --- синхронизация с листом --------------------------------------------
+    def _read_rows(self, ws, first: int, last: int, ncols: int) -> list[list[Any]]:
+        if last < first:
+            return []
+        values = ws.range((first, 1), (last, ncols)).options(ndim=2).value
+        return values or []
+
+    def _key_digests(self, ws, idx: dict[str, int], first: int, last: int) -> list[int]:
+        """Key digests of sheet rows ``first..last``, reading only the key columns."""
+        if last < first:
+            return []
+        cols = [[r[0] for r in ws.range((first, idx[c] + 1), (last, idx[c] + 1)).options(ndim=2).value]
+                for c in self.key_columns]
+        return [key_digest(tuple(self.normalize(v) for v in values)) for values in zip(*cols)]
+
+    def sync(self, ws, verify: bool = False) -> str:
+        """Bring the index in line with ``ws``.
+
+        Returns ``"ok"``, ``"catch-up"`` (only rows added since the last
+        commit were read), ``"rebuild"`` (whole sheet read) or ``"empty"``.
+        ``verify`` compares the whole key columns with the sheet checksum
+        on this run instead of waiting for the periodic check.
+        """
+        header = ws.range("A1").expand("right").value
+        header = header if isinstance(header, list) else ([header] if header else [])
+        self.header = header
+        idx = {str(h).strip(): i for i, h in enumerate(header)}
+        last_row = ws.range("A" + str(ws.cells.rows.count)).end("up").row
+        if not header or any(c not in idx for c in self.key_columns):
+            self.reset()
+            return "empty"
+        data_rows = max(0, last_row - 1)
+        ncols = len(header)
+
+        meta = self._load()
+        if meta is not None and 0 < self.rows <= data_rows and self._recent:
+            last = self.rows + 1
+            matches = self._key_digests(ws, idx, last - len(self._recent) + 1, last) == list(self._recent)
+            full = verify or self._unverified + 1 >= VERIFY_EVERY
+            if matches and full:
+                matches = (sum(self._key_digests(ws, idx, 2, last)) & _MASK) == self._rows_sum
+            if matches:
+                self._unverified = 0 if full else self._unverified + 1
+                if self.rows == data_rows:
+                    self._write_meta()
+                    return "ok"
+                for row in self._read_rows(ws, self.rows + 2, last_row, ncols):
+                    d = key_digest(self.row_key(row, idx))
+                    if not self._add(d):
+                        self._rows_sum = (self._rows_sum + d) & _MASK   # дубль тоже лежит на листе
+                        self._recent.append(d)
+                self.commit(data_rows)
+                return "catch-up"
+
+        self.reset()
+        for row in self._read_rows(ws, 2, last_row, ncols):
+            d = key_digest(self.row_key(row, idx))
+            self._extra.add(d)
+            self._rows_sum = (self._rows_sum + d) & _MASK
+            self._recent.append(d)
+        self.rows = data_rows
+        self._rewrite()
+        return "rebuild"
+
+    def commit(self, rows: int) -> None:
+        """Persist keys added since the last commit; ``rows`` is the sheet's data row count."""
+        self.rows = rows
+        if len(self._extra) > max(COMPACT_MIN_TAIL, len(self._head) // 4):
+            self._rewrite()
+            return
+        if self._pending:
+            pending = np.array(self._pending, dtype="<u8")
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.keys_path, "ab") as f:
+                pending.tofile(f)
+            self._file_tail += len(pending)
+            self._sum = (self._sum + _checksum(pending)) & _MASK
+            self._pending = []
+        self._write_meta()
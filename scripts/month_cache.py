@@ -0,0 +1,74 @@
+"""On-disk cache of monthly API reports.
+
+Monthly marketplace reports (Ozon ``v2/finance/realization``) never change
+once the month is closed, yet importers re-requested every month of the
+period on every run.  :class:`MonthCache` stores the raw rows of one
+``(cabinet, year, month)`` in ``<folder>/<cabinet>/<YYYY-MM>.json.gz``
+together with a ``closed`` flag.  :meth:`MonthCache.get` returns cached
+rows only for closed months; open months are kept for reference and are
+refetched.  Files are written atomically (temp file + ``os.replace``).
+"""
+
+from __future__ import annotations
+
+import datetime as dt
+import gzip
+import json
+import os
+import re
+from pathlib import Path
+from typing import Any
+
+CACHE_VERSION = 1
+
+
+def month_closed(year: int, month: int, grace_days: int, today: dt.date | None = None) -> bool:
+    """``True`` once ``grace_days`` of the month after ``year-month`` have passed."""
+    today = today or dt.date.today()
+    nxt = dt.date(year + month // 12, month % 12 + 1, 1)
+    return today >= nxt + dt.timedelta(days=grace_days)
+
+
+def _safe(name: str) -> str:
+    return re.sub(r"[^\w.-]", "_", str(name).strip()) or "_"
+
+
+class MonthCache:
+    """Raw rows per ``(cabinet, year, month)`` with a closed-month flag."""
+
+    def __init__(self, folder: Path) -> None:
+        self.folder = Path(folder)
+        self.hits = 0
+        self.misses = 0
+
+    def path(self, cabinet: str, year: int, month: int) -> Path:
+        return self.folder / _safe(cabinet) / f"{int(year):04d}-{int(month):02d}.json.gz"
+
+    def load(self, cabinet: str, year: int, month: int) -> dict[str, Any] | None:
+        """Cached entry (``rows``, ``closed``, ``fetched_at`` …) or ``None``."""
+        try:
+            with gzip.open(self.path(cabinet, year, month), "rt", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError, EOFError):
+            return None
+        return entry if entry.get("version") == CACHE_VERSION else None
+
+    def get(self, cabinet: str, year: int, month: int) -> list[Any] | None:
+        """Rows of a closed month, or ``None`` if the month must be fetched."""
+        entry = self.load(cabinet, year, month)
+        if entry is not None and entry.get("closed"):
+            self.hits += 1
+            return entry["rows"]
+        self.misses += 1
+        return None
+
+    def put(self, cabinet: str, year: int, month: int, rows: list[Any], closed: bool) -> None:
+        path = self.path(cabinet, year, month)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        entry = {"version": CACHE_VERSION, "cabinet": str(cabinet), "year": int(year),
+                 "month": int(month), "closed": bool(closed),
+                 "fetched_at": dt.datetime.now().isoformat(timespec="seconds"), "rows": rows}
+        tmp = path.with_name(path.name + ".tmp")
+        with gzip.open(tmp, "wt", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp, path)
@@ -0,0 +1,196 @@
+"""Registry of ``НастройкиОрганизаций`` loaded once per run.
+
+Every stage used to parse the organizations sheet on its own: with its own
+header spelling, its own idea of an empty cell and, in COGS, once per
+product.  :func:`load` reads the sheet in one range read and
+:class:`OrgRegistry` indexes it by organization with typed fields:
+
+* ``logistics`` – ``'Белая'`` if ``Тип_Логистики`` mentions «бел», else ``'Карго'``;
+* ``tax_mode`` – ``РежимНалогооблNew`` (or the older column names), ``'ОСНО'`` by default;
+* ``vat_rate`` / ``usn_rate`` – percents, ``0.2`` and ``'20%'`` both give ``20.0``;
+* ``consolidation`` – ``True`` for «да», ``False`` for «нет», ``None`` if not set;
+* ``token_wb``, ``client_id``, ``token_ozon`` – trimmed strings, ``123.0`` → ``'123'``.
+
+Header names are matched ignoring case, spaces, ``_`` and ``-``, so
+``Client-Id`` and ``Client_ID`` are the same column.  The raw cells stay
+available in :attr:`OrgSettings.raw` and :meth:`OrgRegistry.frame` for
+stage-specific columns.
+"""
+
+from __future__ import annotations
+
+import math
+import re
+from dataclasses import dataclass, field
+from typing import Any, Iterator, Sequence
+
+import pandas as pd
+
+SHEET = 'НастройкиОрганизаций'
+
+WHITE, CARGO = 'Белая', 'Карго'
+DEFAULT_TAX_MODE = 'ОСНО'
+DEFAULT_ORG_TYPE = 'ООО'
+_YES_NO = {'да': True, 'нет': False}
+
+_ALIASES = {
+    'name': ('Организация',),
+    'org_type': ('Тип_Организации',),
+    'logistics': ('Тип_Логистики',),
+    'tax_mode': ('РежимНалогооблNew', 'Режим_налогообложения', 'РежимНалого'),
+    'vat_rate': ('Ставка НДС',),
+    'usn_rate': ('СтавкаНалогаУСН',),
+    'consolidation': ('Консолидация',),
+    'token_wb': ('Token_WB',),
+    'client_id': ('Client-Id',),
+    'token_ozon': ('Token_Ozon',),
+}
+
+
+def header_key(name: Any) -> str:
+    """``'Client-Id'``, ``' client_id '`` → ``'clientid'``."""
+    return re.sub(r'[\s_\-]+', '', str(name or '')).lower()
+
+
+def text(v: Any) -> str:
+    """Cell as trimmed text; blanks and NaN → ``''``, ``123.0`` → ``'123'``."""
+    if v is None or (isinstance(v, float) and math.isnan(v)):
+        return ''
+    if isinstance(v, float) and v.is_integer():
+        return str(int(v))
+    s = str(v).strip()
+    return s[:-2] if s.endswith('.0') and s[:-2].isdigit() else s
+
+
+def percent(v: Any) -> float:
+    """Rate in percents: ``0.2``, ``20`` and ``'20 %'`` give ``20.0``; garbage → 0."""
+    s = ''.join(c for c in text(v).replace(',', '.') if c.isdigit() or c in '-.')
+    try:
+        r = float(s) if s else 0.0
+    except ValueError:
+        return 0.0
+    return r * 100 if 0 < r < 1 else r
+
+
+@dataclass(frozen=True)
+class OrgSettings:
+    """One row of ``НастройкиОрганизаций``."""
+
+    name: str
+    row: int                                # строка листа (1 — шапка)
+    org_type: str = DEFAULT_ORG_TYPE
+    logistics: str = CARGO
+    tax_mode: str = DEFAULT_TAX_MODE
+    vat_rate: float = 0.0
+    usn_rate: float = 0.0
+    consolidation: bool | None = None
+    token_wb: str = ''
+    client_id: str = ''
+    token_ozon: str = ''
+    raw: dict[str, Any] = field(default_factory=dict, compare=False, repr=False)
+
+    @property
+    def has_ozon(self) -> bool:
+        return bool(self.client_id and self.token_ozon)
+
+    def get(self, column: str, default: Any = None) -> Any:
+        """Raw cell of ``column`` (matched like the typed fields)."""
+        return self.raw.get(header_key(column), default)
+
+
+class OrgRegistry:
+    """Organizations in sheet order, indexed by name (the first row of a name wins)."""
+
+    def __init__(self, orgs: Sequence[OrgSettings] = (), columns: Sequence[str] = ()) -> None:
+        self.orgs = list(orgs)
+        self.columns = list(columns)
+        self._by_name: dict[str, OrgSettings] = {}
+        for o in self.orgs:
+            self._by_name.setdefault(o.name, o)
+
+    # --- загрузка ----------------------------------------------------------
+    @classmethod
+    def from_rows(cls, header: Sequence[Any], rows: Sequence[Sequence[Any]]) -> "OrgRegistry":
+        keys = [header_key(h) for h in header]
+        col = {k: i for i, k in reversed(list(enumerate(keys))) if k}
+
+        def pick(values, fname):
+            for alias in _ALIASES[fname]:
+                i = col.get(header_key(alias))
+                if i is not None and i < len(values) and text(values[i]):
+                    return values[i]
+            return None
+
+        name_at = col.get(header_key('Организация'), 0)
+        orgs = []
+        for n, values in enumerate(rows, start=2):
+            values = list(values or [])
+            name = text(values[name_at]) if name_at < len(values) else ''
+            if not name:
+                continue
+            logistics = text(pick(values, 'logistics')).lower()
+            orgs.append(OrgSettings(
+                name=name,
+                row=n,
+                org_type=text(pick(values, 'org_type')) or DEFAULT_ORG_TYPE,
+                logistics=WHITE if 'бел' in logistics else CARGO,
+                tax_mode=text(pick(values, 'tax_mode')) or DEFAULT_TAX_MODE,
+                vat_rate=percent(pick(values, 'vat_rate')),
+                usn_rate=percent(pick(values, 'usn_rate')),
+                consolidation=_YES_NO.get(text(pick(values, 'consolidation')).lower()),
+                token_wb=text(pick(values, 'token_wb')),
+                client_id=text(pick(values, 'client_id')),
+                token_ozon=text(pick(values, 'token_ozon')),
+                raw={k: values[i] if i < len(values) else None for k, i in col.items()},
+            ))
+        return cls(orgs, [str(h).strip() for h in header if h is not None])
+
+    @classmethod
+    def from_values(cls, values: Sequence[Sequence[Any]] | None) -> "OrgRegistry":
+        """Registry of a 2-D sheet read (header row first)."""
+        if not values:
+            return cls()
+        return cls.from_rows(values[0], values[1:])
+
+    # --- доступ ------------------------------------------------------------
+    def __iter__(self) -> Iterator[OrgSettings]:
+        return iter(self.orgs)
+
+    def __len__(self) -> int:
+        return len(self.orgs)
+
+    def __contains__(self, name: Any) -> bool:
+        return text(name) in self._by_name
+
+    def __getitem__(self, name: Any) -> OrgSettings:
+        return self._by_name[text(name)]
+
+    def get(self, name: Any) -> OrgSettings | None:
+        return self._by_name.get(text(name))
+
+    def has_column(self, column: str) -> bool:
+        return header_key(column) in {header_key(c) for c in self.columns}
+
+    def logistics_modes(self) -> dict[str, str]:
+        """``{организация: 'Белая' | 'Карго'}``."""
+        return {name: o.logistics for name, o in self._by_name.items()}
+
+    def wb_tokens(self) -> list[tuple[str, str]]:
+        """``[(организация, Token_WB)]`` of rows with a WB token."""
+        return [(o.name, o.token_wb) for o in self.orgs if o.token_wb]
+
+    def ozon_cabinets(self) -> list[OrgSettings]:
+        """Rows with both ``Client-Id`` and ``Token_Ozon``."""
+        return [o for o in self.orgs if o.has_ozon]
+
+    def frame(self, columns: Sequence[str]) -> pd.DataFrame:
+        """Raw cells of ``columns`` indexed by ``Организация`` (first row of a name)."""
+        data = [[o.get(c) for c in columns] for o in self._by_name.values()]
+        return pd.DataFrame(data, columns=list(columns),
+                            index=pd.Index(list(self._by_name), name='Организация'))
+
+
+def load(wb) -> OrgRegistry:
+    """Read ``НастройкиОрганизаций`` of ``wb`` once."""
+    values = wb.sheets[SHEET].range('A1').expand().options(ndim=2).value
+    return OrgRegistry.from_values(values)
@@ -0,0 +1,218 @@
+"""Columnar Ozon unit-economics engine for ``РасчетЭкономикиОзон``.
+
+The plan is melted to one row per (organization, article, month) with a
+non-zero quantity, ``РасчётСебестоимости`` is joined to it once through a
+hash index on (``Организация``, ``Артикул_поставщика``) – the first cost
+row of a key wins, as the old per-cell filter did – and every fee line is
+an array expression over all rows.
+
+Unit prices and unit costs are taken exactly to 1e-6 ₽ as integers and
+settings rates as exact fractions (``Decimal('0.055')`` → ``11/200``).
+Every line is linear in the exact amounts – gross sales times one rate,
+or revenue less a cost – so it is computed exactly and rounded once, half
+away from zero, to a kopeck: the value the old ``Decimal`` loop produced,
+rounded.  Amounts that would not fit in ``int64`` are computed with Python
+integers instead.
+"""
+
+from __future__ import annotations
+
+from decimal import Decimal
+from fractions import Fraction
+from typing import Any, Mapping
+
+import numpy as np
+import pandas as pd
+
+from scripts.cogs_engine import to_number
+
+MONTH_COLS = [(f"Мес.{m:02d}", m) for m in range(1, 13)]
+
+KEYS = ["Организация", "Артикул_поставщика"]
+TAX_COLS = ("СебестоимостьНалог_руб", "Себестоимость_Налог, руб (новый)", "СебестоимостьНалог")
+
+TAX_COGS = "СебестоимостьПродажНалог, ₽"
+TAX_COGS_WO_VAT = "СебестоимостьПродажНалог_без_НДС, ₽"
+
+# строка настроек → колонка результата
+FEES = [
+    ("Баллы за скидки", "БаллыСкидки_руб"),
+    ("Программы партнеров", "ПрограммыПартнеров_руб"),
+    ("Вознаграждение Озон", "БазовоеВознаграждение_руб"),
+    ("Услуги доставки", "УслугиДоставки_руб"),
+    ("Услуги агентов", "УслугиАгентов_руб"),
+    ("Услуги FBO", "УслугиFBO_руб"),
+    ("Реклама", "Реклама_руб"),
+    ("Другие услуги", "ДругиеУслуги_руб"),
+]
+SERVICES = ["УслугиДоставки_руб", "УслугиАгентов_руб", "УслугиFBO_руб", "Реклама_руб", "ДругиеУслуги_руб"]
+
+# скидка баллами гасит не больше 99 % базового вознаграждения
+DISCOUNT_CAP = Fraction(99, 100)
+WITHOUT_VAT = Fraction(5, 6)        # сумма с НДС 20 % / 1,2
+
+HEADER = [
+    "Месяц", "Организация", "Артикул_поставщика", "SKU", "План_шт",
+    "ВыручкаБезСкидок_руб", "БаллыСкидки_руб", "ПрограммыПартнеров_руб", "Выручка_руб",
+    "БазовоеВознаграждение_руб", "ВознаграждениеПослСкидок_руб",
+    *SERVICES, "ИтогоРасходыМП_руб",
+    "СебестоимостьПродаж_руб", "СебестоимостьБезНДС_руб", TAX_COGS,
+    "ВаловаяПрибыль_Упр", "ВаловаяПрибыль_Налог", TAX_COGS_WO_VAT,
+]
+MONEY_COLUMNS = HEADER[5:]
+
+_INT64_SAFE = 2 ** 62
+
+MICRO = 10 ** 6                     # цены и себестоимость — в миллионных долях рубля
+MICRO_PER_KOPECK = MICRO // 100
+
+
+# --- точная целочисленная арифметика -----------------------------------------
+
+def micros(values: Any) -> np.ndarray:
+    """Roubles → millionths of a rouble, half away from zero (Python ints past ``int64``)."""
+    x = np.asarray(values, dtype=float) * MICRO
+    x = np.sign(x) * np.floor(np.abs(x) + 0.5)
+    if x.size and np.abs(x).max() >= _INT64_SAFE:
+        return np.array([int(v) for v in x], dtype=object)
+    return x.astype(np.int64)
+
+
+def fraction(rate: Any) -> Fraction:
+    """Exact value of a settings rate (floats by their text); blanks and garbage → 0."""
+    try:
+        d = rate if isinstance(rate, Decimal) else Decimal(str(rate))
+        return Fraction(d) if d.is_finite() else Fraction(0)
+    except (ArithmeticError, ValueError, TypeError):
+        return Fraction(0)
+
+
+def _mul(a: np.ndarray, b: Any) -> np.ndarray:
+    """Exact product; ``int64`` when it fits, Python ints otherwise."""
+    bound = np.abs(np.asarray(a, dtype=float)) * np.abs(np.asarray(b, dtype=float))
+    if not bound.size or (bound.max() < _INT64_SAFE and np.asarray(a).dtype != object):
+        return np.asarray(a, dtype=np.int64) * np.asarray(b, dtype=np.int64)
+    return np.asarray(a, dtype=object) * np.asarray(b, dtype=object)
+
+
+def _sub(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """``a − b`` of two :func:`_mul` results."""
+    if a.dtype == object or b.dtype == object:
+        return np.asarray(a, dtype=object) - np.asarray(b, dtype=object)
+    return a - b
+
+
+def _round_div(p: np.ndarray, q: int) -> np.ndarray:
+    """``p / q`` rounded half away from zero, ``q > 0``."""
+    if p.dtype != object and p.size and (q >= _INT64_SAFE or np.abs(p).max() >= _INT64_SAFE):
+        p = p.astype(object)
+    if p.dtype == object:
+        return np.array([(1 if v >= 0 else -1) * ((2 * abs(v) + q) // (2 * q)) for v in p],
+                        dtype=np.int64)
+    return np.sign(p) * ((2 * np.abs(p) + q) // (2 * q))
+
+
+def scale(amount: np.ndarray, rate: Fraction, den: int = 1) -> np.ndarray:
+    """``amount / den × rate`` rounded to a whole unit of ``amount / den``."""
+    return _round_div(_mul(amount, rate.numerator), den * rate.denominator)
+
+
+def _by_sign(amount: np.ndarray, pos: Fraction, neg: Fraction, den: int = 1) -> np.ndarray:
+    """:func:`scale` by ``pos`` for non-negative ``amount``, by ``neg`` for negative."""
+    out = scale(amount, pos, den)
+    if (amount < 0).any():
+        out = np.where(amount < 0, scale(amount, neg, den), out)
+    return out
+
+
+# --- расчёт ------------------------------------------------------------------
+
+def _plan_rows(plan_df: pd.DataFrame) -> tuple[pd.DataFrame, np.ndarray]:
+    """(plan row, month) pairs with a non-zero quantity, plan-row-major."""
+    months = [(c, m) for c, m in MONTH_COLS if c in plan_df.columns]
+    qty = np.column_stack([to_number(plan_df[c]) for c, _ in months]) if months \
+        else np.zeros((len(plan_df), 0))
+    row, col = np.nonzero(qty)
+    return pd.DataFrame({
+        "row": row,
+        "month": np.array([m for _, m in months], dtype=np.int64)[col],
+    }), qty[row, col]
+
+
+def cost_index(cost_df: pd.DataFrame) -> pd.DataFrame:
+    """Unit costs in :func:`micros` indexed by (organization, article), first row of a key."""
+    tax = next((c for c in TAX_COLS if c in cost_df.columns), None)
+    columns = {
+        "unit": "Себестоимость_руб",
+        "unit_wo_vat": "Себестоимость_без_НДС_руб",
+        "mgmt": "СебестоимостьУпр",
+        "tax": tax,
+    }
+    costs = cost_df.dropna(subset=KEYS).drop_duplicates(KEYS, keep="first")
+    return pd.DataFrame(
+        {k: micros(to_number(costs[c])) if c in costs.columns else np.zeros(len(costs), np.int64)
+         for k, c in columns.items()},
+        index=pd.MultiIndex.from_frame(costs[KEYS].astype(object)),
+    )
+
+
+def compute(plan_df: pd.DataFrame, cost_df: pd.DataFrame,
+            settings: Mapping[str, Any]) -> pd.DataFrame:
+    """``РасчетЭкономикиОзон`` rows, sorted by month, organization and article.
+
+    ``settings`` are the ``Настройки`` rates (fractions of gross sales);
+    missing rates are zero.
+    """
+    cells, qty = _plan_rows(plan_df)
+    plan = plan_df.iloc[cells["row"].to_numpy()]
+    q = np.asarray(qty, dtype=float)
+    whole = np.array_equal(q, np.trunc(q))
+    # количество — целые штуки; дробное считается точно с шагом 1e-6
+    q_num, q_den = (q.astype(np.int64), 1) if whole else (np.rint(q * 10 ** 6).astype(np.int64), 10 ** 6)
+
+    # точные суммы строки: цена (себестоимость) × количество, в копейках / den
+    den = q_den * MICRO_PER_KOPECK
+    sales = _mul(micros(to_number(plan["Плановая цена"])), q_num)
+    rate = {col: fraction(settings.get(key, 0)) for key, col in FEES}
+    line = {col: scale(sales, r, den) for col, r in rate.items()}
+
+    # вознаграждение после скидок: max(0, база − min(0,99·база, баллы)),
+    # при отрицательной выручке min и max меняются местами
+    comm, points = rate["БазовоеВознаграждение_руб"], rate["БаллыСкидки_руб"]
+    after = max(Fraction(0), comm - min(comm * DISCOUNT_CAP, points))
+    after_neg = min(Fraction(0), comm - max(comm * DISCOUNT_CAP, points))
+    services = sum(rate[c] for c in SERVICES)
+    line["ВознаграждениеПослСкидок_руб"] = _by_sign(sales, after, after_neg, den)
+    line["ИтогоРасходыМП_руб"] = _by_sign(sales, after + services, after_neg + services, den)
+    line["ВыручкаБезСкидок_руб"] = _round_div(sales, den)
+    revenue = 1 - rate["ПрограммыПартнеров_руб"] - points
+    line["Выручка_руб"] = scale(sales, revenue, den)
+
+    keys = pd.MultiIndex.from_frame(plan[KEYS].astype(object))
+    cost = cost_index(cost_df)
+    at = cost.index.get_indexer(keys)                   # −1 → нулевая себестоимость
+    cogs = {k: _mul(np.append(cost[k].to_numpy(), 0)[at], q_num) for k in cost.columns}
+    line["СебестоимостьПродаж_руб"] = _round_div(cogs["unit"], den)
+    line["СебестоимостьБезНДС_руб"] = _round_div(cogs["unit_wo_vat"], den)
+    line[TAX_COGS] = _round_div(cogs["tax"], den)
+    line[TAX_COGS_WO_VAT] = scale(cogs["tax"], WITHOUT_VAT, den)
+
+    def gross_profit(cogs: np.ndarray) -> np.ndarray:
+        # выручка − себестоимость точно, с одним округлением
+        exact = _sub(_mul(sales, revenue.numerator), _mul(cogs, revenue.denominator))
+        return _round_div(exact, den * revenue.denominator)
+
+    line["ВаловаяПрибыль_Упр"] = gross_profit(cogs["mgmt"])
+    line["ВаловаяПрибыль_Налог"] = gross_profit(cogs["tax"])
+
+    out = pd.DataFrame({
+        "Месяц": cells["month"].to_numpy(),
+        "Организация": plan["Организация"].to_numpy(dtype=object),
+        "Артикул_поставщика": plan["Артикул_поставщика"].to_numpy(dtype=object),
+        "SKU": plan["SKU"].to_numpy(dtype=object),
+        "План_шт": qty,
+        **{c: line[c] / 100 for c in MONEY_COLUMNS},
+    }, columns=HEADER)
+    return out.sort_values(["Месяц", "Организация", "Артикул_поставщика"], kind="stable") \
+              .reset_index(drop=True)
+
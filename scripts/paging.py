@@ -0,0 +1,58 @@
+"""Speculative prefetch for offset-paginated APIs.
+
+Offset pages are independent requests, so the next pages can be in flight
+while the current one is processed.  :func:`prefetch_pages` keeps up to
+``depth`` requests running and yields the pages strictly in offset order,
+so the rows come out exactly as with a sequential crawl.  It stops at the
+first page for which ``is_last`` is true (by default an empty page or a
+failed one returning ``None``); pages requested past the end are
+discarded – queued ones are cancelled, running ones are awaited so no
+request outlives the iterator.  Request pacing is left to the shared HTTP
+client, whose per-token budget decides how many of the prefetched requests
+actually hit the API at once.
+"""
+
+from __future__ import annotations
+
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Iterator
+
+PREFETCH_DEPTH = 4
+
+
+def _empty(page: Any) -> bool:
+    return not page
+
+
+def prefetch_pages(fetch: Callable[[int], Any], page_size: int, depth: int = PREFETCH_DEPTH,
+                   start: int = 0, is_last: Callable[[Any], bool] = _empty) -> Iterator[tuple[int, Any]]:
+    """Yield ``(offset, fetch(offset))`` for ``start``, ``start + page_size``, … in order.
+
+    The last yielded page is the one for which ``is_last`` returned true.
+    Exceptions raised by ``fetch`` are re-raised in offset order.
+    """
+    depth = max(1, depth)
+    pool = ThreadPoolExecutor(max_workers=depth, thread_name_prefix="prefetch")
+    inflight: deque[tuple[int, Future]] = deque()
+    next_offset = start
+
+    def submit() -> None:
+        nonlocal next_offset
+        inflight.append((next_offset, pool.submit(fetch, next_offset)))
+        next_offset += page_size
+
+    try:
+        for _ in range(depth):
+            submit()
+        while inflight:
+            offset, fut = inflight.popleft()
+            page = fut.result()
+            yield offset, page
+            if is_last(page):
+                return
+            submit()
+    finally:
+        for _, fut in inflight:
+            fut.cancel()
+        pool.shutdown(wait=True)        # уже отправленные запросы не переживают итератор
@@ -0,0 +1,203 @@
+"""Snapshot store of WB prices by size for incremental sheet updates.
+
+``Цены_WB`` used to be cleared and rewritten on every run although most
+prices do not change from one day to the next.  :class:`PriceStore` keeps
+the last loaded snapshot in SQLite (``cache/wb_prices_<книга>.sqlite``),
+keyed by ``(org, nmID, sizeID)``, together with the sheet row of every key.
+:func:`diff_prices` compares a fresh download with it and
+:func:`plan_rows` turns the delta into sheet writes:
+
+* changed rows are rewritten in place;
+* new rows take the rows freed by removed ones, then go to the end;
+* leftover holes are filled with rows moved up from the bottom, so the
+  sheet stays contiguous.  Row order is therefore not the API order –
+  consumers look prices up by key.
+
+Every change is stamped (``changed_at``); removed keys stay in the store
+with ``removed = 1``, so :meth:`PriceStore.changed_since` answers "what
+changed since the last plan" including removals.
+"""
+
+from __future__ import annotations
+
+import sqlite3
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Iterable, Sequence
+
+Key = tuple[str, str, str]
+
+# поля строки листа Цены_WB после ключа
+VALUE_FIELDS = ("vendor_code", "size_name", "price", "discounted_price", "club_price")
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS prices (
+    org TEXT NOT NULL, nm_id TEXT NOT NULL, size_id TEXT NOT NULL,
+    sheet_row INTEGER,
+    {", ".join(f"{f} {'TEXT' if f in ('vendor_code', 'size_name') else 'REAL'}" for f in VALUE_FIELDS)},
+    removed INTEGER NOT NULL DEFAULT 0,
+    first_seen TEXT NOT NULL, changed_at TEXT NOT NULL,
+    PRIMARY KEY (org, nm_id, size_id)
+);
+CREATE INDEX IF NOT EXISTS prices_changed ON prices (changed_at);
+"""
+
+
+def norm_key(org: Any, nm_id: Any, size_id: Any) -> Key:
+    """Key of a price row; ``123.0`` and ``'123'`` give the same key."""
+    def code(v: Any) -> str:
+        return str(v).strip().split(".")[0] if v is not None else ""
+    return (str(org or "").strip(), code(nm_id), code(size_id))
+
+
+def _same(a: Any, b: Any) -> bool:
+    if isinstance(a, (int, float)) and isinstance(b, (int, float)):
+        return abs(float(a) - float(b)) < 1e-9
+    return (a if a is not None else "") == (b if b is not None else "")
+
+
+@dataclass
+class PriceDelta:
+    """Difference between the stored snapshot and a fresh download."""
+
+    new: dict[Key, tuple] = field(default_factory=dict)
+    changed: dict[Key, tuple] = field(default_factory=dict)
+    removed: list[Key] = field(default_factory=list)
+    unchanged: int = 0
+
+    def __bool__(self) -> bool:
+        return bool(self.new or self.changed or self.removed)
+
+    def summary(self) -> str:
+        return (f"новых {len(self.new)}, изменено {len(self.changed)}, "
+                f"удалено {len(self.removed)}, без изменений {self.unchanged}")
+
+
+def diff_prices(old: dict[Key, tuple[int, tuple]], fresh: dict[Key, tuple]) -> PriceDelta:
+    """Compare ``{key: (row, values)}`` of the store with ``{key: values}``."""
+    delta = PriceDelta()
+    for key, values in fresh.items():
+        prev = old.get(key)
+        if prev is None:
+            delta.new[key] = values
+        elif all(_same(a, b) for a, b in zip(prev[1], values)):
+            delta.unchanged += 1
+        else:
+            delta.changed[key] = values
+    delta.removed = [k for k in old if k not in fresh]
+    return delta
+
+
+def plan_rows(old: dict[Key, tuple[int, tuple]], delta: PriceDelta,
+              first_row: int = 2) -> tuple[dict[int, Key], int, dict[Key, int]]:
+    """Sheet rows to (re)write for ``delta``.
+
+    Returns ``(writes, last_row, rows)``: ``{row: key}`` to write, the last
+    data row after the update (rows below it up to the old last row must be
+    cleared) and the new ``{key: row}`` of every active key.
+    """
+    rows = {k: r for k, (r, _) in old.items()}
+    old_last = max(rows.values(), default=first_row - 1)
+    writes = {rows[k]: k for k in delta.changed}
+
+    holes = sorted(rows.pop(k) for k in delta.removed)
+    new_keys = list(delta.new)
+    while new_keys and holes:
+        r, key = holes.pop(0), new_keys.pop(0)
+        rows[key], writes[r] = r, key
+    last = old_last
+    for key in new_keys:
+        last += 1
+        rows[key], writes[last] = last, key
+
+    # оставшиеся дыры закрываются строками снизу листа
+    by_row = {r: k for k, r in rows.items()}
+    free = set(holes)
+    for hole in holes:
+        while last in free:
+            free.discard(last)
+            last -= 1
+        if hole > last:
+            break
+        key = by_row.pop(last)
+        writes.pop(last, None)
+        rows[key], writes[hole] = hole, key
+        free.discard(hole)
+        last -= 1
+    last = max(rows.values(), default=first_row - 1)
+    return writes, last, rows
+
+
+def row_blocks(rows: Iterable[int]) -> list[tuple[int, int]]:
+    """Group row numbers into ``[(first, last), ...]`` runs of consecutive rows."""
+    out: list[tuple[int, int]] = []
+    for r in sorted(rows):
+        if out and r == out[-1][1] + 1:
+            out[-1] = (out[-1][0], r)
+        else:
+            out.append((r, r))
+    return out
+
+
+class PriceStore:
+    """SQLite-backed last snapshot of ``Цены_WB``."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(str(self.path))
+        self.db.executescript(_SCHEMA)
+
+    def __enter__(self) -> "PriceStore":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.db.close()
+
+    def snapshot(self) -> dict[Key, tuple[int, tuple]]:
+        """``{key: (sheet_row, values)}`` of the keys currently on the sheet."""
+        cur = self.db.execute(
+            f"SELECT org, nm_id, size_id, sheet_row, {', '.join(VALUE_FIELDS)} "
+            "FROM prices WHERE removed = 0")
+        return {tuple(r[:3]): (r[3], tuple(r[4:])) for r in cur}
+
+    def apply(self, delta: PriceDelta, rows: dict[Key, int], stamp: str | None = None) -> None:
+        """Store ``delta`` and the new sheet ``rows`` in one transaction."""
+        stamp = stamp or datetime.now().isoformat(timespec="seconds")
+        cols = ", ".join(VALUE_FIELDS)
+        marks = ", ".join("?" * len(VALUE_FIELDS))
+        with self.db:
+            self.db.executemany(
+                f"INSERT INTO prices (org, nm_id, size_id, sheet_row, {cols}, removed, first_seen, changed_at) "
+                f"VALUES (?, ?, ?, ?, {marks}, 0, ?, ?) "
+                f"ON CONFLICT (org, nm_id, size_id) DO UPDATE SET "
+                + ", ".join(f"{f} = excluded.{f}" for f in VALUE_FIELDS)
+                + ", sheet_row = excluded.sheet_row, removed = 0, changed_at = excluded.changed_at",
+                [(*k, rows[k], *v, stamp, stamp)
+                 for part in (delta.new, delta.changed) for k, v in part.items()])
+            self.db.executemany(
+                "UPDATE prices SET removed = 1, sheet_row = NULL, changed_at = ? "
+                "WHERE org = ? AND nm_id = ? AND size_id = ?",
+                [(stamp, *k) for k in delta.removed])
+            changed = set(delta.new) | set(delta.changed)
+            self.db.executemany(
+                "UPDATE prices SET sheet_row = ? WHERE org = ? AND nm_id = ? AND size_id = ?",
+                [(r, *k) for k, r in rows.items() if k not in changed])
+
+    def changed_since(self, since: str | datetime, org: str | None = None) -> list[dict[str, Any]]:
+        """Rows changed (added, repriced or removed) at or after ``since``."""
+        if isinstance(since, datetime):
+            since = since.isoformat(timespec="seconds")
+        sql = (f"SELECT org, nm_id, size_id, {', '.join(VALUE_FIELDS)}, removed, changed_at "
+               "FROM prices WHERE changed_at >= ?")
+        args: Sequence[Any] = (since,)
+        if org is not None:
+            sql += " AND org = ?"
+            args = (since, org)
+        cur = self.db.execute(sql + " ORDER BY changed_at, org, nm_id, size_id", args)
+        names = [d[0] for d in cur.description]
+        return [dict(zip(names, r)) for r in cur]
@@ -0,0 +1,82 @@
+"""Thread-safe token-bucket rate limiting.
+
+Marketplace quotas are per API token, so every token gets its own
+:class:`TokenBucket` from a :class:`RateLimiter`.  A ``429`` answer is fed
+back with :meth:`TokenBucket.penalize`, which blocks further requests on
+that token until ``Retry-After`` has passed without affecting other tokens.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from typing import Callable
+
+
+def parse_retry_after(value, default: float) -> float:
+    """Seconds from a ``Retry-After`` header value (only the numeric form)."""
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return default
+
+
+class TokenBucket:
+    """``rate`` requests per second with bursts of up to ``capacity``."""
+
+    def __init__(self, rate: float, capacity: float = 1.0,
+                 clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep) -> None:
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = self.capacity
+        self._stamp = clock()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        """Take one token; return how long the caller must wait for it."""
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.capacity, self._tokens + (now - self._stamp) * self.rate)
+            self._stamp = now
+            self._tokens -= 1.0
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            return max(wait, self._blocked_until - now)
+
+    def acquire(self) -> float:
+        """Block until a request is allowed; return seconds waited."""
+        wait = self._reserve()
+        if wait > 0:
+            self._sleep(wait)
+        return wait
+
+    def penalize(self, seconds: float) -> None:
+        """Hold the bucket for ``seconds`` (server asked to back off)."""
+        with self._lock:
+            now = self._clock()
+            self._blocked_until = max(self._blocked_until, now + seconds)
+            self._tokens = min(self._tokens, 0.0)
+            self._stamp = now
+
+
+class RateLimiter:
+    """Lazily created :class:`TokenBucket` per key (API token)."""
+
+    def __init__(self, rate: float, capacity: float = 1.0, **bucket_kw) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self._bucket_kw = bucket_kw
+        self._buckets: dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, key: str) -> TokenBucket:
+        with self._lock:
+            b = self._buckets.get(key)
+            if b is None:
+                b = self._buckets[key] = TokenBucket(self.rate, self.capacity, **self._bucket_kw)
+            return b
@@ -0,0 +1,133 @@
+"""Dated FX and logistics rates for COGS.
+
+``Настройки`` holds one ``Курс_USD``/``Курс_CNY`` and one per-kg logistics
+tariff, so every SKU is valued at today's rates.  The optional sheet
+``КурсыИТарифы`` lists the same parameters by effective date::
+
+    Дата        Курс_USD  Курс_CNY  Логистика_Карго_$/кг  Логистика_Белая_$/кг
+    01.01.2025  101,7     13,9      3,2                   4,1
+    15.03.2025  84,5                                     3,8
+
+A blank cell means the rate did not change on that date.
+:class:`RateTable` keeps the rates as ``(parameter, date, value)`` rows
+sorted by date, and :meth:`RateTable.lookup` resolves the rate in force
+on each date of a whole column with one as-of join.  Rows without a date,
+dates before the first entry and parameters the table does not list keep
+the ``Настройки`` values.
+"""
+
+from __future__ import annotations
+
+import hashlib
+from typing import Any, Mapping, Sequence
+
+import numpy as np
+import pandas as pd
+
+SHEET = 'КурсыИТарифы'
+
+# колонка листа → ключ параметров read_settings
+PARAMS = {
+    'Курс_USD': 'usdRate',
+    'Курс_CNY': 'cnyRate',
+    'Логистика_Карго_$/кг': 'cargoRatePerKg',
+    'Логистика_Белая_$/кг': 'whiteRatePerKg',
+}
+
+
+def to_date(v: Any) -> pd.Timestamp:
+    """Excel date, ``datetime`` or ``'дд.мм.гггг'`` → midnight ``Timestamp`` (``NaT`` if none)."""
+    if v is None or v == '' or (isinstance(v, float) and np.isnan(v)):
+        return pd.NaT
+    try:
+        ts = pd.to_datetime(v, dayfirst=True)
+    except (ValueError, TypeError, OverflowError):
+        return pd.NaT
+    return ts.tz_localize(None).normalize() if ts.tzinfo else ts.normalize()
+
+
+def dates(s: pd.Series) -> np.ndarray:
+    """:func:`to_date` over a column, parsed once per distinct value."""
+    codes, uniques = pd.factorize(s.astype(object), use_na_sentinel=True)
+    parsed = pd.DatetimeIndex([to_date(v) for v in uniques] + [pd.NaT]).to_numpy(dtype='datetime64[ns]')
+    return parsed[codes]
+
+
+def _number(v: Any) -> float:
+    if v is None or isinstance(v, bool):
+        return np.nan
+    try:
+        return float(str(v).replace(',', '.').replace(' ', '').replace('\xa0', ''))
+    except ValueError:
+        return np.nan
+
+
+class RateTable:
+    """Rates by parameter and effective date."""
+
+    def __init__(self, frame: pd.DataFrame | None = None) -> None:
+        if frame is None:
+            frame = pd.DataFrame({'key': pd.Series(dtype=object),
+                                  'date': pd.Series(dtype='datetime64[ns]'),
+                                  'value': pd.Series(dtype=float)})
+        frame = frame.dropna(subset=['date', 'value'])
+        # при двух значениях на одну дату действует последнее в листе
+        frame = frame.drop_duplicates(['key', 'date'], keep='last')
+        self.frame = frame.sort_values('date', kind='stable').reset_index(drop=True)
+
+    @classmethod
+    def from_values(cls, values: Sequence[Sequence[Any]] | None) -> "RateTable":
+        """Table of a wide sheet read: ``Дата`` and one column per parameter."""
+        if not values or len(values) < 2:
+            return cls()
+        header = [str(h or '').strip() for h in values[0]]
+        if 'Дата' not in header:
+            return cls()
+        at = header.index('Дата')
+        day = dates(pd.Series([r[at] if at < len(r) else None for r in values[1:]], dtype=object))
+        parts = []
+        for j, name in enumerate(header):
+            key = PARAMS.get(name)
+            if key is None:
+                continue
+            vals = [_number(r[j]) if j < len(r) else np.nan for r in values[1:]]
+            parts.append(pd.DataFrame({'key': key, 'date': day, 'value': vals}))
+        return cls(pd.concat(parts, ignore_index=True) if parts else None)
+
+    def __len__(self) -> int:
+        return len(self.frame)
+
+    def digest(self) -> str:
+        """Content hash, part of the COGS settings hash."""
+        raw = pd.util.hash_pandas_object(self.frame, index=False).to_numpy().tobytes()
+        return hashlib.sha1(raw).hexdigest()[:16]
+
+    def lookup(self, keys: Any, on: np.ndarray, defaults: Mapping[str, float]) -> np.ndarray:
+        """Rate of ``keys`` (one key or a column) in force on each date of ``on``.
+
+        Rates the table does not give (see the module docstring) are taken
+        from ``defaults``; an empty key is ``1.0`` (roubles).
+        """
+        n = len(on)
+        keys = np.full(n, keys, dtype=object) if isinstance(keys, str) else np.asarray(keys, dtype=object)
+        when = np.asarray(on, dtype='datetime64[ns]')
+        out = np.full(n, np.nan)
+        if len(self.frame):
+            left = pd.DataFrame({'key': keys, 'date': when, 'pos': np.arange(n)})
+            left = left[~np.isnat(when) & left['key'].isin(set(self.frame['key'])).to_numpy()]
+            left = left.sort_values('date', kind='stable')
+            if len(left):
+                hit = pd.merge_asof(left, self.frame, on='date', by='key', direction='backward')
+                out[hit['pos'].to_numpy()] = hit['value'].to_numpy(dtype=float)
+        missing = np.isnan(out)
+        if missing.any():
+            fill = {**{k: float(v) for k, v in defaults.items()}, '': 1.0}
+            out[missing] = [fill.get(k, np.nan) for k in keys[missing]]
+        return out
+
+
+def read_rates(wb) -> RateTable:
+    """``КурсыИТарифы`` of ``wb``; an empty table if there is no such sheet."""
+    if SHEET not in [s.name for s in wb.sheets]:
+        return RateTable()
+    return RateTable.from_values(wb.sheets[SHEET].range('A1').expand().options(ndim=2).value)
@@ -0,0 +1,158 @@
+"""srid-indexed store of WB orders and sales for the redemption rate.
+
+``%ВыкупаWB`` is the share of orders (by ``srid``) that ended in a sale,
+per nmId over the last ``DAYS`` days.  The statistics API pages by
+``lastChangeDate``, so :class:`RedemptionStore` keeps, per workbook
+(``cache/wb_redemption_<книга>.sqlite``):
+
+* every order and sale by ``(org, srid)`` – re-delivered records (an order
+  cancelled later) replace the stored one;
+* the last ``lastChangeDate`` per organization and feed – the next run
+  only asks for records changed after it;
+* per ``(org, nmId, order day)`` counters of counted orders and of those
+  with a sale.  They are adjusted by the difference every new or changed
+  record makes, so the rates over a rolling window are a ``SUM`` over at
+  most ``DAYS`` buckets per nmId instead of a join of all srids.
+"""
+
+from __future__ import annotations
+
+import sqlite3
+from pathlib import Path
+from typing import Any, Iterable
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS orders (
+    org TEXT NOT NULL, srid TEXT NOT NULL,
+    nm_id TEXT NOT NULL, day TEXT NOT NULL, cancelled INTEGER NOT NULL,
+    PRIMARY KEY (org, srid)
+);
+CREATE TABLE IF NOT EXISTS sales (
+    org TEXT NOT NULL, srid TEXT NOT NULL, day TEXT NOT NULL,
+    PRIMARY KEY (org, srid)
+);
+CREATE TABLE IF NOT EXISTS counters (
+    org TEXT NOT NULL, nm_id TEXT NOT NULL, day TEXT NOT NULL,
+    orders INTEGER NOT NULL, sales INTEGER NOT NULL,
+    PRIMARY KEY (org, nm_id, day)
+);
+CREATE TABLE IF NOT EXISTS watermarks (
+    org TEXT NOT NULL, feed TEXT NOT NULL, last_change TEXT NOT NULL,
+    PRIMARY KEY (org, feed)
+);
+"""
+
+
+def _code(v: Any) -> str:
+    return str(v).strip().split(".")[0] if v is not None else ""
+
+
+class RedemptionStore:
+    """SQLite-backed orders, sales and rolling per-day counters."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(str(self.path))
+        self.db.executescript(_SCHEMA)
+
+    def __enter__(self) -> "RedemptionStore":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.db.close()
+
+    # --- водяные знаки -----------------------------------------------------
+    def watermark(self, org: str, feed: str) -> str | None:
+        r = self.db.execute("SELECT last_change FROM watermarks WHERE org = ? AND feed = ?",
+                            (org, feed)).fetchone()
+        return r[0] if r else None
+
+    def _set_watermark(self, org: str, feed: str, records: list[dict[str, Any]]) -> None:
+        marks = [str(r["lastChangeDate"]) for r in records if r.get("lastChangeDate")]
+        old = self.watermark(org, feed)
+        new = max(marks + ([old] if old else []), default=None)
+        if new:
+            self.db.execute("INSERT OR REPLACE INTO watermarks VALUES (?, ?, ?)", (org, feed, new))
+
+    # --- счётчики ----------------------------------------------------------
+    def _bump(self, org: str, nm_id: str, day: str, orders: int, sales: int) -> None:
+        if not orders and not sales:
+            return
+        self.db.execute(
+            "INSERT INTO counters VALUES (?, ?, ?, ?, ?) ON CONFLICT (org, nm_id, day) DO UPDATE "
+            "SET orders = orders + excluded.orders, sales = sales + excluded.sales",
+            (org, nm_id, day, orders, sales))
+
+    def _sold(self, org: str, srid: str) -> bool:
+        return self.db.execute("SELECT 1 FROM sales WHERE org = ? AND srid = ?",
+                               (org, srid)).fetchone() is not None
+
+    # --- загрузка ----------------------------------------------------------
+    def add_orders(self, org: str, orders: Iterable[dict[str, Any]]) -> int:
+        """Upsert orders and their watermark; returns the number of new or changed orders."""
+        orders = list(orders)
+        changed = 0
+        with self.db:
+            for o in orders:
+                srid = str(o.get("srid") or "")
+                if not srid:
+                    continue
+                nm, day = _code(o.get("nmId")), str(o.get("date") or "")[:10]
+                cancelled = int(bool(o.get("isCancel", True)))
+                prev = self.db.execute(
+                    "SELECT nm_id, day, cancelled FROM orders WHERE org = ? AND srid = ?",
+                    (org, srid)).fetchone()
+                if prev == (nm, day, cancelled):
+                    continue
+                changed += 1
+                sold = int(self._sold(org, srid))
+                if prev is not None and not prev[2]:
+                    self._bump(org, prev[0], prev[1], -1, -sold)
+                if not cancelled:
+                    self._bump(org, nm, day, 1, sold)
+                self.db.execute("INSERT OR REPLACE INTO orders VALUES (?, ?, ?, ?, ?)",
+                                (org, srid, nm, day, cancelled))
+            self._set_watermark(org, "orders", orders)
+        return changed
+
+    def add_sales(self, org: str, sales: Iterable[dict[str, Any]]) -> int:
+        """Record sales (rows with a ``saleID``) and their watermark; returns new srids."""
+        sales = list(sales)
+        added = 0
+        with self.db:
+            for s in sales:
+                srid = str(s.get("srid") or "")
+                if not srid or not s.get("saleID"):
+                    continue
+                cur = self.db.execute("INSERT OR IGNORE INTO sales VALUES (?, ?, ?)",
+                                      (org, srid, str(s.get("date") or "")[:10]))
+                if not cur.rowcount:
+                    continue
+                added += 1
+                order = self.db.execute(
+                    "SELECT nm_id, day, cancelled FROM orders WHERE org = ? AND srid = ?",
+                    (org, srid)).fetchone()
+                if order is not None and not order[2]:
+                    self._bump(org, order[0], order[1], 0, 1)
+            self._set_watermark(org, "sales", sales)
+        return added
+
+    # --- результат ---------------------------------------------------------
+    def rates(self, org: str, since: str) -> list[tuple[str, int, int]]:
+        """``[(nmId, orders, sales)]`` of orders placed on or after ``since`` (``YYYY-MM-DD``)."""
+        return self.db.execute(
+            "SELECT nm_id, SUM(orders), SUM(sales) FROM counters WHERE org = ? AND day >= ? "
+            "GROUP BY nm_id HAVING SUM(orders) > 0 ORDER BY MIN(rowid)", (org, since)).fetchall()
+
+    def prune(self, before: str) -> None:
+        """Drop orders and counters of days before ``before`` and sales older than that."""
+        with self.db:
+            self.db.execute("DELETE FROM orders WHERE day < ?", (before,))
+            self.db.execute("DELETE FROM counters WHERE day < ?", (before,))
+            self.db.execute("DELETE FROM sales WHERE day < ? AND NOT EXISTS ("
+                            "SELECT 1 FROM orders o WHERE o.org = sales.org AND o.srid = sales.srid)",
+                            (before,))
@@ -0,0 +1,65 @@
+"""Keyed upsert of rows into a sheet using per-row content hashes.
+
+Importers that merge fresh API data into a sheet used to rebuild the whole
+sheet, so every run rewrote (and made Excel recalculate) all rows even when
+nothing had changed.  Here each row is reduced to a 64-bit hash of the
+columns the importer owns; :func:`plan_upsert` compares the hashes of the
+sheet rows with those of the fresh rows and returns only the rows that
+differ, plus the keys that are new.  Cell values are normalized before
+hashing, so ``900001`` read back from Excel as ``900001.0`` and ``None``
+vs ``''`` do not count as changes.
+"""
+
+from __future__ import annotations
+
+import hashlib
+from dataclasses import dataclass, field
+from typing import Any, Hashable, Sequence
+
+
+def norm_cell(v: Any) -> str:
+    if v is None:
+        return ""
+    if isinstance(v, float):
+        if v != v:                      # NaN из pandas
+            return ""
+        if v.is_integer():
+            return str(int(v))
+    return str(v).strip()
+
+
+def row_hash(values: Sequence[Any]) -> int:
+    """64-bit BLAKE2b digest of the normalized ``values``."""
+    raw = "\x1f".join(norm_cell(v) for v in values).encode("utf-8")
+    return int.from_bytes(hashlib.blake2b(raw, digest_size=8).digest(), "little")
+
+
+@dataclass
+class UpsertPlan:
+    """Rows to rewrite in place and rows to append."""
+
+    updates: dict[int, Hashable] = field(default_factory=dict)   # строка листа → ключ
+    appends: list[Hashable] = field(default_factory=list)
+    unchanged: int = 0
+
+    def __bool__(self) -> bool:
+        return bool(self.updates or self.appends)
+
+    def summary(self) -> str:
+        return (f"изменено {len(self.updates)}, новых {len(self.appends)}, "
+                f"без изменений {self.unchanged}")
+
+
+def plan_upsert(existing: dict[Hashable, tuple[int, int]],
+                fresh: dict[Hashable, Sequence[Any]]) -> UpsertPlan:
+    """Compare ``{key: (sheet_row, hash)}`` of the sheet with ``{key: owned_values}``."""
+    plan = UpsertPlan()
+    for key, values in fresh.items():
+        prev = existing.get(key)
+        if prev is None:
+            plan.appends.append(key)
+        elif prev[1] == row_hash(values):
+            plan.unchanged += 1
+        else:
+            plan.updates[prev[0]] = key
+    return plan
@@ -8,8 +8,10 @@ from fill_planned_indicators import (
     open_wb,             # открыть/подсоединиться к Excel-книге
     parse_money, parse_month,
     nds_rate,
-    read_rows
+    INPUT_SHEETS,
 )
+from scripts import org_settings
+from scripts.workbook_snapshot import load_snapshot
 
 def normalize(s):
     """Нормализация заголовков: убрать пробелы, привести к нижнему регистру, заменить _."""
@@ -32,7 +34,7 @@ if not EXCEL_PATH.exists():
 # Листы
 SHEET_WB   = "РасчётЭкономикиWB"
 SHEET_OZON = "РасчетЭкономикиОзон"
-SHEET_ORG  = "НастройкиОрганизаций"
+SHEET_ORG  = org_settings.SHEET
 SHEET_SAL  = "Зарплата"
 SHEET_OTH  = "ПрочиеРасходы"
 SHEET_RES  = "Сценарии"
@@ -40,32 +42,33 @@ SHEET_RES  = "Сценарии"
 LIMIT_GROSS_USN = 450_000_000
 
 def load_inputs(wb):
-    sheet_names = [s.name for s in wb.sheets]
+    snap = load_snapshot(wb, INPUT_SHEETS)
+    sheet_names = snap.sheet_names
     raw = []
     # Чтение WB и OZON
     if SHEET_WB in sheet_names:
-        rows, idx = read_rows(wb.sheets[SHEET_WB])
+        rows, idx = snap.read_rows(SHEET_WB)
         raw += [ [*idx.keys()] ] + rows
     if SHEET_OZON in sheet_names:
-        rows, idx = read_rows(wb.sheets[SHEET_OZON])
+        rows, idx = snap.read_rows(SHEET_OZON)
         raw += [ [*idx.keys()] ] + rows
 
     # Настройки организаций (с заголовком!)
     cfg_rows = []
     if SHEET_ORG in sheet_names:
-        rows, idx = read_rows(wb.sheets[SHEET_ORG])
+        rows, idx = snap.read_rows(SHEET_ORG)
         cfg_rows = [list(idx.keys())] + rows
 
     # Зарплата
     sal_rows = []
     if SHEET_SAL in sheet_names:
-        rows, idx = read_rows(wb.sheets[SHEET_SAL])
+        rows, idx = snap.read_rows(SHEET_SAL)
         sal_rows = [list(idx.keys())] + rows
 
     # Прочие расходы
     oth_rows = []
     if SHEET_OTH in sheet_names:
-        rows, idx = read_rows(wb.sheets[SHEET_OTH])
+        rows, idx = snap.read_rows(SHEET_OTH)
         oth_rows = [list(idx.keys())] + rows
 
     return raw, cfg_rows, sal_rows, oth_rows
@@ -99,19 +102,13 @@ def group_records(raw):
 def make_cfg_dict(cfg_rows):
     if not cfg_rows:
         return {}
-    header = [normalize(h) for h in cfg_rows[0]]
-    idx = {h: i for i, h in enumerate(header)}
-    cfg_dict = {}
-    for row in cfg_rows[1:]:
-        org = row[idx[normalize('организация')]]
-        cfg_dict[org] = {
-            'orig_mode': str(row[idx.get(normalize('режимналогооблnew'), '')]).strip() or 'ОСНО',
-            'consolidation': str(row[idx.get(normalize('консолидация'), '')]).strip().lower() == 'да',
-            'nds_rate': parse_money(str(row[idx.get(normalize('ставка ндс'), '')]).replace('%', '').replace(',', '.')) or 0,
-            'usn_rate': parse_money(str(row[idx.get(normalize('ставканалогаусн'), '')]).replace('%', '').replace(',', '.')) or 0,
-            'type': str(row[idx.get(normalize('тип_организации'), '')]).strip() or 'ООО'
-        }
-    return cfg_dict
+    return {o.name: {
+        'orig_mode': o.tax_mode,
+        'consolidation': o.consolidation is True,
+        'nds_rate': o.vat_rate,
+        'usn_rate': o.usn_rate,
+        'type': o.org_type,
+    } for o in org_settings.OrgRegistry.from_values(cfg_rows)}
 
 def make_salary_dict(sal_rows):
     if not sal_rows:
@@ -0,0 +1,125 @@
+"""Buffered log sink for an Excel log sheet.
+
+``log_step``-style helpers used to look up the last row with
+``end('up')`` and write one row per message, i.e. two COM calls for every
+log line.  :class:`SheetLogSink` finds the last row once, keeps the cursor
+in memory and writes buffered entries as one 2-D block when ``flush_rows``
+entries are pending, when ``flush_seconds`` have passed since the last
+flush, or on :meth:`close`.  Every entry is also mirrored to a rotating
+file in ``scripts/log`` so the full log survives even if Excel is closed
+before the final flush.
+
+COM objects belong to the thread that opened the workbook, so only the
+thread that created the sink writes to the sheet.  Other threads (download
+workers) may log freely: their entries are buffered and written by the
+owner thread on its next flush.
+"""
+
+from __future__ import annotations
+
+import atexit
+import datetime
+import logging
+import threading
+import time
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+
+LOG_DIR = Path(__file__).resolve().parent / "log"
+FLUSH_ROWS = 200
+FLUSH_SECONDS = 5.0
+MAX_FILE_BYTES = 5 * 1024 * 1024
+BACKUP_COUNT = 3
+
+
+def _file_logger(name: str, log_dir: Path, max_bytes: int, backup_count: int) -> logging.Logger:
+    logger = logging.getLogger(f"sheet_log.{name}")
+    logger.setLevel(logging.INFO)
+    logger.propagate = False            # не дублировать в корневой логгер
+    if not logger.handlers:
+        log_dir.mkdir(parents=True, exist_ok=True)
+        fh = RotatingFileHandler(log_dir / f"{name}.log", maxBytes=max_bytes,
+                                 backupCount=backup_count, encoding="utf-8")
+        fh.setFormatter(logging.Formatter("%(asctime)s %(levelname)s: %(message)s"))
+        logger.addHandler(fh)
+    return logger
+
+
+class SheetLogSink:
+    """Write ``[timestamp, level, message]`` rows to ``ws`` in blocks."""
+
+    def __init__(self, ws, name: str = "wb_log", log_dir: Path | None = None,
+                 flush_rows: int = FLUSH_ROWS, flush_seconds: float = FLUSH_SECONDS,
+                 echo: bool = True, max_bytes: int = MAX_FILE_BYTES,
+                 backup_count: int = BACKUP_COUNT) -> None:
+        self.ws = ws
+        self.flush_rows = max(1, flush_rows)
+        self.flush_seconds = flush_seconds
+        self.echo = echo
+        self.file = _file_logger(name, log_dir or LOG_DIR, max_bytes, backup_count)
+        self._buf: list[list] = []
+        self._row: int | None = None       # последняя занятая строка листа
+        self._last_flush = time.monotonic()
+        self._closed = False
+        self._owner = threading.get_ident()
+        self._lock = threading.Lock()
+        atexit.register(self.close)
+
+    @property
+    def pending(self) -> int:
+        return len(self._buf)
+
+    def _last_row(self) -> int:
+        if self._row is None:
+            ws = self.ws
+            self._row = ws.range("A" + str(ws.cells.rows.count)).end("up").row
+        return self._row
+
+    def write(self, level: str, msg: str) -> None:
+        if self.echo:
+            print(f"[{level}]", msg)
+        self.file.log(getattr(logging, level, logging.INFO), msg)
+        with self._lock:
+            self._buf.append([datetime.datetime.now(), level, msg])
+            pending = len(self._buf)
+        if threading.get_ident() != self._owner:
+            return
+        if (self._closed or pending >= self.flush_rows
+                or time.monotonic() - self._last_flush >= self.flush_seconds):
+            self.flush()
+
+    def info(self, msg: str) -> None:
+        self.write("INFO", msg)
+
+    def error(self, msg: str) -> None:
+        self.write("ERROR", msg)
+
+    def flush(self) -> None:
+        """Write pending entries; a no-op outside the owner thread."""
+        if threading.get_ident() != self._owner:
+            return
+        self._last_flush = time.monotonic()
+        with self._lock:
+            buf, self._buf = self._buf, []
+        if not buf:
+            return
+        start = self._last_row() + 1
+        try:
+            self.ws.range(f"A{start}").value = buf
+        except Exception as e:              # книга закрыта — файл-лог уже полный
+            self.file.error(f"Не удалось записать {len(buf)} строк лога в Excel: {e}")
+        else:
+            self._row = start + len(buf) - 1
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self.flush()
+        atexit.unregister(self.close)
+
+    def __enter__(self) -> "SheetLogSink":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
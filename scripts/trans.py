@@ -1,19 +1,58 @@
 # ozon_transactions_to_excel.py
+"""Export Ozon finance transactions of all cabinets to sheet «Транзакции».
+
+Cabinets are read from «НастройкиОрганизаций» (Организация, Client-Id,
+Token_Ozon), the period from «Настройки» (ПериодНачало, ПериодКонец) of
+the model workbook.  The sheet itself lives in a separate workbook,
+``scripts/Ozon_Transactions.xlsx`` (created if missing) or the path in
+``FINMODEL_OZON_TRANSACTIONS``, so a full-year export of every cabinet
+does not bloat ``Finmodel.xlsm``.  The
+period is cut into calendar-month windows, the longest the API accepts.
+Page 1 of a window tells ``page_count``; the other pages are then fetched
+concurrently while the next windows are already being requested.  Rows go
+to an append-only :class:`TransactionStore` and only operations not seen
+before are appended to the sheet, in blocks.  Windows that were fetched
+completely after they had closed are not requested again.
+"""
+
+import datetime as dt
 import os
-import xlwings as xw
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import openpyxl
+import pandas as pd
 import requests
+import xlwings as xw
+
+from scripts import org_settings
+from scripts.block_writer import BlockAppender
+from scripts.http_client import get_client
+from scripts.transaction_store import TransactionStore
+from scripts.workbook_backend import is_headless, open_headless
+from scripts.workbook_snapshot import book_tag, cache_dir
 
 # ==== НАСТРОЙКИ ====
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-EXCEL_PATH = os.path.join(BASE_DIR, 'Ozon_Transactions.xlsx')
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_DIR = os.path.dirname(SCRIPTS_DIR)
+EXCEL_PATH = os.path.join(BASE_DIR, 'Finmodel.xlsm')
+TARGET_PATH = os.path.join(SCRIPTS_DIR, 'Ozon_Transactions.xlsx')
+TARGET_ENV = 'FINMODEL_OZON_TRANSACTIONS'
 SHEET_NAME = 'Транзакции'
+SETTINGS_SHEET = 'Настройки'
+ORG_SHEET = org_settings.SHEET
 
-CLIENT_ID = '157232'
-API_KEY = '7e9139cb-7dc3-4174-a6a1-41f839080bb2'
 API_URL = "https://api-seller.ozon.ru/v3/finance/transaction/list"
+PAGE_SIZE = 1000
+MAX_WORKERS = 8            # одновременных запросов страниц (все кабинеты)
+WINDOW_LOOKAHEAD = 4       # окон, запрашиваемых впрок
+CLOSED_AFTER_DAYS = 15     # окно не перезапрашивается через столько дней после конца
+TIMEOUT = (10, 60)
 
 # ==== ЗАГОЛОВКИ (русские) ====
 HEADERS = [
+    "Организация",
     "ID операции",
     "Тип операции",
     "Дата операции",
@@ -29,92 +68,268 @@ HEADERS = [
     "Номер отправления",
     "ID склада"
 ]
+ID_COL = HEADERS.index("ID операции") + 1
 
-def fetch_transactions(from_date, to_date):
-    page = 1
-    page_size = 1000
-    all_ops = []
-    while True:
-        body = {
-            "filter": {
-                "date": {"from": from_date, "to": to_date},
-                "operation_type": [],
-                "posting_number": "",
-                "transaction_type": "all"
-            },
-            "page": page,
-            "page_size": page_size
-        }
-        resp = requests.post(
-            API_URL,
-            headers={
-                "Client-Id": CLIENT_ID,
-                "Api-Key": API_KEY,
-                "Content-Type": "application/json"
-            },
-            json=body
-        )
-        resp.raise_for_status()
-        data = resp.json()
-        ops = data.get("result", {}).get("operations", [])
-        all_ops.extend(ops)
-        print(f"Загружена страница {page}, операций: {len(ops)}")
-        if page >= data["result"]["page_count"] or not ops:
-            break
-        page += 1
-    return all_ops
-
-def prepare_rows(ops):
-    """Конвертируем данные в строки для Excel с русскими заголовками"""
-    rows = []
-    for op in ops:
-        rows.append([
-            op.get("operation_id"),
-            op.get("operation_type"),
-            op.get("operation_date"),
-            op.get("operation_type_name"),
-            op.get("delivery_charge"),
-            op.get("return_delivery_charge"),
-            op.get("accruals_for_sale"),
-            op.get("sale_commission"),
-            op.get("amount"),
-            op.get("type"),
-            op.get("posting", {}).get("delivery_schema"),
-            op.get("posting", {}).get("order_date"),
-            op.get("posting", {}).get("posting_number"),
-            op.get("posting", {}).get("warehouse_id")
-        ])
-    return rows
-
-def write_to_excel(rows):
-    # Если файла нет — создаём новый, если есть — обновляем лист
-    app = xw.App(visible=False)
-    if not os.path.exists(EXCEL_PATH):
-        wb = app.books.add()
-        wb.save(EXCEL_PATH)
-    else:
+
+def log(msg):
+    print(f"[{dt.datetime.now():%Y-%m-%d %H:%M:%S}] {msg}")
+
+
+def get_workbook():
+    try:
+        wb = xw.Book.caller()
+        app = None
+    except Exception:
+        app = xw.App(visible=False)
         wb = app.books.open(EXCEL_PATH)
-    # Удалить лист если уже был, чтобы не плодить копии
+        log(f"Открыт файл: {EXCEL_PATH}")
+    return wb, app
+
+
+def target_path():
+    """Workbook of «Транзакции»: ``FINMODEL_OZON_TRANSACTIONS`` or ``TARGET_PATH``."""
+    return Path(os.environ.get(TARGET_ENV) or TARGET_PATH).resolve()
+
+
+def open_target(wb):
+    """Transactions workbook, created if missing; returns ``(book, opened_here)``."""
+    path = target_path()
+    if is_headless(wb):
+        if not path.exists():
+            openpyxl.Workbook().save(path)
+        return open_headless(path, path), True
+    for book in wb.app.books:
+        if Path(book.fullname).resolve() == path:
+            return book, False
+    if path.exists():
+        return wb.app.books.open(str(path)), True
+    book = wb.app.books.add()
+    book.save(str(path))
+    log(f"Создан файл: {path}")
+    return book, True
+
+
+def read_cabinets(orgs):
+    """Cabinets with Client-Id and Token_Ozon of an :class:`OrgRegistry`."""
+    return [{'org': o.name, 'client_id': o.client_id, 'api_key': o.token_ozon}
+            for o in orgs.ozon_cabinets()]
+
+
+def read_period(ws, today=None):
+    """``(start, end)`` dates from ПериодНачало/ПериодКонец; the end defaults to today."""
+    params = {str(r[0]).strip(): r[1] for r in ws.range('A1').expand().value
+              if r and len(r) >= 2}
+    start = params.get('ПериодНачало')
+    if not start:
+        raise ValueError(f"Не задана дата ПериодНачало в листе '{SETTINGS_SHEET}'")
+    end = params.get('ПериодКонец') or today or dt.date.today()
+    return (pd.to_datetime(start, dayfirst=True).date(),
+            pd.to_datetime(end, dayfirst=True).date())
+
+
+def split_windows(start, end):
+    """Calendar months of ``start``–``end`` as ``[(first_day, last_day), ...]``, clipped."""
+    windows = []
+    cur = start
+    while cur <= end:
+        nxt = dt.date(cur.year + cur.month // 12, cur.month % 12 + 1, 1)
+        windows.append((cur, min(end, nxt - dt.timedelta(days=1))))
+        cur = nxt
+    return windows
+
+
+def window_closed(date_to, today=None):
+    today = today or dt.date.today()
+    return today > date_to + dt.timedelta(days=CLOSED_AFTER_DAYS)
+
+
+def fetch_page(cab, window, page):
+    """``result`` of one page of ``window``; raises on network and API errors."""
+    body = {
+        "filter": {
+            "date": {"from": f"{window[0]:%Y-%m-%d}T00:00:00.000Z",
+                     "to": f"{window[1]:%Y-%m-%d}T23:59:59.000Z"},
+            "operation_type": [],
+            "posting_number": "",
+            "transaction_type": "all"
+        },
+        "page": page,
+        "page_size": PAGE_SIZE
+    }
+    resp = get_client().post(
+        API_URL,
+        headers={"Client-Id": cab['client_id'], "Api-Key": cab['api_key'],
+                 "Content-Type": "application/json"},
+        json=body, timeout=TIMEOUT, budget_key=cab['client_id'])
+    resp.raise_for_status()
+    return resp.json().get("result", {})
+
+
+def _fetch_window(pool, cab, window):
+    """Page 1 of ``window`` plus futures of its other pages, queued right away."""
+    first = fetch_page(cab, window, 1)
+    count = int(first.get("page_count") or 1) if first.get("operations") else 1
+    return first, [pool.submit(fetch_page, cab, window, n) for n in range(2, count + 1)]
+
+
+def iter_pages(units, max_workers=MAX_WORKERS, lookahead=WINDOW_LOOKAHEAD):
+    """Yield ``(cabinet, window, operations)`` per page, in unit and page order.
+
+    ``operations`` is ``None`` for a page that failed.  Page 1 of up to
+    ``lookahead`` windows is in flight ahead of the window being consumed;
+    as soon as it arrives the remaining pages of that window are queued.
+    Pacing per Client-Id is left to the shared HTTP client.
+    """
+    pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ozon_transactions")
+    units = iter(units)
+    queued = deque()
+
+    def submit_next():
+        for cab, window in units:
+            queued.append((cab, window, pool.submit(_fetch_window, pool, cab, window)))
+            return
+
+    try:
+        for _ in range(max(1, lookahead)):
+            submit_next()
+        while queued:
+            cab, window, fut = queued.popleft()
+            submit_next()
+            try:
+                first, rest = fut.result()
+            except (requests.exceptions.RequestException, ValueError) as e:
+                log(f"Ошибка {cab['org']} {window[0]}—{window[1]}: {e}")
+                yield cab, window, None
+                continue
+            yield cab, window, first.get("operations", [])
+            for n, page in enumerate(rest, start=2):
+                try:
+                    res = page.result()
+                except (requests.exceptions.RequestException, ValueError) as e:
+                    log(f"Ошибка {cab['org']} {window[0]}—{window[1]}, стр. {n}: {e}")
+                    yield cab, window, None
+                    continue
+                yield cab, window, res.get("operations", [])
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def operation_row(org, op):
+    """Sheet row of one operation (columns of ``HEADERS``)."""
+    posting = op.get("posting") or {}
+    return [
+        org,
+        op.get("operation_id"),
+        op.get("operation_type"),
+        op.get("operation_date"),
+        op.get("operation_type_name"),
+        op.get("delivery_charge"),
+        op.get("return_delivery_charge"),
+        op.get("accruals_for_sale"),
+        op.get("sale_commission"),
+        op.get("amount"),
+        op.get("type"),
+        posting.get("delivery_schema"),
+        posting.get("order_date"),
+        posting.get("posting_number"),
+        posting.get("warehouse_id")
+    ]
+
+
+def prepare_rows(ops, org=''):
+    """Конвертируем данные в строки для Excel с русскими заголовками"""
+    return [operation_row(org, op) for op in ops]
+
+
+def store_path(wb):
+    return cache_dir() / f"ozon_transactions_{book_tag(wb)}.sqlite"
+
+
+def _op_key(v):
+    if isinstance(v, float) and v.is_integer():
+        v = int(v)
+    return None if v in (None, '') else str(v)
+
+
+def open_sheet(wb, store):
+    """Sheet «Транзакции» caught up with ``store``; returns ``(ws, appender)``.
+
+    The sheet is trusted if its header matches and its last row holds the
+    last operation recorded as written; otherwise it is rebuilt from the
+    store.  Stored rows not yet on the sheet are appended first.
+    """
     if SHEET_NAME in [s.name for s in wb.sheets]:
-        wb.sheets[SHEET_NAME].delete()
-    ws = wb.sheets.add(SHEET_NAME, before=wb.sheets[0])
-    ws.range("A1").value = [HEADERS] + rows
-    # Форматируем шапку
-    ws.range("A1:N1").api.Font.Bold = True
-    ws.autofit()
-    wb.save()
-    app.quit()
-    print(f"✅ Данные записаны в {EXCEL_PATH} (лист '{SHEET_NAME}')")
+        ws = wb.sheets[SHEET_NAME]
+    else:
+        ws = wb.sheets.add(SHEET_NAME)
+    n = store.sheet_rows
+    header = ws.range((1, 1), (1, len(HEADERS))).value
+    in_sync = (header == HEADERS
+               and ws.range(n + 2, ID_COL).value is None
+               and (n == 0 or _op_key(ws.range(n + 1, ID_COL).value) == store.operation_at(n - 1)))
+    if not in_sync:
+        log(f"Лист {SHEET_NAME} не совпадает с хранилищем — перезапись из хранилища")
+        ws.clear_contents()
+        ws.range('A1').value = HEADERS
+        ws.range((1, 1), (1, len(HEADERS))).api.Font.Bold = True
+        n = 0
+    appender = BlockAppender(ws, n + 2)
+    appender.extend(store.rows(n))
+    return ws, appender
+
 
 def main():
-    # Пример периода: 1 ноября 2021 — 2 ноября 2021
-    from_date = "2025-03-01T00:00:00.000Z"
-    to_date   = "2025-03-31T23:59:59.000Z"
-    print("Запрашиваем данные Ozon...")
-    ops = fetch_transactions(from_date, to_date)
-    print(f"Всего операций: {len(ops)}")
-    rows = prepare_rows(ops)
-    write_to_excel(rows)
+    log("Старт выгрузки транзакций Ozon")
+    wb, app = get_workbook()
+    target, opened = None, False
+    try:
+        cabinets = read_cabinets(org_settings.load(wb))
+        if not cabinets:
+            log(f"Нет организаций с Client-Id и Token_Ozon в листе {ORG_SHEET}")
+            return
+        start, end = read_period(wb.sheets[SETTINGS_SHEET])
+        windows = split_windows(start, end)
+        target, opened = open_target(wb)
+
+        with TransactionStore(store_path(target)) as store:
+            units = [(cab, w) for cab in cabinets for w in windows
+                     if not store.window_done(cab['client_id'], str(w[0]), str(w[1]))]
+            log(f"Кабинетов: {len(cabinets)}, окон: {len(windows)}, "
+                f"к загрузке: {len(units)}, уже в хранилище: {len(cabinets) * len(windows) - len(units)}")
+
+            ws, appender = open_sheet(target, store)
+            caught_up = appender.rows + appender.pending
+            fetched, failed = {}, set()
+            for cab, window, ops in iter_pages(units):
+                key = (cab['client_id'], window)
+                if ops is None:
+                    failed.add(key)
+                    continue
+                fetched[key] = fetched.get(key, 0) + len(ops)
+                appender.extend(store.append(
+                    cab['client_id'], ((op.get("operation_id"), operation_row(cab['org'], op)) for op in ops)))
+            appender.close()
+            store.sheet_rows = appender.last_row - 1
+
+            for cab, window in units:
+                key = (cab['client_id'], window)
+                if key not in failed:
+                    store.mark_window(cab['client_id'], str(window[0]), str(window[1]),
+                                      fetched.get(key, 0), window_closed(window[1]))
+            log(f"HTTP-статистика:\n{get_client().metrics.summary()}")
+            log(f"Операций получено: {sum(fetched.values())}, новых на листе: "
+                f"{appender.rows - caught_up}, ошибок окон: {len(failed)}, всего в хранилище: {len(store)}")
+            log(f"Запись {SHEET_NAME}: {appender.summary()}")
+
+        ws.range((1, 1), (1, len(HEADERS))).columns.autofit()
+        target.save()
+        log(f"Данные записаны в {target.fullname} (лист '{SHEET_NAME}')")
+    finally:
+        if target is not None and opened:
+            target.close()
+        if app:
+            app.quit()
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,109 @@
+"""Append-only store of Ozon finance transactions.
+
+Transactions are immutable once posted, so the ``Транзакции`` sheet only
+ever needs new rows.  :class:`TransactionStore` keeps every operation ever
+loaded for a workbook in SQLite (``cache/ozon_transactions_<книга>.sqlite``),
+keyed by ``(client_id, operation_id)``, in the order it was appended – the
+same order as on the sheet.  Next to the operations it records which
+``(client_id, date_from, date_to)`` windows were fetched completely and
+whether they were already closed, so a nightly run only re-requests the
+windows that can still change.
+"""
+
+from __future__ import annotations
+
+import json
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Iterable, Iterator, Sequence
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS operations (
+    seq INTEGER PRIMARY KEY,
+    client_id TEXT NOT NULL, operation_id TEXT NOT NULL,
+    row TEXT NOT NULL,
+    UNIQUE (client_id, operation_id)
+);
+CREATE TABLE IF NOT EXISTS windows (
+    client_id TEXT NOT NULL, date_from TEXT NOT NULL, date_to TEXT NOT NULL,
+    operations INTEGER NOT NULL, closed INTEGER NOT NULL, fetched_at TEXT NOT NULL,
+    PRIMARY KEY (client_id, date_from, date_to)
+);
+CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT);
+"""
+
+
+class TransactionStore:
+    """SQLite-backed append-only log of transaction rows."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(str(self.path))
+        self.db.executescript(_SCHEMA)
+
+    def __enter__(self) -> "TransactionStore":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.db.close()
+
+    def __len__(self) -> int:
+        return self.db.execute("SELECT COUNT(*) FROM operations").fetchone()[0]
+
+    # --- операции ----------------------------------------------------------
+    def append(self, client_id: str, rows: Iterable[tuple[Any, Sequence[Any]]]) -> list[Sequence[Any]]:
+        """Store ``(operation_id, row)`` pairs; returns the rows not seen before, in order."""
+        added = []
+        with self.db:
+            for op_id, row in rows:
+                cur = self.db.execute(
+                    "INSERT OR IGNORE INTO operations (client_id, operation_id, row) VALUES (?, ?, ?)",
+                    (str(client_id), str(op_id), json.dumps(list(row), ensure_ascii=False, default=str)))
+                if cur.rowcount:
+                    added.append(row)
+        return added
+
+    def rows(self, offset: int = 0) -> Iterator[list[Any]]:
+        """Stored rows in append order, skipping the first ``offset``."""
+        cur = self.db.execute("SELECT row FROM operations ORDER BY seq LIMIT -1 OFFSET ?", (offset,))
+        for (row,) in cur:
+            yield json.loads(row)
+
+    def operation_at(self, index: int) -> str | None:
+        """``operation_id`` of the ``index``-th stored row (0-based)."""
+        r = self.db.execute("SELECT operation_id FROM operations ORDER BY seq LIMIT 1 OFFSET ?",
+                            (index,)).fetchone()
+        return r[0] if r else None
+
+    # --- окна --------------------------------------------------------------
+    def window_done(self, client_id: str, date_from: str, date_to: str) -> bool:
+        """``True`` if the window was fetched completely after it had closed."""
+        r = self.db.execute(
+            "SELECT closed FROM windows WHERE client_id = ? AND date_from = ? AND date_to = ?",
+            (str(client_id), date_from, date_to)).fetchone()
+        return bool(r and r[0])
+
+    def mark_window(self, client_id: str, date_from: str, date_to: str,
+                    operations: int, closed: bool) -> None:
+        with self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO windows VALUES (?, ?, ?, ?, ?, ?)",
+                (str(client_id), date_from, date_to, operations, int(closed),
+                 datetime.now().isoformat(timespec="seconds")))
+
+    # --- состояние листа ---------------------------------------------------
+    @property
+    def sheet_rows(self) -> int:
+        """Operations already written to the sheet (in append order)."""
+        r = self.db.execute("SELECT value FROM meta WHERE name = 'sheet_rows'").fetchone()
+        return int(r[0]) if r else 0
+
+    @sheet_rows.setter
+    def sheet_rows(self, value: int) -> None:
+        with self.db:
+            self.db.execute("INSERT OR REPLACE INTO meta VALUES ('sheet_rows', ?)", (str(value),))
@@ -10,6 +10,8 @@ import math#
 import re
 import pandas as pd
 
+from scripts.workbook_backend import headless_requested, open_headless
+
 EXCEL_PATH = Path(__file__).resolve().parents[1] / 'Finmodel.xlsm'
 
 # Все названия листов вынесены в словарь
@@ -75,6 +77,10 @@ def to_num(val):
         return 0
 
 def get_workbook():
+    if headless_requested():
+        wb = open_headless(EXCEL_PATH)
+        print(f'→ Headless-режим (openpyxl): {EXCEL_PATH} → {wb.output_path}')
+        return wb, wb.app, False
     try:
         wb = xw.Book.caller()
         app = None
@@ -2,12 +2,13 @@
 
 from pathlib import Path
 import xlwings as xw
-import requests
+from scripts import org_settings
+from scripts.http_client import get_client
 from scripts.sheet_utils import apply_sheet_settings
 
 # ==== КОНСТАНТЫ ====
 EXCEL_PATH = Path(__file__).resolve().parents[1] / 'Finmodel.xlsm'
-SETTINGS_SHEET = 'НастройкиОрганизаций'
+SETTINGS_SHEET = org_settings.SHEET
 TARGET_SHEET = 'КомиссияWB'
 HEADERS = ['Parent Category', 'Subject Name', 'Commission, %']
 API_URL = 'https://common-api.wildberries.ru/api/v1/tariffs/commission?locale=ru'
@@ -23,9 +24,6 @@ def get_workbook():
         print(f'→ Запуск из консоли, открыт файл: {EXCEL_PATH}')
     return wb, app
 
-def get_idx(header_row):
-    return {h.strip(): i for i, h in enumerate(header_row)}
-
 def main():
     print("=== Старт обновления комиссии WB ===")
     wb, app = get_workbook()
@@ -34,21 +32,19 @@ def main():
         if SETTINGS_SHEET not in [s.name for s in wb.sheets]:
             raise Exception(f'❌ Лист "{SETTINGS_SHEET}" не найден!')
 
-        sht_set = wb.sheets[SETTINGS_SHEET]
-        cfgHdr = sht_set.range('A1').expand('right').value
-        idx = get_idx(cfgHdr)
-
-        if 'Token_WB' not in idx:
+        orgs = org_settings.load(wb)
+        if not orgs.has_column('Token_WB'):
             raise Exception('❌ Нет колонки Token_WB в шапке!')
 
-        token = sht_set.range(2, idx['Token_WB'] + 1).value
-        if not token or not isinstance(token, str):
-            raise Exception('❌ В первой строке нет Token_WB!')
+        tokens = orgs.wb_tokens()
+        if not tokens:
+            raise Exception('❌ В листе нет ни одного Token_WB!')
+        token = tokens[0][1]
 
         print('→ Токен найден, делаем запрос к WB API...')
 
         # --- Запрос к API ---
-        resp = requests.get(API_URL, headers={'Authorization': token.strip()})
+        resp = get_client().get(API_URL, headers={'Authorization': token.strip()})
         if resp.status_code != 200:
             raise Exception(f"❌ Ошибка запроса WB API: {resp.status_code} – {resp.text}")
 
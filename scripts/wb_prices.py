@@ -1,14 +1,23 @@
 from pathlib import Path
 import xlwings as xw
 import requests
-import time
 from datetime import datetime
 
+from scripts import org_settings
+from scripts.block_writer import BlockAppender
+from scripts.http_client import get_client
+from scripts.paging import prefetch_pages
+from scripts.price_store import PriceStore, diff_prices, norm_key, plan_rows, row_blocks
+from scripts.workbook_snapshot import book_tag, cache_dir
+
 # --- Константы ---
 WB_PRICE_URL = 'https://discounts-prices-api.wildberries.ru/api/v2/list/goods/filter'
 PAGE_LIMIT = 1000
-PRICES_PAGE_PAUSE_SEC = 0.4
 PRICES_MAX_RETRIES_FETCH = 3
+PREFETCH_PAGES = 4         # страниц offset в полёте на один токен (бюджет: 2.5 запр./с, пачка 5)
+SHEET_PRICES = 'Цены_WB'
+# доля переписываемых строк, выше которой лист пишется целиком одним блоком
+FULL_REWRITE_SHARE = 0.5
 
 HEADER_DICT = {
     'org': 'Организация',
@@ -28,53 +37,116 @@ def log(msg):
     now = datetime.now().strftime("[%Y-%m-%d %H:%M:%S]")
     print(f"{now} {msg}")
 
-def get_org_tokens(settings_sheet):
-    data = settings_sheet.range('A1').expand('table').value
-    if not data or len(data) < 2:
+def get_org_tokens(orgs):
+    """``[(организация, Token_WB)]`` of an :class:`OrgRegistry`."""
+    if not len(orgs):
         log("❌ Нет данных в листе настроек организаций!")
         return []
-    header = data[0]
-    idx = {str(h).strip(): i for i, h in enumerate(header)}
-    org_tokens = []
-    for row in data[1:]:
-        org = str(row[idx['Организация']]).strip() if row[idx['Организация']] else ''
-        token = str(row[idx['Token_WB']]).strip() if row[idx['Token_WB']] else ''
-        if org and token:
-            log(f"[DEBUG] Организация: {org} | TokenWB: {token[:6]}...")
-            org_tokens.append((org, token))
+    org_tokens = orgs.wb_tokens()
+    for org, token in org_tokens:
+        log(f"[DEBUG] Организация: {org} | TokenWB: {token[:6]}...")
     log(f"[LOG] Всего организаций: {len(org_tokens)}")
     return org_tokens
 
 def safe_fetch(url, headers):
-    for attempt in range(PRICES_MAX_RETRIES_FETCH):
-        try:
-            resp = requests.get(url, headers=headers, timeout=20)
-            if resp.status_code == 200:
-                return resp.json()
-            else:
-                log(f"⚠️ Неудачный статус {resp.status_code} при запросе: {url}")
-        except Exception as e:
-            log(f"⚠️ Ошибка запроса: {e}")
-        time.sleep(1.5)
+    """GET ``url`` via the shared client (retries, token rate budget); ``None`` on failure."""
+    try:
+        resp = get_client().get(url, headers=headers, timeout=(10, 20),
+                                retries=PRICES_MAX_RETRIES_FETCH,
+                                budget_key=headers.get("Authorization"))
+        if resp.status_code == 200:
+            return resp.json()
+        log(f"⚠️ Неудачный статус {resp.status_code} при запросе: {url}")
+    except (requests.exceptions.RequestException, ValueError) as e:
+        log(f"⚠️ Ошибка запроса: {e}")
     log(f"❌ Не удалось получить данные после {PRICES_MAX_RETRIES_FETCH} попыток: {url}")
-    return {'data': {'listGoods': []}}
+    return None
 
-def get_or_create_sheet_with_header(wb, name, header):
-    try:
-        sh = wb.sheets[name]
-        sh.clear()
-        sh.range((1, 1)).value = header
-        sh.range((1, 1), (1, len(header))).api.Font.Bold = True
-    except Exception:
-        sh = wb.sheets.add(name)
-        sh.range((1, 1)).value = header
-        sh.range((1, 1), (1, len(header))).api.Font.Bold = True
-    return sh
+def fetch_org_prices(org, token):
+    """Rows of ``Цены_WB`` for one organization; ``None`` if a page failed.
+
+    Up to ``PREFETCH_PAGES`` offset pages are requested ahead (the token's
+    rate budget in the HTTP client paces them); pages are consumed in
+    offset order, so the row order is that of a sequential crawl.
+    """
+    headers = {"Authorization": token}
+
+    def fetch(offset):
+        resp = safe_fetch(f"{WB_PRICE_URL}?limit={PAGE_LIMIT}&offset={offset}", headers)
+        return None if resp is None else resp.get('data', {}).get('listGoods', [])
+
+    rows = []
+    for offset, goods in prefetch_pages(fetch, PAGE_LIMIT, PREFETCH_PAGES):
+        if goods is None:
+            return None
+        if not goods:
+            log(f"  Конец данных offset={offset}")
+            break
+        n = len(rows)
+        for g in goods:
+            for s in g.get('sizes', []):
+                rows.append([
+                    org,
+                    str(g.get('nmID')),
+                    g.get('vendorCode'),
+                    s.get('sizeID'),
+                    s.get('techSizeName'),
+                    s.get('price'),
+                    s.get('discountedPrice'),
+                    s.get('clubDiscountedPrice')
+                ])
+        log(f"  Получено строк: {len(rows) - n}, offset={offset}")
+    return rows
+
+def price_key(row):
+    return norm_key(row[0], row[1], row[3])
+
+def price_values(row):
+    """Compared fields of a sheet row (everything except the key)."""
+    return (row[2], row[4], row[5], row[6], row[7])
+
+def stored_row(key, values):
+    """Sheet row rebuilt from a store entry (inverse of :func:`price_key`/:func:`price_values`)."""
+    org, nm_id, size_id = key
+    vendor, size_name, price, discounted, club = values
+    size_id = int(size_id) if size_id.isdigit() else size_id
+    return [org, nm_id, vendor, size_id, size_name, price, discounted, club]
+
+def prices_store_path(wb):
+    """Snapshot store of ``Цены_WB`` for workbook ``wb`` (in the cache dir)."""
+    return cache_dir() / f"wb_prices_{book_tag(wb)}.sqlite"
+
+def prices_changed_since(wb, since, org=None):
+    """Price rows of ``wb`` added, changed or removed since ``since`` (for planning)."""
+    with PriceStore(prices_store_path(wb)) as store:
+        return store.changed_since(since, org)
+
+def sheet_matches_store(sheet, snapshot):
+    """``True`` if ``sheet`` holds exactly the keys of ``snapshot`` at their rows."""
+    if not snapshot:
+        return False
+    header = sheet.range((1, 1), (1, len(HEADERS_RU))).value
+    if list(header or []) != HEADERS_RU:
+        return False
+    last_row = sheet.range('A' + str(sheet.cells.rows.count)).end('up').row
+    if last_row != max(r for r, _ in snapshot.values()):
+        return False
+    keys = sheet.range((2, 1), (last_row, 4)).options(ndim=2).value or []
+    expected = {r: k for k, (r, _) in snapshot.items()}
+    return len(keys) == len(expected) and all(
+        expected.get(i) == norm_key(row[0], row[1], row[3])
+        for i, row in enumerate(keys, start=2))
 
 def autofit_columns(sheet, cols_count):
     sheet.range((1, 1), (1, cols_count)).columns.autofit()
 
-def load_wb_prices_by_size_xlwings(wb=None):
+def load_wb_prices_by_size_xlwings(wb=None, full=False):
+    """Sync ``Цены_WB`` with the API.
+
+    Only new, changed and removed rows are written (see
+    :mod:`scripts.price_store`); ``full=True`` or a sheet that no longer
+    matches the stored snapshot rewrites the whole sheet.
+    """
     created = False
     if wb is None:
         try:
@@ -85,65 +157,84 @@ def load_wb_prices_by_size_xlwings(wb=None):
             created = True
             log(f'Открыли файл: {EXCEL_PATH}')
     try:
-        settings = wb.sheets['НастройкиОрганизаций']
+        orgs = org_settings.load(wb)
     except Exception:
         log("❌ Нет листа 'НастройкиОрганизаций'!")
         if created:
             wb.close()
         return
-    org_tokens = get_org_tokens(settings)
+    org_tokens = get_org_tokens(orgs)
     if not org_tokens:
         log("❌ Нет организаций с токенами в настройках!")
         if created:
             wb.close()
         return
-    output_sh = get_or_create_sheet_with_header(wb, 'Цены_WB', HEADERS_RU)
+
+    fresh = {}
+    failed = set()
+    for org, token in org_tokens:
+        log(f'→ Организация: {org}')
+        rows = fetch_org_prices(org, token)
+        if rows is None:
+            log(f"  ⚠️ {org}: загрузка прервана, прежние цены сохранены")
+            failed.add(str(org).strip())
+            continue
+        for row in rows:
+            fresh[price_key(row)] = row
+        log(f"  Всего выгружено строк для {org}: {len(rows)}")
+
+    with PriceStore(prices_store_path(wb)) as store:
+        snapshot = store.snapshot()
+        sheet_exists = SHEET_PRICES in [s.name for s in wb.sheets]
+        output_sh = wb.sheets[SHEET_PRICES] if sheet_exists else wb.sheets.add(SHEET_PRICES)
+        incremental = not full and sheet_exists and sheet_matches_store(output_sh, snapshot)
+        if not incremental and snapshot:
+            log("→ Лист Цены_WB не совпадает со снимком — полная перезапись")
+
+        # у организаций с ошибкой загрузки остаются прежние строки
+        if failed:
+            if not incremental:
+                log("❌ Полная перезапись невозможна без цен всех организаций — лист не изменён")
+                if created:
+                    wb.close()
+                return
+            for key, (_, values) in snapshot.items():
+                if key[0] in failed:
+                    fresh[key] = stored_row(key, values)
+
+        delta = diff_prices(snapshot, {k: price_values(r) for k, r in fresh.items()})
+        log(f"→ Изменения цен: {delta.summary()}")
+        if incremental:
+            writes, last_row, rows = plan_rows(snapshot, delta)
+            if len(writes) > FULL_REWRITE_SHARE * max(1, len(fresh)):
+                incremental = False
+
+        if incremental:
+            old_last = max(r for r, _ in snapshot.values())
+            blocks = row_blocks(writes)
+            for first, last in blocks:
+                output_sh.range((first, 1)).value = [fresh[writes[r]] for r in range(first, last + 1)]
+            if last_row < old_last:
+                output_sh.range((last_row + 1, 1), (old_last, len(HEADERS_RU))).clear_contents()
+            log(f"→ Записано строк: {len(writes)} ({len(blocks)} блок(ов)), "
+                f"очищено: {max(0, old_last - last_row)}")
+        else:
+            output_sh.clear()
+            output_sh.range((1, 1)).value = HEADERS_RU
+            output_sh.range((1, 1), (1, len(HEADERS_RU))).api.Font.Bold = True
+            with BlockAppender(output_sh, 2) as appender:
+                appender.extend(fresh.values())
+            rows = {k: i for i, k in enumerate(fresh, start=2)}
+            log(f"→ Лист записан целиком: {appender.summary()}")
+        store.apply(delta, rows)
+    any_data = bool(fresh)
+
     try:
         output_sh.api.Tab.Color = 142661105
         log("→ Цвет ярлыка #84F8EA установлен")
     except Exception as e:
         log(f"⚠️ Не удалось установить цвет ярлыка: {e}")
 
-    row_idx = 2
-    any_data = False
-    for org, token in org_tokens:
-        offset = 0
-        headers = {"Authorization": token}
-        log(f'→ Организация: {org}')
-        total_rows = 0
-        while True:
-            url = f"{WB_PRICE_URL}?limit={PAGE_LIMIT}&offset={offset}"
-            resp = safe_fetch(url, headers)
-            goods = resp.get('data', {}).get('listGoods', [])
-            if not goods:
-                log(f"  Конец данных offset={offset}")
-                break
-            rows = []
-            for g in goods:
-                for s in g.get('sizes', []):
-                    row = [
-                        org,
-                        str(g.get('nmID')),
-                        g.get('vendorCode'),
-                        s.get('sizeID'),
-                        s.get('techSizeName'),
-                        s.get('price'),
-                        s.get('discountedPrice'),
-                        s.get('clubDiscountedPrice')
-                    ]
-                    rows.append(row)
-            if rows:
-                output_sh.range((row_idx, 1)).value = rows
-                row_idx += len(rows)
-                total_rows += len(rows)
-                any_data = True
-                log(f"  Получено строк: {len(rows)}, offset={offset}")
-            else:
-                log(f"  Нет новых строк offset={offset}")
-            offset += PAGE_LIMIT
-            time.sleep(PRICES_PAGE_PAUSE_SEC)
-        log(f"  Всего выгружено строк для {org}: {total_rows}")
-
     autofit_columns(output_sh, len(HEADERS_RU))
 
     # --- Удалить предыдущую умную таблицу, если есть ---
@@ -2,32 +2,52 @@ from pathlib import Path
 import xlwings as xw
 import requests
 import datetime
-import time
 from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 
+from scripts import org_settings
+from scripts.block_writer import BlockAppender
+from scripts.import_journal import ImportJournal
+from scripts.json_stream import CHUNK_SIZE, iter_json_array
+from scripts.key_index import SheetKeyIndex
+from scripts.http_client import get_client
+from scripts.sheet_log import SheetLogSink
+from scripts.workbook_snapshot import book_tag, cache_dir
+
 SHEET_SETTINGS  = "Настройки"
-SHEET_ORGS      = "НастройкиОрганизаций"
+SHEET_ORGS      = org_settings.SHEET
 SHEET_FACTS     = "ФинотчетыWB"
 SHEET_LOG       = "WB_Log"
+TABLE_FACTS     = "WbFactsTable"
 
 WB_API_URL_STAT = "https://statistics-api.wildberries.ru/api/v5/supplier/reportDetailByPeriod"
 BATCH_SIZE_WB   = 100000
+WB_RATE_PER_SEC = 1.0      # запросов в секунду на один токен (квоты токенов независимы)
+WB_MAX_WORKERS  = 12       # организаций, загружаемых одновременно
+MAX_ATTEMPTS    = 5
 
 EXCEL_FILE_PATH = Path(__file__).resolve().parents[1] / "Finmodel.xlsm"
 
+FACTS_HEADER = [
+    'Организация', 'Дата', 'Предмет', 'Артикул_продавца', 'Артикул_WB', 'Название', 'Номер_отчёта',
+    'Продано_шт', 'Возврат_шт', 'Продано_руб', 'Возвраты_руб', 'Выручка', 'К_перечислению_за_товар', 'Комиссия',
+    'Стоимость_логистики', 'Стоимость_хранения', 'Стоимость_платной_приемки', 'Общая_сумма_штрафов',
+    'Прочие_удержания_выплаты', 'Доплаты', 'Итого_к_оплате', 'Итого_продано'
+]
+
+# ключ дедупликации строк ФинотчетыWB
+FACTS_KEY = ['Организация', 'Номер_отчёта', 'Артикул_WB', 'Артикул_продавца']
+
 def get_idx(header):
     return {str(h).strip(): i for i, h in enumerate(header)}
 
 def log_step(ws_log, msg):
-    print("[INFO]", msg)
-    last_row = ws_log.range('A' + str(ws_log.cells.rows.count)).end('up').row
-    ws_log.range(f'A{last_row + 1}').value = [datetime.datetime.now(), "INFO", msg]
+    """Log ``msg`` to ``ws_log`` (a :class:`SheetLogSink` over WB_Log)."""
+    ws_log.info(msg)
 
 def log_error(ws_log, msg):
-    print("[ERROR]", msg)
-    last_row = ws_log.range('A' + str(ws_log.cells.rows.count)).end('up').row
-    ws_log.range(f'A{last_row + 1}').value = [datetime.datetime.now(), "ERROR", msg]
+    ws_log.error(msg)
 
 def get_or_create_sheet(wb, sheet_name, ws_log=None):
     if sheet_name in [s.name for s in wb.sheets]:
@@ -38,7 +58,17 @@ def get_or_create_sheet(wb, sheet_name, ws_log=None):
             log_step(ws_log, f"Создан новый лист: {sheet_name}")
     return ws
 
-def fetch_wb_report_stat(token, date_from, date_to, rrdid, ws_log=None, org=""):
+def stream_wb_report_stat(token, date_from, date_to, rrdid, acc, ws_log=None, org=""):
+    """Fetch one page of the detailed report straight into ``acc``.
+
+    The response body is parsed while it downloads and every row goes into
+    the :class:`WbReportAccumulator` ``acc``, so the raw page is never held
+    in memory.  Requests go through the shared HTTP client with the token's
+    rate budget.  Returns ``(rows, last_rrd)``: the number of rows read, or
+    ``None`` if the API still answers ``429`` after the client's retries.  On errors
+    ``acc.error`` is set and ``acc`` may hold a partial page that must be
+    discarded.
+    """
     rr_part = f"&rrdid={int(float(rrdid))}" if rrdid is not None else ""
     url = f"{WB_API_URL_STAT}?dateFrom={date_from}&dateTo={date_to}&limit={BATCH_SIZE_WB}{rr_part}"
 
@@ -48,34 +78,54 @@ def fetch_wb_report_stat(token, date_from, date_to, rrdid, ws_log=None, org=""):
 
     headers = {"Authorization": token}
     try:
-        resp = requests.get(url, headers=headers, timeout=90)
-        print(f"← [WB API] {org} | status={resp.status_code} | bytes={len(resp.content)}")
-        if resp.status_code == 429:
-            log_error(ws_log, f"[WB API] {org} | Статус 429 Too Many Requests. Ожидание 60 секунд...")
-            time.sleep(60)
-            return [], rrdid
-        if resp.status_code != 200:
-            log_error(ws_log, f"[WB API] {org} | Код ответа: {resp.status_code}. Пропуск итерации.")
-            return [], rrdid
-        data = resp.json()
-        if not isinstance(data, list):
-            log_error(ws_log, f"[WB API] {org} | Ответ не является списком!")
-            return [], rrdid
-        last_rrd = data[-1]['rrd_id'] if data else rrdid
-        return data, last_rrd
+        with get_client().get(url, headers=headers, timeout=(10, 90), stream=True,
+                              budget_key=token) as resp:
+            print(f"← [WB API] {org} | status={resp.status_code}")
+            if resp.status_code == 429:
+                # паузы по Retry-After уже выдержал клиент; повтор — через его же бюджет
+                log_error(ws_log, f"[WB API] {org} | Статус 429 Too Many Requests после повторов клиента.")
+                return None, rrdid
+            if resp.status_code != 200:
+                log_error(ws_log, f"[WB API] {org} | Код ответа: {resp.status_code}. Пропуск итерации.")
+                acc.error = f"HTTP {resp.status_code}"
+                return 0, rrdid
+            for r in iter_json_array(resp.iter_content(CHUNK_SIZE)):
+                acc.add(r)
+        last_rrd = acc.last_rrd if acc.last_rrd is not None else rrdid
+        return acc.rows, last_rrd
     except requests.exceptions.Timeout:
         log_error(ws_log, f"[WB API] {org} | Таймаут запроса! Пропуск итерации.")
-        return [], rrdid
+        acc.error = "timeout"
+        return 0, rrdid
+    except ValueError as e:
+        log_error(ws_log, f"[WB API] {org} | Ответ не является списком! ({e})")
+        acc.error = str(e)
+        return 0, rrdid
     except Exception as e:
         log_error(ws_log, f"[WB API] {org} | Ошибка: {type(e).__name__}: {e}")
-        return [], rrdid
+        acc.error = f"{type(e).__name__}: {e}"
+        return 0, rrdid
 
-def aggregate_wb_rows(rows, org, doc_types_counter=None):
-    agg = {}
-    for r in rows:
+class WbReportAccumulator:
+    """Fold report rows into ``(org, report, nm_id, sa_name)`` records.
+
+    Rows are added one at a time as they are parsed; ``last_rrd`` follows the
+    ``rrd_id`` of the last row seen.
+    """
+
+    def __init__(self, org, doc_types_counter=None):
+        self.org = org
+        self.doc_types = doc_types_counter if doc_types_counter is not None else Counter()
+        self.agg = {}
+        self.rows = 0
+        self.last_rrd = None
+        self.error = None
+
+    def add(self, r):
+        org = self.org
+        agg = self.agg
         doc_type = (r.get('doc_type_name') or "").strip().lower()
-        if doc_types_counter is not None:
-            doc_types_counter[doc_type] += 1
+        self.doc_types[doc_type] += 1
         key = (
             org,
             r.get('realizationreport_id'),
@@ -120,17 +170,28 @@ def aggregate_wb_rows(rows, org, doc_types_counter=None):
         a['Прочие_удержания_выплаты']  += float(r.get('deduction') or 0)
         a['Доплаты']                   += float(r.get('additional_payment') or 0)
 
-    for a in agg.values():
-        a['Итого_продано']  = a['Продано_шт'] - a['Возврат_шт']
-        a['Выручка']        = a['Продано_руб'] - a['Возвраты_руб']
-        a['Комиссия']       = a['Выручка'] - a['К_перечислению_за_товар']
-        a['Итого_к_оплате'] = (
-            a['К_перечислению_за_товар']
-            - a['Стоимость_логистики'] - a['Стоимость_хранения']
-            - a['Стоимость_платной_приемки'] - a['Общая_сумма_штрафов']
-            - a['Прочие_удержания_выплаты'] + a['Доплаты']
-        )
-    return list(agg.values())
+        self.rows += 1
+        if r.get('rrd_id') is not None:
+            self.last_rrd = r['rrd_id']
+
+    def records(self):
+        for a in self.agg.values():
+            a['Итого_продано']  = a['Продано_шт'] - a['Возврат_шт']
+            a['Выручка']        = a['Продано_руб'] - a['Возвраты_руб']
+            a['Комиссия']       = a['Выручка'] - a['К_перечислению_за_товар']
+            a['Итого_к_оплате'] = (
+                a['К_перечислению_за_товар']
+                - a['Стоимость_логистики'] - a['Стоимость_хранения']
+                - a['Стоимость_платной_приемки'] - a['Общая_сумма_штрафов']
+                - a['Прочие_удержания_выплаты'] + a['Доплаты']
+            )
+        return list(self.agg.values())
+
+def aggregate_wb_rows(rows, org, doc_types_counter=None):
+    acc = WbReportAccumulator(org, doc_types_counter)
+    for r in rows:
+        acc.add(r)
+    return acc.records()
 
 def parse_any_date(dt_str):
     if isinstance(dt_str, (datetime.datetime, datetime.date)):
@@ -157,6 +218,14 @@ def _norm(val: str) -> str:
     """
     return str(val).strip().split('.')[0]
 
+def facts_index_path(wb):
+    """Key index file of ``ФинотчетыWB`` for workbook ``wb`` (in the cache dir)."""
+    return cache_dir() / f"wb_facts_{book_tag(wb)}"
+
+def journal_path(wb):
+    """Checkpoint journal of an unfinished import of workbook ``wb``."""
+    return cache_dir() / f"wb_journal_{book_tag(wb)}.jsonl"
+
 def split_periods_by_week(date_from, date_to):
     start = pd.to_datetime(date_from)
     end   = pd.to_datetime(date_to)
@@ -169,14 +238,74 @@ def split_periods_by_week(date_from, date_to):
         cur = week_end + pd.Timedelta(days=1)
     return periods
 
-def import_wb_detailed_reports(wb=None):
+def download_org_reports(org, token, periods, ws_log, journal=None):
+    """Download every page of ``periods`` for one organization.
+
+    Runs in a worker thread, so it only talks to the API and the log sink
+    (never to the workbook).  Each page is aggregated while it streams in;
+    returns ``[(period_start, period_end, pages, max_rrd), ...]`` in period
+    order, where ``pages`` holds ``(records, doc_type_counts)`` per page.
+    With a ``journal`` every page is checkpointed, and periods saved by an
+    interrupted run are resumed from their last ``rrd_id``.
+    """
+    result = []
+    for period_start, period_end in periods:
+        saved = journal.get(org, period_start, period_end) if journal else None
+        if saved and saved["done"]:
+            log_step(ws_log, f"[{org}] {period_start}—{period_end} | Из журнала: {len(saved['pages'])} стр.")
+            result.append((period_start, period_end, saved["pages"], saved["max_rrd"]))
+            continue
+        local_rrd = saved["rrd"] if saved else 0
+        max_rrd = local_rrd
+        attempts = 0
+        pages = list(saved["pages"]) if saved else []
+        complete = False
+        while True:
+            attempts += 1
+            if attempts > MAX_ATTEMPTS:
+                log_error(ws_log, f"Превышено число попыток ({MAX_ATTEMPTS}) для {org}, {period_start}—{period_end}. Прерывание.")
+                break
+
+            acc = WbReportAccumulator(org)
+            n_rows, last_rrd = stream_wb_report_stat(
+                token, period_start, period_end, local_rrd, acc, ws_log, org
+            )
+            if n_rows is None:             # 429 — новая попытка через клиент
+                continue
+
+            log_step(ws_log, f"[{org}] {period_start}—{period_end} | Получено строк: {n_rows} (попытка {attempts})")
+
+            if not n_rows:
+                complete = acc.error is None
+                break
+            pages.append((acc.records(), acc.doc_types))
+            if journal:
+                journal.page(org, period_start, period_end, last_rrd, *pages[-1])
+
+            if last_rrd > max_rrd:
+                max_rrd = last_rrd
+            if last_rrd == local_rrd:
+                complete = True
+                break
+            local_rrd = last_rrd
+        if journal and complete:
+            journal.done(org, period_start, period_end, max_rrd)
+        result.append((period_start, period_end, pages, max_rrd))
+    return result
+
+def import_wb_detailed_reports(wb=None, verify=False):
+    """``verify`` сверяет индекс ключей со всем листом ``ФинотчетыWB`` в этом запуске."""
     if wb is None:
         try:
             wb = xw.Book.caller()
         except Exception:
             wb = xw.Book(str(EXCEL_FILE_PATH))
 
-    ws_log   = get_or_create_sheet(wb, SHEET_LOG)
+    # курсор WB_Log в памяти, строки пишутся блоками и дублируются в scripts/log/wb_report.log
+    with SheetLogSink(get_or_create_sheet(wb, SHEET_LOG), name="wb_report") as ws_log:
+        _import_reports(wb, ws_log, verify)
+
+def _import_reports(wb, ws_log, verify=False):
     ws_set   = get_or_create_sheet(wb, SHEET_SETTINGS,  ws_log)
     ws_org   = get_or_create_sheet(wb, SHEET_ORGS,      ws_log)
     ws_facts = get_or_create_sheet(wb, SHEET_FACTS,     ws_log)
@@ -199,125 +328,90 @@ def import_wb_detailed_reports(wb=None):
     idx_org   = get_idx(org_data[0])
     idx_rrdid = idx_org.get('rrd_id')
 
-    old_facts = ws_facts.range('A1').expand().value
-    existing_keys = set()
-    if old_facts and len(old_facts) > 1:
-        idx_f = get_idx(old_facts[0])
-        for r in old_facts[1:]:
-            if not r:
-                continue
-            key = (
-                _norm(r[idx_f['Организация']]),
-                _norm(r[idx_f['Номер_отчёта']]),
-                _norm(r[idx_f['Артикул_WB']]),
-                _norm(r[idx_f['Артикул_продавца']])
-            )
-            existing_keys.add(key)
+    # Ключи уже загруженных строк берутся из индекса на диске; лист
+    # перечитывается целиком, только если индекс с ним разошёлся.
+    facts_index = SheetKeyIndex(facts_index_path(wb), FACTS_KEY, _norm)
+    mode = facts_index.sync(ws_facts, verify=verify)
+    log_step(ws_log, f"Найдены ранее загруженные строки: {len(facts_index)} (индекс: {mode})")
 
+    hdr = FACTS_HEADER
 
-            
-    log_step(ws_log, f"Найдены ранее загруженные строки: {len(existing_keys)}")
+    def header_ok(row): return all(col in row for col in hdr)
 
-    results = []
+    def open_appender():
+        """Готовит лист к дозаписи и возвращает буферизованный писатель."""
+        if header_ok(facts_index.header):
+            start = facts_index.rows + 2
+        else:
+            drop_existing_table(ws_facts, TABLE_FACTS)
+            ws_facts.clear_contents()
+            ws_facts.range('A1').value = hdr
+            facts_index.reset()
+            start = 2
+        return BlockAppender(ws_facts, start, hdr)
+
+    appender = None
     doc_types_counter = Counter()
 
-    for row_idx, row in enumerate(org_data[1:], start=2):
-        org   = row[idx_org['Организация']]
-        token = row[idx_org['Token_WB']]
-        if not org or not token:
-            continue
-
-        log_step(ws_log, f"Обработка: {org}")
-        periods = split_periods_by_week(date_from_iso, date_to_iso)
-        log_step(ws_log, f"Загрузка разбита на {len(periods)} недель: {periods}")
-        print(f"Загрузка разбита на {len(periods)} недель: {periods}")
-
-        for period_start, period_end in periods:
-            local_rrd = 0
-            max_rrd = 0
-            attempts = 0
-            while True:
-                attempts += 1
-                if attempts > 5:
-                    log_error(ws_log, f"Превышено число попыток (5) для {org}, {period_start}—{period_end}. Прерывание.")
-                    break
-
-                wb_rows, last_rrd = fetch_wb_report_stat(
-                    token, period_start, period_end, local_rrd, ws_log, org
-                )
-
-                log_step(ws_log, f"[{org}] {period_start}—{period_end} | Получено строк: {len(wb_rows)} (попытка {attempts})")
-                print(f"[{org}] {period_start}—{period_end} | Получено строк: {len(wb_rows)} (попытка {attempts})")
-
-                if not wb_rows:
-                    break
-
-                records_batch = aggregate_wb_rows(wb_rows, org, doc_types_counter)
-                records_new = []
-                for rec in records_batch:
-                    key = (
-                        _norm(rec['Организация']),
-                        _norm(rec['Номер_отчёта']),
-                        _norm(rec['Артикул_WB']),
-                        _norm(rec['Артикул_продавца'])
-                    )
-
-
-                    if key in existing_keys:
-                        continue
-                    existing_keys.add(key)
-                    records_new.append(rec)
-
-                if records_new:
-                    results.extend(records_new)
-
-                if last_rrd > max_rrd:
-                    max_rrd = last_rrd
-                if last_rrd == local_rrd:
-                    break
-                local_rrd = last_rrd
-                time.sleep(1)
-
-            # --- обновление rrd_id после недели ---
-            if idx_rrdid is not None and max_rrd > int(float(row[idx_rrdid] or 0)):
-                ws_org.range(row_idx, idx_rrdid + 1).value = max_rrd
-                log_step(ws_log, f"Обновлён rrd_id для {org} (неделя): {max_rrd}")
-
-    if not results:
+    registry = org_settings.OrgRegistry.from_values(org_data)
+    orgs = [(o.row, o, o.name, o.token_wb) for o in registry if o.token_wb]
+
+    periods = split_periods_by_week(date_from_iso, date_to_iso)
+    log_step(ws_log, f"Загрузка разбита на {len(periods)} недель: {periods}")
+
+    # Организации качаются параллельно, у каждого токена своя квота.
+    # Результаты разбираются в порядке листа, поэтому дедупликация и
+    # порядок строк те же, что при последовательной загрузке.
+    journal = ImportJournal(journal_path(wb), {"from": date_from_iso, "to": date_to_iso})
+    if journal.resumed:
+        log_step(ws_log, f"Продолжение прерванной загрузки: {journal.pages} стр. из журнала")
+
+    client = get_client()
+    client.set_budget(WB_API_URL_STAT, WB_RATE_PER_SEC)
+    workers = max(1, min(WB_MAX_WORKERS, len(orgs)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="wb_report") as pool:
+        futures = [
+            pool.submit(download_org_reports, org, token, periods, ws_log, journal)
+            for _, _, org, token in orgs
+        ]
+        for (row_idx, row, org, _), fut in zip(orgs, futures):
+            log_step(ws_log, f"Обработка: {org}")
+            for period_start, period_end, pages, max_rrd in fut.result():
+                for records_batch, doc_types in pages:
+                    doc_types_counter.update(doc_types)
+                    if records_batch and appender is None:
+                        appender = open_appender()
+                    for rec in records_batch:
+                        key = tuple(_norm(rec[c]) for c in FACTS_KEY)
+                        if facts_index.add(key):
+                            appender.append(rec)
+
+                # --- обновление rrd_id после недели ---
+                if idx_rrdid is not None and max_rrd > int(float(row.get('rrd_id') or 0)):
+                    ws_org.range(row_idx, idx_rrdid + 1).value = max_rrd
+                    log_step(ws_log, f"Обновлён rrd_id для {org} (неделя): {max_rrd}")
+
+    log_step(ws_log, f"HTTP-статистика:\n{client.metrics.summary()}")
+
+    if appender is None or not appender.rows + appender.pending:
         log_step(ws_log, "Нет новых строк — лист ФинотчетыWB оставлен без изменений")
+        journal.clear()
         return
 
-    hdr = [
-        'Организация', 'Дата', 'Предмет', 'Артикул_продавца', 'Артикул_WB', 'Название', 'Номер_отчёта',
-        'Продано_шт', 'Возврат_шт', 'Продано_руб', 'Возвраты_руб', 'Выручка', 'К_перечислению_за_товар', 'Комиссия',
-        'Стоимость_логистики', 'Стоимость_хранения', 'Стоимость_платной_приемки', 'Общая_сумма_штрафов',
-        'Прочие_удержания_выплаты', 'Доплаты', 'Итого_к_оплате', 'Итого_продано'
-    ]
-
-    def header_ok(row): return all(col in row for col in hdr)
-
-    if old_facts and header_ok(old_facts[0]):
-        start = len(old_facts) + 1
-        for i, rec in enumerate(results, start):
-            ws_facts.range(i, 1).value = [rec.get(c, "") for c in hdr]
-    else:
-        drop_existing_table(ws_facts, "WbFactsTable")
-        ws_facts.clear_contents()
-        ws_facts.range('A1').value = hdr
-        for i, rec in enumerate(results, 2):
-            ws_facts.range(i, 1).value = [rec.get(c, "") for c in hdr]
-
-    log_step(ws_log, f"Финально записано {len(results)} новых строк в {SHEET_FACTS}")
+    appender.close()
+    facts_index.commit(appender.last_row - 1)
+    journal.clear()
+    log_step(ws_log, f"Финально записано {appender.rows} новых строк в {SHEET_FACTS}: {appender.summary()}")
 
     try:
         ws_facts.activate()
-        last_row = ws_facts.range('A' + str(ws_facts.cells.rows.count)).end('up').row
+        last_row = appender.last_row       # таблица расширяется один раз
         last_col = len(hdr)
         tbl_rng  = ws_facts.range((1, 1), (last_row, last_col))
 
         existing_tbl = None
         for tbl in ws_facts.tables:
-            if tbl.name == "WbFactsTable":
+            if tbl.name == TABLE_FACTS:
                 existing_tbl = tbl
                 break
 
@@ -325,7 +419,7 @@ def import_wb_detailed_reports(wb=None):
             existing_tbl.resize(tbl_rng)
         else:
             ws_facts.tables.add(tbl_rng,
-                                name="WbFactsTable",
+                                name=TABLE_FACTS,
                                 table_style_name="TableStyleMedium7",
                                 has_headers=True)
 
@@ -339,4 +433,8 @@ def import_wb_detailed_reports(wb=None):
         log_error(ws_log, f"⚠️ Ошибка оформления таблицы: {e}")
 
 if __name__ == "__main__":
-    import_wb_detailed_reports()
+    import argparse
+    p = argparse.ArgumentParser(add_help=False)
+    p.add_argument('--verify', action='store_true',
+                   help='сверить индекс ключей со всем листом ФинотчетыWB')
+    import_wb_detailed_reports(verify=p.parse_known_args()[0].verify)
@@ -0,0 +1,707 @@
+"""Pluggable workbook backends: xlwings (Excel/COM) and headless openpyxl.
+
+The headless backend mimics the small part of the xlwings API used by the
+calculation stages (``wb.sheets[...]``, ``sheet.range(...).expand('table')``,
+``.value``, ``.options(pd.DataFrame, ...)``, ``.end('down')`` …).  Input
+sheets are streamed once from the source workbook in read-only mode; sheets
+written by a stage are saved in write-only mode into a separate output file
+(``<книга>_headless.xlsx`` by default), so the ``.xlsm`` with macros is never
+rewritten.  Sheets from an existing output file take precedence over the
+source, which lets headless stages be chained (COGS → economics → planned
+indicators).
+
+Select the backend with ``FINMODEL_BACKEND=openpyxl`` (default ``xlwings``);
+the output path can be overridden with ``FINMODEL_OUTPUT``.
+"""
+
+from __future__ import annotations
+
+import math
+import os
+import re
+import warnings
+from pathlib import Path
+from typing import Any, Iterator
+
+import pandas as pd
+
+BACKEND_ENV = "FINMODEL_BACKEND"
+OUTPUT_ENV = "FINMODEL_OUTPUT"
+HEADLESS_BACKENDS = ("openpyxl", "headless")
+
+EXCEL_MAX_ROWS = 1_048_576
+EXCEL_MAX_COLS = 16_384
+
+_A1_RE = re.compile(r"^\$?([A-Za-z]{1,3})\$?(\d+)$")
+_COL_RE = re.compile(r"^\$?([A-Za-z]{1,3})$")
+
+
+def headless_requested(backend: str | None = None) -> bool:
+    """Return ``True`` if the headless backend is selected."""
+    name = backend if backend is not None else os.environ.get(BACKEND_ENV, "")
+    return str(name).strip().lower() in HEADLESS_BACKENDS
+
+
+def is_headless(book: Any) -> bool:
+    """Return ``True`` if ``book`` is a :class:`HeadlessBook`."""
+    return isinstance(book, HeadlessBook)
+
+
+def default_output_path(source: Path) -> Path:
+    """Return output path for headless runs of ``source``."""
+    env = os.environ.get(OUTPUT_ENV)
+    if env:
+        return Path(env)
+    return source.with_name(f"{source.stem}_headless.xlsx")
+
+
+def open_headless(path: Path | str, output_path: Path | str | None = None) -> "HeadlessBook":
+    """Open ``path`` with the openpyxl backend."""
+    path = Path(path)
+    if not path.exists():
+        raise FileNotFoundError(path)
+    out = Path(output_path) if output_path is not None else default_output_path(path)
+    return HeadlessBook(path, out)
+
+
+# ---------- Адресация ------------------------------------------------------
+
+def col_index(letters: str) -> int:
+    """Convert column letters (``A``, ``AB``) to a 1-based index."""
+    n = 0
+    for ch in letters.upper():
+        n = n * 26 + (ord(ch) - 64)
+    return n
+
+
+def _parse_cell(addr: str, default_row: int) -> tuple[int, int]:
+    m = _A1_RE.match(addr.strip())
+    if m:
+        return int(m.group(2)), col_index(m.group(1))
+    m = _COL_RE.match(addr.strip())
+    if m:
+        return default_row, col_index(m.group(1))
+    raise ValueError(f"Unsupported address: {addr!r}")
+
+
+def parse_address(addr: str) -> tuple[int, int, int, int]:
+    """Parse ``A1`` / ``A1:C10`` / ``B:B`` into ``(r1, c1, r2, c2)``."""
+    if ":" in addr:
+        left, right = addr.split(":", 1)
+        r1, c1 = _parse_cell(left, 1)
+        r2, c2 = _parse_cell(right, EXCEL_MAX_ROWS)
+    else:
+        r1, c1 = _parse_cell(addr, 1)
+        r2, c2 = r1, c1
+    return min(r1, r2), min(c1, c2), max(r1, r2), max(c1, c2)
+
+
+# ---------- Заглушки COM ---------------------------------------------------
+
+class ComStub:
+    """Absorbs COM calls (``.api``) that have no meaning without Excel.
+
+    Attribute access and calls return the stub itself, assignments are
+    ignored and iteration yields nothing, so formatting code such as
+    ``sh.api.Tab.Color = ...`` or ``for lo in sh.api.ListObjects`` is a no-op.
+    """
+
+    def __getattr__(self, name: str) -> "ComStub":
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return self
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        pass
+
+    def __call__(self, *args: Any, **kwargs: Any) -> "ComStub":
+        return self
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(())
+
+    def __repr__(self) -> str:
+        return "<ComStub>"
+
+
+COM_STUB = ComStub()
+
+
+class HeadlessApp:
+    """Stand-in for ``xw.App``: screen/calculation flags are plain attributes."""
+
+    def __init__(self) -> None:
+        self.screen_updating = False
+        self.enable_events = False
+        self.calculation = "manual"
+        self.visible = False
+        self.api = COM_STUB
+
+    def quit(self) -> None:
+        pass
+
+
+class _Autofit:
+    def __init__(self, count: int = 0) -> None:
+        self.count = count
+
+    def autofit(self) -> None:
+        pass
+
+
+# ---------- Конвертация значений -------------------------------------------
+
+def _read_value(v: Any) -> Any:
+    """Mimic xlwings: numbers come back as ``float``, blanks as ``None``."""
+    if isinstance(v, bool) or v is None:
+        return v
+    if isinstance(v, int):
+        return float(v)
+    if isinstance(v, str) and v == "":
+        return None
+    return v
+
+
+def _write_value(v: Any) -> Any:
+    if v is None:
+        return None
+    if hasattr(v, "item") and not isinstance(v, (str, bytes)):
+        try:
+            v = v.item()
+        except Exception:
+            pass
+    if isinstance(v, float) and math.isnan(v):
+        return None
+    if isinstance(v, pd.Timestamp):
+        return v.to_pydatetime()
+    if v is pd.NaT:
+        return None
+    return v
+
+
+def _to_2d(value: Any, options: dict) -> list[list[Any]]:
+    if isinstance(value, pd.DataFrame):
+        df = value
+        rows: list[list[Any]] = []
+        use_index = options.get("index", True)
+        if options.get("header", True):
+            hdr = list(df.columns)
+            rows.append(([df.index.name] if use_index else []) + hdr)
+        for idx, rec in zip(df.index, df.itertuples(index=False, name=None)):
+            rows.append(([idx] if use_index else []) + list(rec))
+        return rows
+    if isinstance(value, pd.Series):
+        return [[v] for v in value.tolist()]
+    if hasattr(value, "tolist") and not isinstance(value, (str, bytes)):
+        value = value.tolist()
+    if isinstance(value, (list, tuple)):
+        if not value:
+            return []
+        if isinstance(value[0], (list, tuple)):
+            return [list(r) for r in value]
+        return [list(value)]
+    return [[value]]
+
+
+# ---------- Диапазоны ------------------------------------------------------
+
+class HeadlessRange:
+    """Rectangular cell block of a :class:`HeadlessSheet` (1-based, inclusive)."""
+
+    def __init__(self, sheet: "HeadlessSheet", r1: int, c1: int, r2: int, c2: int,
+                 options: dict | None = None) -> None:
+        self.sheet = sheet
+        self.r1, self.c1, self.r2, self.c2 = r1, c1, r2, c2
+        self._options = options or {}
+        self.api = COM_STUB
+
+    def __repr__(self) -> str:
+        return f"<HeadlessRange {self.sheet.name}!R{self.r1}C{self.c1}:R{self.r2}C{self.c2}>"
+
+    # --- геометрия ---------------------------------------------------------
+    @property
+    def row(self) -> int:
+        return self.r1
+
+    @property
+    def column(self) -> int:
+        return self.c1
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return self.r2 - self.r1 + 1, self.c2 - self.c1 + 1
+
+    @property
+    def last_cell(self) -> "HeadlessRange":
+        return HeadlessRange(self.sheet, self.r2, self.c2, self.r2, self.c2)
+
+    @property
+    def columns(self) -> _Autofit:
+        return _Autofit(self.shape[1])
+
+    @property
+    def rows(self) -> _Autofit:
+        return _Autofit(self.shape[0])
+
+    def resize(self, row_size: int | None = None, column_size: int | None = None) -> "HeadlessRange":
+        nr = row_size if row_size is not None else self.shape[0]
+        nc = column_size if column_size is not None else self.shape[1]
+        return HeadlessRange(self.sheet, self.r1, self.c1,
+                             self.r1 + nr - 1, self.c1 + nc - 1, self._options)
+
+    def offset(self, row_offset: int = 0, column_offset: int = 0) -> "HeadlessRange":
+        return HeadlessRange(self.sheet, self.r1 + row_offset, self.c1 + column_offset,
+                             self.r2 + row_offset, self.c2 + column_offset, self._options)
+
+    def end(self, direction: str) -> "HeadlessRange":
+        """Emulate Ctrl+arrow from the top-left cell."""
+        d = direction.lower()[0]
+        dr, dc = {"d": (1, 0), "u": (-1, 0), "r": (0, 1), "l": (0, -1)}[d]
+        r, c = self.r1, self.c1
+        get = self.sheet._get
+        limit_r, limit_c = EXCEL_MAX_ROWS, EXCEL_MAX_COLS
+
+        def inside(rr: int, cc: int) -> bool:
+            return 1 <= rr <= limit_r and 1 <= cc <= limit_c
+
+        nr, nc = r + dr, c + dc
+        if not inside(nr, nc):
+            return HeadlessRange(self.sheet, r, c, r, c)
+        if get(r, c) is not None and get(nr, nc) is not None:
+            # внутри блока — идём до последней заполненной ячейки
+            while inside(nr + dr, nc + dc) and get(nr + dr, nc + dc) is not None:
+                nr, nc = nr + dr, nc + dc
+            return HeadlessRange(self.sheet, nr, nc, nr, nc)
+        # иначе — до первой заполненной ячейки (или до края листа)
+        nr, nc = self.sheet._next_filled(r, c, dr, dc)
+        return HeadlessRange(self.sheet, nr, nc, nr, nc)
+
+    def expand(self, mode: str = "table") -> "HeadlessRange":
+        mode = mode.lower()
+        r2, c2 = self.r2, self.c2
+        get = self.sheet._get
+        if mode in ("table", "down", "d"):
+            if get(self.r2 + 1, self.c1) is not None:
+                r2 = HeadlessRange(self.sheet, self.r2, self.c1, self.r2, self.c1).end("down").row
+        if mode in ("table", "right", "r"):
+            if get(self.r1, self.c2 + 1) is not None:
+                c2 = HeadlessRange(self.sheet, self.r1, self.c2, self.r1, self.c2).end("right").column
+        return HeadlessRange(self.sheet, self.r1, self.c1, r2, c2, self._options)
+
+    def options(self, convert: Any = None, **kwargs: Any) -> "HeadlessRange":
+        opts = dict(self._options)
+        if convert is not None:
+            opts["convert"] = convert
+        opts.update(kwargs)
+        rng = HeadlessRange(self.sheet, self.r1, self.c1, self.r2, self.c2, opts)
+        expand = opts.get("expand")
+        return rng.expand(expand) if expand else rng
+
+    # --- значения ----------------------------------------------------------
+    def _raw(self) -> list[list[Any]]:
+        get = self.sheet._get
+        return [[_read_value(get(r, c)) for c in range(self.c1, self.c2 + 1)]
+                for r in range(self.r1, self.r2 + 1)]
+
+    @property
+    def value(self) -> Any:
+        data = self._raw()
+        convert = self._options.get("convert")
+        if convert is pd.DataFrame:
+            header = self._options.get("header", 1)
+            index = self._options.get("index", 1)
+            cols = data[0] if header else list(range(len(data[0]) if data else 0))
+            body = data[1:] if header else data
+            df = pd.DataFrame(body, columns=cols)
+            if index:
+                df = df.set_index(df.columns[0])
+            return df
+        nrows, ncols = self.shape
+        ndim = self._options.get("ndim")
+        if ndim == 2:
+            return data
+        if ndim == 1:
+            return [v for row in data for v in row]
+        if nrows == 1 and ncols == 1:
+            return data[0][0]
+        if nrows == 1:
+            return data[0]
+        if ncols == 1:
+            return [row[0] for row in data]
+        return data
+
+    @value.setter
+    def value(self, data: Any) -> None:
+        block = _to_2d(data, self._options)
+        if (len(block) == 1 and len(block[0]) == 1 and self.shape != (1, 1)
+                and not isinstance(data, (list, tuple, pd.DataFrame))):
+            # скаляр в диапазон — заполняем весь блок, как Excel
+            block = [[block[0][0]] * self.shape[1] for _ in range(self.shape[0])]
+        self.sheet._write_block(self.r1, self.c1, block)
+
+    @property
+    def formula(self) -> Any:
+        return self.value
+
+    @formula.setter
+    def formula(self, text: Any) -> None:
+        self.value = text
+
+    def clear_contents(self) -> None:
+        self.sheet._clear_block(self.r1, self.c1, self.r2, self.c2)
+
+    clear = clear_contents
+
+    def autofit(self) -> None:
+        pass
+
+    def select(self) -> None:
+        pass
+
+
+# ---------- Таблицы (ListObjects) ------------------------------------------
+
+class HeadlessTable:
+    """Excel table recorded on a headless sheet and written on save."""
+
+    def __init__(self, tables: "HeadlessTables", rng: HeadlessRange, name: str,
+                 table_style_name: str) -> None:
+        self._tables = tables
+        self.range = rng
+        self.name = name
+        self.table_style_name = table_style_name
+        self.api = COM_STUB
+
+    def resize(self, rng: HeadlessRange) -> None:
+        self.range = rng
+
+    def delete(self) -> None:
+        self._tables._items.remove(self)
+
+
+class HeadlessTables:
+    """``sheet.tables`` collection."""
+
+    def __init__(self, sheet: "HeadlessSheet") -> None:
+        self._sheet = sheet
+        self._items: list[HeadlessTable] = []
+
+    def __iter__(self) -> Iterator[HeadlessTable]:
+        return iter(list(self._items))
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def add(self, source: HeadlessRange, name: str | None = None,
+            table_style_name: str = "TableStyleMedium2", has_headers: bool = True,
+            **kwargs: Any) -> HeadlessTable:
+        tbl = HeadlessTable(self, source, name or f"Table{len(self._items) + 1}",
+                            table_style_name)
+        self._items.append(tbl)
+        self._sheet.modified = True
+        return tbl
+
+
+# ---------- Листы ----------------------------------------------------------
+
+class _Cells:
+    def __init__(self, sheet: "HeadlessSheet") -> None:
+        self._sheet = sheet
+        self.rows = _Autofit(EXCEL_MAX_ROWS)
+        self.columns = _Autofit(EXCEL_MAX_COLS)
+
+    @property
+    def last_cell(self) -> HeadlessRange:
+        return HeadlessRange(self._sheet, EXCEL_MAX_ROWS, EXCEL_MAX_COLS,
+                             EXCEL_MAX_ROWS, EXCEL_MAX_COLS)
+
+
+class HeadlessSheet:
+    """Worksheet held in memory as a list of row lists."""
+
+    def __init__(self, book: "HeadlessBook", name: str, loader=None,
+                 from_output: bool = False) -> None:
+        self.book = book
+        self.name = name
+        self._loader = loader
+        self._grid: list[list[Any]] | None = None if loader else []
+        self.modified = loader is None
+        self.from_output = from_output
+        self.tables = HeadlessTables(self)
+        self.cells = _Cells(self)
+        self.api = COM_STUB
+
+    def __repr__(self) -> str:
+        return f"<HeadlessSheet {self.name!r}>"
+
+    # --- хранение ----------------------------------------------------------
+    @property
+    def grid(self) -> list[list[Any]]:
+        if self._grid is None:
+            self._grid = self._loader() if self._loader else []
+            self._loader = None
+        return self._grid
+
+    def _get(self, r: int, c: int) -> Any:
+        grid = self.grid
+        if r < 1 or c < 1 or r > len(grid):
+            return None
+        row = grid[r - 1]
+        if c > len(row):
+            return None
+        v = row[c - 1]
+        return None if v == "" else v
+
+    def _next_filled(self, r: int, c: int, dr: int, dc: int) -> tuple[int, int]:
+        grid = self.grid
+        if dr:
+            last = len(grid) if dr > 0 else 1
+            rr = r + dr
+            while (dr > 0 and rr <= last) or (dr < 0 and rr >= last):
+                if self._get(rr, c) is not None:
+                    return rr, c
+                rr += dr
+            return (EXCEL_MAX_ROWS, c) if dr > 0 else (1, c)
+        row_len = len(grid[r - 1]) if 0 < r <= len(grid) else 0
+        last = row_len if dc > 0 else 1
+        cc = c + dc
+        while (dc > 0 and cc <= last) or (dc < 0 and cc >= last):
+            if self._get(r, cc) is not None:
+                return r, cc
+            cc += dc
+        return (r, EXCEL_MAX_COLS) if dc > 0 else (r, 1)
+
+    def _write_block(self, r1: int, c1: int, block: list[list[Any]]) -> None:
+        grid = self.grid
+        need_rows = r1 - 1 + len(block)
+        while len(grid) < need_rows:
+            grid.append([])
+        for i, vals in enumerate(block):
+            row = grid[r1 - 1 + i]
+            need_cols = c1 - 1 + len(vals)
+            if len(row) < need_cols:
+                row.extend([None] * (need_cols - len(row)))
+            row[c1 - 1:need_cols] = [_write_value(v) for v in vals]
+        self.modified = True
+
+    def _clear_block(self, r1: int, c1: int, r2: int, c2: int) -> None:
+        grid = self.grid
+        for r in range(r1, min(r2, len(grid)) + 1):
+            row = grid[r - 1]
+            for c in range(c1, min(c2, len(row)) + 1):
+                row[c - 1] = None
+        while grid and not any(v is not None for v in grid[-1]):
+            grid.pop()
+        self.modified = True
+
+    # --- API xlwings -------------------------------------------------------
+    def range(self, cell1: Any, cell2: Any = None) -> HeadlessRange:
+        if isinstance(cell1, str):
+            r1, c1, r2, c2 = parse_address(cell1)
+        elif isinstance(cell1, HeadlessRange):
+            r1, c1, r2, c2 = cell1.r1, cell1.c1, cell1.r2, cell1.c2
+        elif isinstance(cell1, tuple):
+            r1, c1 = cell1
+            r2, c2 = r1, c1
+        elif isinstance(cell1, int) and isinstance(cell2, int):
+            return HeadlessRange(self, cell1, cell2, cell1, cell2)
+        else:
+            raise ValueError(f"Unsupported range: {cell1!r}, {cell2!r}")
+        if cell2 is not None:
+            if isinstance(cell2, str):
+                er1, ec1, er2, ec2 = parse_address(cell2)
+            elif isinstance(cell2, HeadlessRange):
+                er1, ec1, er2, ec2 = cell2.r1, cell2.c1, cell2.r2, cell2.c2
+            else:
+                er1, ec1 = cell2
+                er2, ec2 = er1, ec1
+            r1, c1 = min(r1, er1), min(c1, ec1)
+            r2, c2 = max(r2, er2), max(c2, ec2)
+        return HeadlessRange(self, r1, c1, r2, c2)
+
+    def __getitem__(self, addr: str) -> HeadlessRange:
+        return self.range(addr)
+
+    @property
+    def used_range(self) -> HeadlessRange:
+        grid = self.grid
+        if not grid:
+            return HeadlessRange(self, 1, 1, 1, 1)
+        max_c = max((len(r) for r in grid), default=1) or 1
+        return HeadlessRange(self, 1, 1, len(grid), max_c)
+
+    @property
+    def index(self) -> int:
+        return self.book.sheets._items.index(self) + 1
+
+    def clear(self) -> None:
+        self._grid = []
+        self._loader = None
+        self.tables._items.clear()
+        self.modified = True
+
+    def clear_contents(self) -> None:
+        self._grid = []
+        self._loader = None
+        self.modified = True
+
+    def delete(self) -> None:
+        self.book.sheets._items.remove(self)
+
+    def activate(self) -> None:
+        pass
+
+    def select(self) -> None:
+        pass
+
+    def autofit(self, axis: str | None = None) -> None:
+        pass
+
+
+class HeadlessSheets:
+    """``book.sheets`` collection: lookup by name or 0-based position."""
+
+    def __init__(self, book: "HeadlessBook") -> None:
+        self._book = book
+        self._items: list[HeadlessSheet] = []
+
+    def __iter__(self) -> Iterator[HeadlessSheet]:
+        return iter(list(self._items))
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    @property
+    def count(self) -> int:
+        return len(self._items)
+
+    def __contains__(self, name: object) -> bool:
+        return any(s.name == name for s in self._items)
+
+    def __getitem__(self, key: int | str) -> HeadlessSheet:
+        if isinstance(key, str):
+            for s in self._items:
+                if s.name == key:
+                    return s
+            raise KeyError(key)
+        return self._items[key]
+
+    def add(self, name: str | None = None, before: HeadlessSheet | None = None,
+            after: HeadlessSheet | None = None) -> HeadlessSheet:
+        name = name or f"Sheet{len(self._items) + 1}"
+        if name in self:
+            raise ValueError(f"Sheet {name!r} already exists")
+        sheet = HeadlessSheet(self._book, name)
+        if before is not None:
+            self._items.insert(self._items.index(before), sheet)
+        elif after is not None:
+            self._items.insert(self._items.index(after) + 1, sheet)
+        else:
+            self._items.append(sheet)
+        return sheet
+
+
+# ---------- Книга ----------------------------------------------------------
+
+class HeadlessBook:
+    """openpyxl-backed workbook with the xlwings surface used by the stages."""
+
+    def __init__(self, path: Path, output_path: Path) -> None:
+        self.fullname = str(Path(path).resolve())
+        self.name = Path(path).name
+        self.output_path = Path(output_path)
+        self.app = HeadlessApp()
+        self.api = COM_STUB
+        self.sheets = HeadlessSheets(self)
+        self._sources: list[Any] = []
+
+        src = self._open_source(Path(path))
+        out = self._open_source(self.output_path) if self.output_path.exists() else None
+        out_names = set(out.sheetnames) if out is not None else set()
+        for name in src.sheetnames:
+            origin = out if name in out_names else src
+            self.sheets._items.append(HeadlessSheet(
+                self, name, self._loader(origin, name), from_output=origin is out))
+        if out is not None:
+            for name in out.sheetnames:
+                if name not in src.sheetnames:
+                    self.sheets._items.append(HeadlessSheet(
+                        self, name, self._loader(out, name), from_output=True))
+
+    def _open_source(self, path: Path):
+        from openpyxl import load_workbook
+
+        wb = load_workbook(path, read_only=True, data_only=True, keep_links=False)
+        self._sources.append(wb)
+        return wb
+
+    @staticmethod
+    def _loader(src, name: str):
+        def load() -> list[list[Any]]:
+            ws = src[name]
+            try:
+                ws.reset_dimensions()      # размеры в файле бывают неверными
+            except AttributeError:
+                pass
+            grid = [list(r) for r in ws.iter_rows(values_only=True)]
+            while grid and not any(v is not None for v in grid[-1]):
+                grid.pop()
+            return grid
+        return load
+
+    def save(self, path: Path | str | None = None) -> Path:
+        """Write changed and previously headless sheets in write-only mode."""
+        from openpyxl import Workbook
+        from openpyxl.worksheet.table import Table, TableColumn, TableStyleInfo
+
+        target = Path(path) if path is not None else self.output_path
+        out = Workbook(write_only=True)
+        for sheet in self.sheets:
+            if not (sheet.modified or sheet.from_output):
+                continue
+            ws = out.create_sheet(sheet.name)
+            for tbl in sheet.tables:
+                ref = (f"{_col_letters(tbl.range.c1)}{tbl.range.r1}:"
+                       f"{_col_letters(tbl.range.c2)}{tbl.range.r2}")
+                t = Table(displayName=_table_name(tbl.name), ref=ref)
+                t.tableStyleInfo = TableStyleInfo(name=tbl.table_style_name,
+                                                  showRowStripes=True)
+                # в write-only режиме колонки таблицы задаются вручную
+                for i, c in enumerate(range(tbl.range.c1, tbl.range.c2 + 1), start=1):
+                    head = sheet._get(tbl.range.r1, c)
+                    t.tableColumns.append(TableColumn(id=i, name=str(head if head is not None else f"Column{i}")))
+                with warnings.catch_warnings():
+                    warnings.simplefilter("ignore", UserWarning)
+                    ws.add_table(t)
+            for row in sheet.grid:
+                ws.append(row)
+        if not out.worksheets:
+            out.create_sheet("Sheet1")
+        tmp = target.with_suffix(target.suffix + ".tmp")
+        out.save(tmp)
+        os.replace(tmp, target)
+        for sheet in self.sheets:
+            if sheet.modified:
+                sheet.from_output = True
+        return target
+
+    def close(self) -> None:
+        for src in self._sources:
+            try:
+                src.close()
+            except Exception:
+                pass
+        self._sources.clear()
+
+
+def _col_letters(n: int) -> str:
+    s = ""
+    while n > 0:
+        n, r = divmod(n - 1, 26)
+        s = chr(65 + r) + s
+    return s
+
+
+def _table_name(name: str) -> str:
+    clean = re.sub(r"\W", "_", name)
+    return clean if clean and not clean[0].isdigit() else f"T_{clean}"
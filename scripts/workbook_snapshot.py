@@ -0,0 +1,290 @@
+"""One-pass snapshot of input sheets with an on-disk cache.
+
+Each requested sheet is read once (``range(1, 1).expand('table')``) and kept
+as typed column arrays: numeric columns as ``float64`` plus a null mask,
+text columns as unicode arrays, anything else as ``object``.
+
+Sheets are cached in ``cache/sheet_<hash>.npz``.  The hash is taken from the
+saved workbook file without parsing it: an ``.xlsx``/``.xlsm`` is a zip
+archive, and the CRC of the sheet part together with the CRC of the shared
+strings table changes whenever the sheet content changes.  Saving the book
+after writing *other* sheets therefore keeps the input sheets cached, and a
+re-run on unchanged inputs never reads them through COM.  Unsaved Excel
+workbooks and sheets written during the current headless run are always
+read live.
+
+Usage::
+
+    snap = load_snapshot(wb, [SHEET_WB, SHEET_ORG])
+    rows, idx = snap.read_rows(SHEET_WB)      # как fill_planned_indicators.read_rows
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import posixpath
+import zipfile
+from pathlib import Path
+from typing import Any, Iterable
+from xml.etree import ElementTree as ET
+
+import numpy as np
+
+from scripts.workbook_backend import is_headless
+
+SNAPSHOT_VERSION = 1
+CACHE_ENV = "FINMODEL_CACHE_DIR"
+CACHE_DIR = Path(__file__).resolve().parents[1] / "cache"
+KEEP_CACHE_FILES = 200
+
+KIND_NUM = "num"
+KIND_STR = "str"
+KIND_OBJ = "obj"
+
+_NS_MAIN = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_NS_REL = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_NS_PKG = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+
+def cache_dir() -> Path:
+    """Return cache directory (``FINMODEL_CACHE_DIR`` or ``<project>/cache``)."""
+    env = os.environ.get(CACHE_ENV)
+    return Path(env) if env else CACHE_DIR
+
+
+def book_tag(wb) -> str:
+    """Short stable tag of workbook ``wb`` for per-book cache file names."""
+    return hashlib.sha1(str(wb.fullname).lower().encode("utf-8")).hexdigest()[:16]
+
+
+# ---------- Хэши листов по zip-каталогу ------------------------------------
+
+def sheet_part_hashes(path: Path) -> dict[str, str]:
+    """Return ``{sheet name: content hash}`` read from the zip directory of ``path``.
+
+    Only ``workbook.xml`` and its relationships are parsed; the sheet parts
+    themselves are identified by CRC and size, which costs no decompression.
+    Returns an empty dict for files that are not OOXML packages.
+    """
+    try:
+        with zipfile.ZipFile(path) as z:
+            wb_xml = ET.fromstring(z.read("xl/workbook.xml"))
+            rels = ET.fromstring(z.read("xl/_rels/workbook.xml.rels"))
+            targets = {r.get("Id"): r.get("Target") for r in rels.iter(f"{_NS_PKG}Relationship")}
+            infos = {i.filename: i for i in z.infolist()}
+    except (OSError, KeyError, zipfile.BadZipFile, ET.ParseError):
+        return {}
+
+    def part(name: str) -> str:
+        info = infos.get(name)
+        return f"{info.CRC:08x}:{info.file_size}" if info else "-"
+
+    shared = part("xl/sharedStrings.xml")
+    styles = part("xl/styles.xml")         # форматы дат влияют на значения
+    hashes = {}
+    for sh in wb_xml.iter(f"{_NS_MAIN}sheet"):
+        target = targets.get(sh.get(f"{_NS_REL}id"))
+        if not target:
+            continue
+        target = target.lstrip("/") if target.startswith("/") else posixpath.normpath(
+            posixpath.join("xl", target))
+        raw = f"v{SNAPSHOT_VERSION}|{sh.get('name')}|{part(target)}|{shared}|{styles}"
+        hashes[sh.get("name")] = hashlib.sha256(raw.encode()).hexdigest()
+    return hashes
+
+
+def _sheet_hashes(wb, names: list[str]) -> dict[str, str]:
+    """Content hashes of ``names`` that are safe to serve from cache."""
+    if is_headless(wb):
+        by_file: dict[Path, list[str]] = {}
+        for name in names:
+            if name not in wb.sheets:
+                continue
+            sheet = wb.sheets[name]
+            if sheet.modified:            # записан в этом запуске — читаем живьём
+                continue
+            src = wb.output_path if sheet.from_output else Path(wb.fullname)
+            by_file.setdefault(src, []).append(name)
+        out = {}
+        for src, group in by_file.items():
+            hashes = sheet_part_hashes(src)
+            out.update({n: hashes[n] for n in group if n in hashes})
+        return out
+    try:
+        if not wb.api.Saved:              # несохранённые правки в Excel
+            return {}
+        path = Path(wb.fullname)
+    except Exception:
+        return {}
+    if not path.exists():
+        return {}
+    hashes = sheet_part_hashes(path)
+    return {n: hashes[n] for n in names if n in hashes}
+
+
+# ---------- Колонки --------------------------------------------------------
+
+def _is_num(v: Any) -> bool:
+    return isinstance(v, (int, float)) and not isinstance(v, bool)
+
+
+def to_column(values: list[Any]) -> tuple[str, np.ndarray, np.ndarray]:
+    """Convert a list of cell values to ``(kind, data, null_mask)``."""
+    mask = np.array([v is None for v in values], dtype=bool)
+    present = [v for v in values if v is not None]
+    if all(_is_num(v) for v in present):
+        data = np.array([np.nan if v is None else float(v) for v in values], dtype=np.float64)
+        return KIND_NUM, data, mask
+    if all(isinstance(v, str) for v in present):
+        data = np.array(["" if v is None else v for v in values], dtype=str)
+        return KIND_STR, data, mask
+    data = np.empty(len(values), dtype=object)
+    data[:] = values
+    return KIND_OBJ, data, mask
+
+
+def from_column(kind: str, data: np.ndarray, mask: np.ndarray) -> list[Any]:
+    """Inverse of :func:`to_column`."""
+    if kind == KIND_NUM:
+        out: list[Any] = data.tolist()
+    elif kind == KIND_STR:
+        out = data.astype(object).tolist()
+    else:
+        out = list(data)
+    for i in np.flatnonzero(mask):
+        out[i] = None
+    return out
+
+
+class SheetSnapshot:
+    """Header plus typed columns of one sheet."""
+
+    def __init__(self, name: str, header: list[Any],
+                 columns: list[tuple[str, np.ndarray, np.ndarray]], nrows: int) -> None:
+        self.name = name
+        self.header = header
+        self.columns = columns
+        self.nrows = nrows
+        self._rows: list[list[Any]] | None = None
+
+    @classmethod
+    def from_values(cls, name: str, values: list[list[Any]] | None) -> "SheetSnapshot":
+        values = values or []
+        if not values:
+            return cls(name, [], [], 0)
+        header, body = list(values[0]), values[1:]
+        cols = [to_column([r[j] if j < len(r) else None for r in body])
+                for j in range(len(header))]
+        return cls(name, header, cols, len(body))
+
+    def column(self, name: str) -> np.ndarray:
+        """Return typed data array for header ``name`` (nulls as NaN/'')."""
+        for h, (_, data, _) in zip(self.header, self.columns):
+            if str(h).strip() == name:
+                return data
+        raise KeyError(name)
+
+    @property
+    def rows(self) -> list[list[Any]]:
+        if self._rows is None:
+            cols = [from_column(*c) for c in self.columns]
+            self._rows = [list(r) for r in zip(*cols)] if cols else []
+        return self._rows
+
+    # --- сериализация ------------------------------------------------------
+    def save(self, path: Path) -> None:
+        kind, hdata, hmask = to_column(self.header)
+        meta = {"version": SNAPSHOT_VERSION, "name": self.name, "nrows": self.nrows,
+                "header_kind": kind, "kinds": [c[0] for c in self.columns]}
+        arrays = {"meta": np.array(json.dumps(meta, ensure_ascii=False)),
+                  "h": hdata, "hm": hmask}
+        for j, (_, data, mask) in enumerate(self.columns):
+            arrays[f"c{j}"], arrays[f"m{j}"] = data, mask
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + ".tmp.npz")
+        np.savez_compressed(tmp, **arrays)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: Path) -> "SheetSnapshot":
+        with np.load(path, allow_pickle=True) as z:
+            meta = json.loads(str(z["meta"]))
+            if meta.get("version") != SNAPSHOT_VERSION:
+                raise ValueError("snapshot version mismatch")
+            header = from_column(meta["header_kind"], z["h"], z["hm"])
+            cols = [(k, z[f"c{j}"], z[f"m{j}"]) for j, k in enumerate(meta["kinds"])]
+        return cls(meta["name"], header, cols, meta["nrows"])
+
+
+class WorkbookSnapshot:
+    """Input sheets of one workbook state."""
+
+    def __init__(self, sheet_names: list[str]) -> None:
+        self.sheet_names = sheet_names
+        self.sheets: dict[str, SheetSnapshot] = {}
+        self.hashes: dict[str, str] = {}
+        self.cached: set[str] = set()
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.sheets
+
+    @property
+    def from_cache(self) -> bool:
+        """``True`` if every sheet was served from cache."""
+        return bool(self.sheets) and self.cached == set(self.sheets)
+
+    def read_rows(self, name: str) -> tuple[list[list[Any]], dict[str, int]]:
+        """Return ``(rows, idx)`` like ``fill_planned_indicators.read_rows``."""
+        sheet = self.sheets[name]
+        if not sheet.header or sheet.nrows == 0:
+            return [], {}
+        idx = {str(c).strip().lower(): i for i, c in enumerate(sheet.header)}
+        return sheet.rows, idx
+
+
+def _read_sheet(wb, name: str) -> SheetSnapshot:
+    values = wb.sheets[name].range(1, 1).expand("table").options(ndim=2).value
+    return SheetSnapshot.from_values(name, values)
+
+
+def _prune(folder: Path, keep: int = KEEP_CACHE_FILES) -> None:
+    files = sorted(folder.glob("sheet_*.npz"), key=lambda p: p.stat().st_mtime, reverse=True)
+    for p in files[keep:]:
+        try:
+            p.unlink()
+        except OSError:
+            pass
+
+
+def load_snapshot(wb, sheets: Iterable[str], use_cache: bool = True) -> WorkbookSnapshot:
+    """Return snapshot of ``sheets``; sheets absent from ``wb`` are skipped."""
+    snap = WorkbookSnapshot([s.name for s in wb.sheets])
+    names = [n for n in dict.fromkeys(sheets) if n in snap.sheet_names]
+    snap.hashes = _sheet_hashes(wb, names) if use_cache else {}
+    folder = cache_dir()
+    stored = False
+
+    for name in names:
+        key = snap.hashes.get(name)
+        path = folder / f"sheet_{key[:32]}.npz" if key else None
+        if path is not None and path.exists():
+            try:
+                snap.sheets[name] = SheetSnapshot.load(path)
+                snap.cached.add(name)
+                os.utime(path)             # для очистки по давности
+                continue
+            except Exception:
+                pass
+        snap.sheets[name] = _read_sheet(wb, name)
+        if path is not None:
+            try:
+                snap.sheets[name].save(path)
+                stored = True
+            except OSError:
+                pass
+
+    if stored:
+        _prune(folder)
+    return snap
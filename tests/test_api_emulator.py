@@ -0,0 +1,154 @@
+import pytest
+
+from scripts import http_client
+from scripts.api_emulator import EmulatorConfig, run_emulator
+from scripts.http_client import HttpClient, redirect_url
+
+
+@pytest.fixture
+def api(monkeypatch):
+    cfg = EmulatorConfig(wb_report_rows_per_day=30, wb_goods=25, wb_cards=25,
+                         ozon_products=25, ozon_archived=5, ozon_realization_rows=12,
+                         ozon_transactions_per_day=7)
+    with run_emulator(cfg) as server:
+        monkeypatch.setenv('FINMODEL_API_BASE', server.base_url)
+        yield server, HttpClient(budgets={}, sleep=lambda s: None)
+
+
+def test_redirect_url_keeps_path_and_query():
+    url = 'https://statistics-api.wildberries.ru/api/v5/supplier/reportDetailByPeriod?rrdid=5'
+    assert (redirect_url(url, 'http://127.0.0.1:8765/')
+            == 'http://127.0.0.1:8765/api/v5/supplier/reportDetailByPeriod?rrdid=5')
+    assert redirect_url(url, '') == url
+
+
+def test_wb_report_rrdid_paging(api):
+    server, client = api
+    url = ('https://statistics-api.wildberries.ru/api/v5/supplier/reportDetailByPeriod'
+           '?dateFrom=2025-01-01&dateTo=2025-01-02&limit=40')
+    hdr = {'Authorization': 'tok'}
+    rrd, rows = 0, []
+    while True:
+        page = client.get(f'{url}&rrdid={rrd}', headers=hdr).json()
+        if not page:
+            break
+        rows += page
+        rrd = page[-1]['rrd_id']
+    assert len(rows) == 60
+    assert len({r['rrd_id'] for r in rows}) == 60
+    assert rows == client.get(f'{url}&rrdid=0', headers=hdr).json() + \
+        client.get(f"{url}&rrdid={rows[39]['rrd_id']}", headers=hdr).json()
+    # метрики и бюджеты считаются по исходному адресу
+    assert 'https://statistics-api.wildberries.ru/api/v5/supplier/reportDetailByPeriod' \
+        in client.metrics.by_endpoint()
+
+
+def test_wb_offset_and_cursor_paging(api):
+    _, client = api
+    hdr = {'Authorization': 'tok'}
+    goods, offset = [], 0
+    while True:
+        batch = client.get('https://discounts-prices-api.wildberries.ru/api/v2/list/goods/filter'
+                           f'?limit=10&offset={offset}', headers=hdr).json()['data']['listGoods']
+        if not batch:
+            break
+        goods += batch
+        offset += len(batch)
+    assert len({g['nmID'] for g in goods}) == 25
+
+    cards, cursor = [], {'limit': 10}
+    while True:
+        data = client.post('https://content-api.wildberries.ru/content/v2/get/cards/list?locale=ru',
+                           json={'settings': {'cursor': cursor}}, headers=hdr).json()
+        cards += data['cards']
+        if data['cursor']['total'] < 10:
+            break
+        cursor = {'updatedAt': data['cursor']['updatedAt'], 'nmID': data['cursor']['nmID'],
+                  'limit': 10}
+    assert [c['nmID'] for c in cards] == [g['nmID'] for g in goods]
+
+
+def test_ozon_paging(api):
+    _, client = api
+    hdr = {'Client-Id': '42', 'Api-Key': 'key'}
+    base = 'https://api-seller.ozon.ru'
+
+    items, last_id = [], ''
+    while True:
+        res = client.post(f'{base}/v3/product/list', headers=hdr,
+                          json={'limit': 10, 'last_id': last_id}).json()['result']
+        items += res['items']
+        last_id = res['last_id']
+        if not last_id:
+            break
+    assert len(items) == res['total'] == 25
+
+    for vis, expected in (('ALL', 25), ('ARCHIVED', 5)):
+        prices, cursor = [], ''
+        while True:
+            res = client.post(f'{base}/v5/product/info/prices', headers=hdr,
+                              json={'filter': {'visibility': vis}, 'limit': 10,
+                                    'cursor': cursor}).json()
+            prices += res['items']
+            cursor = res['cursor']
+            if not cursor:
+                break
+        assert len(prices) == expected
+
+    rows = client.post(f'{base}/v2/finance/realization/', headers=hdr,
+                       json={'year': 2025, 'month': 3}).json()['result']['rows']
+    assert len(rows) == 12 and rows[0]['item']['offer_id'] == 'OZ-00000'
+
+    body = {'filter': {'date': {'from': '2025-03-01T00:00:00.000Z',
+                                'to': '2025-03-03T23:59:59.000Z'}},
+            'page': 1, 'page_size': 10}
+    res = client.post(f'{base}/v3/finance/transaction/list', headers=hdr, json=body).json()['result']
+    assert res['page_count'] == 3 and res['row_count'] == 21
+    body['page'] = 3
+    last = client.post(f'{base}/v3/finance/transaction/list', headers=hdr, json=body).json()
+    assert len(last['result']['operations']) == 1
+
+
+def test_auth_and_unknown_route(api):
+    _, client = api
+    assert client.post('https://api-seller.ozon.ru/v3/product/list', json={}).status_code == 401
+    assert client.get('https://statistics-api.wildberries.ru/nope',
+                      headers={'Authorization': 't'}).status_code == 404
+
+
+def test_rate_limit_answers_429_with_retry_after(monkeypatch):
+    with run_emulator(EmulatorConfig(rate=0.5, burst=1)) as server:
+        monkeypatch.setenv('FINMODEL_API_BASE', server.base_url)
+        slept = []
+        client = HttpClient(budgets={}, retries=0, sleep=slept.append)
+        url = 'https://discounts-prices-api.wildberries.ru/api/v2/list/goods/filter?limit=1&offset=0'
+        assert client.get(url, headers={'Authorization': 'a'}).status_code == 200
+        resp = client.get(url, headers={'Authorization': 'a'})
+        assert resp.status_code == 429 and int(resp.headers['Retry-After']) >= 1
+        # квота у каждого токена своя
+        assert client.get(url, headers={'Authorization': 'b'}).status_code == 200
+
+
+def test_data_is_deterministic():
+    from scripts.api_emulator import DataSet
+    a, b = DataSet(EmulatorConfig(seed=3)), DataSet(EmulatorConfig(seed=3))
+    assert a.wb_report_page('t', '2025-01-01', '2025-01-01', 0, 5) == \
+        b.wb_report_page('t', '2025-01-01', '2025-01-01', 0, 5)
+    assert a.wb_goods('t1', 0, 3)[0]['nmID'] != a.wb_goods('t2', 0, 3)[0]['nmID']
+
+
+def test_bench_smoke(monkeypatch):
+    from scripts.bench_importers import run_benchmarks
+
+    old = http_client._CLIENT
+    cfg = EmulatorConfig(wb_goods=15, ozon_products=15, ozon_archived=3,
+                         ozon_transactions_per_day=4)
+    results = run_benchmarks(['wb_prices', 'ozon_products', 'ozon_transactions'], cfg,
+                             orgs=2, unthrottled=True)
+    assert http_client._CLIENT is old
+    by_name = {r.name: r for r in results}
+    assert all(r.error is None for r in results)
+    assert by_name['ozon_products'].rows == 30
+    assert by_name['ozon_transactions'].rows == 2 * 31 * 4
+    assert by_name['wb_prices'].rows > 30
+    assert 4 <= by_name['wb_prices'].requests <= 2 * (1 + 4)     # + опережающие страницы
@@ -0,0 +1,56 @@
+from scripts.block_writer import BlockAppender
+
+
+class FakeRange:
+    def __init__(self, sheet, row, col):
+        self.sheet, self.row, self.col = sheet, row, col
+
+    @property
+    def value(self):
+        return None
+
+    @value.setter
+    def value(self, v):
+        self.sheet.writes.append((self.row, self.col, v))
+
+
+class FakeSheet:
+    def __init__(self):
+        self.writes = []
+
+    def range(self, row, col):
+        return FakeRange(self, row, col)
+
+
+def test_records_written_as_contiguous_blocks():
+    ws = FakeSheet()
+    app = BlockAppender(ws, 5, columns=['a', 'b'], max_block_rows=4)
+    app.extend({'a': i, 'b': f'x{i}'} for i in range(10))
+    assert app.pending == 2
+    app.close()
+
+    assert [(r, n) for r, _, v in ws.writes for n in [len(v)]] == [(5, 4), (9, 4), (13, 2)]
+    rows = [row for _, _, block in ws.writes for row in block]
+    assert rows == [[i, f'x{i}'] for i in range(10)]
+    assert app.rows == 10 and app.blocks == 3
+    assert app.last_row == 14
+
+
+def test_block_size_follows_budget():
+    ws = FakeSheet()
+    with BlockAppender(ws, 2, budget_bytes=1) as app:
+        app.extend([[1, 'a'], [2, 'b'], [3, 'c']])
+    assert [len(v) for _, _, v in ws.writes] == [1, 1, 1]
+
+    ws = FakeSheet()
+    with BlockAppender(ws, 2) as app:
+        app.extend([[i, 'a', {}] for i in range(200)])
+    assert len(ws.writes) == 1
+    assert app.last_row == 201
+
+
+def test_missing_columns_default_to_empty():
+    ws = FakeSheet()
+    with BlockAppender(ws, 2, columns=['a', 'b']) as app:
+        app.append({'b': 1})
+    assert ws.writes == [(2, 1, [['', 1]])]
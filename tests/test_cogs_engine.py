@@ -0,0 +1,173 @@
+import openpyxl
+import pandas as pd
+import pytest
+import xlwings as xw
+
+import scripts.calculate_cogs_batched as cogs_mod
+from scripts.cogs_engine import HEADER, compute_cogs, duty_rate, table_rows
+from scripts.org_settings import OrgRegistry
+from scripts.workbook_backend import open_headless
+
+PARAMS = {'cargoRatePerKg': 2, 'whiteRatePerKg': 3, 'usdRate': 90,
+          'cnyRate': 12, 'ndsRateWhite': 0.2}
+
+PROD = [
+    ['ООО А', 'ск-1', 'Кружки', 'Кружка', 1],       # кириллица ↔ латиница в артикуле
+    ['ООО А', 'SK-2', 'Кружки', 'Кружка 2', '0,5'],
+    ['ООО Б', 'SK-3', 'Ложки ', 'Ложка', None],     # тип логистики из настроек организации
+    ['ООО Б', 'NOPE', 'Ложки', 'Без цены', 2],
+]
+PRICES = [
+    ['CK-1', 10, 'USD', 'Белая'],
+    ['SK-2', 100, 'CNY', 'Карго'],
+    ['SK-2', 50, 'CNY', 'Карго'],                    # последняя строка побеждает
+    ['SK-3', '1 000', 'RUB', None],
+]
+DUTIES = [['Кружки', '10%', None], ['Ложки', None, 0.05]]
+ORGS = [['ООО А', 'Карго'], ['ООО Б', 'Белая (импорт)']]
+
+
+def _frames():
+    prod = pd.DataFrame(PROD, columns=['Организация', 'Артикул_поставщика', 'Предмет',
+                                       'Название', 'Вес_брутто'])
+    price = pd.DataFrame(PRICES, columns=['Артикул_поставщика', 'Закуп_Цена', 'Валюта',
+                                          'Тип_Логистики'])
+    duty = pd.DataFrame(DUTIES, columns=['Предмет', 'Ставка_пошлины', 'Пошлина'])
+    orgs = pd.DataFrame(ORGS, columns=['Организация', 'Тип_Логистики'])
+    return prod, price, duty, orgs
+
+
+def _expected():
+    # белая: закупка 900, пошлина 90, логистика 1·3·90 = 270, НДС 20% от 1260
+    white = [900, 270, 90, 252, 1512, 1260, 252, 1512, 1512, 1260]
+    # карго: закупка 600, логистика 0.5·2·90 = 90, без пошлины, НДС и налоговой себестоимости
+    cargo = [600, 90, 0, 0, 690, 690, 0, 690, 0, 0]
+    # белая из настроек организации, без веса; пошлина 5% из запасной колонки
+    org_white = [1000, 0, 50, 210, 1260, 1050, 210, 1260, 1260, 1050]
+    no_price = [0, 540, 0, 108, 648, 540, 108, 648, 648, 540]
+    return [PROD[0][:4] + white, PROD[1][:4] + cargo, PROD[2][:4] + org_white,
+            PROD[3][:4] + no_price]
+
+
+def test_compute_cogs_whole_columns():
+    prod, price, duty, orgs = _frames()
+    out = compute_cogs(prod, price, duty, PARAMS,
+                       OrgRegistry.from_values([list(orgs.columns)] + ORGS).logistics_modes())
+    assert list(out.columns) == HEADER
+    assert table_rows(out) == _expected()
+    assert out.attrs['missing_price'] == 1
+
+
+def _sheet(wb, name, header, rows):
+    ws = wb.create_sheet(name)
+    ws.append(header)
+    for r in rows:
+        ws.append(r)
+
+
+def _book(monkeypatch, tmp_path):
+    monkeypatch.setenv('FINMODEL_CACHE_DIR', str(tmp_path / 'cache'))
+    book = openpyxl.Workbook()
+    book.remove(book.active)
+    prod, price, duty, orgs = _frames()
+    for name, df in [(cogs_mod.SHEET_PRODUCTS, prod), (cogs_mod.SHEET_PRICES, price),
+                     (cogs_mod.SHEET_DUTIES, duty), (cogs_mod.SHEET_ORGS, orgs)]:
+        _sheet(book, name, list(df.columns), df.astype(object).where(df.notna(), None).values.tolist())
+    _sheet(book, cogs_mod.SHEET_SETTINGS, ['Параметр', 'Значение'],
+           [['Логистика_Карго_$/кг', 2], ['Логистика_Белая_$/кг', 3], ['Курс_USD', 90],
+            ['Курс_CNY', 12], ['НДС_Белая', 20]])
+    book.save(tmp_path / 'book.xlsx')
+
+    wb = open_headless(tmp_path / 'book.xlsx', tmp_path / 'out.xlsx')
+    monkeypatch.setattr(xw.Book, 'caller', staticmethod(lambda: wb))
+    return wb
+
+
+def _result(wb):
+    rows = wb.sheets[cogs_mod.SHEET_RESULT].range('A1').expand().value
+    return [[int(v) if isinstance(v, float) else v for v in r] for r in rows]
+
+
+def test_main_writes_cogs_table(monkeypatch, tmp_path):
+    wb = _book(monkeypatch, tmp_path)
+    cogs_mod.main()
+    rows = _result(wb)
+    assert rows[0] == HEADER
+    assert rows[1:] == _expected()
+    ws = wb.sheets[cogs_mod.SHEET_RESULT]
+    assert [t.name for t in ws.tables] == [cogs_mod.TABLE_NAME]
+
+
+def test_main_rewrites_only_changed_rows(monkeypatch, tmp_path):
+    wb = _book(monkeypatch, tmp_path)
+    cogs_mod.main()
+    ws = wb.sheets[cogs_mod.SHEET_RESULT]
+    writes = []
+    real_write = ws._write_block
+    monkeypatch.setattr(ws, '_write_block',
+                        lambda r, c, block: (writes.append((r, len(block))), real_write(r, c, block)))
+
+    cogs_mod.main()                                        # ничего не изменилось
+    assert writes == []
+
+    wb.sheets[cogs_mod.SHEET_PRICES].range('B5').value = '2 000'    # цена SK-3
+    cogs_mod.main()
+    assert writes == [(4, 1)]
+    assert _result(wb)[3][4:9] == [2000, 0, 100, 420, 2520]
+
+    # новый курс USD: пересчитываются все, переписываются только строки, где он участвует
+    writes.clear()
+    wb.sheets[cogs_mod.SHEET_SETTINGS].range('B4').value = 100
+    cogs_mod.main()
+    assert writes == [(2, 2), (5, 1)]          # закупка в USD и логистика по весу, строка 4 без веса
+
+    # удалённый товар: хвост очищается, таблица сжимается
+    writes.clear()
+    wb.sheets[cogs_mod.SHEET_PRODUCTS].range('A5:E5').clear_contents()
+    cogs_mod.main()
+    assert writes == []
+    assert len(_result(wb)) == 4
+    assert [t.range.shape for t in ws.tables] == [(4, len(HEADER))]
+
+    # лист результата очищен вручную — полная перезапись
+    ws.clear()
+    cogs_mod.main(full=False)
+    assert len(_result(wb)) == 4 and _result(wb)[0] == HEADER
+
+
+def test_main_repairs_rows_edited_or_not_saved(monkeypatch, tmp_path):
+    wb = _book(monkeypatch, tmp_path)
+    cogs_mod.main()
+    ws = wb.sheets[cogs_mod.SHEET_RESULT]
+    expected = _result(wb)
+    writes = []
+    real_write = ws._write_block
+
+    def run():
+        writes.clear()
+        monkeypatch.setattr(ws, '_write_block',
+                            lambda r, c, block: (writes.append((r, len(block))), real_write(r, c, block)))
+        cogs_mod.main()
+        monkeypatch.setattr(ws, '_write_block', real_write)
+
+    ws.range('I3').value = 1                     # правка внутри таблицы
+    ws.range('D5').value = 'Чужое название'
+    ws.range('F4').value = None
+    run()
+    assert writes == [(3, 3)]
+    assert _result(wb) == expected
+
+    # состояние сохранено, а книга — нет: на листе остались старые значения
+    wb.sheets[cogs_mod.SHEET_PRICES].range('B5').value = '2 000'
+    run()
+    assert writes == [(4, 1)]
+    ws.range('A4').value = expected[3]
+    run()
+    assert writes == [(4, 1)]
+    assert _result(wb)[3][4] == 2000
+
+
+@pytest.mark.parametrize('raw, rate', [('14,2%', 0.142), (14.2, 0.142), (0.1, 0.1),
+                                       ('abc', 0.0), (None, 0.0)])
+def test_duty_rate_parsing(raw, rate):
+    assert duty_rate(raw) == pytest.approx(rate)
@@ -30,3 +30,13 @@ def test_ozon_new_header_mapping():
 
     assert ct == 20
     assert ctn == 10
+
+
+def test_org_config_keeps_duplicate_headers_in_place():
+    from scripts.fill_planned_indicators import org_config
+
+    header = ['Организация', 'Комментарий', 'Комментарий', None, 'Ставка НДС', 'Token_WB']
+    rows = [['ООО А', 'x', 'y', 'z', '20', 'tokA']]
+    cfg = org_config(header, rows)
+    assert cfg['ООО А']['nds_rate'] == 20.0
+    assert cfg['ООО А']['consolidation'] is True
@@ -0,0 +1,74 @@
+import pytest
+import requests
+
+from scripts.http_client import HttpClient, endpoint_of
+
+
+class FakeResponse:
+    def __init__(self, status, body=b'{}', headers=None):
+        self.status_code = status
+        self.content = body
+        self.headers = headers or {}
+
+    def close(self):
+        pass
+
+
+class FakeSession:
+    def __init__(self, answers):
+        self.answers = list(answers)
+        self.calls = []
+
+    def request(self, method, url, timeout=None, **kwargs):
+        self.calls.append((method, url, timeout))
+        ans = self.answers.pop(0)
+        if isinstance(ans, Exception):
+            raise ans
+        return ans
+
+
+def _client(answers, **kw):
+    slept = []
+    client = HttpClient(session=FakeSession(answers), sleep=slept.append, budgets={}, **kw)
+    return client, slept
+
+
+def test_retries_with_backoff_and_retry_after():
+    client, slept = _client([
+        FakeResponse(503),
+        FakeResponse(429, headers={'Retry-After': '7'}),
+        requests.exceptions.ConnectionError('reset'),
+        FakeResponse(200, b'12345'),
+    ], backoff_base=1.0)
+    resp = client.get('https://api.example/v1/items?page=2')
+    assert resp.status_code == 200
+    assert len(slept) == 3
+    assert 0.5 <= slept[0] <= 1.0 and slept[1] == 7.0 and 2.0 <= slept[2] <= 4.0
+
+    stats = client.metrics.by_endpoint()['https://api.example/v1/items']
+    assert stats['requests'] == 1 and stats['retries'] == 3 and stats['bytes'] == 5
+
+
+def test_gives_up_after_retries():
+    client, _ = _client([FakeResponse(500)] * 3, retries=2)
+    assert client.post('https://api.example/x').status_code == 500
+
+    client, _ = _client([requests.exceptions.Timeout()] * 2, retries=1)
+    with pytest.raises(requests.exceptions.Timeout):
+        client.get('https://api.example/x')
+    assert client.metrics.by_endpoint()['https://api.example/x']['errors'] == 1
+
+
+def test_budget_is_per_endpoint_and_key():
+    client, slept = _client([FakeResponse(200)] * 4)
+    client.set_budget('https://api.example/slow', 0.5)
+    client.get('https://api.example/slow', budget_key='t1')
+    client.get('https://api.example/slow', budget_key='t2')
+    client.get('https://api.example/fast', budget_key='t1')
+    assert slept == []
+    client.get('https://api.example/slow?page=2', budget_key='t1')
+    assert len(slept) == 1 and 1.9 < slept[0] <= 2.0
+
+
+def test_endpoint_of_drops_query():
+    assert endpoint_of('https://h.ru/a/b?x=1') == 'https://h.ru/a/b'
@@ -0,0 +1,34 @@
+from scripts.import_journal import ImportJournal
+
+RUN = {'from': '2025-01-01', 'to': '2025-01-14'}
+
+
+def test_journal_roundtrip_and_torn_line(tmp_path):
+    path = tmp_path / 'j.jsonl'
+    j = ImportJournal(path, RUN)
+    assert not j.resumed
+    j.page('Org', 'a', 'b', 10, [{'Номер_отчёта': 1}], {'продажа': 2})
+    j.done('Org', 'a', 'b', 10)
+    j.page('Org', 'c', 'd', 20, [{'Номер_отчёта': 2}], {})
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('{"org": "Org", "sta')          # запись оборвалась
+
+    j = ImportJournal(path, RUN)
+    assert j.resumed and j.pages == 2
+    assert j.get('Org', 'a', 'b')['done'] and j.get('Org', 'a', 'b')['max_rrd'] == 10
+    unit = j.get('Org', 'c', 'd')
+    assert not unit['done'] and unit['rrd'] == 20
+    assert unit['pages'] == [([{'Номер_отчёта': 2}], {})]
+
+    j.clear()
+    assert not path.exists()
+
+
+def test_other_run_starts_fresh(tmp_path):
+    path = tmp_path / 'j.jsonl'
+    ImportJournal(path, RUN).page('Org', 'a', 'b', 10, [], {})
+    j = ImportJournal(path, {'from': '2025-02-01', 'to': '2025-02-28'})
+    assert not j.resumed
+    j.page('Org', 'x', 'y', 1, [], {})
+    assert ImportJournal(path, {'from': '2025-02-01', 'to': '2025-02-28'}).pages == 1
+    assert not ImportJournal(path, RUN).resumed
@@ -0,0 +1,27 @@
+import json
+
+import pytest
+
+from scripts.json_stream import iter_json_array
+
+
+def _chunks(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def test_elements_split_across_chunks():
+    items = [{'rrd_id': i, 'name': 'Футболка «ß»', 'x': [1.5, None, True]} for i in range(50)]
+    body = json.dumps(items, ensure_ascii=False).encode()
+    for size in (1, 3, 64, len(body)):
+        assert list(iter_json_array(_chunks(body, size))) == items
+
+
+def test_scalars_are_not_cut_at_chunk_boundary():
+    assert list(iter_json_array([b'[12', b'34, 5', b'6]'])) == [1234, 56]
+    assert list(iter_json_array([b' [ ] '])) == []
+
+
+@pytest.mark.parametrize('body', [b'{"a": 1}', b'null', b'[{"a": 1}', b'[1 2]'])
+def test_invalid_documents_raise(body):
+    with pytest.raises(ValueError):
+        list(iter_json_array(_chunks(body, 2)))
@@ -0,0 +1,125 @@
+from openpyxl import Workbook
+
+from scripts.key_index import SheetKeyIndex
+from scripts.workbook_backend import open_headless
+
+KEY = ['Орг', 'Номер']
+
+
+def _make_book(path, n, extra=()):
+    wb = Workbook()
+    ws = wb.active
+    ws.title = 'Факты'
+    ws.append(['Орг', 'Номер', 'Сумма'])
+    for i in range(n):
+        ws.append(['A', i, i * 10])
+    for row in extra:
+        ws.append(row)
+    wb.save(path)
+
+
+def _sync(src, tmp_path, verify=False):
+    wb = open_headless(src, tmp_path / 'out.xlsx')
+    idx = SheetKeyIndex(tmp_path / 'cache' / 'facts', KEY, lambda v: str(v).split('.')[0])
+    mode = idx.sync(wb.sheets['Факты'], verify=verify)
+    wb.close()
+    return idx, mode
+
+
+def test_index_survives_runs_and_catches_up(tmp_path):
+    src = tmp_path / 'book.xlsx'
+    _make_book(src, 5)
+    idx, mode = _sync(src, tmp_path)
+    assert mode == 'rebuild' and len(idx) == 5 and idx.rows == 5
+    assert ('A', '3') in idx and ('A', '7') not in idx
+    assert idx.add(('A', '5')) and not idx.add(('A', '5'))
+    idx.commit(6)
+
+    _make_book(src, 6)                       # строка из add() действительно записана
+    idx, mode = _sync(src, tmp_path)
+    assert mode == 'ok' and len(idx) == 6 and ('A', '5') in idx
+
+    _make_book(src, 6, extra=[['B', 1, 0], ['B', 2, 0]])
+    idx, mode = _sync(src, tmp_path)
+    assert mode == 'catch-up' and idx.rows == 8 and ('B', '2') in idx
+    idx, mode = _sync(src, tmp_path)
+    assert mode == 'ok'
+
+
+def test_mismatch_triggers_rebuild(tmp_path):
+    src = tmp_path / 'book.xlsx'
+    _make_book(src, 5)
+    idx, _ = _sync(src, tmp_path)
+    idx.add(('A', '99'))
+    idx.commit(6)                            # книгу не сохранили — строки нет
+
+    idx, mode = _sync(src, tmp_path)
+    assert mode == 'rebuild' and ('A', '99') not in idx
+
+    keys = tmp_path / 'cache' / 'facts.keys'
+    keys.write_bytes(keys.read_bytes()[:-8])  # повреждённый файл
+    idx, mode = _sync(src, tmp_path)
+    assert mode == 'rebuild' and len(idx) == 5
+
+
+def test_commit_compacts_tail(tmp_path, monkeypatch):
+    import scripts.key_index as key_index
+    monkeypatch.setattr(key_index, 'COMPACT_MIN_TAIL', 2)
+    src = tmp_path / 'book.xlsx'
+    _make_book(src, 2)
+    idx, _ = _sync(src, tmp_path)
+    for i in range(2, 10):
+        idx.add(('A', str(i)))
+    idx.commit(10)
+    assert (tmp_path / 'cache' / 'facts.keys').stat().st_size == 10 * 8
+    _make_book(src, 10)
+    idx, mode = _sync(src, tmp_path)
+    assert mode == 'ok' and len(idx) == 10
+
+
+def test_edits_in_the_middle_trigger_rebuild(tmp_path):
+    src = tmp_path / 'book.xlsx'
+    _make_book(src, 6)
+    _sync(src, tmp_path)
+
+    # строка в середине изменена, последняя строка и их число те же
+    wb = Workbook()
+    ws = wb.active
+    ws.title = 'Факты'
+    ws.append(['Орг', 'Номер', 'Сумма'])
+    for i in [0, 1, 77, 3, 4, 5]:
+        ws.append(['A', i, 0])
+    wb.save(src)
+    idx, mode = _sync(src, tmp_path)
+    assert mode == 'rebuild' and ('A', '2') not in idx and ('A', '77') in idx
+
+    # дубль, дописанный вне импортёра, учитывается в контрольной сумме листа
+    ws.append(['A', 1, 0])
+    wb.save(src)
+    idx, mode = _sync(src, tmp_path)
+    assert mode == 'catch-up' and len(idx) == 6
+    idx, mode = _sync(src, tmp_path)
+    assert mode == 'ok'
+
+
+def test_edits_above_the_tail_need_a_full_check(tmp_path, monkeypatch):
+    import scripts.key_index as key_index
+    monkeypatch.setattr(key_index, 'TAIL_ROWS', 2)
+    monkeypatch.setattr(key_index, 'VERIFY_EVERY', 3)
+    src = tmp_path / 'book.xlsx'
+    _make_book(src, 6)
+    _sync(src, tmp_path)
+
+    # строка 2 изменена выше сверяемого хвоста из двух строк
+    _make_book(src, 0, extra=[['A', i, 0] for i in [0, 77, 2, 3, 4, 5]])
+    idx, mode = _sync(src, tmp_path)
+    assert mode == 'ok' and ('A', '77') not in idx
+    idx, mode = _sync(src, tmp_path, verify=True)
+    assert mode == 'rebuild' and ('A', '77') in idx and ('A', '1') not in idx
+
+    # без verify лист сверяется целиком раз в VERIFY_EVERY запусков
+    _make_book(src, 0, extra=[['A', i, 0] for i in [0, 88, 2, 3, 4, 5]])
+    assert _sync(src, tmp_path)[1] == 'ok'
+    assert _sync(src, tmp_path)[1] == 'ok'
+    idx, mode = _sync(src, tmp_path)
+    assert mode == 'rebuild' and ('A', '88') in idx
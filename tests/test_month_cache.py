@@ -0,0 +1,26 @@
+import datetime as dt
+import gzip
+
+from scripts.month_cache import MonthCache, month_closed
+
+
+def test_month_closed_after_grace_period():
+    assert not month_closed(2025, 1, 15, today=dt.date(2025, 2, 15))
+    assert month_closed(2025, 1, 15, today=dt.date(2025, 2, 16))
+    assert month_closed(2024, 12, 0, today=dt.date(2025, 1, 1))
+    assert not month_closed(2025, 3, 15, today=dt.date(2025, 3, 31))
+
+
+def test_only_closed_months_are_served(tmp_path):
+    cache = MonthCache(tmp_path)
+    assert cache.get('123', 2025, 1) is None
+    cache.put('123', 2025, 1, [{'a': 1}], closed=True)
+    cache.put('123', 2025, 2, [{'a': 2}], closed=False)
+    assert cache.get('123', 2025, 1) == [{'a': 1}]
+    assert cache.get('123', 2025, 2) is None
+    assert cache.load('123', 2025, 2)['rows'] == [{'a': 2}]
+    assert (cache.hits, cache.misses) == (1, 2)
+
+    # повреждённый файл — просто промах
+    cache.path('123', 2025, 1).write_bytes(gzip.compress(b'{"version": 1, "ro'))
+    assert cache.get('123', 2025, 1) is None
@@ -0,0 +1,62 @@
+import datetime as dt
+
+import pytest
+
+from scripts import org_settings
+from scripts.bench_importers import build_workbook
+from scripts.org_settings import CARGO, WHITE, OrgRegistry, percent
+from scripts.workbook_backend import open_headless
+
+HEADER = ['Организация', 'Тип_Логистики', 'РежимНалого', 'Ставка НДС', 'СтавкаНалогаУСН',
+          'Консолидация', 'Token_WB', 'Client_ID', 'Token_Ozon', 'rrd_id']
+ROWS = [
+    ['ООО Белая', 'Белая (импорт)', 'Доходы', 0.2, '6%', 'да', ' wb-1 ', 123.0, 'oz-1', 5],
+    [None, 'Белая', None, None, None, None, 'lost', None, None, None],
+    ['ИП Карго', None, None, '20', None, 'нет', None, '77', None, None],
+    ['ООО Белая', 'Карго', 'ОСНО', 0, 0, None, 'wb-2', None, None, None],
+]
+
+
+def _registry():
+    return OrgRegistry.from_values([HEADER] + ROWS)
+
+
+def test_typed_fields_and_aliases():
+    reg = _registry()
+    assert len(reg) == 3                                  # строка без организации пропущена
+    white = reg['ООО Белая']                              # первая строка с именем
+    assert (white.row, white.logistics, white.tax_mode) == (2, WHITE, 'Доходы')
+    assert (white.vat_rate, white.usn_rate, white.consolidation) == (20.0, 6.0, True)
+    assert (white.token_wb, white.client_id, white.token_ozon) == ('wb-1', '123', 'oz-1')
+    assert white.get('RRD_ID') == 5
+
+    cargo = reg.get(' ИП Карго ')
+    assert (cargo.logistics, cargo.tax_mode, cargo.org_type) == (CARGO, 'ОСНО', 'ООО')
+    assert (cargo.vat_rate, cargo.consolidation, cargo.has_ozon) == (20.0, False, False)
+    assert reg.orgs[2].consolidation is None
+    assert 'ООО Нет' not in reg and reg.get('ООО Нет') is None
+
+
+def test_stage_views():
+    reg = _registry()
+    assert reg.logistics_modes() == {'ООО Белая': WHITE, 'ИП Карго': CARGO}
+    assert reg.wb_tokens() == [('ООО Белая', 'wb-1'), ('ООО Белая', 'wb-2')]
+    assert [o.client_id for o in reg.ozon_cabinets()] == ['123']
+    assert reg.has_column('client-id') and not reg.has_column('Тип_Организации')
+    meta = reg.frame(['Консолидация', 'Нет такой'])
+    assert meta.loc['ИП Карго', 'Консолидация'] == 'нет'
+    assert meta['Нет такой'].isna().all()
+
+
+@pytest.mark.parametrize('raw, rate', [(0.06, 6.0), ('6 %', 6.0), ('20,5', 20.5),
+                                       (None, 0.0), ('нет', 0.0)])
+def test_percent(raw, rate):
+    assert percent(raw) == pytest.approx(rate)
+
+
+def test_load_from_workbook(tmp_path):
+    src = build_workbook(tmp_path / 'book.xlsx', 2, dt.date(2025, 1, 1), dt.date(2025, 1, 31))
+    wb = open_headless(src, tmp_path / 'out.xlsx')
+    reg = org_settings.load(wb)
+    assert [o.name for o in reg.ozon_cabinets()] == ['ООО Тест 1', 'ООО Тест 2']
+    assert len(reg.wb_tokens()) == 2
@@ -21,3 +21,87 @@ def test_taxable_cogs_column():
     assert 'СебестоимостьПродажНалог, ₽' in df.columns
     assert 'СебестоимостьПродажНалог_без_НДС, ₽' in df.columns
     assert df.loc[0, 'СебестоимостьПродажНалог, ₽'] == 300
+
+
+def test_fee_lines_in_kopecks():
+    from decimal import Decimal
+
+    plan_df = pd.DataFrame({
+        'Организация': ['Org', 'Org', 'Org'],
+        'Артикул_поставщика': ['A1', 'A2', 'A3'],
+        'SKU': ['S1', 'S2', 'S3'],
+        'Плановая цена': [333.33, 10.0, 1e15],
+        'Мес.01': [3, 0, 0],
+        'Мес.02': [0, 2, 0],
+        'Мес.03': [0, 0, 7],          # суммы вне int64 в копейках считаются точно
+    })
+    cost_df = pd.DataFrame({
+        'Организация': ['Org', 'Org', 'Org'],
+        'Артикул_поставщика': ['A1', 'A1', 'A3'],
+        'Себестоимость_руб': [100, 999, 1],    # первая строка ключа побеждает
+        'Себестоимость_без_НДС_руб': [80, 999, 1],
+        'СебестоимостьНалог': [121, 999, 1],
+    })
+    settings = {
+        'Вознаграждение Озон': Decimal('0.15'),
+        'Баллы за скидки': Decimal('0.2'),      # больше 99 % вознаграждения
+        'Реклама': Decimal('0.0333'),
+    }
+    df = compute_ozon_economics_df(plan_df, cost_df, settings)
+    assert df['Месяц'].tolist() == [1, 2, 3]
+
+    a1 = df.iloc[0]
+    assert a1['ВыручкаБезСкидок_руб'] == 999.99
+    assert a1['БаллыСкидки_руб'] == 200.0         # 199,998
+    assert a1['Выручка_руб'] == 799.99             # 799,992
+    assert a1['БазовоеВознаграждение_руб'] == 150.0
+    assert a1['ВознаграждениеПослСкидок_руб'] == 1.5   # 1 % от 149,9985
+    assert a1['Реклама_руб'] == 33.3               # 33,2997
+    assert a1['ИтогоРасходыМП_руб'] == 34.8        # 34,79967 — одно округление
+    assert a1['СебестоимостьПродаж_руб'] == 300
+    assert a1['СебестоимостьПродажНалог, ₽'] == 363
+    assert a1['СебестоимостьПродажНалог_без_НДС, ₽'] == 302.5
+    assert a1['ВаловаяПрибыль_Упр'] == 799.99      # нет СебестоимостьУпр
+
+    a2, a3 = df.iloc[1], df.iloc[2]
+    assert a2['СебестоимостьПродаж_руб'] == 0      # нет себестоимости
+    assert a3['ВыручкаБезСкидок_руб'] == 7e15
+    assert a3['Реклама_руб'] == 2.331e14
+
+
+def test_sub_kopeck_prices_rounded_once():
+    from decimal import Decimal, ROUND_HALF_UP
+
+    prices, costs, qty = [333.333, 100.004, 1999.995], [0.005, 33.3333, 10.0049], [3, 3, 1]
+    plan_df = pd.DataFrame({
+        'Организация': ['Org'] * 3,
+        'Артикул_поставщика': ['A1', 'A2', 'A3'],
+        'SKU': ['S1', 'S2', 'S3'],
+        'Плановая цена': prices,
+        'Мес.01': qty,
+    })
+    cost_df = pd.DataFrame({
+        'Организация': ['Org'] * 3,
+        'Артикул_поставщика': ['A1', 'A2', 'A3'],
+        'Себестоимость_руб': costs,
+        'Себестоимость_без_НДС_руб': costs,
+        'СебестоимостьУпр': costs,
+    })
+    settings = {'Баллы за скидки': Decimal('0.1'), 'Реклама': Decimal('0.0333')}
+    df = compute_ozon_economics_df(plan_df, cost_df, settings)
+
+    def kop(d):
+        return float(d.quantize(Decimal('0.01'), ROUND_HALF_UP))
+
+    for i, (p, c, q) in enumerate(zip(prices, costs, qty)):
+        sales = Decimal(str(p)) * q                  # как в старом цикле на Decimal
+        cogs = Decimal(str(c)) * q
+        revenue = sales - sales * Decimal('0.1')
+        row = df.iloc[i]
+        assert row['ВыручкаБезСкидок_руб'] == kop(sales)
+        assert row['Реклама_руб'] == kop(sales * Decimal('0.0333'))
+        assert row['Выручка_руб'] == kop(revenue)
+        assert row['СебестоимостьПродаж_руб'] == kop(cogs)
+        assert row['ВаловаяПрибыль_Упр'] == kop(revenue - cogs)
+
+    assert df['ВыручкаБезСкидок_руб'].tolist() == [1000.0, 300.01, 2000.0]
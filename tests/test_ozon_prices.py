@@ -0,0 +1,105 @@
+import json
+import threading
+
+import xlwings as xw
+from openpyxl import Workbook
+
+import scripts.http_client as http_client
+import scripts.import_ozon_price_info as prices
+from scripts.api_emulator import DataSet, EmulatorConfig
+from scripts.workbook_backend import open_headless
+
+
+class FakeResponse:
+    def __init__(self, status, data=None):
+        self.status_code = status
+        self.headers = {}
+        self.content = json.dumps(data).encode()
+        self.text = self.content.decode()
+
+    def json(self):
+        return json.loads(self.content)
+
+    def close(self):
+        pass
+
+
+class FakeSession:
+    def __init__(self, post):
+        self.post = post
+
+    def request(self, method, url, headers=None, json=None, timeout=None, **kwargs):
+        return self.post(headers, json)
+
+
+def _item(offer, price):
+    return {'offer_id': offer, 'product_id': 1, 'price': {'price': price},
+            'commissions': {'acquiring': 1.5}, 'marketing_actions': None}
+
+
+def _run(tmp_path, monkeypatch, post):
+    src = tmp_path / 'book.xlsx'
+    wb = Workbook()
+    ws = wb.active
+    ws.title = 'НастройкиОрганизаций'
+    ws.append(['Организация', 'Client-Id', 'Token_Ozon'])
+    ws.append(['Альфа', 11, 'kA'])
+    ws.append(['Бета', 22, 'kB'])
+    ws = wb.create_sheet(prices.SHEET_PRICES)
+    ws.append(['старые цены'])
+    wb.save(src)
+    client = http_client.HttpClient(session=FakeSession(post), sleep=lambda s: None, budgets={})
+    monkeypatch.setattr(http_client, '_CLIENT', client)
+    book = open_headless(src, tmp_path / 'out.xlsx')
+    monkeypatch.setattr(xw.Book, 'caller', staticmethod(lambda: book))
+    sheet = book.sheets[prices.SHEET_PRICES]
+    writes = []
+    real_write = sheet._write_block
+    monkeypatch.setattr(sheet, '_write_block',
+                        lambda r, c, block: (writes.append((r, len(block))), real_write(r, c, block)))
+    prices.main()
+    return sheet, writes
+
+
+def test_price_row_matches_headers():
+    item = DataSet(EmulatorConfig()).ozon_price('1', 7)
+    row = prices.price_row(item)
+    assert len(row) == len(prices.OUTPUT_HEADERS)
+    by_name = dict(zip(prices.OUTPUT_HEADERS, row))
+    assert by_name['Артикул'] == item['offer_id']
+    assert by_name['FBS: возвраты'] == item['commissions']['fbs_return_flow_amount']
+    assert by_name['Итоговая цена'] == item['price']['price']
+    assert prices.price_row({})[:3] == ['', '', None]
+
+
+def test_all_crawls_concurrent_dedup_single_write(tmp_path, monkeypatch):
+    catalogue = {('11', 'ALL'): [[_item('A', 100)], [_item('B', 200)]],
+                 ('11', 'ARCHIVED'): [[_item('B', 999), _item('C', 300)]],
+                 ('22', 'ALL'): [[_item('A', 150)]],
+                 ('22', 'ARCHIVED'): [[]]}
+    barrier = threading.Barrier(4, timeout=5)
+
+    def post(headers, body):
+        pages = catalogue[(headers['Client-Id'], body['filter']['visibility'])]
+        n = int(body.get('cursor') or 0)
+        if n == 0:
+            barrier.wait()                  # первые страницы всех выгрузок — одновременно
+        return FakeResponse(200, {'items': pages[n],
+                                  'cursor': str(n + 1) if n + 1 < len(pages) else ''})
+
+    sheet, writes = _run(tmp_path, monkeypatch, post)
+    rows = sheet.range('A1').expand().value
+    assert rows[0] == prices.OUTPUT_HEADERS
+    assert [(r[0], r[22]) for r in rows[1:]] == [('A', 100), ('B', 200), ('C', 300), ('A', 150)]
+    assert writes == [(1, 5)]
+
+
+def test_failed_crawl_keeps_sheet(tmp_path, monkeypatch):
+    def post(headers, body):
+        if headers['Client-Id'] == '22' and body['filter']['visibility'] == 'ARCHIVED':
+            return FakeResponse(403, {'message': 'forbidden'})
+        return FakeResponse(200, {'items': [_item('A', 1)], 'cursor': ''})
+
+    sheet, writes = _run(tmp_path, monkeypatch, post)
+    assert writes == []
+    assert sheet.range('A1').value == 'старые цены'
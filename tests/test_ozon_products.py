@@ -0,0 +1,89 @@
+import json
+import threading
+
+import xlwings as xw
+from openpyxl import Workbook
+
+import scripts.http_client as http_client
+import scripts.import_ozon_products as prod
+from scripts.row_upsert import plan_upsert, row_hash
+from scripts.workbook_backend import open_headless
+
+
+class FakeResponse:
+    def __init__(self, status, data=None):
+        self.status_code = status
+        self.headers = {}
+        self.content = json.dumps(data).encode()
+        self.text = self.content.decode()
+
+    def json(self):
+        return json.loads(self.content)
+
+    def close(self):
+        pass
+
+
+class FakeSession:
+    def __init__(self, post):
+        self.post = post
+
+    def request(self, method, url, headers=None, json=None, timeout=None, **kwargs):
+        return self.post(headers, json)
+
+
+def test_plan_upsert_ignores_excel_number_format():
+    existing = {('A', '1'): (2, row_hash([900001.0, 'n'])), ('A', '2'): (3, row_hash([900002, 'x']))}
+    plan = plan_upsert(existing, {('A', '1'): [900001, 'n'], ('A', '2'): [900002, 'y'],
+                                  ('A', '3'): [900003, 'z']})
+    assert (plan.updates, plan.appends, plan.unchanged) == ({3: ('A', '2')}, [('A', '3')], 1)
+
+
+def test_only_changed_rows_written_cabinets_in_parallel(tmp_path, monkeypatch):
+    src = tmp_path / 'book.xlsx'
+    wb = Workbook()
+    ws = wb.active
+    ws.title = 'НастройкиОрганизаций'
+    ws.append(['Организация', 'Client-Id', 'Token_Ozon'])
+    ws.append(['Альфа', '11', 'kA'])
+    ws.append(['Бета', '22', 'kB'])
+    ws = wb.create_sheet('Номенклатура_WB')
+    ws.append(prod.HEADERS)
+    ws.append(['Альфа', '555', 'WB-1', 'Бренд', 'WB товар', 'Футболки', 1, 2, 3, 4, 5])
+    ws.append(['Альфа', 900001, 'OZ-1', 'Свой бренд', 'старое', '', '', '', '', '', ''])
+    ws.append(['Бета', 900002, 'OZ-2', '', 'тот же', '', '', '', '', '', ''])
+    wb.save(src)
+
+    catalogue = {'11': [{'product_id': 900001, 'offer_id': 'OZ-1', 'name': 'новое'},
+                        {'product_id': 900003, 'offer_id': 'OZ-3', 'name': 'новый'}],
+                 '22': [{'product_id': 900002, 'offer_id': 'OZ-2', 'name': 'тот же'}]}
+    barrier = threading.Barrier(2, timeout=5)
+
+    def post(headers, body):
+        barrier.wait()                      # оба кабинета должны запрашиваться одновременно
+        return FakeResponse(200, {'result': {'items': catalogue[headers['Client-Id']],
+                                             'last_id': ''}})
+
+    client = http_client.HttpClient(session=FakeSession(post), sleep=lambda s: None, budgets={})
+    monkeypatch.setattr(http_client, '_CLIENT', client)
+    book = open_headless(src, tmp_path / 'out.xlsx')
+    monkeypatch.setattr(xw.Book, 'caller', staticmethod(lambda: book))
+    sheet = book.sheets[prod.PRODUCTS_SHEET]
+    before = [list(r) for r in sheet.grid]
+    writes = []
+    real_write = sheet._write_block
+    monkeypatch.setattr(sheet, '_write_block',
+                        lambda r, c, block: (writes.append((r, len(block))), real_write(r, c, block)))
+
+    prod.main()
+    rows = sheet.range('A1').expand().value
+    assert rows[1] == before[1]
+    assert rows[2][1:5] == [900001, 'OZ-1', 'Свой бренд', 'новое']
+    assert rows[3] == before[3]
+    assert rows[4][:5] == ['Альфа', 900003, 'OZ-3', None, 'новый']
+    assert writes == [(3, 1), (5, 1)]
+
+    writes.clear()
+    prod.main()
+    assert writes == []
+    assert sheet.range('A1').expand().value == rows
@@ -0,0 +1,169 @@
+import datetime as dt
+import json
+import threading
+import time
+
+import pytest
+import xlwings as xw
+from openpyxl import Workbook
+
+import scripts.http_client as http_client
+import scripts.import_ozon_realization_grouped as real
+from scripts.workbook_backend import open_headless
+
+
+class FakeResponse:
+    def __init__(self, status, data=None):
+        self.status_code = status
+        self.headers = {}
+        self.content = json.dumps(data).encode()
+
+    def json(self):
+        return json.loads(self.content)
+
+    def close(self):
+        pass
+
+
+class FakeSession:
+    def __init__(self, post):
+        self.post = post
+
+    def request(self, method, url, headers=None, json=None, timeout=None, **kwargs):
+        return self.post(headers, json)
+
+
+def _row(offer, qty, price=100.0, ret=None):
+    block = lambda q: {'amount': price * q, 'bonus': 1.0, 'commission': 10.0 * q,
+                       'compensation': 0, 'price_per_instance': price, 'quantity': q,
+                       'standard_fee': 12.0 * q, 'bank_coinvestment': 0.5, 'stars': 0,
+                       'pick_up_point_coinvestment': 0, 'total': 80.0 * q}
+    return {'item': {'offer_id': offer, 'sku': 1, 'barcode': 'b', 'name': 'n'},
+            'delivery_commission': block(qty), 'return_commission': block(ret) if ret else None,
+            'seller_price_per_instance': price, 'commission_ratio': 0.1}
+
+
+def _book(path, orgs, start=dt.datetime(2024, 1, 1), end=dt.datetime(2024, 3, 31)):
+    wb = Workbook()
+    ws = wb.active
+    ws.title = 'Настройки'
+    ws.append(['Параметр', 'Значение'])
+    ws.append(['ПериодНачало', start])
+    ws.append(['ПериодКонец', end])
+    ws = wb.create_sheet('НастройкиОрганизаций')
+    ws.append(['Организация', 'Client-Id', 'Token_Ozon'])
+    for org in orgs:
+        ws.append(org)
+    wb.save(path)
+
+
+def _run(monkeypatch, tmp_path, src, post):
+    client = http_client.HttpClient(session=FakeSession(post), sleep=lambda s: None, budgets={})
+    monkeypatch.setattr(http_client, '_CLIENT', client)
+    wb = open_headless(src, tmp_path / 'out.xlsx')
+    monkeypatch.setattr(xw.Book, 'caller', staticmethod(lambda: wb))
+    real.main()
+    rows = wb.sheets[real.SHEET_NAME].range('A1').expand().value
+    wb.close()
+    return rows
+
+
+def test_closed_months_come_from_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv('FINMODEL_CACHE_DIR', str(tmp_path / 'cache'))
+    src = tmp_path / 'book.xlsx'
+    _book(src, [['Альфа', '11', 'kA']])
+    calls = []
+    lock = threading.Lock()
+
+    def post(headers, body):
+        with lock:
+            calls.append((headers['Client-Id'], body['year'], body['month']))
+        return FakeResponse(200, {'result': {'rows': [_row('A-1', body['month'])]}})
+
+    rows = _run(monkeypatch, tmp_path, src, post)
+    assert rows[0] == real.OUTPUT_HEADERS
+    assert [(r[2], r[14]) for r in rows[1:]] == [(1, 1), (2, 2), (3, 3)]
+    assert len(calls) == 3
+
+    calls.clear()
+    assert _run(monkeypatch, tmp_path, src, post) == rows
+    assert calls == []
+
+
+def test_failed_and_open_months_are_refetched(tmp_path, monkeypatch):
+    monkeypatch.setenv('FINMODEL_CACHE_DIR', str(tmp_path / 'cache'))
+    src = tmp_path / 'book.xlsx'
+    _book(src, [['Альфа', '11', 'kA']], end=dt.datetime(2024, 2, 29))
+    monkeypatch.setattr(real, 'month_closed', lambda y, m, grace: m == 1)
+    calls, failing = [], {1}
+
+    def post(headers, body):
+        calls.append(body['month'])
+        if body['month'] in failing:
+            return FakeResponse(500)
+        return FakeResponse(200, {'result': {'rows': [_row('A-1', 1)]}})
+
+    rows = _run(monkeypatch, tmp_path, src, post)
+    assert [r[2] for r in rows[1:]] == [2]
+    # январь: ошибка не кэшируется; февраль открыт и запрашивается каждый раз
+    calls.clear()
+    failing.clear()
+    _run(monkeypatch, tmp_path, src, post)
+    _run(monkeypatch, tmp_path, src, post)
+    assert calls == [1, 2, 2]
+
+
+def test_months_fetched_concurrently_and_merged_in_order(tmp_path, monkeypatch):
+    monkeypatch.setenv('FINMODEL_CACHE_DIR', str(tmp_path / 'cache'))
+    src = tmp_path / 'book.xlsx'
+    _book(src, [['Бета', '22', 'kB'], ['Альфа', '11', 'kA']])
+    lock = threading.Lock()
+    active, peak, threads = [0], [0], set()
+
+    def post(headers, body):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+            threads.add(threading.current_thread().name)
+        time.sleep(0.05 * (4 - body['month']))        # поздние месяцы отвечают раньше
+        with lock:
+            active[0] -= 1
+        return FakeResponse(200, {'result': {'rows': [_row(headers['Client-Id'], body['month'])]}})
+
+    rows = _run(monkeypatch, tmp_path, src, post)
+    assert [(r[0], r[2]) for r in rows[1:]] == [
+        ('Бета', 1), ('Бета', 2), ('Бета', 3), ('Альфа', 1), ('Альфа', 2), ('Альфа', 3)]
+    assert peak[0] > 1
+    assert all(t.startswith('ozon_realization') for t in threads)
+
+
+def test_accumulator_sums_and_derived_columns():
+    acc = real.RealizationAccumulator()
+    acc.add_rows('Альфа', 2024, 1, [_row('A-1', 2), _row(' A-1 ', 1, ret=1), _row('B-2', 1)])
+    acc.add_rows('Альфа', 2024, 1, [{'item': {'offer_id': 'C'}, 'delivery_commission': None}])
+    assert (len(acc), acc.rows) == (3, 4)
+
+    df = acc.frame()
+    assert list(df.columns) == real.OUTPUT_HEADERS
+    a = df.iloc[0]
+    assert a['Артикул_поставщика'] == 'A-1'
+    assert a['Дост: кол-во'] == 3 and a['Возв: кол-во'] == 1 and a['Продано шт.'] == 2
+    assert a['Сумма продаж ед.'] == 300 and a['Сумма коэфф. комиссий'] == pytest.approx(0.1)
+    assert a['Всего выплат от партнёров'] == 0.5 + 0.5 - 0.5
+    assert a['Реализовано (руб)'] == 300 - 100 + 0.5
+    assert a['Базовое вознаграждение Ozon'] == 36 - 12
+    assert a['Вознаграждение после скидок'] == (36 - 12) - (2 - 1)
+    c = df.iloc[2]
+    assert c['Сумма коэфф. комиссий'] == 0 and c['Вознаграждение после скидок'] == 0
+
+
+def test_accumulator_buffer_grows_with_groups_not_rows(monkeypatch):
+    monkeypatch.setattr(real.RealizationAccumulator, 'INITIAL_CAPACITY', 2)
+    acc = real.RealizationAccumulator()
+    for page in range(50):                       # одни и те же 5 групп на каждой странице
+        acc.add_rows('Альфа', 2024, 1, [_row(f'A-{i}', 1) for i in range(5)])
+    assert (len(acc), acc.rows) == (5, 250)
+    assert acc._sums.shape == (8, len(real.BLOCK_FIELDS) * 2 + 3)
+    df = acc.frame()
+    assert df['Дост: кол-во'].tolist() == [50] * 5
+    assert df['Сумма продаж ед.'].tolist() == [5000] * 5
@@ -0,0 +1,119 @@
+import datetime as dt
+
+import pytest
+import xlwings as xw
+
+import scripts.http_client as http_client
+import scripts.trans as trans
+from scripts.api_emulator import EmulatorConfig, run_emulator
+from scripts.bench_importers import build_workbook
+from scripts.transaction_store import TransactionStore
+from scripts.workbook_backend import open_headless
+
+PATH = '/v3/finance/transaction/list'
+
+
+@pytest.fixture
+def api(monkeypatch, tmp_path):
+    monkeypatch.setenv('FINMODEL_CACHE_DIR', str(tmp_path / 'cache'))
+    monkeypatch.setenv(trans.TARGET_ENV, str(tmp_path / 'Ozon_Transactions.xlsx'))
+    monkeypatch.setattr(trans, 'PAGE_SIZE', 10)
+    with run_emulator(EmulatorConfig(ozon_transactions_per_day=7)) as server:
+        monkeypatch.setenv('FINMODEL_API_BASE', server.base_url)
+        monkeypatch.setattr(http_client, '_CLIENT',
+                            http_client.HttpClient(budgets={}, sleep=lambda s: None))
+        yield server
+
+
+def _book(monkeypatch, tmp_path, date_from, date_to):
+    src = build_workbook(tmp_path / 'book.xlsx', 2, date_from, date_to)
+    wb = open_headless(src, tmp_path / 'out.xlsx')
+    monkeypatch.setattr(xw.Book, 'caller', staticmethod(lambda: wb))
+    return wb
+
+
+def _target():
+    return open_headless(trans.target_path(), trans.target_path())
+
+
+def _sheet(wb):
+    target = _target()
+    try:
+        return target.sheets[trans.SHEET_NAME].range('A1').expand().value
+    finally:
+        target.close()
+
+
+def test_split_windows_by_calendar_month():
+    assert trans.split_windows(dt.date(2025, 1, 20), dt.date(2025, 3, 5)) == [
+        (dt.date(2025, 1, 20), dt.date(2025, 1, 31)),
+        (dt.date(2025, 2, 1), dt.date(2025, 2, 28)),
+        (dt.date(2025, 3, 1), dt.date(2025, 3, 5)),
+    ]
+    assert trans.split_windows(dt.date(2024, 12, 1), dt.date(2024, 12, 31)) == [
+        (dt.date(2024, 12, 1), dt.date(2024, 12, 31))]
+
+
+def test_all_cabinets_paged_then_closed_windows_skipped(api, monkeypatch, tmp_path):
+    wb = _book(monkeypatch, tmp_path, dt.date(2025, 1, 1), dt.date(2025, 2, 10))
+    trans.main()
+    rows = _sheet(wb)
+    assert rows[0] == trans.HEADERS
+    per_org = (31 + 10) * 7
+    assert len(rows) - 1 == 2 * per_org
+    assert [r[0] for r in rows[1:]] == ['ООО Тест 1'] * per_org + ['ООО Тест 2'] * per_org
+    dates = [r[3] for r in rows[1:per_org + 1]]
+    assert dates == sorted(dates)                       # страницы в порядке, несмотря на параллельность
+    assert len({(r[0], r[1]) for r in rows[1:]}) == 2 * per_org
+    # 22 + 7 страниц на кабинет
+    assert api.hits[PATH] == 2 * (22 + 7)
+
+    # окна закрыты и загружены полностью — повторный запуск ничего не запрашивает
+    trans.main()
+    assert api.hits[PATH] == 2 * (22 + 7)
+    assert _sheet(wb) == rows
+
+    # хвост листа удалён — лист восстанавливается из хранилища без API
+    target = _target()
+    target.sheets[trans.SHEET_NAME].range('A500:O600').clear_contents()
+    target.save()
+    target.close()
+    trans.main()
+    assert api.hits[PATH] == 2 * (22 + 7)
+    assert _sheet(wb) == rows
+
+
+def test_model_workbook_untouched_and_no_cabinets_returns(api, monkeypatch, tmp_path):
+    wb = _book(monkeypatch, tmp_path, dt.date(2025, 1, 1), dt.date(2025, 1, 5))
+    trans.main()
+    assert trans.SHEET_NAME not in wb.sheets
+    assert len(_sheet(wb)) - 1 == 2 * 5 * 7
+
+    wb.sheets[trans.ORG_SHEET].range('C2:D3').clear_contents()      # нет Client-Id
+    hits = api.hits[PATH]
+    trans.main()
+    assert api.hits[PATH] == hits
+
+
+def test_open_window_refetched_only_new_rows_appended(api, monkeypatch, tmp_path):
+    today = dt.date.today()
+    wb = _book(monkeypatch, tmp_path, today.replace(day=1), today)
+    trans.main()
+    rows = _sheet(wb)
+    first = api.hits[PATH]
+    trans.main()
+    assert api.hits[PATH] == 2 * first
+    assert _sheet(wb) == rows
+
+
+def test_store_keeps_first_copy_of_each_operation(tmp_path):
+    with TransactionStore(tmp_path / 'tr.sqlite') as store:
+        assert store.append('1', [(10, ['a', 10]), (11, ['a', 11])]) == [['a', 10], ['a', 11]]
+        assert store.append('1', [(11, ['b', 11]), (12, ['b', 12])]) == [['b', 12]]
+        assert store.append('2', [(11, ['c', 11])]) == [['c', 11]]
+        assert list(store.rows(2)) == [['b', 12], ['c', 11]]
+        assert store.operation_at(0) == '10' and store.operation_at(9) is None
+        store.mark_window('1', '2025-01-01', '2025-01-31', 2, closed=False)
+        assert not store.window_done('1', '2025-01-01', '2025-01-31')
+        store.mark_window('1', '2025-01-01', '2025-01-31', 3, closed=True)
+        assert store.window_done('1', '2025-01-01', '2025-01-31')
@@ -0,0 +1,55 @@
+import threading
+import time
+
+import pytest
+
+from scripts.paging import prefetch_pages
+
+
+def test_pages_in_order_and_stop_on_empty():
+    calls = []
+    lock = threading.Lock()
+
+    def fetch(offset):
+        with lock:
+            calls.append(offset)
+        time.sleep(0.01 * ((offset // 10) % 3))    # ответы приходят вразнобой
+        return list(range(offset, offset + 10)) if offset < 50 else []
+
+    pages = list(prefetch_pages(fetch, 10, depth=4))
+    assert [o for o, _ in pages] == [0, 10, 20, 30, 40, 50]
+    assert [x for _, p in pages for x in p] == list(range(50))
+    # запросов за концом не больше глубины опережения
+    assert max(calls) <= 50 + 3 * 10
+
+
+def test_requests_overlap():
+    active, peak = [0], [0]
+    lock = threading.Lock()
+
+    def fetch(offset):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.02)
+        with lock:
+            active[0] -= 1
+        return [offset] if offset < 80 else []
+
+    assert len(list(prefetch_pages(fetch, 10, depth=4))) == 9
+    assert peak[0] > 1
+
+
+def test_failed_page_and_errors():
+    pages = list(prefetch_pages(lambda o: None if o == 20 else [o], 10, depth=3))
+    assert pages == [(0, [0]), (10, [10]), (20, None)]
+
+    def boom(offset):
+        if offset == 10:
+            raise RuntimeError('boom')
+        return [offset]
+
+    it = prefetch_pages(boom, 10, depth=2)
+    assert next(it) == (0, [0])
+    with pytest.raises(RuntimeError):
+        next(it)
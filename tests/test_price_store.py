@@ -0,0 +1,67 @@
+import random
+
+from scripts.price_store import PriceStore, diff_prices, norm_key, plan_rows, row_blocks
+
+
+def _old(n):
+    return {('o', str(i), '1'): (i + 2, ('v', 'M', 100.0 + i, 90.0, 80.0)) for i in range(n)}
+
+
+def test_diff_and_plan_reuse_rows():
+    old = _old(5)
+    fresh = {k: v for k, (_, v) in old.items()}
+    fresh[('o', '1', '1')] = ('v', 'M', 999.0, 90.0, 80.0)     # цена изменилась
+    del fresh[('o', '2', '1')]                                 # снят с продажи
+    del fresh[('o', '3', '1')]
+    fresh[('o', 'new', '1')] = ('n', 'L', 1.0, 1.0, 1.0)
+
+    delta = diff_prices(old, fresh)
+    assert list(delta.changed) == [('o', '1', '1')]
+    assert list(delta.new) == [('o', 'new', '1')]
+    assert sorted(delta.removed) == [('o', '2', '1'), ('o', '3', '1')]
+    assert delta.unchanged == 2
+
+    writes, last, rows = plan_rows(old, delta)
+    # новая строка встаёт на место удалённой, последняя строка — во вторую дыру
+    assert writes == {3: ('o', '1', '1'), 4: ('o', 'new', '1'), 5: ('o', '4', '1')}
+    assert last == 5
+    assert sorted(rows.values()) == [2, 3, 4, 5]
+    assert row_blocks(writes) == [(3, 5)]
+
+
+def test_plan_keeps_sheet_contiguous():
+    rnd = random.Random(7)
+    for _ in range(500):
+        old = _old(rnd.randint(0, 15))
+        fresh = {k: (v[0], v[1], v[2] + (rnd.random() < 0.2), v[3], v[4])
+                 for k, (_, v) in old.items() if rnd.random() < 0.7}
+        for j in range(rnd.randint(0, 6)):
+            fresh[('o', f'n{j}', '1')] = ('n', 'S', 1.0, 1.0, 1.0)
+        delta = diff_prices(old, fresh)
+        writes, last, rows = plan_rows(old, delta)
+
+        sheet = {r: k for k, (r, _) in old.items()}
+        sheet.update(writes)
+        assert set(rows) == set(fresh)
+        assert sorted(rows.values()) == list(range(2, last + 1))
+        assert all(sheet[r] == k for k, r in rows.items())
+
+
+def test_store_changed_since(tmp_path):
+    key = norm_key('Org', 123.0, '7')
+    assert key == ('Org', '123', '7')
+    with PriceStore(tmp_path / 'p.sqlite') as store:
+        d1 = diff_prices({}, {key: ('v', 'M', 10.0, 9.0, 8.0)})
+        store.apply(d1, {key: 2}, stamp='2025-01-01T00:00:00')
+        assert store.snapshot() == {key: (2, ('v', 'M', 10.0, 9.0, 8.0))}
+
+        d2 = diff_prices(store.snapshot(), {key: ('v', 'M', 10.0, 9.0, 8.0)})
+        assert not d2
+        store.apply(d2, {key: 2}, stamp='2025-01-02T00:00:00')
+        assert store.changed_since('2025-01-02') == []
+
+        d3 = diff_prices(store.snapshot(), {})
+        store.apply(d3, {}, stamp='2025-01-03T00:00:00')
+        assert store.snapshot() == {}
+        changed = store.changed_since('2025-01-02', org='Org')
+        assert [(c['nm_id'], c['removed']) for c in changed] == [('123', 1)]
@@ -0,0 +1,43 @@
+from scripts.rate_limit import RateLimiter, TokenBucket, parse_retry_after
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.slept = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, s):
+        self.slept.append(s)
+        self.now += s
+
+
+def test_bucket_spaces_requests():
+    clock = FakeClock()
+    b = TokenBucket(2.0, clock=clock, sleep=clock.sleep)
+    for _ in range(3):
+        b.acquire()
+    assert clock.slept == [0.5, 0.5]
+
+
+def test_penalize_honours_retry_after():
+    clock = FakeClock()
+    b = TokenBucket(1.0, clock=clock, sleep=clock.sleep)
+    b.acquire()
+    b.penalize(parse_retry_after('30', 60))
+    b.acquire()
+    assert clock.now == 30.0
+    assert parse_retry_after(None, 60) == 60
+    assert parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT', 60) == 60
+
+
+def test_limiter_keeps_tokens_independent():
+    clock = FakeClock()
+    lim = RateLimiter(1.0, clock=clock, sleep=clock.sleep)
+    assert lim.bucket('a') is lim.bucket('a')
+    lim.bucket('a').acquire()
+    lim.bucket('a').penalize(100)
+    lim.bucket('b').acquire()
+    assert clock.slept == []
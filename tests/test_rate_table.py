@@ -0,0 +1,55 @@
+import datetime as dt
+
+import pandas as pd
+
+from scripts.cogs_engine import compute_cogs, table_rows
+from scripts.rate_table import RateTable, to_date
+
+DEFAULTS = {'usdRate': 90.0, 'cnyRate': 12.0, 'cargoRatePerKg': 2.0, 'whiteRatePerKg': 3.0}
+VALUES = [
+    ['Дата', 'Курс_USD', 'Курс_CNY', 'Логистика_Карго_$/кг', 'Комментарий'],
+    ['01.03.2025', 100, '14,5', None, 'март'],
+    [dt.datetime(2025, 1, 1), 80, None, 1.5, None],
+    ['15.01.2025', None, 13, '', None],
+    [None, 1000, None, None, 'без даты — пропускается'],
+]
+
+
+def _on(*days):
+    return pd.DatetimeIndex([to_date(d) for d in days]).to_numpy(dtype='datetime64[ns]')
+
+
+def test_lookup_as_of_dates():
+    rates = RateTable.from_values(VALUES)
+    assert len(rates) == 5
+    on = _on('31.12.2024', '01.01.2025', '20.02.2025', '01.03.2025', None)
+    assert rates.lookup('usdRate', on, DEFAULTS).tolist() == [90, 80, 80, 100, 90]
+    assert rates.lookup('cnyRate', on, DEFAULTS).tolist() == [12, 12, 13, 14.5, 12]
+    # тариф белой логистики в таблице не задан
+    keys = ['cargoRatePerKg', 'whiteRatePerKg', '', 'cargoRatePerKg', '']
+    assert rates.lookup(keys, on, DEFAULTS).tolist() == [2, 3, 1, 1.5, 1]
+
+
+def test_empty_table_and_digest():
+    empty = RateTable.from_values([['Параметр', 'Значение']])
+    assert len(empty) == 0
+    assert empty.lookup('usdRate', _on('01.01.2025'), DEFAULTS).tolist() == [90]
+    assert RateTable.from_values(VALUES).digest() == RateTable.from_values(VALUES).digest()
+    assert RateTable.from_values(VALUES[:3]).digest() != RateTable.from_values(VALUES).digest()
+
+
+def test_cogs_per_batch_date():
+    prod = pd.DataFrame([['ООО А', 'A-1', 'Кружки', 'Старая партия', 1],
+                         ['ООО А', 'A-2', 'Кружки', 'Новая партия', 1],
+                         ['ООО А', 'A-3', 'Кружки', 'Без даты', 1]],
+                        columns=['Организация', 'Артикул_поставщика', 'Предмет', 'Название', 'Вес_брутто'])
+    price = pd.DataFrame([['A-1', 10, 'USD', 'Карго', '10.01.2025'],
+                          ['A-2', 10, 'USD', 'Карго', dt.datetime(2025, 3, 2)],
+                          ['A-3', 10, 'USD', 'Карго', None]],
+                         columns=['Артикул_поставщика', 'Закуп_Цена', 'Валюта', 'Тип_Логистики',
+                                  'Дата_Закупки'])
+    duty = pd.DataFrame([['Кружки', 0]], columns=['Предмет', 'Ставка_пошлины'])
+    params = {**DEFAULTS, 'ndsRateWhite': 0.2}
+    out = compute_cogs(prod, price, duty, params, {}, RateTable.from_values(VALUES))
+    # закупка 10$ по курсу даты партии, логистика 1 кг по тарифу и курсу той же даты
+    assert [r[4:6] for r in table_rows(out)] == [[800, 120], [1000, 150], [900, 180]]
@@ -17,3 +17,85 @@ def test_nmId_mapping_logistics():
     return_rate = 1 - wb_percent / 100
     per_full = per_unit + REVERSE_LOG * return_rate
     assert round(per_full) == 110
+
+
+def _orders_sales_api(monkeypatch, feeds, calls):
+    import json
+
+    import scripts.http_client as http_client
+
+    class Resp:
+        status_code = 200
+        headers = {}
+
+        def __init__(self, data):
+            self.content = json.dumps(data).encode()
+            self.text = ''
+
+        def json(self):
+            return json.loads(self.content)
+
+        def close(self):
+            pass
+
+    class Session:
+        def request(self, method, url, params=None, **kwargs):
+            feed = 'orders' if url.endswith('/orders') else 'sales'
+            calls.append((feed, params['dateFrom']))
+            return Resp([r for r in feeds[feed] if r['lastChangeDate'] > params['dateFrom']])
+
+    monkeypatch.setattr(http_client, '_CLIENT', http_client.HttpClient(
+        session=Session(), sleep=lambda s: None, budgets={}))
+
+
+def test_incremental_redemption_rate(tmp_path, monkeypatch):
+    import datetime as dt
+
+    import xlwings as xw
+    from openpyxl import Workbook
+
+    import scripts.calculate_redemption_rate as rr
+    from scripts.workbook_backend import open_headless
+
+    monkeypatch.setenv('FINMODEL_CACHE_DIR', str(tmp_path / 'cache'))
+    src = tmp_path / 'book.xlsx'
+    book = Workbook()
+    book.active.title = 'НастройкиОрганизаций'
+    book.active.append(['Организация', 'Token_WB'])
+    book.active.append(['Альфа', 'tok'])
+    book.save(src)
+    wb = open_headless(src, tmp_path / 'out.xlsx')
+    monkeypatch.setattr(xw.Book, 'caller', staticmethod(lambda: wb))
+
+    day = (dt.date.today() - dt.timedelta(days=3)).isoformat()
+    old = (dt.date.today() - dt.timedelta(days=rr.DAYS + 5)).isoformat()
+
+    def order(srid, nm, change, cancel=False, date=day):
+        return {'srid': srid, 'nmId': nm, 'date': f'{date}T10:00:00', 'isCancel': cancel,
+                'lastChangeDate': f'{day}T{change}'}
+
+    def sale(srid, change):
+        return {'srid': srid, 'saleID': 'S' + srid, 'date': f'{day}T12:00:00',
+                'lastChangeDate': f'{day}T{change}'}
+
+    feeds = {'orders': [order('a', 1, '10:00:00'), order('b', 1, '10:01:00'),
+                        order('c', 2, '10:02:00', cancel=True), order('d', 2, '10:03:00'),
+                        order('z', 3, '10:04:00', date=old)],
+             'sales': [sale('a', '11:00:00')]}
+    calls = []
+    _orders_sales_api(monkeypatch, feeds, calls)
+
+    def table():
+        return wb.sheets[rr.SHEET_OUTPUT].range('B1').expand().value[1:]     # A — индекс DataFrame
+
+    rr.main()
+    assert table() == [['Альфа', 1, 2, 1, 50], ['Альфа', 2, 1, 0, 0]]
+    assert sorted(f for f, _ in calls) == ['orders', 'sales']     # по одному запросу
+
+    # второй запуск: только изменения после водяного знака
+    feeds['orders'] += [order('b', 1, '12:00:00', cancel=True), order('e', 2, '12:01:00')]
+    feeds['sales'] += [sale('d', '12:02:00')]
+    calls.clear()
+    rr.main()
+    assert sorted(calls) == [('orders', f'{day}T10:04:00'), ('sales', f'{day}T11:00:00')]
+    assert table() == [['Альфа', 1, 1, 1, 100], ['Альфа', 2, 2, 1, 50]]
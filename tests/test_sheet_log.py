@@ -0,0 +1,53 @@
+from openpyxl import Workbook
+
+from scripts.sheet_log import SheetLogSink
+from scripts.workbook_backend import open_headless
+
+
+def _make_book(path):
+    wb = Workbook()
+    ws = wb.active
+    ws.title = 'WB_Log'
+    ws.append(['Время', 'Уровень', 'Сообщение'])
+    wb.save(path)
+
+
+def test_entries_are_flushed_in_blocks(tmp_path):
+    src = tmp_path / 'book.xlsx'
+    _make_book(src)
+    wb = open_headless(src, tmp_path / 'out.xlsx')
+    ws = wb.sheets['WB_Log']
+    writes = []
+    orig = ws._write_block
+    ws._write_block = lambda *a, **k: (writes.append(a), orig(*a, **k))[1]
+
+    sink = SheetLogSink(ws, name='test_sink', log_dir=tmp_path / 'log',
+                        flush_rows=3, flush_seconds=3600, echo=False)
+    for i in range(5):
+        sink.info(f'msg {i}')
+    assert len(writes) == 1 and sink.pending == 2
+    sink.error('boom')
+    sink.close()
+    assert len(writes) == 2
+
+    rows = ws.range('A1').expand().value
+    assert [r[1:] for r in rows[1:]] == [
+        ['INFO', 'msg 0'], ['INFO', 'msg 1'], ['INFO', 'msg 2'],
+        ['INFO', 'msg 3'], ['INFO', 'msg 4'], ['ERROR', 'boom'],
+    ]
+    text = (tmp_path / 'log' / 'test_sink.log').read_text(encoding='utf-8')
+    assert 'INFO: msg 4' in text and 'ERROR: boom' in text
+    wb.close()
+
+
+def test_time_threshold_flushes(tmp_path):
+    src = tmp_path / 'book.xlsx'
+    _make_book(src)
+    wb = open_headless(src, tmp_path / 'out.xlsx')
+    ws = wb.sheets['WB_Log']
+    with SheetLogSink(ws, name='test_sink_time', log_dir=tmp_path / 'log',
+                      flush_seconds=0, echo=False) as sink:
+        sink.info('now')
+        assert sink.pending == 0
+    assert ws.range('B2').value == 'INFO'
+    wb.close()
@@ -0,0 +1,140 @@
+import datetime as dt
+import json
+
+import xlwings as xw
+
+import scripts.http_client as http_client
+import scripts.import_wb_product_cards as cards_mod
+from scripts.api_emulator import EmulatorConfig, run_emulator
+from scripts.bench_importers import build_workbook
+from scripts.workbook_backend import open_headless
+
+PATH = '/content/v2/get/cards/list'
+
+
+class FakeResponse:
+    def __init__(self, status, data=None):
+        self.status_code = status
+        self.headers = {}
+        self.content = json.dumps(data).encode()
+        self.text = self.content.decode()
+
+    def json(self):
+        return json.loads(self.content)
+
+    def close(self):
+        pass
+
+
+class FakeSession:
+    def __init__(self, post):
+        self.post = post
+
+    def request(self, method, url, headers=None, json=None, timeout=None, **kwargs):
+        return self.post(headers, json)
+
+
+def _book(monkeypatch, tmp_path, orgs=2):
+    monkeypatch.setenv('FINMODEL_CACHE_DIR', str(tmp_path / 'cache'))
+    src = build_workbook(tmp_path / 'book.xlsx', orgs, dt.date(2025, 1, 1), dt.date(2025, 1, 31))
+    wb = open_headless(src, tmp_path / 'out.xlsx')
+    monkeypatch.setattr(xw.Book, 'caller', staticmethod(lambda: wb))
+    return wb
+
+
+def _sheet(wb):
+    return wb.sheets[cards_mod.PRODUCTS_SHEET].range('A1').expand().value
+
+
+def test_second_run_pulls_nothing(monkeypatch, tmp_path):
+    wb = _book(monkeypatch, tmp_path)
+    with run_emulator(EmulatorConfig(wb_cards=250)) as server:
+        monkeypatch.setenv('FINMODEL_API_BASE', server.base_url)
+        monkeypatch.setattr(http_client, '_CLIENT',
+                            http_client.HttpClient(budgets={}, sleep=lambda s: None))
+        cards_mod.main()
+        rows = _sheet(wb)
+        assert rows[0] == cards_mod.HEADERS
+        assert len(rows) == 1 + 2 * 250
+        assert server.hits[PATH] == 2 * 3
+
+        cards_mod.main()
+        assert server.hits[PATH] == 2 * 3 + 2      # одна пустая страница на организацию
+        assert _sheet(wb) == rows
+
+
+def _card(nm, title, updated):
+    return {'nmID': nm, 'vendorCode': f'V{nm}', 'brand': 'B', 'title': title,
+            'subjectName': 'S', 'updatedAt': updated,
+            'dimensions': {'width': 10, 'height': 10, 'length': 10, 'weightBrutto': 1}}
+
+
+def _serve(monkeypatch, catalogue, requests):
+    """Card list API over ``{nmID: card}``, recording request cursors."""
+    def post(headers, body):
+        cursor = body['settings']['cursor']
+        requests.append(dict(cursor))
+        after = (cursor.get('updatedAt', ''), cursor.get('nmID', 0))
+        cards = sorted((c for c in catalogue.values() if (c['updatedAt'], c['nmID']) > after),
+                       key=lambda c: (c['updatedAt'], c['nmID']))[:cursor['limit']]
+        cur = {'total': len(cards)}
+        if cards:
+            cur.update(updatedAt=cards[-1]['updatedAt'], nmID=cards[-1]['nmID'])
+        return FakeResponse(200, {'cards': cards, 'cursor': cur})
+
+    client = http_client.HttpClient(session=FakeSession(post), sleep=lambda s: None, budgets={})
+    monkeypatch.setattr(http_client, '_CLIENT', client)
+
+
+def test_changed_cards_rewritten_in_place(monkeypatch, tmp_path):
+    wb = _book(monkeypatch, tmp_path, orgs=1)
+    catalogue = {1: _card(1, 'a', '2025-01-01T00:00:00Z'), 2: _card(2, 'b', '2025-01-02T00:00:00Z'),
+                 3: _card(3, 'c', '2025-01-03T00:00:00Z')}
+    requests = []
+    _serve(monkeypatch, catalogue, requests)
+    cards_mod.main()
+    # строка Ozon ниже карточек WB не должна трогаться
+    ws = wb.sheets[cards_mod.PRODUCTS_SHEET]
+    ws.range('A5').value = ['ООО Тест 1', '777', 'OZ-1', '', 'ozon']
+    assert [r[4] for r in _sheet(wb)[1:]] == ['a', 'b', 'c', 'ozon']
+
+    catalogue[2] = _card(2, 'b2', '2025-02-01T00:00:00Z')
+    catalogue[4] = _card(4, 'd', '2025-02-02T00:00:00Z')
+    requests.clear()
+    cards_mod.main()
+    assert requests[0] == {'updatedAt': '2025-01-03T00:00:00Z', 'nmID': 3, 'limit': cards_mod.LIMIT}
+    assert [r[4] for r in _sheet(wb)[1:]] == ['a', 'b2', 'c', 'ozon', 'd']
+
+    requests.clear()
+    cards_mod.main()
+    assert requests == [{'updatedAt': '2025-02-02T00:00:00Z', 'nmID': 4, 'limit': cards_mod.LIMIT}]
+
+    # лист очищен — все карточки возвращаются из хранилища, без полной выгрузки
+    ws.clear()
+    cards_mod.main()
+    assert sorted(r[4] for r in _sheet(wb)[1:]) == ['a', 'b2', 'c', 'd']
+
+
+def test_deleted_cards_stay_deleted(monkeypatch, tmp_path):
+    wb = _book(monkeypatch, tmp_path, orgs=1)
+    catalogue = {1: _card(1, 'a', '2025-01-01T00:00:00Z'), 2: _card(2, 'b', '2025-01-02T00:00:00Z'),
+                 3: _card(3, 'c', '2025-01-03T00:00:00Z')}
+    _serve(monkeypatch, catalogue, [])
+    cards_mod.main()
+    ws = wb.sheets[cards_mod.PRODUCTS_SHEET]
+
+    # карточку удалили в WB, строку — вручную; изменение другой карточки её не возвращает
+    del catalogue[2]
+    ws.range('A3:K3').value = ws.range('A4:K4').value
+    ws.range('A4:K4').clear()
+    catalogue[1] = _card(1, 'a2', '2025-02-01T00:00:00Z')
+    cards_mod.main()
+    assert [r[4] for r in _sheet(wb)[1:]] == ['a2', 'c']
+
+    # полная выгрузка забывает карточку и в хранилище
+    cards_mod.main(full=True)
+    with cards_mod.CardStore(cards_mod.cards_store_path(wb)) as store:
+        assert sorted(k[1] for k, _ in store.rows()) == ['1', '3']
+    ws.clear()
+    cards_mod.main()
+    assert sorted(r[4] for r in _sheet(wb)[1:]) == ['a2', 'c']
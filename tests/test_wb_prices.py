@@ -0,0 +1,121 @@
+import json
+from urllib.parse import parse_qs, urlparse
+
+from openpyxl import Workbook
+
+import scripts.http_client as http_client
+import scripts.wb_prices as wb_prices
+from scripts.workbook_backend import open_headless
+
+
+class FakeResponse:
+    def __init__(self, status, data=None):
+        self.status_code = status
+        self.headers = {}
+        self.content = json.dumps(data).encode()
+
+    def json(self):
+        return json.loads(self.content)
+
+    def close(self):
+        pass
+
+
+class FakeSession:
+    def __init__(self, get):
+        self.get = get
+
+    def request(self, method, url, headers=None, timeout=None, **kwargs):
+        return self.get(url, headers)
+
+
+def _catalogue(n, price=100):
+    return [{'nmID': 1000 + i, 'vendorCode': f'SKU{i}',
+             'sizes': [{'sizeID': 10 * i + s, 'techSizeName': str(42 + s), 'price': price + i,
+                        'discountedPrice': price + i - 10, 'clubDiscountedPrice': price + i - 20}
+                       for s in range(2)]}
+            for i in range(n)]
+
+
+def _serve(monkeypatch, catalogues, failing=()):
+    def get(url, headers):
+        token = headers['Authorization']
+        if token in failing:
+            return FakeResponse(500)
+        q = parse_qs(urlparse(url).query)
+        offset, limit = int(q['offset'][0]), int(q['limit'][0])
+        goods = catalogues[token][offset:offset + limit]
+        return FakeResponse(200, {'data': {'listGoods': goods}})
+
+    client = http_client.HttpClient(session=FakeSession(get), sleep=lambda s: None, budgets={})
+    monkeypatch.setattr(http_client, '_CLIENT', client)
+
+
+def _book(path):
+    wb = Workbook()
+    ws = wb.active
+    ws.title = 'НастройкиОрганизаций'
+    ws.append(['Организация', 'Token_WB'])
+    ws.append(['Альфа', 'tA'])
+    ws.append(['Бета', 'tB'])
+    wb.save(path)
+
+
+def _sheet(wb):
+    rows = wb.sheets['Цены_WB'].range('A1').expand().value
+    return rows[0], {(r[0], str(r[1]), int(r[3])): r[5] for r in rows[1:]}, len(rows) - 1
+
+
+def test_incremental_sync_writes_only_delta(tmp_path, monkeypatch):
+    monkeypatch.setenv('FINMODEL_CACHE_DIR', str(tmp_path / 'cache'))
+    monkeypatch.setattr(wb_prices, 'PAGE_LIMIT', 3)
+    src = tmp_path / 'book.xlsx'
+    _book(src)
+    cats = {'tA': _catalogue(5), 'tB': _catalogue(4, price=500)}
+    _serve(monkeypatch, cats)
+
+    wb = open_headless(src, tmp_path / 'out.xlsx')
+    wb_prices.load_wb_prices_by_size_xlwings(wb)
+    header, prices, n = _sheet(wb)
+    assert header == wb_prices.HEADERS_RU and n == 18
+    assert prices[('Альфа', '1001', 10)] == 101
+
+    # следующий день: одна цена изменилась, один товар снят, один добавлен
+    cats['tA'][1]['sizes'][0]['price'] = 777
+    del cats['tB'][0]
+    cats['tB'].append(_catalogue(9, price=500)[8])
+    ws = wb.sheets['Цены_WB']
+    writes = []
+    orig = type(ws)._write_block
+    monkeypatch.setattr(type(ws), '_write_block',
+                        lambda self, r, c, block: (writes.append((r, len(block))), orig(self, r, c, block)))
+    wb_prices.load_wb_prices_by_size_xlwings(wb)
+
+    _, prices, n = _sheet(wb)
+    assert n == 18
+    assert prices[('Альфа', '1001', 10)] == 777
+    assert ('Бета', '1000', 0) not in prices and prices[('Бета', '1008', 80)] == 508
+    assert sum(k for _, k in writes) == 3          # 1 изменённая + 2 новых размера
+
+    changed = wb_prices.prices_changed_since(wb, '2000-01-01', org='Бета')
+    assert {c['nm_id'] for c in changed} == {'1000', '1001', '1002', '1003', '1008'}
+    wb.close()
+
+
+def test_failed_org_keeps_previous_prices(tmp_path, monkeypatch):
+    monkeypatch.setenv('FINMODEL_CACHE_DIR', str(tmp_path / 'cache'))
+    src = tmp_path / 'book.xlsx'
+    _book(src)
+    cats = {'tA': _catalogue(3), 'tB': _catalogue(2, price=500)}
+    _serve(monkeypatch, cats)
+    wb = open_headless(src, tmp_path / 'out.xlsx')
+    wb_prices.load_wb_prices_by_size_xlwings(wb)
+
+    cats['tA'][0]['sizes'][0]['price'] = 1
+    _serve(monkeypatch, cats, failing={'tB'})
+    wb_prices.load_wb_prices_by_size_xlwings(wb)
+    _, prices, n = _sheet(wb)
+    assert n == 10
+    assert prices[('Альфа', '1000', 0)] == 1
+    assert prices[('Бета', '1001', 10)] == 501
+    wb.close()
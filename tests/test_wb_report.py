@@ -0,0 +1,196 @@
+import json
+import threading
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+from openpyxl import Workbook
+
+import scripts.http_client as http_client
+import scripts.sheet_log as sheet_log
+import scripts.wb_report as wb_report
+from scripts.workbook_backend import open_headless
+
+
+def _make_book(path, orgs):
+    wb = Workbook()
+    ws = wb.active
+    ws.title = 'Настройки'
+    ws.append(['Параметр', 'Значение'])
+    ws.append(['ПериодНачало', '2025-01-01'])
+    ws.append(['ПериодКонец', '2025-01-14'])
+    org = wb.create_sheet('НастройкиОрганизаций')
+    org.append(['Организация', 'Token_WB', 'rrd_id'])
+    for name, token in orgs:
+        org.append([name, token, 0])
+    wb.create_sheet('ФинотчетыWB')
+    wb.create_sheet('WB_Log')
+    wb.save(path)
+
+
+class FakeResponse:
+    def __init__(self, status, data=None, headers=None):
+        self.status_code = status
+        self.headers = headers or {}
+        self._body = json.dumps(data, ensure_ascii=False).encode()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def close(self):
+        pass
+
+    def iter_content(self, chunk_size):
+        for i in range(0, len(self._body), 7):     # мелкие куски, как по сети
+            yield self._body[i:i + 7]
+
+
+class FakeSession:
+    def __init__(self, get):
+        self.get = get
+
+    def request(self, method, url, headers=None, timeout=None, stream=False, **kwargs):
+        return self.get(url, headers, timeout, stream)
+
+
+def _use_fake_api(monkeypatch, get):
+    client = http_client.HttpClient(session=FakeSession(get), sleep=lambda s: None)
+    monkeypatch.setattr(http_client, '_CLIENT', client)
+    return client
+
+
+def _rows(token, week, start_rrd, n):
+    return [{'realizationreport_id': f'{token}-{week}', 'nm_id': 100 + start_rrd + i, 'sa_name': f'SKU{i}',
+             'doc_type_name': 'Продажа', 'quantity': 1, 'retail_amount': 10,
+             'ppvz_for_pay': 8, 'create_dt': week, 'rrd_id': start_rrd + i + 1}
+            for i in range(n)]
+
+
+def test_orgs_download_concurrently_in_sheet_order(tmp_path, monkeypatch):
+    monkeypatch.setattr(sheet_log, 'LOG_DIR', tmp_path / 'log')
+    monkeypatch.setattr(wb_report, 'WB_RATE_PER_SEC', 1000.0)
+    monkeypatch.setenv('FINMODEL_CACHE_DIR', str(tmp_path / 'cache'))
+    src = tmp_path / 'book.xlsx'
+    _make_book(src, [('Бета', 'tB'), ('Альфа', 'tA')])
+
+    seen_429 = set()
+    threads = set()
+
+    def fake_get(url, headers, timeout, stream=False):
+        threads.add(threading.current_thread().name)
+        token = headers['Authorization']
+        q = parse_qs(urlparse(url).query)
+        week, rrd = q['dateFrom'][0], int(q['rrdid'][0])
+        if token == 'tA' and token not in seen_429:
+            seen_429.add(token)
+            return FakeResponse(429, headers={'Retry-After': '0'})
+        if rrd == 0:
+            return FakeResponse(200, _rows(token, week, 0, 2))
+        return FakeResponse(200, [])
+
+    client = _use_fake_api(monkeypatch, fake_get)
+    wb = open_headless(src, tmp_path / 'out.xlsx')
+    wb_report.import_wb_detailed_reports(wb)
+
+    facts = wb.sheets['ФинотчетыWB'].range('A1').expand().value
+    assert facts[0] == wb_report.FACTS_HEADER
+    assert [(r[0], r[6]) for r in facts[1:]] == [
+        ('Бета', 'tB-2025-01-01'), ('Бета', 'tB-2025-01-01'),
+        ('Бета', 'tB-2025-01-08'), ('Бета', 'tB-2025-01-08'),
+        ('Альфа', 'tA-2025-01-01'), ('Альфа', 'tA-2025-01-01'),
+        ('Альфа', 'tA-2025-01-08'), ('Альфа', 'tA-2025-01-08'),
+    ]
+    assert all(t.startswith('wb_report') for t in threads)
+    assert wb.sheets['НастройкиОрганизаций'].range('C2').value == 2
+    stats = client.metrics.by_endpoint()[wb_report.WB_API_URL_STAT]
+    assert stats['retries'] == 1 and stats['errors'] == 0
+    wb.save()
+    wb.close()
+
+    # повторный запуск: ключи из индекса, лист не дописывается
+    wb = open_headless(src, tmp_path / 'out.xlsx')
+    wb_report.import_wb_detailed_reports(wb)
+    assert len(wb.sheets['ФинотчетыWB'].range('A1').expand().value) == 9
+    log = wb.sheets['WB_Log'].range('C2').expand('down').value
+    assert any('индекс: ok' in m for m in log)
+    wb.close()
+
+
+def test_accumulator_tracks_last_rrd():
+    acc = wb_report.WbReportAccumulator('Org')
+    for r in _rows('t', '2025-01-01', 10, 3):
+        acc.add(r)
+    acc.add({**_rows('t', '2025-01-01', 10, 1)[0], 'doc_type_name': 'Возврат', 'rrd_id': 14})
+    recs = acc.records()
+    assert acc.rows == 4 and acc.last_rrd == 14
+    assert acc.doc_types == {'продажа': 3, 'возврат': 1}
+    assert recs[0]['Итого_продано'] == 0 and recs[0]['Выручка'] == 0
+    assert len(recs) == 3
+
+
+class Crash(BaseException):
+    pass
+
+
+def test_interrupted_import_resumes_from_journal(tmp_path, monkeypatch):
+    monkeypatch.setattr(sheet_log, 'LOG_DIR', tmp_path / 'log')
+    monkeypatch.setattr(wb_report, 'WB_RATE_PER_SEC', 1000.0)
+    monkeypatch.setenv('FINMODEL_CACHE_DIR', str(tmp_path / 'cache'))
+    src = tmp_path / 'book.xlsx'
+    _make_book(src, [('Альфа', 'tA')])
+    calls = []
+
+    def fake_get(url, headers, timeout, stream=False, crash=False):
+        q = parse_qs(urlparse(url).query)
+        week, rrd = q['dateFrom'][0], int(q['rrdid'][0])
+        calls.append((week, rrd))
+        if crash and week == '2025-01-08' and rrd == 2:
+            raise Crash()
+        if rrd < 4:
+            return FakeResponse(200, _rows('tA', week, rrd, 2))
+        return FakeResponse(200, [])
+
+    _use_fake_api(monkeypatch, lambda *a, **k: fake_get(*a, **k, crash=True))
+    wb = open_headless(src, tmp_path / 'out.xlsx')
+    with pytest.raises(Crash):
+        wb_report.import_wb_detailed_reports(wb)
+    wb.close()
+    assert calls[-1] == ('2025-01-08', 2)
+
+    calls.clear()
+    _use_fake_api(monkeypatch, fake_get)
+    wb = open_headless(src, tmp_path / 'out.xlsx')
+    wb_report.import_wb_detailed_reports(wb)
+    assert calls == [('2025-01-08', 2), ('2025-01-08', 4)]
+    facts = wb.sheets['ФинотчетыWB'].range('A1').expand().value
+    assert len(facts) == 1 + 8
+    wb.close()
+    assert not wb_report.journal_path(wb).exists()
+
+
+def test_429_waits_only_in_the_client(monkeypatch):
+    import time
+
+    class Log:
+        def __init__(self):
+            self.errors = []
+
+        def info(self, msg):
+            pass
+
+        def error(self, msg):
+            self.errors.append(msg)
+
+    waits = []
+    client = http_client.HttpClient(session=FakeSession(
+        lambda url, headers, timeout, stream: FakeResponse(429, headers={'Retry-After': '7'})),
+        sleep=waits.append, budgets={}, retries=2)
+    monkeypatch.setattr(http_client, '_CLIENT', client)
+    monkeypatch.setattr(time, 'sleep', lambda s: pytest.fail('повторная пауза после 429'))
+
+    log = Log()
+    acc = wb_report.WbReportAccumulator('Org')
+    assert wb_report.stream_wb_report_stat('t', '2025-01-01', '2025-01-07', 0, acc, log, 'Org') == (None, 0)
+    assert waits == [7, 7] and len(log.errors) == 1
@@ -0,0 +1,76 @@
+import pandas as pd
+from openpyxl import Workbook, load_workbook
+
+from scripts.workbook_backend import headless_requested, open_headless
+
+
+def _make_book(path):
+    wb = Workbook()
+    ws = wb.active
+    ws.title = 'Настройки'
+    ws.append(['Параметр', 'Значение'])
+    ws.append(['Курс_USD', 90])
+    ws.append(['Курс_CNY', 12.5])
+    ws['E1'] = 'отдельно'
+    wb.save(path)
+
+
+def test_read_table_like_xlwings(tmp_path):
+    src = tmp_path / 'book.xlsx'
+    _make_book(src)
+    wb = open_headless(src, tmp_path / 'out.xlsx')
+    sh = wb.sheets['Настройки']
+    assert sh.range(1, 1).expand('table').value == [
+        ['Параметр', 'Значение'], ['Курс_USD', 90.0], ['Курс_CNY', 12.5],
+    ]
+    assert sh.range('A1').expand('right').value == ['Параметр', 'Значение']
+    assert sh.range('A1').end('down').row == 3
+    assert sh.range('A' + str(sh.cells.last_cell.row)).end('up').row == 3
+    df = sh.range(1, 1).expand().options(pd.DataFrame, header=1, index=False).value
+    assert list(df.columns) == ['Параметр', 'Значение']
+    assert df['Значение'].tolist() == [90.0, 12.5]
+    wb.close()
+
+
+def test_written_sheets_go_to_output(tmp_path):
+    src = tmp_path / 'book.xlsx'
+    out = tmp_path / 'out.xlsx'
+    _make_book(src)
+    wb = open_headless(src, out)
+    res = wb.sheets.add('Итог')
+    res.range(1, 1).value = ['A', 'B']
+    res.range(2, 1).value = [[1, 2], [3, 4]]
+    res.tables.add(res.range((1, 1), (3, 2)), name='ResTbl')
+    res.range(4, 1).formula = '=SUBTOTAL(9,A2:A3)'
+    wb.save()
+    wb.close()
+
+    saved = load_workbook(out)
+    assert saved.sheetnames == ['Итог']
+    assert saved['Итог']['B3'].value == 4
+    assert saved['Итог']['A4'].value == '=SUBTOTAL(9,A2:A3)'
+    assert 'ResTbl' in saved['Итог'].tables
+
+    # следующий этап видит результат предыдущего
+    wb2 = open_headless(src, out)
+    assert wb2.sheets['Итог'].range('A1').expand().value == [['A', 'B'], [1.0, 2.0], [3.0, 4.0]]
+    wb2.close()
+
+
+def test_com_calls_are_noops(tmp_path):
+    src = tmp_path / 'book.xlsx'
+    _make_book(src)
+    wb = open_headless(src, tmp_path / 'out.xlsx')
+    sh = wb.sheets[0]
+    sh.api.Tab.Color = 0xEAF884
+    assert list(sh.api.ListObjects) == []
+    wb.app.screen_updating = False
+    wb.close()
+
+
+def test_backend_selection(monkeypatch):
+    monkeypatch.delenv('FINMODEL_BACKEND', raising=False)
+    assert not headless_requested()
+    monkeypatch.setenv('FINMODEL_BACKEND', 'openpyxl')
+    assert headless_requested()
+    assert not headless_requested('xlwings')
@@ -0,0 +1,64 @@
+import datetime
+
+from openpyxl import Workbook
+
+from scripts.workbook_backend import open_headless
+from scripts.workbook_snapshot import from_column, load_snapshot, to_column
+
+
+def _make_book(path, revenue=1000):
+    wb = Workbook()
+    ws = wb.active
+    ws.title = 'РасчётЭкономикиWB'
+    ws.append(['Организация', 'Месяц', 'Выручка, ₽', 'Комментарий'])
+    ws.append(['Org', 1, revenue, None])
+    ws.append(['Org', 2, None, 'ok'])
+    org = wb.create_sheet('НастройкиОрганизаций')
+    org.append(['Организация', 'Дата'])
+    org.append(['Org', datetime.datetime(2025, 1, 1)])
+    wb.save(path)
+
+
+def test_column_roundtrip():
+    for values in ([1.0, None, 2.5], ['a', None, 'b'], ['a', 1.0, None, True]):
+        assert from_column(*to_column(values)) == values
+
+
+def test_snapshot_is_served_from_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv('FINMODEL_CACHE_DIR', str(tmp_path / 'cache'))
+    src = tmp_path / 'book.xlsx'
+    _make_book(src)
+    sheets = ['РасчётЭкономикиWB', 'НастройкиОрганизаций', 'Зарплата']
+
+    wb = open_headless(src, tmp_path / 'out.xlsx')
+    first = load_snapshot(wb, sheets)
+    wb.close()
+    assert not first.from_cache
+    assert 'Зарплата' not in first      # листа нет в книге
+
+    wb = open_headless(src, tmp_path / 'out.xlsx')
+    second = load_snapshot(wb, sheets)
+    wb.close()
+    assert second.from_cache
+    assert second.read_rows('РасчётЭкономикиWB') == first.read_rows('РасчётЭкономикиWB')
+    rows, idx = second.read_rows('РасчётЭкономикиWB')
+    assert rows == [['Org', 1.0, 1000.0, None], ['Org', 2.0, None, 'ok']]
+    assert idx['выручка, ₽'] == 2
+    org_rows, _ = second.read_rows('НастройкиОрганизаций')
+    assert org_rows[0][1] == datetime.datetime(2025, 1, 1)
+
+
+def test_changed_file_invalidates_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv('FINMODEL_CACHE_DIR', str(tmp_path / 'cache'))
+    src = tmp_path / 'book.xlsx'
+    _make_book(src)
+    wb = open_headless(src, tmp_path / 'out.xlsx')
+    load_snapshot(wb, ['РасчётЭкономикиWB'])
+    wb.close()
+
+    _make_book(src, revenue=2000)
+    wb = open_headless(src, tmp_path / 'out.xlsx')
+    snap = load_snapshot(wb, ['РасчётЭкономикиWB'])
+    wb.close()
+    assert not snap.from_cache
+    assert snap.read_rows('РасчётЭкономикиWB')[0][0][2] == 2000.0